@@ -0,0 +1,63 @@
+"""
+Cross-user reflection analytics for the ops dashboard.
+
+Reads every user's reflection dates in one streaming pass, computes
+streaks, gaps, weekly retention by monthly cohort and activity histograms
+with NumPy (services/cohorts.py) and writes a compact JSON report.
+
+Usage:
+    python analytics.py [--out report.json] [--weeks 12] [--today YYYY-MM-DD]
+    python analytics.py --per-user streaks.npz   # also save per-user arrays
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import date
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cohort and streak analytics for all users")
+    parser.add_argument("--out", help="report path (default: stdout)")
+    parser.add_argument("--weeks", type=int, default=12, help="weeks of retention per cohort")
+    parser.add_argument("--today", type=date.fromisoformat, default=None)
+    parser.add_argument("--per-user", help="also write user_id/total/longest/current arrays to this .npz")
+    args = parser.parse_args()
+
+    try:
+        import numpy as np
+        from services.cohorts import cohort_report, day_number, load_activity, user_streaks
+    except ImportError:
+        sys.exit("analytics needs numpy: pip install numpy")
+
+    today = args.today or date.today()
+
+    started = time.perf_counter()
+    users, days = load_activity()
+    loaded = time.perf_counter()
+    report = cohort_report(users, days, today=today, weeks=args.weeks)
+    computed = time.perf_counter()
+
+    if args.per_user:
+        streaks = user_streaks(users, days, today=day_number(today))
+        np.savez_compressed(
+            args.per_user,
+            **{key: streaks[key] for key in ("user_id", "total", "longest", "current")},
+        )
+
+    body = json.dumps(report, separators=(",", ":"))
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(body)
+    else:
+        print(body)
+
+    print(
+        f"{len(users)} reflections, {report['summary']['users']} users: "
+        f"read {loaded - started:.2f}s, computed {computed - loaded:.2f}s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
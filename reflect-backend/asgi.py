@@ -0,0 +1,173 @@
+"""
+ASGI entry point.
+
+Serves /api/morning-insights on the event loop so that slow model calls do not
+hold a worker thread, and hands every other request to the Flask app, which
+runs in asgiref's thread pool as before. The async route goes through the
+same admission control (services/admission.py) and on-demand profiling
+(profiling.py) as the Flask routes.
+
+Run with: uvicorn asgi:application --workers 2
+
+Each worker is its own process: per-process state such as the task reminder
+dispatcher runs in only one of them (services/reminders.py).
+"""
+import cProfile
+import json
+import time
+from datetime import date, timedelta
+
+from asgiref.wsgi import WsgiToAsgi
+
+from db import async_session_for_user, dispose_async_engine
+from main import create_app, goal_to_dict, reflection_to_dict, insight_cache_filler
+from profiling import PROFILE_HEADER, new_profile_id, should_profile, write_profile
+from services.admission import EXPENSIVE, admit_request, release_request
+from services.ai_insights import generate_morning_insights_async
+from services.goals import get_goals_for_user_async
+from services.insight_batch import get_stored_insights_async
+from services.reflections import condensed_fields, get_reflection_for_date_async
+
+CORS_ORIGIN = "http://localhost:5173"
+
+flask_application = WsgiToAsgi(create_app())
+
+
+async def _send_json(send, status, payload, extra_headers=()):
+    body = json.dumps(payload).encode("utf-8")
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"access-control-allow-origin", CORS_ORIGIN.encode()),
+        (b"access-control-allow-credentials", b"true"),
+        *extra_headers,
+    ]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _header(scope, name: bytes):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def _morning_insights_payload(user_id: int):
+    """(status, body) for a user's morning insights."""
+    try:
+        async with async_session_for_user(user_id) as db:
+            stored = await get_stored_insights_async(db=db, user_id=user_id, insight_date=date.today())
+            if stored is not None:
+                return 200, stored
+
+            goals = await get_goals_for_user_async(db=db, user_id=user_id, status="active")
+            goals_list = [goal_to_dict(g) for g in goals]
+
+            yesterday = date.today() - timedelta(days=1)
+            reflection = await get_reflection_for_date_async(
+                db=db, user_id=user_id, reflection_date=yesterday
+            )
+            yesterday_reflection = None
+            if reflection:
+                yesterday_reflection = reflection_to_dict(reflection)
+                # stale copies are recomputed in memory; the sync path persists them
+                yesterday_reflection["condensed"] = condensed_fields(reflection)
+
+        # the session is released before awaiting the model
+        insights = await generate_morning_insights_async(
+            goals_list,
+            yesterday_reflection,
+            on_late_result=insight_cache_filler(user_id, date.today()),
+        )
+        return 200, insights
+
+    except Exception as e:
+        print(f"Error in morning_insights: {e}")
+        return 500, {"error": "Failed to generate insights"}
+
+
+async def morning_insights(scope, receive, send):
+    """Async counterpart of main.get_morning_insights"""
+    if scope["method"] == "OPTIONS":
+        await _send_json(send, 200, None, (
+            (b"access-control-allow-headers", b"Content-Type, X-User-Id"),
+            (b"access-control-allow-methods", b"GET, OPTIONS"),
+        ))
+        return
+
+    if scope["method"] != "GET":
+        await _send_json(send, 405, {"error": "method not allowed"})
+        return
+
+    user_id = _header(scope, b"x-user-id")
+    if user_id is None:
+        await _send_json(send, 401, {"error": "X-User-Id header required"})
+        return
+    try:
+        user_id = int(user_id)
+    except ValueError:
+        await _send_json(send, 400, {"error": "X-User-Id must be an integer"})
+        return
+
+    # same limits as the Flask route, which is in main.EXPENSIVE_ENDPOINTS
+    decision = admit_request(user_id=user_id, cost_class=EXPENSIVE)
+    if decision.status is not None:
+        await _send_json(
+            send,
+            decision.status,
+            {"error": decision.reason, "retry_after": decision.retry_after},
+            ((b"retry-after", str(decision.retry_after).encode()),),
+        )
+        return
+
+    try:
+        profiler = None
+        if should_profile(scope["method"], _header(scope, PROFILE_HEADER.lower().encode())):
+            profile_id = new_profile_id("asgi.morning_insights")
+            started = time.perf_counter()
+            # other requests served by the loop meanwhile show up in it too
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            status, payload = await _morning_insights_payload(user_id)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                write_profile(
+                    profiler, profile_id, f"GET {scope['path']}",
+                    (time.perf_counter() - started) * 1000,
+                )
+
+        extra_headers = ((b"x-profile-id", profile_id.encode()),) if profiler is not None else ()
+        await _send_json(send, status, payload, extra_headers)
+    finally:
+        release_request()
+
+
+ASYNC_ROUTES = {
+    "/api/morning-insights": morning_insights,
+}
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await dispose_async_engine()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] == "http":
+        handler = ASYNC_ROUTES.get(scope["path"])
+        if handler is not None:
+            await handler(scope, receive, send)
+            return
+    await flask_application(scope, receive, send)
@@ -0,0 +1,166 @@
+"""
+Analyze journal entries and reflections written before text analytics
+existed (or by an older analyzer) and rebuild the affected rollups.
+
+Rows are read in id order, in batches, and analyzed by a pool of worker
+processes while the main process keeps reading and writes finished
+batches back. Every database holding user data is covered (shards, and
+the archive when ARCHIVE_ENABLED=1). Safe to re-run: rows already
+analyzed by the current ANALYZER_VERSION are skipped.
+
+Usage:
+    python backfill_text_analytics.py [--workers 4] [--batch-size 500]
+"""
+import argparse
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from sqlalchemy import and_, or_
+
+from db import init_db, session_factories
+from models import (
+    ArchivedJournalEntry,
+    ArchivedReflection,
+    DailyReflection,
+    JournalEntry,
+    TextAnalytics,
+)
+from services.archive import reaches_archive
+from services.html_text import html_to_text
+from services.text_analytics import ANALYZER_VERSION, analyze_text, rebuild_rollups, reflection_text
+
+
+def _sources():
+    """(source, model, date column, text columns) for every table to analyze."""
+    sources = [
+        ("journal_entry", JournalEntry, JournalEntry.entry_date, (JournalEntry.plain_text, JournalEntry.content)),
+        ("reflection", DailyReflection, DailyReflection.reflection_date,
+         (DailyReflection.summary, DailyReflection.accomplishments, DailyReflection.improvements_to_make)),
+    ]
+    if reaches_archive(None):
+        sources += [
+            ("journal_entry", ArchivedJournalEntry, ArchivedJournalEntry.entry_date,
+             (ArchivedJournalEntry.plain_text, ArchivedJournalEntry.content)),
+            ("reflection", ArchivedReflection, ArchivedReflection.reflection_date,
+             (ArchivedReflection.summary, ArchivedReflection.accomplishments,
+              ArchivedReflection.improvements_to_make)),
+        ]
+    return sources
+
+
+def analyze_batch(source: str, rows: list) -> list:
+    """Worker side: (id, user_id, day, *text columns) rows to analytics rows."""
+    analyzed = []
+    for source_id, user_id, day, *fields in rows:
+        if source == "journal_entry":
+            plain_text, content = fields
+            text = plain_text if plain_text is not None else html_to_text(content)
+        else:
+            text = reflection_text(fields)
+        result = analyze_text(text)
+        analyzed.append({
+            "user_id": user_id,
+            "source": source,
+            "source_id": source_id,
+            "day": day,
+            "words": result["words"],
+            "positive": result["positive"],
+            "negative": result["negative"],
+            "mood": result["mood"],
+            "terms": result["terms"],
+            "analyzer_version": ANALYZER_VERSION,
+        })
+    return analyzed
+
+
+def read_batches(db, batch_size: int):
+    """Yield (source, rows) batches of rows missing a current analysis."""
+    for source, model, day_column, text_columns in _sources():
+        last_id = 0
+        while True:
+            rows = (
+                db.query(model.id, model.user_id, day_column, *text_columns)
+                .outerjoin(
+                    TextAnalytics,
+                    and_(TextAnalytics.source == source, TextAnalytics.source_id == model.id),
+                )
+                .filter(
+                    model.id > last_id,
+                    or_(TextAnalytics.id.is_(None), TextAnalytics.analyzer_version < ANALYZER_VERSION),
+                )
+                .order_by(model.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+            yield source, [tuple(row) for row in rows]
+
+
+def write_batch(db, analyzed: list) -> None:
+    """Replace the analytics rows of one batch; rollups are rebuilt afterwards."""
+    by_source = {}
+    for row in analyzed:
+        by_source.setdefault(row["source"], []).append(row["source_id"])
+    for source, ids in by_source.items():
+        db.query(TextAnalytics).filter(
+            TextAnalytics.source == source, TextAnalytics.source_id.in_(ids)
+        ).delete(synchronize_session=False)
+    db.add_all(
+        TextAnalytics(**{**row, "terms": json.dumps(row["terms"])}) for row in analyzed
+    )
+    db.commit()
+
+
+def backfill(factory, pool, batch_size: int, max_pending: int) -> tuple:
+    """Backfill one database; returns (rows analyzed, users touched)."""
+    reader, writer = factory(), factory()
+    analyzed = 0
+    users = set()
+    pending = set()
+
+    def collect(done):
+        nonlocal analyzed
+        for future in done:
+            rows = future.result()
+            write_batch(writer, rows)
+            analyzed += len(rows)
+            users.update(row["user_id"] for row in rows)
+
+    try:
+        for source, rows in read_batches(reader, batch_size):
+            pending.add(pool.submit(analyze_batch, source, rows))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        done, _ = wait(pending)
+        collect(done)
+
+        rebuild_rollups(db=writer, user_ids=sorted(users))
+    finally:
+        reader.close()
+        writer.close()
+    return analyzed, users
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill per-entry text analytics and rollups")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    init_db()
+    total_rows, total_users = 0, 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for factory in session_factories():
+            analyzed, users = backfill(factory, pool, args.batch_size, max_pending=args.workers * 2)
+            total_rows += analyzed
+            total_users += len(users)
+
+    print(f"analyzed {total_rows} rows; rebuilt rollups for {total_users} users")
+
+
+if __name__ == "__main__":
+    main()
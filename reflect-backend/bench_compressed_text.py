@@ -0,0 +1,100 @@
+"""
+Storage and throughput benchmark for CompressedText.
+
+Writes the same synthetic TipTap-style journal HTML into throwaway SQLite
+databases as plain text, zlib and zstd, then reports file size, write and
+read throughput.
+
+Usage:
+    python bench_compressed_text.py [--entries 5000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import column_types
+from db import Base
+from models import JournalEntry
+
+WORDS = (
+    "today felt focused tired grateful walked meeting project deadline wrote "
+    "read coffee friends family workout calm anxious progress shipped learned"
+).split()
+
+
+def synthetic_entry(rng: random.Random) -> str:
+    paragraphs = []
+    for _ in range(rng.randint(3, 12)):
+        words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 80)))
+        if rng.random() < 0.3:
+            words = f"<strong>{words[:30]}</strong> {words[30:]}"
+        paragraphs.append(f'<p class="editor-paragraph">{words}</p>')
+    if rng.random() < 0.5:
+        items = "".join(
+            f'<li class="editor-list-item"><p>{rng.choice(WORDS)} {rng.choice(WORDS)}</p></li>'
+            for _ in range(rng.randint(2, 6))
+        )
+        paragraphs.append(f'<ul class="editor-bullet-list">{items}</ul>')
+    return "".join(paragraphs)
+
+
+def run(label: str, contents, *, enabled: bool, codec: str):
+    column_types.TEXT_COMPRESSION_ENABLED = enabled
+    column_types.TEXT_COMPRESSION_CODEC = codec
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        engine = create_engine(f"sqlite:///{path}", future=True)
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine, future=True)
+
+        started = time.perf_counter()
+        with Session() as db:
+            db.add_all(
+                JournalEntry(user_id=1, content=c, entry_date=date.today())
+                for c in contents
+            )
+            db.commit()
+        write_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with Session() as db:
+            total = sum(len(e.content) for e in db.query(JournalEntry).all())
+        read_s = time.perf_counter() - started
+
+        engine.dispose()
+        size = os.path.getsize(path)
+
+    raw_mb = sum(len(c.encode("utf-8")) for c in contents) / 1e6
+    print(
+        f"{label:<6} db={size / 1e6:7.2f} MB  "
+        f"write={raw_mb / write_s:7.1f} MB/s  read={raw_mb / read_s:7.1f} MB/s  "
+        f"chars={total}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CompressedText benchmark")
+    parser.add_argument("--entries", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    contents = [synthetic_entry(rng) for _ in range(args.entries)]
+    print(f"{args.entries} entries, {sum(map(len, contents)) / 1e6:.2f} MB of HTML\n")
+
+    run("plain", contents, enabled=False, codec="zlib")
+    run("zlib", contents, enabled=True, codec="zlib")
+    if column_types.zstandard is not None:
+        run("zstd", contents, enabled=True, codec="zstd")
+    else:
+        print("zstd   skipped (zstandard not installed)")
+
+
+if __name__ == "__main__":
+    main()
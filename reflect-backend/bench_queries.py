@@ -0,0 +1,141 @@
+"""
+Per-call overhead of the hot service lookups.
+
+Seeds an in-memory SQLite database and times each lookup two ways: the
+legacy `db.query(...).filter(...)` form, rebuilt on every call, and the
+service function, which executes a module-level statement with bound
+parameters. Rows are tiny, so the difference is statement construction
+and compilation rather than I/O.
+
+Usage:
+    python bench_queries.py [--calls 5000] [--users 50]
+"""
+import argparse
+import time
+from datetime import date, time as dtime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from db import Base
+from models import DailyReflection, Goal, JournalEntry, ScheduledTask
+from services.goals import get_goals_for_user
+from services.journal_entries import get_journal_entries_for_date
+from services.reflections import get_reflection_for_date
+from services.scheduled_tasks import get_scheduled_task
+
+
+def seed(db, *, users: int, day: date):
+    task_ids = []
+    for user_id in range(1, users + 1):
+        db.add(DailyReflection(user_id=user_id, reflection_date=day, summary="<p>day</p>"))
+        db.add(JournalEntry(user_id=user_id, content="<p>entry</p>", entry_date=day))
+        db.add_all(Goal(user_id=user_id, description=f"Goal {n}") for n in range(3))
+        task = ScheduledTask(
+            user_id=user_id,
+            title="Task",
+            task_date=day,
+            start_time=dtime(9, 0),
+            end_time=dtime(10, 0),
+        )
+        db.add(task)
+        db.flush()
+        task_ids.append(task.id)
+    db.commit()
+    return task_ids
+
+
+def legacy_lookups(day: date, task_ids):
+    return {
+        "reflection": lambda db, user_id: (
+            db.query(DailyReflection)
+            .filter(DailyReflection.user_id == user_id, DailyReflection.reflection_date == day)
+            .one_or_none()
+        ),
+        "journal_entries": lambda db, user_id: (
+            db.query(JournalEntry)
+            .filter(JournalEntry.user_id == user_id, JournalEntry.entry_date == day)
+            .order_by(JournalEntry.created_at.asc())
+            .all()
+        ),
+        "goals": lambda db, user_id: (
+            db.query(Goal)
+            .filter(Goal.user_id == user_id, Goal.status == "active")
+            .order_by(Goal.created_at.asc())
+            .all()
+        ),
+        "scheduled_task": lambda db, user_id: (
+            db.query(ScheduledTask)
+            .filter(ScheduledTask.id == task_ids[user_id - 1], ScheduledTask.user_id == user_id)
+            .one_or_none()
+        ),
+    }
+
+
+def cached_lookups(day: date, task_ids):
+    return {
+        "reflection": lambda db, user_id: get_reflection_for_date(
+            db=db, user_id=user_id, reflection_date=day
+        ),
+        "journal_entries": lambda db, user_id: get_journal_entries_for_date(
+            db=db, user_id=user_id, entry_date=day
+        ),
+        "goals": lambda db, user_id: get_goals_for_user(db=db, user_id=user_id, status="active"),
+        "scheduled_task": lambda db, user_id: get_scheduled_task(
+            db=db, task_id=task_ids[user_id - 1], user_id=user_id
+        ),
+    }
+
+
+def time_calls(Session, lookup, *, calls: int, users: int) -> float:
+    """Microseconds per call; a fresh session per batch keeps the identity map small."""
+    with Session() as db:
+        for user_id in range(1, users + 1):
+            lookup(db, user_id)  # warm the compiled cache
+
+    started = time.perf_counter()
+    done = 0
+    while done < calls:
+        with Session() as db:
+            for user_id in range(1, users + 1):
+                lookup(db, user_id)
+        done += users
+    return (time.perf_counter() - started) * 1e6 / done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot query microbenchmark")
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+
+    engine = create_engine(
+        "sqlite://",
+        future=True,
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, future=True)
+
+    # a recent date, so reflection and journal lookups never reach the archive
+    day = date.today() - timedelta(days=1)
+    with Session() as db:
+        task_ids = seed(db, users=args.users, day=day)
+
+    legacy = legacy_lookups(day, task_ids)
+    cached = cached_lookups(day, task_ids)
+
+    print(f"{args.calls} calls per lookup, {args.users} users, in-memory SQLite\n")
+    print(f"{'lookup':<16} {'legacy':>10} {'cached':>10} {'speedup':>8}")
+    for name in legacy:
+        before = time_calls(Session, legacy[name], calls=args.calls, users=args.users)
+        after = time_calls(Session, cached[name], calls=args.calls, users=args.users)
+        print(f"{name:<16} {before:8.1f}us {after:8.1f}us {before / after:7.2f}x")
+
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
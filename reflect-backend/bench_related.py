@@ -0,0 +1,107 @@
+"""
+Related-entries lookups: LSH buckets vs a full scan.
+
+Indexes synthetic journal entries for one user (each drawn from a few
+themes of a shared vocabulary) into a temporary index file, then times the
+MinHash signature per write, an LSH query, and a brute-force query that
+compares the signature against every entry in the file.
+
+Usage:
+    python bench_related.py [--entries 20000] [--queries 200] [--seed 3]
+"""
+import argparse
+import os
+import random
+import struct
+import tempfile
+import time
+
+from services.related_entries import (
+    _PREFIX,
+    _RECORD,
+    _SIGNATURE,
+    UserIndex,
+    signature,
+    similarity,
+)
+
+THEMES = 40
+WORDS_PER_THEME = 60
+COMMON_WORDS = 400
+
+
+def synthetic_texts(count: int, rng: random.Random):
+    themes = [[f"theme{t}word{w}" for w in range(WORDS_PER_THEME)] for t in range(THEMES)]
+    common = [f"everyday{w}" for w in range(COMMON_WORDS)]
+    for _ in range(count):
+        picked = rng.sample(range(THEMES), 2)
+        words = rng.sample(themes[picked[0]], 25) + rng.sample(themes[picked[1]], 10) + rng.sample(common, 40)
+        # keep the bench on letters only, like journal text
+        yield " ".join(words).translate(str.maketrans("0123456789", "abcdefghij"))
+
+
+def brute_force(index: UserIndex, sig, limit: int):
+    scored = []
+    for slot in range(index.count):
+        offset = index._offset(slot)
+        entry_id, live = struct.unpack_from("<II", index._map, offset)
+        if live:
+            other = _SIGNATURE.unpack_from(index._map, offset + _PREFIX.size)
+            scored.append((entry_id, similarity(sig, other)))
+    scored.sort(key=lambda item: (-item[1], -item[0]))
+    return scored[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Related-entries index benchmark")
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = list(synthetic_texts(args.entries, rng))
+
+    started = time.perf_counter()
+    signatures = [signature(text) for text in texts]
+    sign_ms = (time.perf_counter() - started) * 1e3 / len(texts)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.mhx")
+        index = UserIndex(path)
+        started = time.perf_counter()
+        for entry_id, sig in enumerate(signatures, start=1):
+            index.upsert(entry_id, sig)
+        upsert_us = (time.perf_counter() - started) * 1e6 / len(texts)
+        index.flush()
+        size_mb = os.path.getsize(path) / 1e6
+
+        started = time.perf_counter()
+        UserIndex(path).close()
+        open_ms = (time.perf_counter() - started) * 1e3
+
+        probes = rng.sample(range(1, args.entries + 1), min(args.queries, args.entries))
+        started = time.perf_counter()
+        lsh_results = [index.query(signatures[p - 1], exclude=p, limit=5) for p in probes]
+        lsh_ms = (time.perf_counter() - started) * 1e3 / len(probes)
+
+        started = time.perf_counter()
+        exact_results = [
+            [hit for hit in brute_force(index, signatures[p - 1], 6) if hit[0] != p][:5] for p in probes
+        ]
+        scan_ms = (time.perf_counter() - started) * 1e3 / len(probes)
+        index.close()
+
+    found = sum(len({e for e, _ in a} & {e for e, _ in b}) for a, b in zip(lsh_results, exact_results))
+    wanted = sum(len(b) for b in exact_results)
+    print(f"{args.entries} entries, {_RECORD.size} B per record, index file {size_mb:.1f} MB\n")
+    print(f"  signature per entry   {sign_ms:8.2f} ms")
+    print(f"  index upsert          {upsert_us:8.1f} us")
+    print(f"  open (bucket rebuild) {open_ms:8.1f} ms")
+    print(f"  LSH query             {lsh_ms:8.2f} ms")
+    print(f"  full-scan query       {scan_ms:8.2f} ms  ({scan_ms / lsh_ms:.0f}x slower)")
+    print(f"  top-5 recall vs scan  {found / max(wanted, 1):8.1%}")
+
+
+if __name__ == "__main__":
+    main()
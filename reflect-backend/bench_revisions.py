@@ -0,0 +1,98 @@
+"""
+Revision history storage: full copies vs snapshots plus deltas.
+
+Simulates a day of autosaves on one long journal entry (each save types a
+few words somewhere, or adds a paragraph) in a temporary SQLite database,
+records every save with services/revisions.py, then reports:
+
+  - bytes on disk for the revision rows vs a full copy per save,
+  - the average time to record a save and to rebuild a revision.
+
+Usage:
+    python bench_revisions.py [--saves 500] [--paragraphs 60] [--seed 7]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import services.revisions as revisions
+from db import Base
+from models import JournalEntry
+
+WORDS = (
+    "today morning evening work project meeting walk river coffee friend "
+    "quiet tired happy plan write read garden rain letter call"
+).split()
+
+
+def paragraph(rng) -> str:
+    return "<p>" + " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 60))) + ".</p>"
+
+
+def autosave_edit(rng, html: str) -> str:
+    if rng.random() < 0.15:
+        return html + paragraph(rng)
+    at = html.rfind(" ", 0, rng.randrange(len(html))) + 1
+    return html[:at] + " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6))) + " " + html[at:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Revision history storage benchmark")
+    parser.add_argument("--saves", type=int, default=500)
+    parser.add_argument("--paragraphs", type=int, default=60, help="size of the entry at the first save")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    revisions.REVISION_COALESCE_S = 0  # every save is its own revision
+    revisions.REVISION_KEEP = args.saves
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", future=True)
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine, future=True, autoflush=False)
+
+        with Session() as db:
+            content = "".join(paragraph(rng) for _ in range(args.paragraphs))
+            entry = JournalEntry(user_id=1, content=content, entry_date=date.today())
+            db.add(entry)
+            db.flush()
+
+            full_bytes = 0
+            record_s = 0.0
+            for _ in range(args.saves):
+                entry.content = content = autosave_edit(rng, content)
+                started = time.perf_counter()
+                revisions.record_revision(db=db, entry=entry)
+                record_s += time.perf_counter() - started
+                db.commit()
+                full_bytes += len(content.encode("utf-8"))
+
+            stored_bytes, rows, snapshots = db.execute(text(
+                "SELECT SUM(LENGTH(CAST(data AS BLOB))), COUNT(*), SUM(base_revision IS NULL) "
+                "FROM journal_revisions"
+            )).one()
+
+            numbers = [rng.randint(1, args.saves) for _ in range(200)]
+            started = time.perf_counter()
+            for number in numbers:
+                revisions.get_revision(db=db, entry_id=entry.id, revision=number)
+            rebuild_s = (time.perf_counter() - started) / len(numbers)
+        engine.dispose()
+
+    print(f"{args.saves} saves, final entry {len(content) / 1024:.1f} KiB")
+    print(f"  full copy per save    {full_bytes / 1024:10.1f} KiB")
+    print(f"  snapshots + deltas    {stored_bytes / 1024:10.1f} KiB  ({rows} rows, {snapshots} snapshots)")
+    print(f"  reduction             {full_bytes / stored_bytes:10.1f}x")
+    print(f"  record a save         {record_s / args.saves * 1e3:10.2f} ms")
+    print(f"  rebuild a revision    {rebuild_s * 1e3:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Concurrent write throughput: one database file vs N shard files.
+
+Starts `--writers` processes (like app workers), each saving journal
+entries for its own user through a ShardRouter in a temporary directory,
+one commit per entry (as a request would). SQLite allows one writer per
+file, so with a single shard the writers queue on its lock; with hash
+sharding writers for different shards commit in parallel. Reports commits
+per second for each layout. The gain is bounded by the CPU cores free for
+the writers: on one core it mostly comes from shorter lock waits.
+
+Usage:
+    python bench_shards.py [--writers 8] [--writes 200] [--shards 1 8]
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import date
+
+# lock waits are the point here; keep them out of the slow query log
+os.environ.setdefault("SLOW_QUERY_MS", "0")
+
+from db import ShardRouter  # noqa: E402
+from models import JournalEntry  # noqa: E402
+
+CONTENT = "<p>" + "a few words about the day " * 40 + "</p>"
+
+
+def writer(shards: int, directory: str, user_id: int, writes: int, start) -> None:
+    router = ShardRouter("hash", shards, directory, max_engines=1)
+    router.engine_for_key(router.shard_key(user_id))
+    start.wait()
+    for _ in range(writes):
+        session = router.session_for_user(user_id)
+        try:
+            session.add(JournalEntry(user_id=user_id, content=CONTENT, entry_date=date.today()))
+            session.commit()
+        finally:
+            session.close()
+
+
+def run(shards: int, writers: int, writes: int, directory: str) -> float:
+    # create every shard up front, so schema creation is not timed
+    router = ShardRouter("hash", shards, directory, max_engines=max(shards, 1))
+    for user_id in range(writers):
+        router.engine_for_key(router.shard_key(user_id)).dispose()
+
+    start = multiprocessing.Barrier(writers + 1)
+    processes = [
+        multiprocessing.Process(target=writer, args=(shards, directory, user_id, writes, start))
+        for user_id in range(writers)
+    ]
+    for process in processes:
+        process.start()
+    start.wait()
+    started = time.perf_counter()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    failed = sum(1 for process in processes if process.exitcode != 0)
+    if failed:
+        print(f"  {failed} writers failed")
+    return writers * writes / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shard write throughput benchmark")
+    parser.add_argument("--writers", type=int, default=8, help="concurrent writer processes, one user each")
+    parser.add_argument("--writes", type=int, default=200, help="commits per writer")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = None
+        for shards in args.shards:
+            rate = run(shards, args.writers, args.writes, os.path.join(tmp, f"shards_{shards}"))
+            baseline = baseline or rate
+            print(f"{shards:3d} shard(s)  {rate:10.0f} commits/s  ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Cold-start benchmark for the API process.
+
+Starts fresh interpreters that import main and call create_app() under
+`python -X importtime`. It reports the wall-clock cold start and the
+slowest imports, and fails (exit 1) when:
+
+  - the median cold start exceeds --budget-ms,
+  - it regressed more than --tolerance over the saved --baseline, or
+  - a module that must load lazily (the AI SDK, async drivers, numpy)
+    was imported at startup.
+
+Usage:
+    python bench_startup.py [--runs 5] [--budget-ms 1000]
+    python bench_startup.py --baseline startup_baseline.json --update-baseline
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# imported on first use only; seeing one at startup is a regression
+LAZY_MODULES = ("anthropic", "sqlalchemy.ext.asyncio", "aiosqlite", "numpy")
+
+STARTUP_SNIPPET = "import main; main.create_app()"
+
+
+def parse_importtime(stderr: str) -> dict:
+    """{module: (cumulative microseconds, nesting depth)} from -X importtime output."""
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        name = name.rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports[name.strip()] = (int(cumulative), depth)
+    return imports
+
+
+def measure_once(workdir: str) -> tuple:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = HERE + os.pathsep + env.get("PYTHONPATH", "")
+    # a configured key must not change what gets imported
+    env.pop("ANTHROPIC_API_KEY", None)
+
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_SNIPPET],
+        cwd=workdir,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise SystemExit(f"startup failed:\n{result.stderr[-2000:]}")
+    return elapsed_ms, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("STARTUP_BUDGET_MS", "1000")))
+    parser.add_argument("--baseline", help="JSON file with a previous median_ms")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression over the baseline")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    # throwaway working directory, so create_app() builds a fresh app.db
+    with tempfile.TemporaryDirectory() as workdir:
+        measure_once(workdir)  # warm the filesystem cache and .pyc files
+        runs = [measure_once(workdir) for _ in range(args.runs)]
+
+    times = [elapsed for elapsed, _ in runs]
+    median_ms = statistics.median(times)
+    imports = runs[-1][1]
+
+    print(f"cold start: median {median_ms:.0f} ms, min {min(times):.0f} ms, max {max(times):.0f} ms ({args.runs} runs)")
+    # main and what it imports directly, or via one more module
+    print("\nslowest imports (cumulative, last run):")
+    shallow = [(us, depth, name) for name, (us, depth) in imports.items() if depth <= 2]
+    for us, depth, name in sorted(shallow, reverse=True)[: args.top]:
+        print(f"  {us / 1000:8.1f} ms  {'  ' * depth}{name}")
+
+    failures = []
+
+    eager = sorted(
+        name for name in imports
+        if any(name == lazy or name.startswith(lazy + ".") for lazy in LAZY_MODULES)
+    )
+    if eager:
+        failures.append(f"lazily loaded modules imported at startup: {', '.join(eager[:5])}")
+
+    if median_ms > args.budget_ms:
+        failures.append(f"median {median_ms:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+
+    if args.baseline and os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline_ms = json.load(f)["median_ms"]
+        limit = baseline_ms * (1 + args.tolerance)
+        print(f"\nbaseline {baseline_ms:.0f} ms, limit {limit:.0f} ms")
+        if median_ms > limit:
+            failures.append(f"median {median_ms:.0f} ms regressed past {limit:.0f} ms")
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"median_ms": round(median_ms, 1), "runs": args.runs}, f)
+        print(f"\nbaseline written to {args.baseline}")
+
+    if failures:
+        print("\nFAIL:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
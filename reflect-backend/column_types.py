@@ -0,0 +1,124 @@
+"""
+Custom SQLAlchemy column types.
+"""
+import os
+import zlib
+
+from sqlalchemy.types import Text, TypeDecorator
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional
+    zstandard = None
+
+
+# compression on write is opt-in; reads always understand compressed values
+TEXT_COMPRESSION_ENABLED = os.environ.get("TEXT_COMPRESSION_ENABLED", "0") == "1"
+
+# values shorter than this (in UTF-8 bytes) are stored as plain text
+TEXT_COMPRESSION_MIN_SIZE = int(os.environ.get("TEXT_COMPRESSION_MIN_SIZE", "512"))
+
+# "zlib" or "zstd"; zstd falls back to zlib when zstandard is not installed
+TEXT_COMPRESSION_CODEC = os.environ.get("TEXT_COMPRESSION_CODEC", "zlib")
+
+TEXT_COMPRESSION_LEVEL = int(os.environ.get("TEXT_COMPRESSION_LEVEL", "6"))
+
+# format markers; a NUL byte never starts HTML or user text
+ZLIB_MARKER = b"\x00z1"
+ZSTD_MARKER = b"\x00s1"
+
+
+def compress_text(value: str, codec: str = None, level: int = None) -> bytes:
+    """Encode a string into a marked, compressed blob."""
+    codec = codec or TEXT_COMPRESSION_CODEC
+    level = TEXT_COMPRESSION_LEVEL if level is None else level
+    raw = value.encode("utf-8")
+
+    if codec == "zstd" and zstandard is not None:
+        return ZSTD_MARKER + zstandard.ZstdCompressor(level=level).compress(raw)
+    return ZLIB_MARKER + zlib.compress(raw, level)
+
+
+def decompress_text(value) -> str:
+    """Decode a stored value, whether plain text or a marked blob."""
+    if isinstance(value, str):
+        return value
+
+    value = bytes(value)
+    marker, payload = value[:3], value[3:]
+
+    if marker == ZLIB_MARKER:
+        return zlib.decompress(payload).decode("utf-8")
+    if marker == ZSTD_MARKER:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed text.")
+        return zstandard.ZstdDecompressor().decompress(payload).decode("utf-8")
+
+    # unmarked bytes are plain UTF-8 text
+    return value.decode("utf-8")
+
+
+def is_compressed(value) -> bool:
+    return isinstance(value, (bytes, memoryview)) and bytes(value[:3]) in (ZLIB_MARKER, ZSTD_MARKER)
+
+
+class CompressedText(TypeDecorator):
+    """
+    Text column that transparently compresses large values.
+
+    Values at or above TEXT_COMPRESSION_MIN_SIZE are written as a marked
+    zlib/zstd blob when TEXT_COMPRESSION_ENABLED is set; smaller values and
+    all values written with compression disabled stay plain TEXT. SQLite's
+    dynamic typing lets both live in the same column, so enabling it needs
+    no schema change. Compressed values cannot be matched with LIKE.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        # bytes are already encoded (e.g. written by the backfill)
+        if value is None or isinstance(value, bytes) or not TEXT_COMPRESSION_ENABLED:
+            return value
+        size = len(value.encode("utf-8"))
+        if size < TEXT_COMPRESSION_MIN_SIZE:
+            return value
+
+        compressed = compress_text(value)
+        if len(compressed) >= size:
+            return value
+        return compressed
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decompress_text(value)
+
+
+# archived values are compressed from this size up, regardless of
+# TEXT_COMPRESSION_ENABLED (see services/archive.py)
+ARCHIVE_COMPRESSION_MIN_SIZE = int(os.environ.get("ARCHIVE_COMPRESSION_MIN_SIZE", "64"))
+
+
+class ArchiveText(CompressedText):
+    """
+    CompressedText for cold archive tables: always compresses values of
+    ARCHIVE_COMPRESSION_MIN_SIZE bytes or more, at the highest zlib/zstd
+    level the codec offers, since archived rows are written once and
+    rarely read.
+    """
+
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, bytes):
+            return value
+        size = len(value.encode("utf-8"))
+        if size < ARCHIVE_COMPRESSION_MIN_SIZE:
+            return value
+
+        level = 19 if TEXT_COMPRESSION_CODEC == "zstd" and zstandard is not None else 9
+        compressed = compress_text(value, level=level)
+        if len(compressed) >= size:
+            return value
+        return compressed
@@ -0,0 +1,249 @@
+"""
+Response compression for the Flask app.
+
+Negotiates zstd, brotli or gzip from the request's Accept-Encoding header,
+skips payloads below a size threshold and compresses streamed responses
+chunk by chunk so that each chunk is flushed to the client as it is produced.
+"""
+import os
+import time
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional
+    zstandard = None
+
+
+COMPRESSION_ENABLED = os.environ.get("COMPRESSION_ENABLED", "1") != "0"
+
+# responses smaller than this are sent as-is; the headers would eat the savings
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+
+# gzip 1-9, brotli 0-11 and zstd 1-22 are clamped to their own ranges
+COMPRESSION_LEVEL = int(os.environ.get("COMPRESSION_LEVEL", "6"))
+
+# upper bound on the time spent compressing a single buffered response;
+# payloads expected to exceed it are compressed at the fastest level instead
+COMPRESSION_CPU_BUDGET_MS = float(os.environ.get("COMPRESSION_CPU_BUDGET_MS", "5"))
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "text/html",
+    "text/plain",
+    "text/css",
+    "text/csv",
+    "text/event-stream",
+    "application/javascript",
+}
+
+
+def _available_encodings():
+    # server preference order, best ratio first
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+AVAILABLE_ENCODINGS = _available_encodings()
+
+
+class _ThroughputTracker:
+    """
+    Exponentially weighted bytes-per-second estimate per encoding,
+    used to predict whether a payload fits in the CPU budget.
+    """
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.rates = {}
+
+    def record(self, encoding: str, size: int, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        rate = size / seconds
+        previous = self.rates.get(encoding)
+        if previous is None:
+            self.rates[encoding] = rate
+        else:
+            self.rates[encoding] = previous + self.alpha * (rate - previous)
+
+    def estimate_ms(self, encoding: str, size: int):
+        rate = self.rates.get(encoding)
+        if not rate:
+            return None
+        return size / rate * 1000
+
+
+_throughput = _ThroughputTracker()
+
+
+def choose_encoding(accept_encoding: str):
+    """
+    Pick the best available encoding allowed by an Accept-Encoding header.
+
+    Returns None when the client does not accept any supported encoding.
+    """
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token] = q
+
+    best = None
+    best_q = 0.0
+    for encoding in AVAILABLE_ENCODINGS:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+
+    return best
+
+
+def _clamp_level(encoding: str, level: int) -> int:
+    if encoding == "gzip":
+        return max(1, min(level, 9))
+    if encoding == "br":
+        return max(0, min(level, 11))
+    return max(1, min(level, 22))
+
+
+class _StreamCompressor:
+    """Uniform compress/flush/finish interface over the three codecs."""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        level = _clamp_level(encoding, level)
+
+        if encoding == "gzip":
+            # wbits=31 emits a gzip header and trailer
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=level)
+        else:
+            self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._obj.process(data)
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        if self.encoding == "gzip":
+            return self._obj.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == "br":
+            return self._obj.flush()
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        if self.encoding == "gzip":
+            return self._obj.flush(zlib.Z_FINISH)
+        if self.encoding == "br":
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+def compress_bytes(data: bytes, encoding: str, level: int = COMPRESSION_LEVEL) -> bytes:
+    """Compress a complete payload with the given encoding."""
+    compressor = _StreamCompressor(encoding, level)
+    return compressor.compress(data) + compressor.finish()
+
+
+def _compress_stream(chunks, encoding: str, level: int):
+    compressor = _StreamCompressor(encoding, level)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        if not chunk:
+            continue
+        # flush every chunk so streamed events are not held back in the codec
+        yield compressor.compress(chunk) + compressor.flush()
+    yield compressor.finish()
+
+
+def _should_compress(response) -> bool:
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if response.direct_passthrough:
+        return False
+    if "Content-Encoding" in response.headers:
+        return False
+    return response.mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def _add_vary(response) -> None:
+    vary = response.headers.get("Vary")
+    if not vary:
+        response.headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        response.headers["Vary"] = f"{vary}, Accept-Encoding"
+
+
+def compress_response(response):
+    """after_request hook: compress eligible responses in place."""
+    if not COMPRESSION_ENABLED or not _should_compress(response):
+        return response
+
+    encoding = choose_encoding(request.headers.get("Accept-Encoding", ""))
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        _add_vary(response)
+        response.response = _compress_stream(
+            response.response, encoding, COMPRESSION_LEVEL
+        )
+        response.headers["Content-Encoding"] = encoding
+        response.headers.pop("Content-Length", None)
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return response
+
+    _add_vary(response)
+
+    level = COMPRESSION_LEVEL
+    estimate = _throughput.estimate_ms(encoding, len(data))
+    if estimate is not None and estimate > COMPRESSION_CPU_BUDGET_MS:
+        level = 1
+
+    started = time.perf_counter()
+    compressed = compress_bytes(data, encoding, level)
+    if level == COMPRESSION_LEVEL:
+        _throughput.record(encoding, len(data), time.perf_counter() - started)
+
+    if len(compressed) >= len(data):
+        return response
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def init_compression(app) -> None:
+    """Register response compression on a Flask app."""
+    app.after_request(compress_response)
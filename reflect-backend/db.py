@@ -1,7 +1,36 @@
-from sqlalchemy import create_engine
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+from sqlalchemy import MetaData, create_engine, event, inspect
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.schema import CreateTable
 
 DATABASE_URL = "sqlite:///app.db"
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///app.db"
+
+# "off" keeps everything in app.db; "hash" spreads users over DB_SHARD_COUNT
+# files; "per_user" gives every user their own file
+DB_SHARD_MODE = os.environ.get("DB_SHARD_MODE", "off")
+DB_SHARD_COUNT = int(os.environ.get("DB_SHARD_COUNT", "8"))
+DB_SHARD_DIR = os.environ.get("DB_SHARD_DIR", "shards")
+# open engines kept per kind (sync/async); least recently used are disposed
+DB_SHARD_ENGINE_CACHE = int(os.environ.get("DB_SHARD_ENGINE_CACHE", "64"))
+
+# hot/cold tiering: old rows move to "<db>.archive.db", attached to every
+# connection as schema "archive" (see services/archive.py)
+ARCHIVE_ENABLED = os.environ.get("ARCHIVE_ENABLED", "0") == "1"
+
+# statements slower than this are logged with their query plan; 0 turns the
+# log off. Recent entries stay in memory, SLOW_QUERY_LOG_FILE adds JSON lines
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG_SIZE = int(os.environ.get("SLOW_QUERY_LOG_SIZE", "200"))
+SLOW_QUERY_LOG_FILE = os.environ.get("SLOW_QUERY_LOG_FILE", "")
 
 engine = create_engine(
     DATABASE_URL,
@@ -9,11 +38,375 @@ engine = create_engine(
     future=True,
 )
 
-SessionLocal = sessionmaker(
+_default_sessionmaker = sessionmaker(
     bind=engine,
     autocommit=False,
     autoflush=False,
     future=True,
 )
 
-Base = declarative_base()
\ No newline at end of file
+# async engine for the ASGI insights path; built on first use, so the WSGI
+# app and scripts never import sqlalchemy.ext.asyncio or aiosqlite
+_async_engine = None
+_async_sessionmaker = None
+_async_lock = threading.Lock()
+
+
+def get_async_engine():
+    """Process-wide async engine on app.db, or None without aiosqlite."""
+    global _async_engine
+    with _async_lock:
+        if _async_engine is None:
+            from sqlalchemy.ext.asyncio import create_async_engine
+
+            try:
+                _async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False)
+            except ImportError:
+                return None
+    return _async_engine
+
+
+async def dispose_async_engine() -> None:
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+
+def AsyncSessionLocal(**kwargs):
+    """Async session, on app.db unless a `bind` is given."""
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_sessionmaker = async_sessionmaker(autoflush=False, expire_on_commit=False)
+    if "bind" not in kwargs:
+        kwargs["bind"] = get_async_engine()
+    return _async_sessionmaker(**kwargs)
+
+Base = declarative_base()
+
+# tables living in the attached archive database
+ArchiveBase = declarative_base()
+
+
+def archive_path_for(database_path: str) -> str:
+    """Archive file that sits next to a hot SQLite database file."""
+    root, _ = os.path.splitext(database_path)
+    return f"{root}.archive.db"
+
+
+if ARCHIVE_ENABLED:
+    @event.listens_for(Engine, "connect")
+    def _attach_archive(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA database_list")
+        main_file = next((row[2] for row in cursor.fetchall() if row[1] == "main"), "")
+        archive_file = archive_path_for(main_file) if main_file else ":memory:"
+        cursor.execute("ATTACH DATABASE ? AS archive", (archive_file,))
+        cursor.close()
+
+
+_slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_slow_queries_lock = threading.Lock()
+
+# statements EXPLAIN QUERY PLAN accepts; PRAGMA, ATTACH, BEGIN... are skipped
+_EXPLAINABLE = ("select", "insert", "update", "delete", "with")
+
+
+def _format_params(parameters, limit: int = 100) -> list:
+    if isinstance(parameters, dict):
+        parameters = list(parameters.values())
+    formatted = []
+    for value in parameters or ():
+        text = repr(value)
+        formatted.append(text if len(text) <= limit else text[:limit] + "...")
+    return formatted
+
+
+def _explain_query_plan(conn, statement, parameters) -> list:
+    """Detail column of EXPLAIN QUERY PLAN, on a separate cursor of the same connection."""
+    if conn.dialect.name != "sqlite" or not statement.lstrip().lower().startswith(_EXPLAINABLE):
+        return []
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        return [row[-1] for row in cursor.fetchall()]
+    except Exception as e:
+        return [f"plan unavailable: {e}"]
+    finally:
+        cursor.close()
+
+
+if SLOW_QUERY_MS > 0:
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _log_slow_query(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_started", None)
+        if started is None:
+            return
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms < SLOW_QUERY_MS:
+            return
+
+        record = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration_ms, 2),
+            "endpoint": request.endpoint if has_request_context() else None,
+            "sql": statement,
+            "params": [] if executemany else _format_params(parameters),
+            "executemany": executemany,
+            "plan": [] if executemany else _explain_query_plan(conn, statement, parameters),
+        }
+        with _slow_queries_lock:
+            _slow_queries.append(record)
+            if SLOW_QUERY_LOG_FILE:
+                with open(SLOW_QUERY_LOG_FILE, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+        print(f"slow query ({duration_ms:.1f} ms, {record['endpoint']}): {' '.join(statement.split())[:200]}")
+
+
+def get_slow_queries() -> list:
+    """Most recent slow statements, newest last."""
+    with _slow_queries_lock:
+        return list(_slow_queries)
+
+
+class ShardRouter:
+    """
+    Maps users to SQLite files and keeps a bounded LRU of open engines.
+
+    Schemas are created the first time a shard is opened by this process.
+    """
+
+    def __init__(self, mode: str, shard_count: int, directory: str, max_engines: int):
+        self.mode = mode
+        self.shard_count = shard_count
+        self.directory = directory
+        self.max_engines = max_engines
+
+        self._lock = threading.Lock()
+        self._engines = OrderedDict()
+        self._initialised = set()
+
+    def shard_key(self, user_id: int) -> str:
+        if self.mode == "per_user":
+            return f"user_{user_id}"
+        return f"shard_{user_id % self.shard_count:03d}"
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.db")
+
+    def shard_keys(self) -> list:
+        """Keys of the shard files that exist on disk."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name[:-3]
+            for name in os.listdir(self.directory)
+            # "<key>.archive.db" files belong to their shard (see archive_path_for)
+            if name.endswith(".db") and not name.endswith(".archive.db")
+        )
+
+    def _cached(self, cache_key, build, dispose):
+        with self._lock:
+            existing = self._engines.get(cache_key)
+            if existing is not None:
+                self._engines.move_to_end(cache_key)
+                return existing
+
+            created = build()
+            self._engines[cache_key] = (created, dispose)
+            while len(self._engines) > self.max_engines:
+                _, (old, old_dispose) = self._engines.popitem(last=False)
+                old_dispose(old)
+            return self._engines[cache_key]
+
+    def engine_for_key(self, key: str):
+        def build():
+            os.makedirs(self.directory, exist_ok=True)
+            shard_engine = create_engine(f"sqlite:///{self.path_for(key)}", echo=False, future=True)
+            if key not in self._initialised:
+                init_db(bind=shard_engine)
+                self._initialised.add(key)
+            return shard_engine
+
+        shard_engine, _ = self._cached(("sync", key), build, lambda e: e.dispose())
+        return shard_engine
+
+    def async_engine_for_key(self, key: str):
+        # make sure the schema exists before the async driver touches the file
+        self.engine_for_key(key)
+
+        def build():
+            from sqlalchemy.ext.asyncio import create_async_engine
+
+            return create_async_engine(f"sqlite+aiosqlite:///{self.path_for(key)}", echo=False)
+
+        def dispose(e):
+            # AsyncEngine.dispose() is a coroutine; closing the sync pool is enough here
+            e.sync_engine.dispose()
+
+        shard_engine, _ = self._cached(("async", key), build, dispose)
+        return shard_engine
+
+    def session_for_key(self, key: str):
+        return _default_sessionmaker(bind=self.engine_for_key(key))
+
+    def session_for_user(self, user_id: int):
+        return self.session_for_key(self.shard_key(user_id))
+
+    def async_session_for_user(self, user_id: int):
+        return AsyncSessionLocal(bind=self.async_engine_for_key(self.shard_key(user_id)))
+
+
+shard_router = (
+    ShardRouter(DB_SHARD_MODE, DB_SHARD_COUNT, DB_SHARD_DIR, DB_SHARD_ENGINE_CACHE)
+    if DB_SHARD_MODE != "off"
+    else None
+)
+
+
+def session_for_user(user_id: int):
+    """Session on the database that holds `user_id`'s rows."""
+    if shard_router is None:
+        return _default_sessionmaker()
+    return shard_router.session_for_user(user_id)
+
+
+def async_session_for_user(user_id: int):
+    """Async counterpart of session_for_user."""
+    if shard_router is None:
+        return AsyncSessionLocal()
+    return shard_router.async_session_for_user(user_id)
+
+
+def SessionLocal():
+    """
+    Session for the current request's user.
+
+    Outside a request (scripts, background jobs) or with sharding off this
+    is a session on app.db; jobs that span users go through shard_router.
+    """
+    if shard_router is not None and has_request_context() and "user_id" in g:
+        return shard_router.session_for_user(g.user_id)
+    return _default_sessionmaker()
+
+
+def session_factories() -> list:
+    """One session factory per database holding user data, for cross-user jobs."""
+    if shard_router is None:
+        return [_default_sessionmaker]
+    return [
+        lambda key=key: shard_router.session_for_key(key)
+        for key in shard_router.shard_keys()
+    ]
+
+
+def add_missing_columns(table, bind=None) -> list:
+    """
+    Add columns declared on `table` but missing from the database.
+
+    SQLite can only append nullable (or defaulted) columns, which is all the
+    derived columns added after the initial schema need. Returns the names of
+    the columns that were added.
+    """
+    bind = bind or engine
+    existing = {c["name"] for c in inspect(bind).get_columns(table.name, schema=table.schema)}
+    qualified_name = f"{table.schema}.{table.name}" if table.schema else table.name
+    added = []
+
+    with bind.begin() as conn:
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl_type = column.type.compile(dialect=bind.dialect)
+            conn.exec_driver_sql(
+                f'ALTER TABLE {qualified_name} ADD COLUMN "{column.name}" {ddl_type}'
+            )
+            added.append(column.name)
+
+    return added
+
+
+def add_autoincrement(table, bind=None) -> bool:
+    """
+    Rebuild a table created before it was declared with
+    sqlite_autoincrement=True, keeping its rows and ids.
+
+    SQLite cannot add AUTOINCREMENT to an existing table, so the rows are
+    copied into a new one that replaces it. Indexes go with the old table;
+    init_db recreates them. Returns whether the table was rebuilt.
+    """
+    bind = bind or engine
+    if table.schema or not table.dialect_options["sqlite"]["autoincrement"]:
+        return False
+
+    with bind.begin() as conn:
+        sql = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+        ).scalar()
+        if sql is None or "AUTOINCREMENT" in sql.upper():
+            return False
+
+        # the new table's foreign keys need their targets in the same metadata
+        rebuild_metadata = MetaData()
+        for foreign_key in table.foreign_keys:
+            if foreign_key.column.table is not table:
+                foreign_key.column.table.to_metadata(rebuild_metadata)
+        rebuilt = table.to_metadata(rebuild_metadata, name=f"{table.name}__rebuild")
+
+        existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+        columns = ", ".join(f'"{c.name}"' for c in table.columns if c.name in existing)
+        conn.execute(CreateTable(rebuilt))
+        conn.exec_driver_sql(
+            f"INSERT INTO {rebuilt.name} ({columns}) SELECT {columns} FROM {table.name}"
+        )
+        conn.exec_driver_sql(f"DROP TABLE {table.name}")
+        conn.exec_driver_sql(f"ALTER TABLE {rebuilt.name} RENAME TO {table.name}")
+    return True
+
+
+def reserve_archived_ids(archive_table, bind=None) -> None:
+    """
+    Keep the id sequence of the hot table `archive_table` is the archive of
+    above every archived id, so a new row never takes the id of one that
+    was moved out (archived rows keep their ids).
+    """
+    bind = bind or engine
+    hot_name = archive_table.info["archive_of"]
+    qualified_name = f"{archive_table.schema}.{archive_table.name}"
+    with bind.begin() as conn:
+        highest = conn.exec_driver_sql(f"SELECT MAX(id) FROM {qualified_name}").scalar()
+        if highest is None:
+            return
+        updated = conn.exec_driver_sql(
+            "UPDATE sqlite_sequence SET seq = ? WHERE name = ? AND seq < ?",
+            (highest, hot_name, highest),
+        ).rowcount
+        present = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_sequence WHERE name = ?", (hot_name,)
+        ).scalar()
+        if not updated and not present:
+            conn.exec_driver_sql(
+                "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (hot_name, highest)
+            )
+
+
+def init_db(bind=None) -> None:
+    """Create missing tables, columns and indexes on existing databases."""
+    bind = bind or engine
+    metadatas = [Base.metadata]
+    if ARCHIVE_ENABLED:
+        metadatas.append(ArchiveBase.metadata)
+
+    for metadata in metadatas:
+        metadata.create_all(bind=bind)
+        for table in metadata.sorted_tables:
+            add_missing_columns(table, bind=bind)
+            add_autoincrement(table, bind=bind)
+            for index in table.indexes:
+                index.create(bind=bind, checkfirst=True)
+            if "archive_of" in table.info:
+                reserve_archived_ids(table, bind=bind)
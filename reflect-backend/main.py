@@ -1,24 +1,30 @@
 from datetime import date, time, datetime
-from flask import Flask, request, jsonify, g
+import json
+from flask import Blueprint, Flask, Response, request, jsonify, g, stream_with_context
 from flask_cors import CORS
-app = Flask(__name__)
-CORS(
-    app,
-    resources={r"/api/*": {"origins": "http://localhost:5173"}},
-    supports_credentials=True
-)
 
-from db import SessionLocal
+from compression import init_compression
+from db import SessionLocal, get_slow_queries, init_db, session_for_user
+from profiling import init_profiling, is_admin_request
 from services.reflections import (
     create_or_update_daily_reflection,
     get_reflection_for_date,
     get_reflections_in_range,
+    patch_daily_reflection,
+    refresh_condensed_fields,
+    InvalidReflection,
     InvalidReflectionDate,
+    ReflectionNotFound,
 )
 
 from services.journal_entries import (
     create_journal_entry,
     get_journal_entries_for_date,
+    get_all_journal_entries,
+    get_related_journal_entries,
+    get_journal_entry_revision,
+    get_journal_entry_revisions,
+    restore_journal_entry_revision,
     update_journal_entry,
     delete_journal_entry,
     InvalidJournalEntry,
@@ -27,23 +33,50 @@ from services.journal_entries import (
 
 from services.goals import (
     create_goal,
+    delete_goal,
     get_goals_for_user,
+    get_upcoming_goals,
     update_goal,
     InvalidGoal,
     GoalNotFound
 )
 
 from services.stats import get_user_stats
+from services.text_analytics import get_mood_trend, get_top_terms, InvalidAnalyticsRange
+from services.bulk import apply_bulk_operations, BulkTargetNotFound, BulkTaskOverlap, InvalidBulkOperation
+from services.html_text import make_preview
+from services.revisions import RevisionNotFound
+from services.edits import EditConflict, InvalidPatch
 
 from services.scheduled_tasks import (
     create_scheduled_task,
     get_scheduled_tasks_for_week,
     update_scheduled_task,
     delete_scheduled_task,
-    ScheduledTaskNotFound
+    ScheduledTaskNotFound,
+    TaskOverlap
+)
+from services.task_intervals import find_free_slots
+from services.reminders import get_reminder_metrics, init_reminders
+from services.events import RESYNC, bus, register_serializer
+from services.calendar_layout import get_week_layout, week_version
+
+from services.ai_insights import (
+    generate_morning_insights,
+    get_insights_metrics,
+    stream_morning_insights,
+)
+from services.insight_batch import get_stored_insights, store_insights
+from services.admission import (
+    EXPENSIVE,
+    STANDARD,
+    admit_request,
+    get_admission_metrics,
+    release_request,
 )
 
-from services.ai_insights import generate_morning_insights
+# every route lives on this blueprint; create_app() builds the app around it
+api = Blueprint("api", __name__)
 
 # -- HELPERS --
 
@@ -60,6 +93,19 @@ def parse_time(value: str) -> time:
     except ValueError:
         raise ValueError("invalid time format: should be HH:MM.")
 
+def parse_base_version(data):
+    """The optional base_version of an edit request; a patch requires one."""
+    base_version = data.get("base_version")
+    if base_version is None and data.get("patch", data.get("patches")) is not None:
+        raise InvalidPatch("base_version is required with a patch.")
+    if base_version is not None and (not isinstance(base_version, int) or isinstance(base_version, bool)):
+        raise InvalidPatch("base_version must be an integer.")
+    return base_version
+
+def conflict_response(e):
+    # the client rebases on the current text, fetched with a GET
+    return jsonify({"error": str(e), "version": e.version}), 409
+
 def reflection_to_dict(reflection):
     # Ensure timezone-aware datetime serialization
     from datetime import timezone
@@ -73,6 +119,7 @@ def reflection_to_dict(reflection):
         "summary": reflection.summary,
         "accomplishments": reflection.accomplishments,
         "improvements_to_make": reflection.improvements_to_make,
+        "version": reflection.version or 1,
         "created_at": created_at.isoformat(),
         "updated_at": updated_at.isoformat()
     }
@@ -89,6 +136,45 @@ def journal_entry_to_dict(entry):
         "content": entry.content,
         "entry_date": entry.entry_date.isoformat(),
         "reflection_id": entry.reflection_id,
+        "word_count": entry.word_count,
+        "char_count": entry.char_count,
+        "version": entry.version or 1,
+        "created_at": created_at.isoformat(),
+        "updated_at": updated_at.isoformat(),
+    }
+
+def revision_to_dict(revision, content=None):
+    from datetime import timezone
+    created_at = revision.created_at.replace(tzinfo=timezone.utc) if revision.created_at.tzinfo is None else revision.created_at
+    updated_at = revision.updated_at.replace(tzinfo=timezone.utc) if revision.updated_at.tzinfo is None else revision.updated_at
+
+    result = {
+        "revision": revision.revision,
+        "entry_id": revision.entry_id,
+        "char_count": revision.char_count,
+        "created_at": created_at.isoformat(),
+        "updated_at": updated_at.isoformat(),
+    }
+    if content is not None:
+        result["content"] = content
+    return result
+
+def journal_entry_preview_to_dict(entry):
+    # Like journal_entry_to_dict, but with a plain-text preview instead of the
+    # HTML body so listings never have to load or ship `content`
+    from datetime import timezone
+    created_at = entry.created_at.replace(tzinfo=timezone.utc) if entry.created_at.tzinfo is None else entry.created_at
+    updated_at = entry.updated_at.replace(tzinfo=timezone.utc) if entry.updated_at.tzinfo is None else entry.updated_at
+
+    return {
+        "id": entry.id,
+        "user_id": entry.user_id,
+        "preview": make_preview(entry.plain_text),
+        "entry_date": entry.entry_date.isoformat(),
+        "reflection_id": entry.reflection_id,
+        "word_count": entry.word_count,
+        "char_count": entry.char_count,
+        "version": entry.version or 1,
         "created_at": created_at.isoformat(),
         "updated_at": updated_at.isoformat(),
     }
@@ -132,7 +218,7 @@ def scheduled_task_to_dict(task):
 
 # -- ROUTES --
 
-@app.before_request
+@api.before_request
 def load_user():
 
     # code to allow cors connection between react and flask
@@ -153,9 +239,62 @@ def load_user():
         return jsonify({"error": "X-User-Id must be an integer"}), 400
 
 
+# routes that hold a worker thread and a DB connection for a long time
+EXPENSIVE_ENDPOINTS = {
+    "api.get_morning_insights",
+    "api.stream_morning_insights_route",
+    "api.bulk_mutation_route",
+    "api.get_stats_route",
+    "api.get_free_slots_route",
+}
+
+
+# open for as long as the client listens; rate limited, but not counted in flight
+LONG_LIVED_ENDPOINTS = {
+    "api.stream_reminders_route",
+    "api.stream_events_route",
+}
+
+
+def request_cost_class() -> str:
+    if request.endpoint in EXPENSIVE_ENDPOINTS:
+        return EXPENSIVE
+    # the full journal listing; a single day is cheap
+    if request.endpoint == "api.get_journal_entries_route" and "date" not in request.args:
+        return EXPENSIVE
+    return STANDARD
+
+
+@api.before_request
+def admit():
+    """
+    Token-bucket rate limit per user and cost class (429), and shedding of
+    expensive routes while the process is saturated (503).
+    """
+    if request.method == "OPTIONS":
+        return None
+
+    decision = admit_request(user_id=g.user_id, cost_class=request_cost_class())
+    if decision.status is not None:
+        response = jsonify({"error": decision.reason, "retry_after": decision.retry_after})
+        response.status_code = decision.status
+        response.headers["Retry-After"] = str(decision.retry_after)
+        return response
+    if request.endpoint in LONG_LIVED_ENDPOINTS:
+        release_request()
+    else:
+        g.admitted = True
+
+
+@api.teardown_request
+def release(exc):
+    if g.pop("admitted", False):
+        release_request()
+
+
 # -- DAILY REFLECTION ROUTES --
 
-@app.route("/api/reflections", methods=["POST"])
+@api.route("/api/reflections", methods=["POST"])
 def create_or_update_reflection():
     db = SessionLocal()
     try:
@@ -171,18 +310,62 @@ def create_or_update_reflection():
             summary=data.get("summary"),
             accomplishments=data.get("accomplishments"),
             improvements_to_make=data.get("improvements_to_make"),
+            base_version=parse_base_version(data),
         )
 
         return jsonify(reflection_to_dict(reflection)), 200
     
-    except InvalidReflectionDate as e:
+    except (InvalidReflectionDate, InvalidPatch) as e:
         return jsonify({"error": str(e)}), 400
+
+    except EditConflict as e:
+        return conflict_response(e)
     
     finally: 
         db.close()
 
 
-@app.route("/api/reflections", methods=["GET"])
+@api.route("/api/reflections/<reflection_date>", methods=["PATCH"])
+def patch_reflection_route(reflection_date):
+    """
+    Patch some of a reflection's text fields against base_version:
+    {"base_version": 3, "patches": {"summary": [[0, 120], "new words", [120, 480]]}}.
+    Answers with the reflection without its text fields, or 409 with the
+    current version when base_version is stale.
+    """
+    db = SessionLocal()
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get("patches"), dict):
+            return jsonify({"error": "patches must be an object of field name to patch"}), 400
+
+        reflection = patch_daily_reflection(
+            db=db,
+            user_id=g.user_id,
+            reflection_date=parse_date(reflection_date),
+            base_version=parse_base_version(data),
+            patches=data["patches"],
+        )
+
+        result = reflection_to_dict(reflection)
+        for field in ("summary", "accomplishments", "improvements_to_make"):
+            del result[field]
+        return jsonify(result), 200
+
+    except ReflectionNotFound as e:
+        return jsonify({"error": str(e)}), 404
+
+    except (InvalidReflectionDate, InvalidReflection, InvalidPatch) as e:
+        return jsonify({"error": str(e)}), 400
+
+    except EditConflict as e:
+        return conflict_response(e)
+
+    finally:
+        db.close()
+
+
+@api.route("/api/reflections", methods=["GET"])
 def get_reflections():
     db = SessionLocal()
     try:
@@ -225,7 +408,7 @@ def get_reflections():
 
 # -- JOURNAL ENTRY ROUTES --
 
-@app.route("/api/journal-entries", methods=["POST"])
+@api.route("/api/journal-entries", methods=["POST"])
 def create_journal_entry_route():
     db = SessionLocal()
     try:
@@ -250,10 +433,14 @@ def create_journal_entry_route():
         db.close()
 
 
-@app.route("/api/journal-entries", methods=["GET"])
+@api.route("/api/journal-entries", methods=["GET"])
 def get_journal_entries_route():
     db = SessionLocal()
     try:
+        # ?preview=1 returns plain-text previews instead of full HTML bodies
+        preview = request.args.get("preview") in ("1", "true")
+        to_dict = journal_entry_preview_to_dict if preview else journal_entry_to_dict
+
         # If date parameter is provided, get entries for that specific date
         if "date" in request.args:
             entries = get_journal_entries_for_date(
@@ -261,23 +448,96 @@ def get_journal_entries_route():
                 user_id=g.user_id,
                 entry_date=parse_date(request.args["date"]),
             )
-            return jsonify([journal_entry_to_dict(e) for e in entries]), 200
+            return jsonify([to_dict(e) for e in entries]), 200
         
         # NEW: Get ALL journal entries for user (sorted by date descending)
-        from models import JournalEntry
-        entries = (
-            db.query(JournalEntry)
-            .filter(JournalEntry.user_id == g.user_id)
-            .order_by(JournalEntry.entry_date.desc(), JournalEntry.created_at.desc())
-            .all()
+        entries = get_all_journal_entries(
+            db=db,
+            user_id=g.user_id,
+            with_content=not preview,
         )
-        return jsonify([journal_entry_to_dict(e) for e in entries]), 200
+        return jsonify([to_dict(e) for e in entries]), 200
 
     finally:
         db.close()
 
 
-@app.route("/api/journal-entries/<int:entry_id>", methods=["PATCH"])
+@api.route("/api/journal-entries/<int:entry_id>/related", methods=["GET"])
+def get_related_journal_entries_route(entry_id):
+    """Earlier entries with similar wording, as previews with a similarity score"""
+    limit = request.args.get("limit", 5, type=int)
+    if not 1 <= limit <= 20:
+        return jsonify({"error": "limit must be between 1 and 20"}), 400
+
+    db = SessionLocal()
+    try:
+        related = get_related_journal_entries(
+            db=db,
+            entry_id=entry_id,
+            user_id=g.user_id,
+            limit=limit,
+        )
+        return jsonify([
+            {**journal_entry_preview_to_dict(entry), "similarity": round(score, 3)}
+            for entry, score in related
+        ]), 200
+
+    except JournalEntryNotFound as e:
+        return jsonify({"error": str(e)}), 404
+
+    finally:
+        db.close()
+
+
+@api.route("/api/journal-entries/<int:entry_id>/revisions", methods=["GET"])
+def get_journal_revisions_route(entry_id):
+    """Saved versions of an entry, newest first, without their content"""
+    db = SessionLocal()
+    try:
+        revisions = get_journal_entry_revisions(db=db, entry_id=entry_id, user_id=g.user_id)
+        return jsonify([revision_to_dict(r) for r in revisions]), 200
+
+    except JournalEntryNotFound as e:
+        return jsonify({"error": str(e)}), 404
+
+    finally:
+        db.close()
+
+
+@api.route("/api/journal-entries/<int:entry_id>/revisions/<int:revision>", methods=["GET"])
+def get_journal_revision_route(entry_id, revision):
+    db = SessionLocal()
+    try:
+        row, content = get_journal_entry_revision(
+            db=db, entry_id=entry_id, user_id=g.user_id, revision=revision
+        )
+        return jsonify(revision_to_dict(row, content)), 200
+
+    except (JournalEntryNotFound, RevisionNotFound) as e:
+        return jsonify({"error": str(e)}), 404
+
+    finally:
+        db.close()
+
+
+@api.route("/api/journal-entries/<int:entry_id>/revisions/<int:revision>/restore", methods=["POST"])
+def restore_journal_revision_route(entry_id, revision):
+    """Put an earlier version back; returns the updated entry"""
+    db = SessionLocal()
+    try:
+        entry = restore_journal_entry_revision(
+            db=db, entry_id=entry_id, user_id=g.user_id, revision=revision
+        )
+        return jsonify(journal_entry_to_dict(entry)), 200
+
+    except (JournalEntryNotFound, RevisionNotFound) as e:
+        return jsonify({"error": str(e)}), 404
+
+    finally:
+        db.close()
+
+
+@api.route("/api/journal-entries/<int:entry_id>", methods=["PATCH"])
 def update_journal_entry_route(entry_id):
     db = SessionLocal()
     try:
@@ -290,21 +550,30 @@ def update_journal_entry_route(entry_id):
             entry_id=entry_id,
             user_id=g.user_id,
             content=data.get("content"),
+            patch=data.get("patch"),
+            base_version=parse_base_version(data),
         )
 
-        return jsonify(journal_entry_to_dict(entry)), 200
+        result = journal_entry_to_dict(entry)
+        if data.get("patch") is not None:
+            # the client already has the text it patched; don't send it back
+            del result["content"]
+        return jsonify(result), 200
 
     except JournalEntryNotFound as e:
         return jsonify({"error": str(e)}), 404
 
-    except InvalidJournalEntry as e:
+    except (InvalidJournalEntry, InvalidPatch) as e:
         return jsonify({"error": str(e)}), 400
 
+    except EditConflict as e:
+        return conflict_response(e)
+
     finally:
         db.close()
 
 
-@app.route("/api/journal-entries/<int:entry_id>", methods=["DELETE"])
+@api.route("/api/journal-entries/<int:entry_id>", methods=["DELETE"])
 def delete_journal_entry_route(entry_id):
     db = SessionLocal()
     try:
@@ -324,7 +593,7 @@ def delete_journal_entry_route(entry_id):
 
 # -- GOALS ROUTES --
 
-@app.route("/api/goals", methods=["POST"])
+@api.route("/api/goals", methods=["POST"])
 def create_goal_route():
     db = SessionLocal()
     try:
@@ -347,7 +616,7 @@ def create_goal_route():
     finally:
         db.close()
 
-@app.route("/api/goals", methods=["GET"])
+@api.route("/api/goals", methods=["GET"])
 def get_goals_route():
     db = SessionLocal()
     try:
@@ -364,7 +633,36 @@ def get_goals_route():
     finally:
         db.close()
 
-@app.route("/api/goals/<int:goal_id>", methods=["PATCH"])
+@api.route("/api/goals/upcoming", methods=["GET"])
+def get_upcoming_goals_route():
+    """Active goals due within `within` days (default 7), overdue ones first unless overdue=0"""
+    db = SessionLocal()
+    try:
+        within = int(request.args.get("within", "7"))
+        if not 0 <= within <= 366:
+            return jsonify({"error": "within must be between 0 and 366 days"}), 400
+
+        today = date.today()
+        goals = get_upcoming_goals(
+            db=db,
+            user_id=g.user_id,
+            within_days=within,
+            include_overdue=request.args.get("overdue", "1") not in ("0", "false"),
+            today=today,
+        )
+
+        return jsonify([
+            {**goal_to_dict(goal), "days_until": (goal.deadline - today).days}
+            for goal in goals
+        ]), 200
+
+    except ValueError:
+        return jsonify({"error": "within must be an integer"}), 400
+    finally:
+        db.close()
+
+
+@api.route("/api/goals/<int:goal_id>", methods=["PATCH"])
 def update_goal_route(goal_id: int):
     db = SessionLocal()
     try:
@@ -394,7 +692,7 @@ def update_goal_route(goal_id: int):
 
 # -- STATS ROUTES --
 
-@app.route("/api/stats", methods=["GET"])
+@api.route("/api/stats", methods=["GET"])
 def get_stats_route():
     db = SessionLocal()
     try:
@@ -403,31 +701,72 @@ def get_stats_route():
     finally:
         db.close()
 
-@app.route("/api/goals/<int:goal_id>", methods=["DELETE"])
+
+@api.route("/api/analytics/mood", methods=["GET"])
+def get_mood_trend_route():
+    """Mood per day or week (period=day|week) between start and end, from the rollups"""
+    db = SessionLocal()
+    try:
+        if "start" not in request.args or "end" not in request.args:
+            return jsonify({"error": "start and end are required"}), 400
+
+        trend = get_mood_trend(
+            db=db,
+            user_id=g.user_id,
+            start_date=parse_date(request.args["start"]),
+            end_date=parse_date(request.args["end"]),
+            period=request.args.get("period", "day"),
+        )
+        return jsonify(trend), 200
+
+    except (InvalidReflectionDate, InvalidAnalyticsRange) as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        db.close()
+
+
+@api.route("/api/analytics/terms", methods=["GET"])
+def get_top_terms_route():
+    """The `limit` (default 20) most used terms between start and end"""
+    db = SessionLocal()
+    try:
+        if "start" not in request.args or "end" not in request.args:
+            return jsonify({"error": "start and end are required"}), 400
+
+        limit = int(request.args.get("limit", "20"))
+        if not 1 <= limit <= 100:
+            return jsonify({"error": "limit must be between 1 and 100"}), 400
+
+        terms = get_top_terms(
+            db=db,
+            user_id=g.user_id,
+            start_date=parse_date(request.args["start"]),
+            end_date=parse_date(request.args["end"]),
+            limit=limit,
+        )
+        return jsonify(terms), 200
+
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    except (InvalidReflectionDate, InvalidAnalyticsRange) as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        db.close()
+
+@api.route("/api/goals/<int:goal_id>", methods=["DELETE"])
 def delete_goal_route(goal_id: int):
     db = SessionLocal()
     try:
-        from models import Goal
-        
-        # Find the goal
-        goal = (
-            db.query(Goal)
-            .filter(
-                Goal.id == goal_id,
-                Goal.user_id == g.user_id,
-            )
-            .one_or_none()
+        delete_goal(
+            db=db,
+            goal_id=goal_id,
+            user_id=g.user_id,
         )
-        
-        if goal is None:
-            return jsonify({"error": "Goal not found"}), 404
-        
-        # Delete the goal
-        db.delete(goal)
-        db.commit()
-        
         return jsonify({"message": "Goal deleted successfully"}), 200
 
+    except GoalNotFound as e:
+        return jsonify({"error": str(e)}), 404
+
     except Exception as e:
         db.rollback()
         return jsonify({"error": str(e)}), 500
@@ -438,7 +777,17 @@ def delete_goal_route(goal_id: int):
 
 # -- SCHEDULED TASKS ROUTES --
 
-@app.route("/api/scheduled-tasks", methods=["POST"])
+def task_overlap_response(e):
+    return jsonify({
+        "error": str(e),
+        "conflicts": [
+            {"date": day.isoformat(), "task": scheduled_task_to_dict(task)}
+            for day, task in e.conflicts
+        ],
+    }), 409
+
+
+@api.route("/api/scheduled-tasks", methods=["POST"])
 def create_scheduled_task_route():
     db = SessionLocal()
     try:
@@ -455,10 +804,13 @@ def create_scheduled_task_route():
             end_time=parse_time(data["end_time"]),
             is_recurring=data.get("is_recurring", False),
             recurrence_pattern=data.get("recurrence_pattern"),
+            allow_overlap=data.get("allow_overlap", False),
         )
 
         return jsonify(scheduled_task_to_dict(task)), 201
 
+    except TaskOverlap as e:
+        return task_overlap_response(e)
     except KeyError as e:
         return jsonify({"error": f"missing field: {e}"}), 400
     except ValueError as e:
@@ -467,7 +819,7 @@ def create_scheduled_task_route():
         db.close()
 
 
-@app.route("/api/scheduled-tasks", methods=["GET"])
+@api.route("/api/scheduled-tasks", methods=["GET"])
 def get_scheduled_tasks_route():
     db = SessionLocal()
     try:
@@ -475,6 +827,25 @@ def get_scheduled_tasks_route():
         start_date = parse_date(request.args.get("start_date"))
         end_date = parse_date(request.args.get("end_date"))
 
+        # ?layout=week returns tasks bucketed by day and hour with overlap lanes
+        if request.args.get("layout") == "week":
+            version = week_version(db=db, user_id=user_id, start_date=start_date, end_date=end_date)
+            if version in request.if_none_match:
+                return Response(status=304, headers={"ETag": f'"{version}"'})
+
+            layout = get_week_layout(
+                db=db,
+                user_id=user_id,
+                start_date=start_date,
+                end_date=end_date,
+                to_dict=scheduled_task_to_dict,
+                version=version,
+            )
+            response = jsonify(layout)
+            response.set_etag(version)
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response, 200
+
         tasks = get_scheduled_tasks_for_week(
             db=db,
             user_id=user_id,
@@ -492,7 +863,48 @@ def get_scheduled_tasks_route():
         db.close()
 
 
-@app.route("/api/scheduled-tasks/<int:task_id>", methods=["PATCH"])
+@api.route("/api/scheduled-tasks/free-slots", methods=["GET"])
+def get_free_slots_route():
+    """Open time of at least `duration` minutes on each day of a date range"""
+    db = SessionLocal()
+    try:
+        start_date = parse_date(request.args.get("start_date"))
+        end_date = parse_date(request.args.get("end_date"))
+        duration = int(request.args.get("duration", "60"))
+
+        if end_date < start_date:
+            return jsonify({"error": "end_date cannot be before start_date"}), 400
+        if (end_date - start_date).days > 92:
+            return jsonify({"error": "date range cannot exceed 92 days"}), 400
+        if duration <= 0:
+            return jsonify({"error": "duration must be positive"}), 400
+
+        slots = find_free_slots(
+            db=db,
+            user_id=g.user_id,
+            start_date=start_date,
+            end_date=end_date,
+            duration_minutes=duration,
+            day_start=parse_time(request.args["day_start"]) if "day_start" in request.args else None,
+            day_end=parse_time(request.args["day_end"]) if "day_end" in request.args else None,
+        )
+
+        return jsonify([
+            {
+                "date": slot["date"].isoformat(),
+                "start_time": slot["start_time"].strftime("%H:%M"),
+                "end_time": slot["end_time"].strftime("%H:%M"),
+            }
+            for slot in slots
+        ]), 200
+
+    except (InvalidReflectionDate, TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        db.close()
+
+
+@api.route("/api/scheduled-tasks/<int:task_id>", methods=["PATCH"])
 def update_scheduled_task_route(task_id: int):
     db = SessionLocal()
     try:
@@ -518,6 +930,8 @@ def update_scheduled_task_route(task_id: int):
             update_params["recurrence_pattern"] = data["recurrence_pattern"]
         if "is_completed" in data:
             update_params["is_completed"] = data["is_completed"]
+        if "allow_overlap" in data:
+            update_params["allow_overlap"] = data["allow_overlap"]
 
         task = update_scheduled_task(**update_params)
 
@@ -525,13 +939,15 @@ def update_scheduled_task_route(task_id: int):
 
     except ScheduledTaskNotFound as e:
         return jsonify({"error": str(e)}), 404
+    except TaskOverlap as e:
+        return task_overlap_response(e)
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
     finally:
         db.close()
 
 
-@app.route("/api/scheduled-tasks/<int:task_id>", methods=["DELETE"])
+@api.route("/api/scheduled-tasks/<int:task_id>", methods=["DELETE"])
 def delete_scheduled_task_route(task_id: int):
     db = SessionLocal()
     try:
@@ -544,27 +960,103 @@ def delete_scheduled_task_route(task_id: int):
         db.close()
 
 
-@app.route("/api/morning-insights", methods=["GET"])
+# -- BULK ROUTES --
+
+BULK_SERIALIZERS = {
+    "scheduled_task": scheduled_task_to_dict,
+    "goal": goal_to_dict,
+    "journal_entry": journal_entry_to_dict,
+}
+
+
+@api.route("/api/bulk", methods=["POST"])
+def bulk_mutation_route():
+    """Apply an ordered list of create/update/delete operations atomically"""
+    db = SessionLocal()
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "Request body must be JSON"}), 400
+
+        results = apply_bulk_operations(
+            db=db,
+            user_id=g.user_id,
+            operations=data.get("operations"),
+        )
+
+        return jsonify({
+            "results": [
+                {
+                    "op": result.op,
+                    "type": result.type,
+                    "id": result.id,
+                    "item": BULK_SERIALIZERS[result.type](result.obj) if result.obj is not None else None,
+                }
+                for result in results
+            ]
+        }), 200
+
+    except BulkTargetNotFound as e:
+        return jsonify({"error": str(e), "index": e.index}), 404
+
+    except BulkTaskOverlap as e:
+        response, status = task_overlap_response(e)
+        return jsonify({**response.get_json(), "index": e.index}), status
+
+    except InvalidBulkOperation as e:
+        return jsonify({"error": str(e), "index": e.index}), 400
+
+    except EditConflict as e:
+        return conflict_response(e)
+
+    finally:
+        db.close()
+
+
+def insight_cache_filler(user_id, insight_date):
+    """Callback that stores late AI insights; runs on a background thread"""
+    def fill(insights):
+        db = session_for_user(user_id)
+        try:
+            store_insights(db=db, user_id=user_id, insight_date=insight_date, insights=insights)
+        finally:
+            db.close()
+    return fill
+
+
+@api.route("/api/morning-insights", methods=["GET"])
 def get_morning_insights():
     """Generate AI-powered morning insights based on goals and yesterday's reflection"""
     from datetime import timedelta
     db = SessionLocal()
     try:
+        # Served from the nightly batch when it already ran for this user
+        stored = get_stored_insights(db=db, user_id=g.user_id, insight_date=date.today())
+        if stored is not None:
+            return jsonify(stored), 200
+
         # Get user's active goals
-        goals = get_goals_for_user(db, g.user_id, status='active')
+        goals = get_goals_for_user(db=db, user_id=g.user_id, status='active')
         goals_list = [goal_to_dict(g) for g in goals]
 
         # Get yesterday's reflection
         yesterday = date.today() - timedelta(days=1)
         yesterday_reflection = None
         try:
-            reflection = get_reflection_for_date(db, g.user_id, yesterday)
-            yesterday_reflection = reflection_to_dict(reflection) if reflection else None
+            reflection = get_reflection_for_date(db=db, user_id=g.user_id, reflection_date=yesterday)
+            if reflection:
+                yesterday_reflection = reflection_to_dict(reflection)
+                yesterday_reflection["condensed"] = refresh_condensed_fields(db=db, reflection=reflection)
         except:
             pass  # No reflection from yesterday is okay
 
-        # Generate insights
-        insights = generate_morning_insights(goals_list, yesterday_reflection)
+        # Generate insights; a model call that outlives the latency budget
+        # fills the cache for the next request instead
+        insights = generate_morning_insights(
+            goals_list,
+            yesterday_reflection,
+            on_late_result=insight_cache_filler(g.user_id, date.today()),
+        )
 
         return jsonify(insights), 200
 
@@ -575,7 +1067,157 @@ def get_morning_insights():
         db.close()
 
 
+@api.route("/api/morning-insights/stream", methods=["GET"])
+def stream_morning_insights_route():
+    """Stream morning insights as Server-Sent Events while they are generated"""
+    from datetime import timedelta
+    db = SessionLocal()
+    try:
+        stored = get_stored_insights(db=db, user_id=g.user_id, insight_date=date.today())
+
+        goals_list = []
+        yesterday_reflection = None
+        if stored is None:
+            goals = get_goals_for_user(db=db, user_id=g.user_id, status='active')
+            goals_list = [goal_to_dict(g) for g in goals]
+
+            yesterday = date.today() - timedelta(days=1)
+            reflection = get_reflection_for_date(db=db, user_id=g.user_id, reflection_date=yesterday)
+            if reflection:
+                yesterday_reflection = reflection_to_dict(reflection)
+                yesterday_reflection["condensed"] = refresh_condensed_fields(db=db, reflection=reflection)
+    finally:
+        # the stream can outlive the request setup by seconds; don't hold the session
+        db.close()
+
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    def events():
+        if stored is not None:
+            for insight in stored:
+                yield sse("insight", insight)
+            yield sse("done", {"source": "stored"})
+            return
+
+        for event, data in stream_morning_insights(goals_list, yesterday_reflection):
+            yield sse(event, data)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# -- PUSH STREAMS --
+
+# seconds between keep-alive comments on idle event streams
+REMINDER_STREAM_KEEPALIVE_S = 15
+
+
+def event_stream_response(topics=None):
+    """
+    Relay the user's bus events as SSE. Each event carries its per-user
+    sequence number as the SSE id; "resync" tells a client that fell behind
+    to refetch.
+    """
+    subscription = bus.subscribe(g.user_id, topics=topics)
+
+    def events():
+        try:
+            yield ": connected\n\n"
+            while True:
+                event = subscription.get(timeout=REMINDER_STREAM_KEEPALIVE_S)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                elif event.topic == RESYNC:
+                    yield "event: resync\ndata: {}\n\n"
+                else:
+                    yield f"id: {event.seq}\nevent: {event.topic}\ndata: {json.dumps(event.data)}\n\n"
+        finally:
+            bus.unsubscribe(subscription)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@api.route("/api/reminders/stream", methods=["GET"])
+def stream_reminders_route():
+    """Server-sent reminder events for the user's upcoming tasks (REMINDER_SINKS must include sse)"""
+    return event_stream_response(topics={"reminder"})
+
+
+@api.route("/api/events/stream", methods=["GET"])
+def stream_events_route():
+    """Server-sent change events for the user's tasks, goals, entries and reflections, plus reminders"""
+    return event_stream_response()
+
+
+@api.route("/api/metrics/events", methods=["GET"])
+def get_event_metrics_route():
+    """Open event-stream subscriptions"""
+    return jsonify(bus.snapshot()), 200
+
+
+@api.route("/api/metrics/reminders", methods=["GET"])
+def get_reminder_metrics_route():
+    """Pending reminders, wakeups and DB loads of the reminder dispatcher"""
+    return jsonify(get_reminder_metrics()), 200
+
+
+@api.route("/api/metrics/ai-insights", methods=["GET"])
+def get_insights_metrics_route():
+    """Circuit breaker state and fallback counters for the insights pipeline"""
+    return jsonify(get_insights_metrics()), 200
+
+
+@api.route("/api/metrics/admission", methods=["GET"])
+def get_admission_metrics_route():
+    """Rate limits, in-flight requests and shed counts"""
+    return jsonify(get_admission_metrics()), 200
+
+
+@api.route("/api/admin/slow-queries", methods=["GET"])
+def get_slow_queries_route():
+    """Recent statements over SLOW_QUERY_MS with their query plans; admin token required"""
+    if not is_admin_request():
+        return jsonify({"error": "admin token required"}), 403
+    return jsonify(get_slow_queries()), 200
+
+
+def create_app() -> Flask:
+    """
+    Build the Flask app. Nothing heavy happens at import time: the schema
+    upgrade runs here, and the AI SDK is only imported on first use.
+    """
+    app = Flask(__name__)
+    CORS(
+        app,
+        resources={r"/api/*": {"origins": "http://localhost:5173"}},
+        supports_credentials=True
+    )
+    init_compression(app)
+    init_profiling(app)
+    init_reminders(app)
+
+    # change events carry the same row shapes as the REST responses
+    register_serializer("scheduled_task", scheduled_task_to_dict)
+    register_serializer("goal", goal_to_dict)
+    register_serializer("journal_entry", journal_entry_to_dict)
+    register_serializer("reflection", reflection_to_dict)
+
+    # bring databases created by older versions up to the current schema
+    init_db()
+
+    app.register_blueprint(api)
+    return app
+
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
 
 
@@ -0,0 +1,105 @@
+"""
+Backfill: rewrite existing journal and reflection text through CompressedText.
+
+Usage:
+    python migrate_compress_text.py [--batch-size 500] [--codec zlib|zstd] [--vacuum]
+    python migrate_compress_text.py --revert      # store everything as plain text again
+"""
+import argparse
+
+from sqlalchemy import Text, select, type_coerce, update
+
+import column_types
+from column_types import compress_text, decompress_text, is_compressed
+from db import engine
+from models import DailyReflection, JournalEntry
+
+COMPRESSED_COLUMNS = [
+    (JournalEntry.__table__, ["content"]),
+    (DailyReflection.__table__, ["summary", "accomplishments", "improvements_to_make"]),
+]
+
+
+def _rewrite(value, revert: bool, codec: str):
+    if value is None:
+        return None
+
+    text = decompress_text(value)
+    if revert:
+        return text if is_compressed(value) else None
+
+    if is_compressed(value) or len(text.encode("utf-8")) < column_types.TEXT_COMPRESSION_MIN_SIZE:
+        return None
+
+    compressed = compress_text(text, codec=codec)
+    return compressed if len(compressed) < len(text.encode("utf-8")) else None
+
+
+def migrate_table(table, columns, *, batch_size: int, revert: bool, codec: str) -> int:
+    """
+    Walk a table in primary-key order, one transaction per batch.
+
+    Reads raw column values (bypassing CompressedText's decoding) so rows
+    already in the target format are skipped and the backfill can be re-run.
+    """
+    rewritten = 0
+    last_id = 0
+
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(table.c.id, *[type_coerce(table.c[name], Text).label(name) for name in columns])
+                .where(table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+
+            if not rows:
+                break
+
+            for row in rows:
+                values = {}
+                for name in columns:
+                    new_value = _rewrite(row._mapping[name], revert, codec)
+                    if new_value is not None:
+                        values[name] = new_value
+
+                if values:
+                    conn.execute(update(table).where(table.c.id == row.id).values(**values))
+                    rewritten += 1
+
+            last_id = rows[-1].id
+
+    return rewritten
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--codec", choices=["zlib", "zstd"], default=column_types.TEXT_COMPRESSION_CODEC)
+    parser.add_argument("--revert", action="store_true", help="decompress all values")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to shrink app.db")
+    args = parser.parse_args()
+
+    if args.revert:
+        # keep CompressedText from re-compressing the plain text we write back
+        column_types.TEXT_COMPRESSION_ENABLED = False
+
+    for table, columns in COMPRESSED_COLUMNS:
+        count = migrate_table(
+            table,
+            columns,
+            batch_size=args.batch_size,
+            revert=args.revert,
+            codec=args.codec,
+        )
+        print(f"{table.name}: rewrote {count} rows")
+
+    if args.vacuum:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+        print("vacuumed database")
+
+
+if __name__ == "__main__":
+    main()
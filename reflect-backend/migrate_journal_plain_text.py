@@ -0,0 +1,64 @@
+"""
+Add the derived plain_text / word_count / char_count columns to
+journal_entries and backfill them for existing rows.
+
+Usage:
+    python migrate_journal_plain_text.py [--batch-size 500]
+"""
+import argparse
+
+from sqlalchemy import select, update
+
+from db import Base, add_missing_columns, engine
+from models import JournalEntry
+from services.html_text import text_stats
+
+
+def backfill(batch_size: int) -> int:
+    """
+    Fill derived text columns for rows that do not have them yet.
+
+    updated_at is written back unchanged; a backfill is not a user edit.
+    """
+    table = JournalEntry.__table__
+    updated = 0
+    last_id = 0
+
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(table.c.id, table.c.content)
+                .where(table.c.id > last_id, table.c.plain_text.is_(None))
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            for row in rows:
+                conn.execute(
+                    update(table)
+                    .where(table.c.id == row.id)
+                    .values(**text_stats(row.content), updated_at=table.c.updated_at)
+                )
+
+            updated += len(rows)
+            last_id = rows[-1].id
+
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill journal plain text")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    added = add_missing_columns(JournalEntry.__table__)
+    print(f"added columns: {added or 'none'}")
+
+    print(f"backfilled {backfill(args.batch_size)} journal entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,17 @@
 from datetime import datetime, date, timezone
-from db import Base
+from db import ArchiveBase, Base
+from column_types import ArchiveText, CompressedText
 
 from sqlalchemy import (
     Column,
     Integer,
     Date,
     DateTime,
+    Float,
     Text,
     Time,
     Boolean,
+    Index,
     UniqueConstraint,
     ForeignKey
 )
@@ -40,9 +43,19 @@ class DailyReflection(Base):
     )
 
     # reflection content
-    summary = Column(Text, nullable=True)
-    accomplishments = Column(Text, nullable=True)
-    improvements_to_make = Column(Text, nullable=True)
+    summary = Column(CompressedText, nullable=True)
+    accomplishments = Column(CompressedText, nullable=True)
+    improvements_to_make = Column(CompressedText, nullable=True)
+
+    # condensed versions of the fields above for AI prompts; valid while
+    # condensed_at == updated_at (see services/reflections.py)
+    condensed_summary = Column(Text, nullable=True)
+    condensed_accomplishments = Column(Text, nullable=True)
+    condensed_improvements_to_make = Column(Text, nullable=True)
+    condensed_at = Column(DateTime, nullable=True)
+
+    # bumped whenever one of the text fields changes (see services/edits.py)
+    version = Column(Integer, nullable=True, default=1)
 
     # uniqueness constraint
     __table_args__ = (
@@ -51,6 +64,8 @@ class DailyReflection(Base):
             "reflection_date",
             name="uq_user_reflection_date",
         ),
+        # archived rows keep their ids, so ids must never be handed out twice
+        {"sqlite_autoincrement": True},
     )
 
     def __repr__(self) -> str:
@@ -76,7 +91,16 @@ class JournalEntry(Base):
     )
 
     # content
-    content = Column(Text, nullable=False)
+    content = Column(CompressedText, nullable=False)
+
+    # derived from content on every write (see services/html_text.py)
+    plain_text = Column(Text, nullable=True)
+    word_count = Column(Integer, nullable=True)
+    char_count = Column(Integer, nullable=True)
+
+    # bumped on every content change; patches name the version they apply
+    # to (see services/edits.py). NULL on older rows, read as 1
+    version = Column(Integer, nullable=True, default=1)
 
     # time
     entry_date = Column(Date, nullable=False)
@@ -99,6 +123,9 @@ class JournalEntry(Base):
         backref="journal_entries",
     )
 
+    # archived rows keep their ids, so ids must never be handed out twice
+    __table_args__ = {"sqlite_autoincrement": True}
+
     def __repr__(self) -> str:
         return (
             f"<JournalEntry "
@@ -136,6 +163,13 @@ class Goal(Base):
         default="active",
     )
 
+    # due-soon/overdue range scans, across users (services/deadlines.py)
+    # and per user (/api/goals/upcoming)
+    __table_args__ = (
+        Index("ix_goals_status_deadline", "status", "deadline"),
+        Index("ix_goals_user_status_deadline", "user_id", "status", "deadline"),
+    )
+
     def __repr__(self) -> str:
         return (
             f"<Goal "
@@ -183,6 +217,11 @@ class ScheduledTask(Base):
         nullable=False,
     )
 
+    # week views and the per-day interval index (services/task_intervals.py)
+    __table_args__ = (
+        Index("ix_scheduled_tasks_user_date", "user_id", "task_date"),
+    )
+
     def __repr__(self) -> str:
         return (
             f"<ScheduledTask "
@@ -192,3 +231,319 @@ class ScheduledTask(Base):
             f"date={self.task_date} "
             f"time={self.start_time}-{self.end_time}>"
         )
+
+
+class ScheduledTaskChange(Base):
+    """
+    A write to scheduled_tasks, recorded in the same transaction for the
+    reminder dispatcher (services/reminders.py), which may run in another
+    process. Rows are deleted once the dispatcher has applied them. Task ids
+    repeat across shards, so a change names the task's user too.
+    """
+    __tablename__ = "scheduled_task_changes"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    task_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+
+class MorningInsight(Base):
+    __tablename__ = "morning_insights"
+
+    # identity
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+
+    # the morning these insights are for
+    insight_date = Column(Date, nullable=False)
+
+    # JSON array of insight dicts, as returned by /api/morning-insights
+    insights = Column(Text, nullable=False)
+
+    # 'ai' or 'default' (rule-based fallback)
+    source = Column(Text, nullable=False, default="ai")
+
+    created_at = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        UniqueConstraint(
+            "user_id",
+            "insight_date",
+            name="uq_user_insight_date",
+        ),
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<MorningInsight "
+            f"id={self.id} "
+            f"user_id={self.user_id} "
+            f"insight_date={self.insight_date} "
+            f"source={self.source}>"
+        )
+
+class InsightBatchRun(Base):
+    __tablename__ = "insight_batch_runs"
+
+    # identity
+    id = Column(Integer, primary_key=True)
+    insight_date = Column(Date, nullable=False, unique=True)
+
+    # progress: users are walked in user_id order, so the last finished
+    # user_id is enough to resume an interrupted run
+    status = Column(Text, nullable=False, default="running")  # 'running' or 'completed'
+    last_user_id = Column(Integer, nullable=False, default=0)
+    users_processed = Column(Integer, nullable=False, default=0)
+    users_failed = Column(Integer, nullable=False, default=0)
+
+    # JSON throughput / latency stats for the run
+    stats = Column(Text, nullable=True)
+
+    started_at = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self) -> str:
+        return (
+            f"<InsightBatchRun "
+            f"id={self.id} "
+            f"insight_date={self.insight_date} "
+            f"status={self.status} "
+            f"processed={self.users_processed}>"
+        )
+
+
+class JournalRevision(Base):
+    """
+    One saved version of a journal entry's content (see services/revisions.py).
+
+    Snapshots hold the full HTML; deltas hold a JSON edit script against
+    the snapshot named by base_revision, so any version is rebuilt from at
+    most two rows.
+    """
+    __tablename__ = "journal_revisions"
+
+    # identity; no foreign key, entries may have moved to the archive
+    id = Column(Integer, primary_key=True)
+    entry_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+
+    # 1, 2, ... per entry
+    revision = Column(Integer, nullable=False)
+
+    # None for snapshots, the snapshot's revision number for deltas
+    base_revision = Column(Integer, nullable=True)
+
+    # written once and rarely read: always compressed, like archived text
+    data = Column(ArchiveText, nullable=False)
+    char_count = Column(Integer, nullable=False)
+
+    # saves arriving shortly after each other are folded into one revision;
+    # created_at is the first of them, updated_at the last
+    created_at = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+    updated_at = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        UniqueConstraint(
+            "entry_id",
+            "revision",
+            name="uq_entry_revision",
+        ),
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<JournalRevision "
+            f"entry_id={self.entry_id} "
+            f"revision={self.revision} "
+            f"base_revision={self.base_revision}>"
+        )
+
+class TextAnalytics(Base):
+    """What the local analyzers found in one journal entry or reflection."""
+    __tablename__ = "text_analytics"
+
+    # identity
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+
+    # the analyzed row: source is 'journal_entry' or 'reflection'
+    source = Column(Text, nullable=False)
+    source_id = Column(Integer, nullable=False)
+    day = Column(Date, nullable=False)
+
+    # word count and summed lexicon weights; mood is derived from the two
+    words = Column(Integer, nullable=False, default=0)
+    positive = Column(Integer, nullable=False, default=0)
+    negative = Column(Integer, nullable=False, default=0)
+    mood = Column(Float, nullable=True)
+
+    # JSON object of the entry's most frequent terms and their counts
+    terms = Column(Text, nullable=False, default="{}")
+
+    # rows written by an older analyzer are redone by the backfill
+    analyzer_version = Column(Integer, nullable=False)
+
+    updated_at = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        UniqueConstraint("source", "source_id", name="uq_text_analytics_source"),
+        Index("ix_text_analytics_user_day", "user_id", "day"),
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<TextAnalytics "
+            f"source={self.source} "
+            f"source_id={self.source_id} "
+            f"day={self.day} "
+            f"mood={self.mood}>"
+        )
+
+class AnalyticsRollup(Base):
+    """Sum of the TextAnalytics rows of one user over a day or a week."""
+    __tablename__ = "analytics_rollups"
+
+    # identity
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+
+    # 'day', or 'week' starting on period_start (a Monday)
+    period = Column(Text, nullable=False)
+    period_start = Column(Date, nullable=False)
+
+    entries = Column(Integer, nullable=False, default=0)
+    words = Column(Integer, nullable=False, default=0)
+    positive = Column(Integer, nullable=False, default=0)
+    negative = Column(Integer, nullable=False, default=0)
+
+    # JSON object: merged term counts of the entries above
+    terms = Column(Text, nullable=False, default="{}")
+
+    updated_at = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        UniqueConstraint(
+            "user_id",
+            "period",
+            "period_start",
+            name="uq_user_rollup_period",
+        ),
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<AnalyticsRollup "
+            f"user_id={self.user_id} "
+            f"period={self.period} "
+            f"period_start={self.period_start} "
+            f"entries={self.entries}>"
+        )
+
+
+# -- COLD ARCHIVE (schema "archive", see services/archive.py) --
+# Same columns and ids as the hot tables, so archived rows serialize with the
+# same helpers. Text is always stored compressed, and there are no foreign
+# keys: SQLite cannot reference tables across attached databases. "archive_of"
+# names the hot table whose id sequence must stay above the archived ids.
+
+class ArchivedReflection(ArchiveBase):
+    __tablename__ = "archived_reflections"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False)
+    reflection_date = Column(Date, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+    summary = Column(ArchiveText, nullable=True)
+    accomplishments = Column(ArchiveText, nullable=True)
+    improvements_to_make = Column(ArchiveText, nullable=True)
+
+    condensed_summary = Column(Text, nullable=True)
+    condensed_accomplishments = Column(Text, nullable=True)
+    condensed_improvements_to_make = Column(Text, nullable=True)
+    condensed_at = Column(DateTime, nullable=True)
+    version = Column(Integer, nullable=True)
+
+    archived_at = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        Index("ix_archived_reflections_user_date", "user_id", "reflection_date", unique=True),
+        {"schema": "archive", "info": {"archive_of": "daily_reflections"}},
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<ArchivedReflection "
+            f"id={self.id} "
+            f"user_id={self.user_id} "
+            f"reflection_date={self.reflection_date}>"
+        )
+
+class ArchivedJournalEntry(ArchiveBase):
+    __tablename__ = "archived_journal_entries"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False)
+    reflection_id = Column(Integer, nullable=True)
+
+    content = Column(ArchiveText, nullable=False)
+    plain_text = Column(ArchiveText, nullable=True)
+    word_count = Column(Integer, nullable=True)
+    char_count = Column(Integer, nullable=True)
+    version = Column(Integer, nullable=True)
+
+    entry_date = Column(Date, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+    archived_at = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        Index("ix_archived_journal_entries_user_date", "user_id", "entry_date"),
+        {"schema": "archive", "info": {"archive_of": "journal_entries"}},
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<ArchivedJournalEntry "
+            f"id={self.id} "
+            f"user_id={self.user_id} "
+            f"entry_date={self.entry_date}>"
+        )
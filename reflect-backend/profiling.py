@@ -0,0 +1,89 @@
+"""
+On-demand request profiling for the Flask app and the ASGI routes.
+
+A request is run under cProfile when it carries the admin header
+(X-Profile-Token matching PROFILE_ADMIN_TOKEN) or is picked by
+PROFILE_SAMPLE_RATE. The stats are dumped to PROFILE_DIR as a .pstats
+file named in the X-Profile-Id response header; read it with
+`python -m pstats`, or render a flame graph with flameprof or snakeviz.
+
+Slow SQL statements are captured separately, by the engine events in db.py.
+"""
+import cProfile
+import hmac
+import os
+import random
+import time
+import uuid
+
+from flask import g, request
+
+PROFILE_ADMIN_TOKEN = os.environ.get("PROFILE_ADMIN_TOKEN", "")
+PROFILE_HEADER = "X-Profile-Token"
+
+# fraction of requests profiled without the header (0 turns sampling off)
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+
+
+def token_matches(token) -> bool:
+    """Whether `token` is the admin token; always False when none is configured."""
+    if not PROFILE_ADMIN_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), PROFILE_ADMIN_TOKEN.encode("utf-8"))
+
+
+def is_admin_request() -> bool:
+    """Whether the request carries the admin token; always False when none is configured."""
+    return token_matches(request.headers.get(PROFILE_HEADER))
+
+
+def should_profile(method: str, token) -> bool:
+    """Whether to profile a request with this method and X-Profile-Token value."""
+    if method == "OPTIONS":
+        return False
+    if token_matches(token):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def new_profile_id(endpoint) -> str:
+    return f"{int(time.time())}-{endpoint or 'unmatched'}-{uuid.uuid4().hex[:8]}"
+
+
+def write_profile(profiler: cProfile.Profile, profile_id: str, label: str, elapsed_ms: float) -> None:
+    """Dump `profiler` to PROFILE_DIR as <profile_id>.pstats."""
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{profile_id}.pstats")
+        profiler.dump_stats(path)
+        print(f"profile of {label} ({elapsed_ms:.1f} ms) written to {path}")
+    except OSError as e:
+        print(f"Error writing profile {profile_id}: {e}")
+
+
+def init_profiling(app) -> None:
+    @app.before_request
+    def start_profile():
+        if not should_profile(request.method, request.headers.get(PROFILE_HEADER)):
+            return
+        g.profile_id = new_profile_id(request.endpoint)
+        g.profile_started = time.perf_counter()
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+    @app.after_request
+    def tag_profiled_response(response):
+        if "profile_id" in g:
+            response.headers["X-Profile-Id"] = g.profile_id
+        return response
+
+    # teardown runs after a streamed body is finished, so streams are covered too
+    @app.teardown_request
+    def stop_profile(exc):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return
+        profiler.disable()
+        elapsed_ms = (time.perf_counter() - g.profile_started) * 1000
+        write_profile(profiler, g.profile_id, f"{request.method} {request.path}", elapsed_ms)
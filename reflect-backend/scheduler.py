@@ -0,0 +1,141 @@
+"""
+Local scheduler for nightly jobs.
+
+Usage:
+    python scheduler.py                 # run forever, firing jobs at their times
+    python scheduler.py --run-now       # run the insight batch once for today and exit
+    python scheduler.py --archive-now   # move old rows to the archive once and exit
+    python scheduler.py --scan-deadlines [--within 7]   # list goals due soon or overdue
+"""
+import argparse
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+
+from db import ARCHIVE_ENABLED, init_db, session_factories
+from services.archive import archive_old_rows, cold_cutoff
+from services.deadlines import iter_due_goals
+from services.insight_batch import default_batch_client, run_nightly_insights
+
+# local time at which tomorrow-morning insights are generated, HH:MM
+INSIGHT_BATCH_AT = os.environ.get("INSIGHT_BATCH_AT", "03:00")
+
+# local time at which old rows are moved to the archive, HH:MM
+ARCHIVE_AT = os.environ.get("ARCHIVE_AT", "04:00")
+
+
+def _database_label(db) -> str:
+    """File name of the database a session is bound to, for log lines"""
+    return os.path.basename(db.get_bind().url.database)
+
+
+def nightly_insights_job(insight_date: date = None) -> None:
+    insight_date = insight_date or date.today()
+    client = default_batch_client()
+
+    # each database keeps its own run row, so shards resume independently
+    for make_session in session_factories():
+        db = make_session()
+        label = _database_label(db)
+        try:
+            run = run_nightly_insights(
+                db=db,
+                insight_date=insight_date,
+                client=client,
+            )
+            print(
+                f"insight batch {run.insight_date} [{label}]: {run.status}, "
+                f"{run.users_processed} users, {run.users_failed} failed, "
+                f"stats={json.loads(run.stats) if run.stats else {}}"
+            )
+        finally:
+            db.close()
+
+
+def archive_job() -> None:
+    for make_session in session_factories():
+        db = make_session()
+        label = _database_label(db)
+        try:
+            moved = archive_old_rows(db=db)
+            print(f"archive before {cold_cutoff()} [{label}]: {moved}")
+        finally:
+            db.close()
+
+
+def scan_deadlines(within_days: int) -> None:
+    due = 0
+    for goal in iter_due_goals(within_days=within_days):
+        state = f"overdue by {-goal.days_until}d" if goal.days_until < 0 else f"due in {goal.days_until}d"
+        print(f"{goal.deadline} user={goal.user_id} goal={goal.goal_id} {state}: {goal.description[:60]}")
+        due += 1
+    print(f"{due} active goals overdue or due within {within_days} days")
+
+
+def _next_run(now: datetime, at: str) -> datetime:
+    hour, minute = (int(part) for part in at.split(":"))
+    candidate = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if candidate <= now:
+        candidate += timedelta(days=1)
+    return candidate
+
+
+def run_forever(jobs) -> None:
+    """
+    Sleep until the earliest job is due, run it, repeat.
+
+    `jobs` is a list of (HH:MM, callable) pairs in local time. A job that
+    raises is logged and rescheduled for the next day.
+    """
+    schedule = [(_next_run(datetime.now(), at), at, job) for at, job in jobs]
+
+    while True:
+        schedule.sort(key=lambda item: item[0])
+        due, at, job = schedule[0]
+
+        delay = (due - datetime.now()).total_seconds()
+        if delay > 0:
+            time.sleep(delay)
+
+        try:
+            job()
+        except Exception as e:
+            print(f"Error in scheduled job {job.__name__}: {e}")
+
+        schedule[0] = (_next_run(datetime.now(), at), at, job)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reflect nightly job scheduler")
+    parser.add_argument("--run-now", action="store_true", help="run the insight batch once and exit")
+    parser.add_argument("--date", help="insight date for --run-now (YYYY-MM-DD), defaults to today")
+    parser.add_argument("--archive-now", action="store_true", help="archive old rows once and exit")
+    parser.add_argument("--scan-deadlines", action="store_true", help="list goals due soon across users and exit")
+    parser.add_argument("--within", type=int, default=7, help="days ahead for --scan-deadlines")
+    args = parser.parse_args()
+
+    init_db()
+
+    if args.run_now:
+        nightly_insights_job(date.fromisoformat(args.date) if args.date else None)
+        return
+
+    if args.scan_deadlines:
+        scan_deadlines(args.within)
+        return
+
+    if args.archive_now:
+        if not ARCHIVE_ENABLED:
+            raise SystemExit("Archiving is disabled; set ARCHIVE_ENABLED=1.")
+        archive_job()
+        return
+
+    jobs = [(INSIGHT_BATCH_AT, nightly_insights_job)]
+    if ARCHIVE_ENABLED:
+        jobs.append((ARCHIVE_AT, archive_job))
+    run_forever(jobs)
+
+
+if __name__ == "__main__":
+    main()
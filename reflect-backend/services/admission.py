@@ -0,0 +1,158 @@
+"""
+Per-user admission control and load shedding.
+
+Every request is charged to a token bucket keyed by (user_id, cost class).
+A bucket holds up to `burst` tokens and refills at `rate` tokens per
+second; a request that finds it empty is rejected with 429 and a
+Retry-After of the time until the next token.
+
+Independently, the number of requests in flight in this process is
+tracked. While it is at or above ADMISSION_SHED_CONCURRENCY, expensive
+requests are shed with 503 before they take a worker and a DB connection,
+so cheap requests keep their latency.
+"""
+import math
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+from typing import Dict
+
+EXPENSIVE = "expensive"
+STANDARD = "standard"
+
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "1") == "1"
+
+# tokens per second and bucket size, per user and cost class
+ADMISSION_EXPENSIVE_RATE = float(os.environ.get("ADMISSION_EXPENSIVE_RATE", "0.2"))
+ADMISSION_EXPENSIVE_BURST = int(os.environ.get("ADMISSION_EXPENSIVE_BURST", "5"))
+ADMISSION_STANDARD_RATE = float(os.environ.get("ADMISSION_STANDARD_RATE", "20"))
+ADMISSION_STANDARD_BURST = int(os.environ.get("ADMISSION_STANDARD_BURST", "60"))
+
+# in-flight requests at which expensive ones are shed, and the Retry-After they get
+ADMISSION_SHED_CONCURRENCY = int(os.environ.get("ADMISSION_SHED_CONCURRENCY", "16"))
+ADMISSION_SHED_RETRY_AFTER_S = int(os.environ.get("ADMISSION_SHED_RETRY_AFTER_S", "2"))
+
+# buckets kept in memory, least recently used dropped first (a dropped
+# bucket comes back full)
+ADMISSION_MAX_BUCKETS = int(os.environ.get("ADMISSION_MAX_BUCKETS", "10000"))
+
+# status is None when the request was admitted
+Decision = namedtuple("Decision", ["status", "retry_after", "reason"])
+ADMITTED = Decision(None, 0, None)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int, now: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = now
+
+    def try_take(self, now: float) -> float:
+        """Take a token; returns 0.0 on success, else seconds until one is available."""
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (1 - self._tokens) / self.rate
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        limits: Dict[str, tuple],
+        shed_concurrency: int,
+        shed_retry_after: int,
+        max_buckets: int = ADMISSION_MAX_BUCKETS,
+    ):
+        self.limits = limits
+        self.shed_concurrency = shed_concurrency
+        self.shed_retry_after = shed_retry_after
+        self.max_buckets = max_buckets
+
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[tuple, TokenBucket]" = OrderedDict()
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._counters = Counter()
+
+    def admit(self, user_id: int, cost_class: str) -> Decision:
+        """
+        Decide on one request. An admitted request counts as in flight
+        until release() is called for it.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if cost_class == EXPENSIVE and self._in_flight >= self.shed_concurrency:
+                self._counters[f"{cost_class}.shed"] += 1
+                return Decision(503, self.shed_retry_after, "server busy")
+
+            key = (user_id, cost_class)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                rate, burst = self.limits[cost_class]
+                bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+                while len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+
+            wait = bucket.try_take(now)
+            if wait > 0:
+                self._counters[f"{cost_class}.rate_limited"] += 1
+                retry_after = self.shed_retry_after if math.isinf(wait) else max(1, math.ceil(wait))
+                return Decision(429, retry_after, "rate limit exceeded")
+
+            self._counters[f"{cost_class}.admitted"] += 1
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+            return ADMITTED
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_flight = max(self._in_flight - 1, 0)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._peak_in_flight,
+                "shed_concurrency": self.shed_concurrency,
+                "tracked_buckets": len(self._buckets),
+                "limits": {
+                    cost_class: {"rate_per_s": rate, "burst": burst}
+                    for cost_class, (rate, burst) in self.limits.items()
+                },
+                "counters": dict(self._counters),
+            }
+
+
+_controller = AdmissionController(
+    limits={
+        EXPENSIVE: (ADMISSION_EXPENSIVE_RATE, ADMISSION_EXPENSIVE_BURST),
+        STANDARD: (ADMISSION_STANDARD_RATE, ADMISSION_STANDARD_BURST),
+    },
+    shed_concurrency=ADMISSION_SHED_CONCURRENCY,
+    shed_retry_after=ADMISSION_SHED_RETRY_AFTER_S,
+)
+
+
+def admit_request(*, user_id: int, cost_class: str) -> Decision:
+    if not ADMISSION_ENABLED:
+        return ADMITTED
+    return _controller.admit(user_id, cost_class)
+
+
+def release_request() -> None:
+    _controller.release()
+
+
+def get_admission_metrics() -> Dict:
+    """Limits, in-flight requests and admitted/rate-limited/shed counts"""
+    metrics = _controller.snapshot()
+    metrics["enabled"] = ADMISSION_ENABLED
+    return metrics
@@ -1,40 +1,399 @@
 """
 AI-powered insights generation using Anthropic's Claude API
 """
+import asyncio
+import json
 import os
-from anthropic import Anthropic
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, timedelta
 
+from services.circuit_breaker import CircuitBreaker
+from services.reflections import condense_text
 
-def generate_morning_insights(goals, yesterday_reflection):
+INSIGHTS_MODEL = "claude-3-5-sonnet-20241022"
+
+# cap on concurrent upstream calls from the async path
+INSIGHTS_MAX_CONCURRENCY = int(os.environ.get('INSIGHTS_MAX_CONCURRENCY', '200'))
+
+# Icons for each insight type
+ICON_MAP = {
+    'goal': 'Target',
+    'improvement': 'TrendingUp',
+    'motivation': 'Sparkles',
+    'reflection': 'Lightbulb'
+}
+
+# prompt budget for the user context (goals + yesterday's reflection)
+INSIGHTS_CONTEXT_TOKEN_BUDGET = int(os.environ.get('INSIGHTS_CONTEXT_TOKEN_BUDGET', '600'))
+MAX_CONTEXT_GOALS = 5
+
+REFLECTION_LABELS = {
+    'summary': 'Day summary',
+    'accomplishments': 'Accomplishments',
+    'improvements_to_make': 'Wanted to improve',
+}
+
+# seconds a request waits for the model before falling back to rule-based insights
+INSIGHTS_LATENCY_BUDGET_S = float(os.environ.get('INSIGHTS_LATENCY_BUDGET_S', '3'))
+# hard client timeout for calls that keep running after the budget
+INSIGHTS_UPSTREAM_TIMEOUT_S = float(os.environ.get('INSIGHTS_UPSTREAM_TIMEOUT_S', '30'))
+INSIGHTS_BACKGROUND_WORKERS = int(os.environ.get('INSIGHTS_BACKGROUND_WORKERS', '8'))
+
+_breaker = CircuitBreaker(
+    'anthropic',
+    failure_threshold=int(os.environ.get('INSIGHTS_BREAKER_FAILURES', '5')),
+    reset_timeout=float(os.environ.get('INSIGHTS_BREAKER_RESET_S', '30')),
+)
+
+_metrics = Counter()
+_metrics_lock = threading.Lock()
+
+_executor = None
+_client = None
+_client_lock = threading.Lock()
+_async_client = None
+_async_semaphore = None
+
+
+def generate_morning_insights(goals, yesterday_reflection, on_late_result=None):
     """
     Generate personalized morning insights based on user's goals and yesterday's reflection.
 
+    The model gets INSIGHTS_LATENCY_BUDGET_S seconds. When the budget runs
+    out the rule-based insights are returned and the call keeps running in
+    the background; if it then succeeds, on_late_result(insights) is called
+    so the caller can cache the result for the next request. While the
+    circuit breaker is open the model is not called at all.
+
     Args:
         goals: List of active goal objects with description and deadline
         yesterday_reflection: Reflection object from yesterday with summary, accomplishments, improvements_to_make
+        on_late_result: Optional callback for insights that arrive after the budget
 
     Returns:
         List of insight dictionaries with type, title, message, color
     """
+    _count('requests')
     api_key = os.environ.get('ANTHROPIC_API_KEY')
     if not api_key:
         # Return default insights if no API key
-        return _generate_default_insights(goals, yesterday_reflection)
+        return _fallback('no_api_key', goals, yesterday_reflection)
+
+    # Prepare context for Claude
+    context = _build_context(goals, yesterday_reflection)
+    prompt = _build_prompt(context)
+
+    if not _breaker.allow_request():
+        return _fallback('breaker_open', goals, yesterday_reflection)
+
+    _count('upstream_calls')
+    future = _get_executor().submit(_call_model, api_key, prompt)
+
+    try:
+        insights = future.result(timeout=INSIGHTS_LATENCY_BUDGET_S)
+        _breaker.record_success()
+        return insights
+
+    except FutureTimeoutError:
+        _breaker.record_failure()
+        future.add_done_callback(lambda f: _finish_late_call(f, on_late_result))
+        return _fallback('timeout', goals, yesterday_reflection)
+
+    except Exception as e:
+        print(f"Error generating AI insights: {e}")
+        _breaker.record_failure()
+        # Fallback to default insights
+        return _fallback('error', goals, yesterday_reflection)
+
+
+def _call_model(api_key, prompt):
+    """Blocking model call, run on the background executor"""
+    client = _get_client(api_key)
+    started = time.perf_counter()
+    message = client.messages.create(
+        model=INSIGHTS_MODEL,
+        max_tokens=1024,
+        messages=[{
+            "role": "user",
+            "content": prompt
+        }]
+    )
+    _report_call(prompt, message, started)
+    return _parse_insights(message.content[0].text)
+
+
+def _finish_late_call(future, on_late_result):
+    """Done-callback for calls that outlived their latency budget"""
+    if future.exception() is not None:
+        _count('late_failures')
+        return
+    _count('late_completions')
+    if on_late_result is not None:
+        try:
+            on_late_result(future.result())
+        except Exception as e:
+            print(f"Error storing late AI insights: {e}")
+
+
+async def generate_morning_insights_async(goals, yesterday_reflection, on_late_result=None):
+    """
+    Async variant of generate_morning_insights.
+
+    Awaits the model through a shared AsyncAnthropic client so that a single
+    event loop can keep many insight requests in flight at once. The latency
+    budget and circuit breaker behave as in the sync variant; on_late_result
+    is a plain function and runs in the default executor.
+    """
+    _count('requests')
+    client = _get_async_client()
+    if client is None:
+        return _fallback('no_api_key', goals, yesterday_reflection)
+
+    context = _build_context(goals, yesterday_reflection)
+    prompt = _build_prompt(context)
+
+    if not _breaker.allow_request():
+        return _fallback('breaker_open', goals, yesterday_reflection)
+
+    async def call():
+        async with _get_async_semaphore():
+            started = time.perf_counter()
+            message = await client.messages.create(
+                model=INSIGHTS_MODEL,
+                max_tokens=1024,
+                messages=[{
+                    "role": "user",
+                    "content": prompt
+                }]
+            )
+        _report_call(prompt, message, started)
+        return _parse_insights(message.content[0].text)
+
+    _count('upstream_calls')
+    task = asyncio.ensure_future(call())
 
     try:
-        client = Anthropic(api_key=api_key)
+        insights = await asyncio.wait_for(asyncio.shield(task), INSIGHTS_LATENCY_BUDGET_S)
+        _breaker.record_success()
+        return insights
+
+    except asyncio.TimeoutError:
+        _breaker.record_failure()
+        loop = asyncio.get_running_loop()
+
+        def on_done(t):
+            if t.cancelled() or t.exception() is not None:
+                _count('late_failures')
+                return
+            _count('late_completions')
+            if on_late_result is not None:
+                loop.run_in_executor(None, on_late_result, t.result())
+
+        task.add_done_callback(on_done)
+        return _fallback('timeout', goals, yesterday_reflection)
+
+    except Exception as e:
+        print(f"Error generating AI insights: {e}")
+        _breaker.record_failure()
+        return _fallback('error', goals, yesterday_reflection)
+
+
+def _fallback(reason, goals, yesterday_reflection):
+    _count('fallbacks')
+    _count(f'fallback_{reason}')
+    return _generate_default_insights(goals, yesterday_reflection)
+
+
+def _count(name, amount=1):
+    with _metrics_lock:
+        _metrics[name] += amount
+
+
+def get_insights_metrics():
+    """Counters, fallback rate and breaker state for the insights pipeline"""
+    with _metrics_lock:
+        counters = dict(_metrics)
+    requests = counters.get('requests', 0)
+    return {
+        'counters': counters,
+        'fallback_rate': round(counters.get('fallbacks', 0) / requests, 4) if requests else 0.0,
+        'latency_budget_s': INSIGHTS_LATENCY_BUDGET_S,
+        'breaker': _breaker.snapshot(),
+    }
+
+
+def _get_executor():
+    """Background pool for sync model calls; created on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=INSIGHTS_BACKGROUND_WORKERS,
+            thread_name_prefix='ai-insights',
+        )
+    return _executor
+
+
+def _report_call(prompt, message, started):
+    """Log prompt size and latency of one model call"""
+    latency_ms = (time.perf_counter() - started) * 1000
+    usage = getattr(message, 'usage', None)
+    input_tokens = getattr(usage, 'input_tokens', None) or estimate_tokens(prompt)
+    print(f"AI insights call: prompt_tokens={input_tokens} latency_ms={latency_ms:.0f}")
+
+
+def stream_morning_insights(goals, yesterday_reflection):
+    """
+    Generate morning insights incrementally.
+
+    Yields (event, data) pairs: first ('placeholder', rule-based insights),
+    then ('insight', insight) for each insight as soon as the model has
+    finished writing it, and finally ('done', {'source': 'ai' | 'default'}).
+    When the model is unavailable or fails before producing anything the
+    placeholder stands as the result.
+    """
+    _count('requests')
+    yield 'placeholder', _generate_default_insights(goals, yesterday_reflection)
 
-        # Prepare context for Claude
-        context = _build_context(goals, yesterday_reflection)
+    api_key = os.environ.get('ANTHROPIC_API_KEY')
+    if not api_key:
+        _count('fallbacks')
+        _count('fallback_no_api_key')
+        yield 'done', {'source': 'default'}
+        return
+
+    prompt = _build_prompt(_build_context(goals, yesterday_reflection))
+    if not _breaker.allow_request():
+        _count('fallbacks')
+        _count('fallback_breaker_open')
+        yield 'done', {'source': 'default'}
+        return
+
+    _count('upstream_calls')
+    emitted = 0
+    try:
+        client = _get_client(api_key)
+        parser = JSONArrayStreamParser()
 
-        # Call Claude API
-        message = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
+        started = time.perf_counter()
+        with client.messages.stream(
+            model=INSIGHTS_MODEL,
             max_tokens=1024,
-            messages=[{
-                "role": "user",
-                "content": f"""You are a supportive personal growth coach. Based on the user's goals and yesterday's reflection, generate 2-3 personalized morning insights to help them start their day with intention.
+            messages=[{"role": "user", "content": prompt}],
+        ) as stream:
+            for text in stream.text_stream:
+                for insight in parser.feed(text):
+                    insight['icon'] = ICON_MAP.get(insight.get('type', 'motivation'), 'Sparkles')
+                    emitted += 1
+                    yield 'insight', insight
+            _report_call(prompt, stream.get_final_message(), started)
+        _breaker.record_success()
+
+    except Exception as e:
+        print(f"Error streaming AI insights: {e}")
+        _breaker.record_failure()
+
+    if not emitted:
+        _count('fallbacks')
+        _count('fallback_error')
+    yield 'done', {'source': 'ai' if emitted else 'default'}
+
+
+class JSONArrayStreamParser:
+    """
+    Incremental parser for a JSON array of objects arriving in pieces.
+
+    feed() returns the objects completed by the new text. Anything before
+    the opening bracket (such as a ```json fence) is skipped.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text):
+        completed = []
+        for char in text:
+            if not self._started:
+                if char == '[':
+                    self._started = True
+                continue
+
+            if self._depth == 0:
+                # between elements of the top-level array
+                if char == '{':
+                    self._depth = 1
+                    self._buffer = [char]
+                continue
+
+            self._buffer.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        completed.append(json.loads(''.join(self._buffer)))
+                    except ValueError:
+                        pass
+                    self._buffer = []
+
+        return completed
+
+
+def _get_client(api_key):
+    """
+    Return the process-wide Anthropic client. The SDK takes over a second to
+    import, so it is imported here on first use rather than at module load.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from anthropic import Anthropic
+
+            _client = Anthropic(api_key=api_key, timeout=INSIGHTS_UPSTREAM_TIMEOUT_S)
+    return _client
+
+
+def _get_async_client():
+    """Return the process-wide AsyncAnthropic client, or None without an API key"""
+    global _async_client
+    api_key = os.environ.get('ANTHROPIC_API_KEY')
+    if not api_key:
+        return None
+    if _async_client is None:
+        from anthropic import AsyncAnthropic
+
+        _async_client = AsyncAnthropic(api_key=api_key, timeout=INSIGHTS_UPSTREAM_TIMEOUT_S)
+    return _async_client
+
+
+def _get_async_semaphore():
+    """Bound concurrent upstream calls; created lazily inside the running loop"""
+    global _async_semaphore
+    if _async_semaphore is None:
+        _async_semaphore = asyncio.Semaphore(INSIGHTS_MAX_CONCURRENCY)
+    return _async_semaphore
+
+
+def _build_prompt(context):
+    """Build the insight prompt around the user context"""
+    return f"""You are a supportive personal growth coach. Based on the user's goals and yesterday's reflection, generate 2-3 personalized morning insights to help them start their day with intention.
 
 {context}
 
@@ -57,84 +416,144 @@ Example format:
   {{"type": "goal", "title": "Focus on Key Priority", "message": "Your project deadline is in 3 days. Block 2 hours today for focused work.", "color": "blue"}},
   {{"type": "improvement", "title": "Build on Yesterday", "message": "You wanted to improve your morning routine. Start with just 5 minutes of planning.", "color": "sky"}}
 ]"""
-            }]
-        )
-
-        # Parse Claude's response
-        import json
-        insights_text = message.content[0].text.strip()
-        # Remove markdown code blocks if present
-        if insights_text.startswith('```'):
-            insights_text = insights_text.split('```')[1]
-            if insights_text.startswith('json'):
-                insights_text = insights_text[4:]
-
-        insights = json.loads(insights_text)
 
-        # Add icons for each insight type
-        icon_map = {
-            'goal': 'Target',
-            'improvement': 'TrendingUp',
-            'motivation': 'Sparkles',
-            'reflection': 'Lightbulb'
-        }
 
-        for insight in insights:
-            insight['icon'] = icon_map.get(insight.get('type', 'motivation'), 'Sparkles')
+def _parse_insights(insights_text):
+    """Parse Claude's JSON response and attach icons"""
+    insights_text = insights_text.strip()
+    # Remove markdown code blocks if present
+    if insights_text.startswith('```'):
+        insights_text = insights_text.split('```')[1]
+        if insights_text.startswith('json'):
+            insights_text = insights_text[4:]
 
-        return insights
-
-    except Exception as e:
-        print(f"Error generating AI insights: {e}")
-        # Fallback to default insights
-        return _generate_default_insights(goals, yesterday_reflection)
+    insights = json.loads(insights_text)
 
+    for insight in insights:
+        insight['icon'] = ICON_MAP.get(insight.get('type', 'motivation'), 'Sparkles')
 
-def _build_context(goals, yesterday_reflection):
-    """Build context string for Claude"""
-    context_parts = []
+    return insights
 
-    # Add goals context
-    if goals and len(goals) > 0:
-        context_parts.append("USER'S ACTIVE GOALS:")
-        for goal in goals[:5]:  # Limit to top 5 goals
-            goal_text = f"- {goal['description']}"
-            if goal.get('deadline'):
-                deadline = goal['deadline']
-                if isinstance(deadline, str):
-                    deadline_date = datetime.fromisoformat(deadline.replace('Z', '+00:00'))
-                else:
-                    deadline_date = deadline
 
-                today = datetime.now()
-                days_until = (deadline_date.date() - today.date()).days
+def estimate_tokens(text):
+    """Rough token count for prompt budgeting (~4 characters per token)"""
+    return (len(text) + 3) // 4
 
-                if days_until < 0:
-                    goal_text += f" (OVERDUE by {abs(days_until)} days)"
-                elif days_until == 0:
-                    goal_text += " (DUE TODAY)"
-                elif days_until <= 7:
-                    goal_text += f" (Due in {days_until} days)"
-                else:
-                    goal_text += f" (Deadline: {deadline_date.strftime('%B %d')})"
 
-            context_parts.append(goal_text)
+def _goal_deadline(goal):
+    """Return (days_until, deadline_datetime) for a goal, or (None, None)"""
+    deadline = goal.get('deadline')
+    if not deadline:
+        return None, None
+    if isinstance(deadline, str):
+        deadline_date = datetime.fromisoformat(deadline.replace('Z', '+00:00'))
     else:
-        context_parts.append("USER'S ACTIVE GOALS: None yet")
+        deadline_date = deadline
+    return (deadline_date.date() - datetime.now().date()).days, deadline_date
+
+
+def _goal_line(goal):
+    goal_text = f"- {goal['description']}"
+    days_until, deadline_date = _goal_deadline(goal)
+    if days_until is not None:
+        if days_until < 0:
+            goal_text += f" (OVERDUE by {abs(days_until)} days)"
+        elif days_until == 0:
+            goal_text += " (DUE TODAY)"
+        elif days_until <= 7:
+            goal_text += f" (Due in {days_until} days)"
+        else:
+            goal_text += f" (Deadline: {deadline_date.strftime('%B %d')})"
+    return goal_text
 
-    context_parts.append("")
 
-    # Add yesterday's reflection context
+def _build_context(goals, yesterday_reflection, token_budget=None):
+    """
+    Build context string for Claude within a token budget.
+
+    Budget is spent in priority order: goals due within a week (most urgent
+    first), condensed reflection fields, remaining goals, then the full text
+    of reflection fields in place of their condensed versions. Condensed
+    versions come from yesterday_reflection['condensed'] when the caller
+    provides them (see services.reflections.condensed_fields).
+    """
+    if token_budget is None:
+        token_budget = INSIGHTS_CONTEXT_TOKEN_BUDGET
+
+    # most urgent first; goals without a deadline keep their order at the end
+    ranked_goals = []
+    for goal in (goals or []):
+        days_until, _ = _goal_deadline(goal)
+        critical = days_until is not None and days_until <= 7
+        ranked_goals.append((not critical, days_until if days_until is not None else float('inf'), goal))
+    ranked_goals.sort(key=lambda item: item[:2])
+    ranked_goals = ranked_goals[:MAX_CONTEXT_GOALS]
+
+    goals_header = "USER'S ACTIVE GOALS:" if ranked_goals else "USER'S ACTIVE GOALS: None yet"
+    reflection_header = (
+        "YESTERDAY'S REFLECTION:" if yesterday_reflection
+        else "YESTERDAY'S REFLECTION: No reflection from yesterday"
+    )
+    remaining = token_budget - estimate_tokens(goals_header) - estimate_tokens(reflection_header)
+
+    def take(line):
+        nonlocal remaining
+        cost = estimate_tokens(line) + 1  # newline
+        if cost > remaining:
+            return False
+        remaining -= cost
+        return True
+
+    goal_lines = {}
+    for not_critical, _, goal in ranked_goals:
+        if not not_critical:
+            line = _goal_line(goal)
+            if take(line):
+                goal_lines[id(goal)] = line
+
+    reflection_lines = {}
+    full_text = {}
     if yesterday_reflection:
-        context_parts.append("YESTERDAY'S REFLECTION:")
-        if yesterday_reflection.get('summary'):
-            context_parts.append(f"Day summary: {yesterday_reflection['summary']}")
-        if yesterday_reflection.get('accomplishments'):
-            context_parts.append(f"Accomplishments: {yesterday_reflection['accomplishments']}")
-        if yesterday_reflection.get('improvements_to_make'):
-            context_parts.append(f"Wanted to improve: {yesterday_reflection['improvements_to_make']}")
-    else:
-        context_parts.append("YESTERDAY'S REFLECTION: No reflection from yesterday")
+        condensed = yesterday_reflection.get('condensed') or {}
+        for field in ('improvements_to_make', 'accomplishments', 'summary'):
+            text = yesterday_reflection.get(field)
+            if not text:
+                continue
+            label = REFLECTION_LABELS[field]
+            full_text[field] = f"{label}: {text}"
+            short = condensed.get(field) or condense_text(text)
+            line = f"{label}: {short}"
+            if take(line):
+                reflection_lines[field] = line
+            elif remaining > estimate_tokens(label) + 2:
+                # cut whatever still fits rather than dropping the field
+                line = line[: (remaining - 1) * 4 - 1].rstrip() + "…"
+                remaining = 0
+                reflection_lines[field] = line
+
+    for not_critical, _, goal in ranked_goals:
+        if not_critical:
+            line = _goal_line(goal)
+            if take(line):
+                goal_lines[id(goal)] = line
+
+    for field, line in reflection_lines.items():
+        full = full_text[field]
+        if full != line:
+            extra = estimate_tokens(full) - estimate_tokens(line)
+            if extra <= remaining:
+                remaining -= extra
+                reflection_lines[field] = full
+
+    context_parts = [goals_header]
+    context_parts.extend(goal_lines[id(goal)] for _, _, goal in ranked_goals if id(goal) in goal_lines)
+    context_parts.append("")
+    context_parts.append(reflection_header)
+    context_parts.extend(
+        reflection_lines[field]
+        for field in ('summary', 'accomplishments', 'improvements_to_make')
+        if field in reflection_lines
+    )
 
     return "\n".join(context_parts)
 
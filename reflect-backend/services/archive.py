@@ -0,0 +1,268 @@
+"""
+Hot/cold tiering for reflections and journal entries.
+
+Rows dated before the horizon are moved by a nightly job from the hot
+tables into `archive.archived_reflections` / `archive.archived_journal_entries`,
+which live in "<db>.archive.db" (attached to every connection, see db.py)
+with their text always compressed. The hot tables and their indexes only
+hold recent data.
+
+Reads go through transparently: the read helpers in services/ call into
+this module when the requested dates reach past the cutoff. Archived rows
+keep their ids and column names, so they serialize like hot rows; the hot
+tables use AUTOINCREMENT and init_db keeps their sequences above the
+archived ids, so an id is never given to a new row while its old row sits
+in the archive (revisions, analytics and the related-entries index are
+keyed by id alone).
+
+Writing to an archived row first moves it back to the hot tables ("thaws"
+it); the next archive run moves it out again once it is old enough.
+"""
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, defer
+
+from db import ARCHIVE_ENABLED
+from models import (
+    ArchivedJournalEntry,
+    ArchivedReflection,
+    DailyReflection,
+    JournalEntry,
+)
+
+# rows older than this many days are moved to the archive
+ARCHIVE_HORIZON_DAYS = int(os.environ.get("ARCHIVE_HORIZON_DAYS", "365"))
+
+# rows moved per transaction
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "500"))
+
+
+def cold_cutoff(today: Optional[date] = None) -> date:
+    """First date that is still hot; everything before it may be archived."""
+    return (today or date.today()) - timedelta(days=ARCHIVE_HORIZON_DAYS)
+
+
+def reaches_archive(start_date: Optional[date]) -> bool:
+    """
+    Whether a read starting at `start_date` (None: unbounded) needs the
+    archive.
+    """
+    if not ARCHIVE_ENABLED:
+        return False
+    return start_date is None or start_date < cold_cutoff()
+
+
+def _copy_columns(source, target_model) -> Dict:
+    """Column values of `source` that `target_model` also has."""
+    return {
+        column.key: getattr(source, column.key)
+        for column in target_model.__table__.columns
+        if hasattr(source, column.key)
+    }
+
+
+# -- READ-THROUGH --
+
+def get_archived_reflection(
+    *,
+    db: Session,
+    user_id: int,
+    reflection_date: date,
+) -> Optional[ArchivedReflection]:
+    return (
+        db.query(ArchivedReflection)
+        .filter(
+            ArchivedReflection.user_id == user_id,
+            ArchivedReflection.reflection_date == reflection_date,
+        )
+        .one_or_none()
+    )
+
+
+def get_archived_reflections_in_range(
+    *,
+    db: Session,
+    user_id: int,
+    start_date: date,
+    end_date: date,
+) -> List[ArchivedReflection]:
+    return (
+        db.query(ArchivedReflection)
+        .filter(
+            ArchivedReflection.user_id == user_id,
+            ArchivedReflection.reflection_date >= start_date,
+            ArchivedReflection.reflection_date <= end_date,
+        )
+        .order_by(ArchivedReflection.reflection_date.asc())
+        .all()
+    )
+
+
+def get_archived_reflection_dates(*, db: Session, user_id: int) -> List[date]:
+    return [
+        row[0]
+        for row in db.query(ArchivedReflection.reflection_date)
+        .filter(ArchivedReflection.user_id == user_id)
+    ]
+
+
+def get_archived_journal_entries(
+    *,
+    db: Session,
+    user_id: int,
+    entry_date: Optional[date] = None,
+    with_content: bool = True,
+) -> List[ArchivedJournalEntry]:
+    """
+    Archived entries for one date (oldest first), or all of them (newest
+    first) when `entry_date` is None.
+    """
+    query = db.query(ArchivedJournalEntry).filter(ArchivedJournalEntry.user_id == user_id)
+    if entry_date is not None:
+        query = query.filter(ArchivedJournalEntry.entry_date == entry_date)
+        query = query.order_by(ArchivedJournalEntry.created_at.asc())
+    else:
+        query = query.order_by(
+            ArchivedJournalEntry.entry_date.desc(),
+            ArchivedJournalEntry.created_at.desc(),
+        )
+    if not with_content:
+        query = query.options(defer(ArchivedJournalEntry.content))
+    return query.all()
+
+
+# -- THAWING --
+
+def thaw_reflection(
+    *,
+    db: Session,
+    user_id: int,
+    reflection_date: date,
+) -> Optional[DailyReflection]:
+    """
+    Move an archived reflection back into the hot table. Does not commit.
+    """
+    if not ARCHIVE_ENABLED:
+        return None
+
+    archived = get_archived_reflection(db=db, user_id=user_id, reflection_date=reflection_date)
+    if archived is None:
+        return None
+
+    reflection = DailyReflection(**_copy_columns(archived, DailyReflection))
+    db.delete(archived)
+    db.add(reflection)
+    db.flush()
+    return reflection
+
+
+def thaw_journal_entry(
+    *,
+    db: Session,
+    user_id: int,
+    entry_id: int,
+) -> Optional[JournalEntry]:
+    """
+    Move an archived journal entry, and its archived reflection if any,
+    back into the hot tables. Does not commit.
+    """
+    if not ARCHIVE_ENABLED:
+        return None
+
+    archived = (
+        db.query(ArchivedJournalEntry)
+        .filter(
+            ArchivedJournalEntry.id == entry_id,
+            ArchivedJournalEntry.user_id == user_id,
+        )
+        .one_or_none()
+    )
+    if archived is None:
+        return None
+
+    if archived.reflection_id is not None:
+        archived_reflection = db.get(ArchivedReflection, archived.reflection_id)
+        if archived_reflection is not None:
+            thaw_reflection(
+                db=db,
+                user_id=user_id,
+                reflection_date=archived_reflection.reflection_date,
+            )
+
+    entry = JournalEntry(**_copy_columns(archived, JournalEntry))
+    db.delete(archived)
+    db.add(entry)
+    db.flush()
+    return entry
+
+
+# -- ARCHIVING --
+
+def _move_batch(db: Session, rows, archive_model, hot_table) -> int:
+    now = datetime.now(timezone.utc)
+    ids = [row.id for row in rows]
+
+    db.add_all(archive_model(**_copy_columns(row, archive_model), archived_at=now) for row in rows)
+    db.flush()
+    # Core delete, so the ORM does not null out journal_entries.reflection_id
+    db.execute(hot_table.delete().where(hot_table.c.id.in_(ids)))
+    # both databases share the connection, so this commits the move atomically
+    db.commit()
+    return len(ids)
+
+
+def archive_old_rows(
+    *,
+    db: Session,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+) -> Dict[str, int]:
+    """
+    Move journal entries and reflections dated before cold_cutoff() into the
+    archive, one transaction per batch, so an interrupted run loses nothing
+    and simply continues next time.
+
+    A reflection stays hot while a hot journal entry still links to it.
+    Returns the number of rows moved per table.
+    """
+    if not ARCHIVE_ENABLED:
+        raise RuntimeError("Archiving is disabled; set ARCHIVE_ENABLED=1.")
+
+    cutoff = cold_cutoff()
+    moved = {"journal_entries": 0, "daily_reflections": 0}
+
+    while True:
+        entries = (
+            db.query(JournalEntry)
+            .filter(JournalEntry.entry_date < cutoff)
+            .order_by(JournalEntry.id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not entries:
+            break
+        moved["journal_entries"] += _move_batch(
+            db, entries, ArchivedJournalEntry, JournalEntry.__table__
+        )
+
+    still_linked = select(JournalEntry.reflection_id).where(JournalEntry.reflection_id.isnot(None))
+    while True:
+        reflections = (
+            db.query(DailyReflection)
+            .filter(
+                DailyReflection.reflection_date < cutoff,
+                DailyReflection.id.not_in(still_linked),
+            )
+            .order_by(DailyReflection.id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not reflections:
+            break
+        moved["daily_reflections"] += _move_batch(
+            db, reflections, ArchivedReflection, DailyReflection.__table__
+        )
+
+    return moved
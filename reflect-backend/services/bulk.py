@@ -0,0 +1,395 @@
+"""
+Bulk mutations across scheduled tasks, goals and journal entries.
+
+An operation is a dict:
+
+    {"op": "create" | "update" | "delete",
+     "type": "scheduled_task" | "goal" | "journal_entry",
+     "id": <int, for update/delete>,
+     "data": {...fields, for create/update}}
+
+All operations are validated first, the rows they touch are loaded with
+one query per type, and everything is applied in a single transaction:
+the unit of work batches the INSERT/UPDATE/DELETE statements and the
+whole list costs one commit. Any invalid operation rejects the batch.
+"""
+import os
+from collections import namedtuple
+from datetime import date, datetime, timezone
+from typing import Dict, List
+
+from sqlalchemy.orm import Session
+
+from models import DailyReflection, Goal, JournalEntry, ScheduledTask
+from services import related_entries, reminders, revisions, text_analytics
+from services.archive import thaw_journal_entry
+from services.edits import claim_version
+from services.events import changed_fields, publish_change
+from services.html_text import text_stats
+from services.task_intervals import find_conflicts
+
+BULK_MAX_OPERATIONS = int(os.environ.get("BULK_MAX_OPERATIONS", "200"))
+
+BulkResult = namedtuple("BulkResult", ["op", "type", "id", "obj"])
+
+MODELS = {
+    "scheduled_task": ScheduledTask,
+    "goal": Goal,
+    "journal_entry": JournalEntry,
+}
+
+OPS = ("create", "update", "delete")
+
+
+class InvalidBulkOperation(Exception):
+    def __init__(self, message: str, index: int = None):
+        super().__init__(message)
+        self.index = index
+
+
+class BulkTargetNotFound(InvalidBulkOperation):
+    pass
+
+
+class BulkTaskOverlap(InvalidBulkOperation):
+    """A task in the batch would overlap another; carries (date, task) pairs."""
+
+    def __init__(self, conflicts, index: int):
+        super().__init__("Task overlaps existing scheduled tasks.", index=index)
+        self.conflicts = conflicts
+
+
+def _parse_date(value, field):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise InvalidBulkOperation(f"{field}: invalid date format, should be YYYY-MM-DD.")
+
+
+def _parse_time(value, field):
+    try:
+        return datetime.strptime(value, "%H:%M").time()
+    except (TypeError, ValueError):
+        raise InvalidBulkOperation(f"{field}: invalid time format, should be HH:MM.")
+
+
+def _non_empty(value, field):
+    if not isinstance(value, str) or not value.strip():
+        raise InvalidBulkOperation(f"{field} cannot be empty.")
+    return value
+
+
+# -- FIELD VALIDATION --
+# each returns the attribute values to set; `creating` makes fields required
+
+def _task_fields(data: Dict, creating: bool) -> Dict:
+    fields = {}
+    if creating or "title" in data:
+        fields["title"] = _non_empty(data.get("title"), "title")
+    if "description" in data:
+        fields["description"] = data["description"]
+    if creating or "task_date" in data:
+        fields["task_date"] = _parse_date(data.get("task_date"), "task_date")
+    if creating or "start_time" in data:
+        fields["start_time"] = _parse_time(data.get("start_time"), "start_time")
+    if creating or "end_time" in data:
+        fields["end_time"] = _parse_time(data.get("end_time"), "end_time")
+    if "is_recurring" in data:
+        fields["is_recurring"] = bool(data["is_recurring"])
+    if "recurrence_pattern" in data:
+        fields["recurrence_pattern"] = data["recurrence_pattern"]
+    if "is_completed" in data:
+        fields["is_completed"] = bool(data["is_completed"])
+        fields["completed_at"] = datetime.now(timezone.utc) if data["is_completed"] else None
+    # updates that move only one end are checked against the row later
+    if "start_time" in fields and "end_time" in fields and fields["end_time"] <= fields["start_time"]:
+        raise InvalidBulkOperation("end_time must be after start_time.")
+    return fields
+
+
+def _goal_fields(data: Dict, creating: bool) -> Dict:
+    fields = {}
+    if creating or "description" in data:
+        fields["description"] = _non_empty(data.get("description"), "description").strip()
+    if data.get("deadline"):
+        fields["deadline"] = _parse_date(data["deadline"], "deadline")
+    if "status" in data:
+        fields["status"] = _non_empty(data["status"], "status").strip()
+    elif creating:
+        fields["status"] = "active"
+    return fields
+
+
+def _journal_fields(data: Dict, creating: bool) -> Dict:
+    fields = {}
+    if creating or "content" in data:
+        content = _non_empty(data.get("content"), "content")
+        fields["content"] = content
+        fields.update(text_stats(content))
+    if creating:
+        fields["entry_date"] = _parse_date(data.get("entry_date"), "entry_date")
+    if data.get("reflection_id") is not None:
+        fields["reflection_id"] = data["reflection_id"]
+    return fields
+
+
+FIELD_VALIDATORS = {
+    "scheduled_task": _task_fields,
+    "goal": _goal_fields,
+    "journal_entry": _journal_fields,
+}
+
+
+def _validate(operations) -> List[Dict]:
+    if not isinstance(operations, list) or not operations:
+        raise InvalidBulkOperation("operations must be a non-empty list.")
+    if len(operations) > BULK_MAX_OPERATIONS:
+        raise InvalidBulkOperation(f"at most {BULK_MAX_OPERATIONS} operations per request.")
+
+    validated = []
+    for index, operation in enumerate(operations):
+        try:
+            if not isinstance(operation, dict):
+                raise InvalidBulkOperation("operation must be an object.")
+            op, kind = operation.get("op"), operation.get("type")
+            if op not in OPS:
+                raise InvalidBulkOperation(f"op must be one of {', '.join(OPS)}.")
+            if kind not in MODELS:
+                raise InvalidBulkOperation(f"type must be one of {', '.join(MODELS)}.")
+
+            target_id = operation.get("id")
+            if op != "create" and not isinstance(target_id, int):
+                raise InvalidBulkOperation(f"{op} requires an integer id.")
+
+            fields = {}
+            allow_overlap = False
+            if op != "delete":
+                data = operation.get("data")
+                if not isinstance(data, dict):
+                    raise InvalidBulkOperation(f"{op} requires a data object.")
+                fields = FIELD_VALIDATORS[kind](data, creating=op == "create")
+                allow_overlap = kind == "scheduled_task" and bool(data.get("allow_overlap", False))
+
+            validated.append({
+                "op": op,
+                "type": kind,
+                "id": target_id,
+                "fields": fields,
+                "allow_overlap": allow_overlap,
+            })
+        except InvalidBulkOperation as e:
+            raise InvalidBulkOperation(str(e), index=index)
+
+    return validated
+
+
+def _load_targets(db: Session, user_id: int, validated: List[Dict]) -> Dict:
+    """(type, id) -> row for every row the batch touches, one query per type."""
+    wanted = {kind: set() for kind in MODELS}
+    for operation in validated:
+        if operation["op"] != "create":
+            wanted[operation["type"]].add(operation["id"])
+
+    targets = {}
+    for kind, ids in wanted.items():
+        if not ids:
+            continue
+        model = MODELS[kind]
+        for row in db.query(model).filter(model.user_id == user_id, model.id.in_(ids)):
+            targets[(kind, row.id)] = row
+
+        # journal entries may have moved to the archive
+        if kind == "journal_entry":
+            for entry_id in ids - {row_id for k, row_id in targets if k == kind}:
+                entry = thaw_journal_entry(db=db, user_id=user_id, entry_id=entry_id)
+                if entry is not None:
+                    targets[(kind, entry.id)] = entry
+    return targets
+
+
+def _check_reflections(db: Session, user_id: int, validated: List[Dict]) -> None:
+    linked = {
+        op["fields"]["reflection_id"]: index
+        for index, op in enumerate(validated)
+        if "reflection_id" in op["fields"]
+    }
+    if not linked:
+        return
+
+    owned = {
+        row[0]
+        for row in db.query(DailyReflection.id).filter(
+            DailyReflection.user_id == user_id,
+            DailyReflection.id.in_(linked),
+        )
+    }
+    for reflection_id, index in linked.items():
+        if reflection_id not in owned:
+            raise InvalidBulkOperation(
+                "Reflection does not exist or does not belong to user.", index=index
+            )
+
+
+# task fields that decide when a task takes place
+SCHEDULE_FIELDS = ("task_date", "start_time", "end_time", "is_recurring", "recurrence_pattern")
+
+
+def _note_changes(changed: Dict, results: List[BulkResult]) -> None:
+    """Add the pending attribute changes of updated rows to `changed`; a flush resets them."""
+    for result in results:
+        if result.op != "update":
+            continue
+        fields = changed.setdefault((result.type, result.id), [])
+        fields.extend(name for name in changed_fields(result.obj) if name not in fields)
+
+
+def _check_task_slot(db: Session, user_id: int, operation: Dict, row, index: int) -> None:
+    """
+    The same rules as create/update_scheduled_task: end after start and,
+    unless allow_overlap, no overlap with other tasks. The caller flushes
+    first, so earlier operations of the batch are part of the check.
+    """
+    values = {name: getattr(row, name, None) for name in SCHEDULE_FIELDS} if row is not None else {}
+    values.update((name, operation["fields"][name]) for name in SCHEDULE_FIELDS if name in operation["fields"])
+    if values["end_time"] <= values["start_time"]:
+        raise InvalidBulkOperation("end_time must be after start_time.", index=index)
+    if operation["allow_overlap"]:
+        return
+
+    conflicts = find_conflicts(
+        db=db,
+        user_id=user_id,
+        task_date=values["task_date"],
+        start_time=values["start_time"],
+        end_time=values["end_time"],
+        is_recurring=bool(values.get("is_recurring")),
+        recurrence_pattern=values.get("recurrence_pattern"),
+        exclude_task_id=row.id if row is not None else None,
+    )
+    if conflicts:
+        raise BulkTaskOverlap(conflicts, index=index)
+
+
+def apply_bulk_operations(
+    *,
+    db: Session,
+    user_id: int,
+    operations: List[Dict],
+) -> List[BulkResult]:
+    """
+    Validate and apply `operations` in order, in one transaction.
+
+    Returns one BulkResult per operation; `obj` is the created or updated
+    row, or None for deletes. Raises InvalidBulkOperation (with the index
+    of the offending operation) and leaves the database untouched if any
+    operation is invalid or targets a row the user does not own; tasks
+    that would overlap another (earlier creates in the batch included)
+    raise BulkTaskOverlap unless their data sets allow_overlap.
+    """
+    validated = _validate(operations)
+
+    try:
+        _check_reflections(db, user_id, validated)
+        targets = _load_targets(db, user_id, validated)
+
+        results = []
+        deleted = set()
+        # net attribute changes per updated row, gathered before each flush
+        changed = {}
+        # content each journal entry had before this request, for its history
+        previous_content = {}
+        for index, operation in enumerate(validated):
+            op, kind, fields = operation["op"], operation["type"], operation["fields"]
+            model = MODELS[kind]
+
+            if kind == "scheduled_task" and op == "create":
+                _note_changes(changed, results)
+                db.flush()
+                _check_task_slot(db, user_id, operation, None, index)
+
+            if op == "create":
+                row = model(user_id=user_id, **fields)
+                db.add(row)
+                results.append(BulkResult(op, kind, None, row))
+                continue
+
+            key = (kind, operation["id"])
+            row = targets.get(key)
+            if row is None or key in deleted:
+                raise BulkTargetNotFound(f"{kind} {operation['id']} not found.", index=index)
+
+            if op == "delete":
+                db.delete(row)
+                deleted.add(key)
+                results.append(BulkResult(op, kind, row.id, None))
+            else:
+                if kind == "scheduled_task" and any(name in fields for name in SCHEDULE_FIELDS):
+                    _note_changes(changed, results)
+                    db.flush()
+                    _check_task_slot(db, user_id, operation, row, index)
+                if kind == "journal_entry" and "content" in fields:
+                    previous_content.setdefault(row.id, row.content)
+                for field, value in fields.items():
+                    setattr(row, field, value)
+                results.append(BulkResult(op, kind, row.id, row))
+
+        _note_changes(changed, results)
+        db.flush()
+
+        # analytics and history go in the same transaction as the entries
+        for result in results:
+            if result.type != "journal_entry":
+                continue
+            if result.op == "delete":
+                text_analytics.remove_analysis(db=db, source="journal_entry", source_id=result.id)
+                revisions.delete_revisions(db=db, entry_id=result.id)
+            elif result.op == "create" or "content" in changed[(result.type, result.id)]:
+                if result.op == "update":
+                    # a whole-text write: no base to check, but open patches
+                    # against the old version must now conflict
+                    claim_version(db=db, row=result.obj, base_version=None)
+                    changed[(result.type, result.id)].append("version")
+                text_analytics.record_analysis(
+                    db=db,
+                    user_id=user_id,
+                    source="journal_entry",
+                    source_id=result.obj.id,
+                    day=result.obj.entry_date,
+                    text=result.obj.plain_text,
+                )
+                revisions.record_revision(
+                    db=db, entry=result.obj, previous_content=previous_content.get(result.id)
+                )
+    except Exception:
+        db.rollback()
+        raise
+
+    # results are serialized from the flushed rows, without reloading them
+    db.expire_on_commit = False
+    db.commit()
+
+    results = [
+        result._replace(id=result.obj.id) if result.op == "create" else result
+        for result in results
+    ]
+    for result in results:
+        publish_change(
+            user_id=user_id,
+            entity=result.type,
+            op=result.op,
+            obj=result.obj,
+            entity_id=result.id,
+            changed=changed.get((result.type, result.id)),
+        )
+        if result.type == "journal_entry":
+            if result.op == "delete":
+                related_entries.entry_deleted(user_id, result.id)
+            elif result.op == "create" or "content" in changed[(result.type, result.id)]:
+                related_entries.entry_saved(result.obj)
+        if result.type != "scheduled_task":
+            continue
+        if result.op == "delete":
+            reminders.task_deleted(user_id, result.id)
+        else:
+            reminders.task_saved(result.obj)
+    return results
@@ -0,0 +1,170 @@
+"""
+Pre-bucketed week layout for the calendar view.
+
+`build_week_layout` takes a week's tasks sorted by (task_date, start_time)
+and, in one linear pass, groups them by day, indexes them by start hour,
+computes durations and assigns overlap lanes so overlapping tasks render
+side by side. The client only looks values up.
+
+Layouts are cached per week version, a fingerprint of the tasks in the
+range that changes whenever one is created, updated or deleted; the
+version doubles as the HTTP ETag.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import ScheduledTask
+from services.task_intervals import to_minutes
+
+# week layouts kept in memory, least recently used evicted first
+WEEK_LAYOUT_CACHE_SIZE = int(os.environ.get("WEEK_LAYOUT_CACHE_SIZE", "256"))
+
+_cache: "OrderedDict[tuple, Dict]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def week_version(*, db: Session, user_id: int, start_date: date, end_date: date) -> str:
+    """Fingerprint of the user's tasks in the range, from one aggregate query."""
+    count, id_sum, last_update = (
+        db.query(
+            func.count(ScheduledTask.id),
+            func.coalesce(func.sum(ScheduledTask.id), 0),
+            func.max(ScheduledTask.updated_at),
+        )
+        .filter(
+            ScheduledTask.user_id == user_id,
+            ScheduledTask.task_date >= start_date,
+            ScheduledTask.task_date <= end_date,
+        )
+        .one()
+    )
+    raw = f"{user_id}:{start_date}:{end_date}:{count}:{id_sum}:{last_update}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _assign_lanes(day_tasks: List[Dict]) -> None:
+    """
+    Greedy lane assignment over tasks sorted by start. Each cluster of
+    transitively overlapping tasks shares a lane count.
+    """
+    lane_ends: List[int] = []
+    cluster: List[Dict] = []
+    cluster_end = -1
+
+    for task in day_tasks:
+        start, end = task["start_minute"], task["start_minute"] + task["duration_minutes"]
+
+        if start >= cluster_end:
+            for member in cluster:
+                member["lanes"] = len(lane_ends)
+            cluster, lane_ends = [], []
+
+        for lane, lane_end in enumerate(lane_ends):
+            if lane_end <= start:
+                lane_ends[lane] = end
+                break
+        else:
+            lane = len(lane_ends)
+            lane_ends.append(end)
+
+        task["lane"] = lane
+        cluster.append(task)
+        cluster_end = max(cluster_end, end) if cluster_end > start else end
+
+    for member in cluster:
+        member["lanes"] = len(lane_ends)
+
+
+def build_week_layout(
+    tasks: List[ScheduledTask],
+    *,
+    start_date: date,
+    end_date: date,
+    to_dict: Callable[[ScheduledTask], Dict],
+) -> Dict:
+    """
+    {"start_date", "end_date", "days": {iso_date: {"tasks": [...], "hours":
+    {hour: [task indexes]}}}}. Every date in the range has an entry.
+    """
+    days = {}
+    day = start_date
+    while day <= end_date:
+        days[day.isoformat()] = {"tasks": [], "hours": {}}
+        day += timedelta(days=1)
+
+    current_key, current = None, None
+    for task in tasks:
+        key = task.task_date.isoformat()
+        if key != current_key:
+            if current is not None:
+                _assign_lanes(current["tasks"])
+            current_key, current = key, days[key]
+
+        start = to_minutes(task.start_time)
+        item = to_dict(task)
+        item["start_minute"] = start
+        item["duration_minutes"] = max(to_minutes(task.end_time) - start, 0)
+
+        current["hours"].setdefault(str(task.start_time.hour), []).append(len(current["tasks"]))
+        current["tasks"].append(item)
+
+    if current is not None:
+        _assign_lanes(current["tasks"])
+
+    return {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "days": days,
+    }
+
+
+def get_week_layout(
+    *,
+    db: Session,
+    user_id: int,
+    start_date: date,
+    end_date: date,
+    to_dict: Callable[[ScheduledTask], Dict],
+    version: Optional[str] = None,
+) -> Dict:
+    """
+    Cached week layout; the returned dict includes its "version". Pass a
+    `version` already computed with week_version to skip recomputing it.
+    """
+    if version is None:
+        version = week_version(db=db, user_id=user_id, start_date=start_date, end_date=end_date)
+    cache_key = (user_id, start_date, end_date)
+
+    with _cache_lock:
+        cached = _cache.get(cache_key)
+        if cached is not None and cached["version"] == version:
+            _cache.move_to_end(cache_key)
+            return cached
+
+    tasks = (
+        db.query(ScheduledTask)
+        .filter(
+            ScheduledTask.user_id == user_id,
+            ScheduledTask.task_date >= start_date,
+            ScheduledTask.task_date <= end_date,
+        )
+        .order_by(ScheduledTask.task_date, ScheduledTask.start_time, ScheduledTask.end_time)
+        .all()
+    )
+    layout = build_week_layout(tasks, start_date=start_date, end_date=end_date, to_dict=to_dict)
+    layout["version"] = version
+
+    with _cache_lock:
+        _cache[cache_key] = layout
+        _cache.move_to_end(cache_key)
+        while len(_cache) > WEEK_LAYOUT_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return layout
@@ -0,0 +1,84 @@
+"""
+Circuit breaker for upstream calls.
+
+closed     -> calls go through; `failure_threshold` consecutive failures open it
+open       -> calls are skipped until `reset_timeout` seconds have passed
+half_open  -> a single probe call is let through; success closes the
+              breaker, failure opens it again. A probe that never reports
+              back is replaced after another `reset_timeout`.
+"""
+import threading
+import time
+from typing import Dict
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+
+        self._times_opened = 0
+        self._short_circuited = 0
+
+    def allow_request(self) -> bool:
+        """Whether a call may go upstream now; counts skipped calls."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                self._probe_in_flight = False
+
+            if self._state == HALF_OPEN:
+                now = time.monotonic()
+                if not self._probe_in_flight or now - self._probe_started >= self.reset_timeout:
+                    self._probe_in_flight = True
+                    self._probe_started = now
+                    return True
+
+            self._short_circuited += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self._times_opened += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "times_opened": self._times_opened,
+                "short_circuited": self._short_circuited,
+            }
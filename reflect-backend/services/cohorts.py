@@ -0,0 +1,259 @@
+"""
+Cross-user reflection analytics with NumPy.
+
+`get_user_stats` walks one user's dates in Python, which is fine for a
+request but takes hours when repeated for every user. Here the
+(user_id, reflection_date) pairs of all users are read once, in
+batches of COHORT_READ_BATCH rows, into two integer arrays (day numbers
+since 1970-01-01). After one sort, streaks, gaps, retention and histograms
+for everyone come from array operations over run boundaries; nothing
+loops per user or per row in Python.
+
+SQLite turns the dates into day numbers (julianday) and the rows are
+fetched straight from the DBAPI cursor, so no Python date or Row object is
+built per reflection. Archived reflections are included when the archive
+is enabled, like in get_user_stats.
+
+numpy is only needed by this module and the analytics CLI; the API
+process never imports it.
+"""
+import os
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Integer, cast, func, literal_column, select, union_all
+
+from db import ARCHIVE_ENABLED, session_factories
+from models import ArchivedReflection, DailyReflection
+
+COHORT_READ_BATCH = int(os.environ.get("COHORT_READ_BATCH", "50000"))
+
+# histogram bin edges; the last bin is open ended
+COUNT_EDGES = (1, 2, 3, 5, 8, 15, 31, 61, 121, 366)
+GAP_EDGES = (1, 2, 3, 4, 8, 15, 31, 91)
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def day_number(day: date) -> int:
+    return int((np.datetime64(day, "D") - _EPOCH).astype(np.int64))
+
+
+def _day_column(column):
+    # julian day 2440587.5 is 1970-01-01 00:00
+    return cast(func.julianday(column) - literal_column("2440587.5"), Integer)
+
+
+def _activity_statement():
+    hot = select(DailyReflection.user_id, _day_column(DailyReflection.reflection_date))
+    if not ARCHIVE_ENABLED:
+        return hot
+    cold = select(ArchivedReflection.user_id, _day_column(ArchivedReflection.reflection_date))
+    return union_all(hot, cold)
+
+
+def _read_columns(make_session, batch_size: int) -> List[np.ndarray]:
+    """(n, 2) int64 blocks of (user_id, day) rows from one database."""
+    blocks = []
+    db = make_session()
+    try:
+        connection = db.connection()
+        sql = str(_activity_statement().compile(dialect=connection.dialect))
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(sql)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                blocks.append(np.array(rows, dtype=np.int64))
+        finally:
+            cursor.close()
+    finally:
+        db.close()
+    return blocks
+
+
+def sort_activity(users: np.ndarray, days: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Order pairs by (user, day) and drop duplicates, in one np.unique pass."""
+    if len(users) == 0:
+        return users.astype(np.int64), days.astype(np.int64)
+    base = int(days.min())
+    keys = np.unique((users.astype(np.int64) << 32) | (days.astype(np.int64) - base))
+    return keys >> 32, (keys & 0xFFFFFFFF) + base
+
+
+def load_activity(
+    *,
+    factories: Optional[Iterable] = None,
+    batch_size: int = COHORT_READ_BATCH,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (user_ids, day_numbers) for every reflection in every database, sorted
+    by user then day, one row per user and day.
+    """
+    blocks = []
+    for make_session in factories or session_factories():
+        blocks.extend(_read_columns(make_session, batch_size))
+    if not blocks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    rows = np.concatenate(blocks)
+    return sort_activity(rows[:, 0], rows[:, 1])
+
+
+def user_streaks(users: np.ndarray, days: np.ndarray, *, today: int) -> Dict[str, np.ndarray]:
+    """
+    Per-user totals and streaks from sorted, de-duplicated activity.
+
+    A streak is a run of consecutive days; the current streak is the run
+    ending today or yesterday, as in get_user_stats.
+    """
+    n = len(users)
+    if n == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return {"user_id": empty, "total": empty, "longest": empty, "current": empty,
+                "first_day": empty, "last_day": empty}
+
+    new_user = np.empty(n, dtype=bool)
+    new_user[0] = True
+    np.not_equal(users[1:], users[:-1], out=new_user[1:])
+    user_start = np.flatnonzero(new_user)
+    user_end = np.append(user_start[1:], n)
+
+    # a run starts at every new user and after every missed day
+    new_run = new_user.copy()
+    new_run[1:] |= np.diff(days) != 1
+    run_start = np.flatnonzero(new_run)
+    run_length = np.diff(np.append(run_start, n))
+
+    first_run = np.searchsorted(run_start, user_start)
+    last_run = np.append(first_run[1:], len(run_start)) - 1
+    last_day = days[user_end - 1]
+
+    return {
+        "user_id": users[user_start],
+        "total": user_end - user_start,
+        "longest": np.maximum.reduceat(run_length, first_run),
+        "current": np.where(last_day >= today - 1, run_length[last_run], 0),
+        "first_day": days[user_start],
+        "last_day": last_day,
+    }
+
+
+def _histogram(values: np.ndarray, edges: Tuple[int, ...]) -> Dict[str, int]:
+    """Counts per bin; values below the first edge get a bin only when there are any."""
+    counts = np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1)
+    labels = ["0" if edges[0] == 1 else f"<{edges[0]}"] + [
+        str(low) if high - low == 1 else f"{low}-{high - 1}"
+        for low, high in zip(edges, edges[1:])
+    ] + [f"{edges[-1]}+"]
+    histogram = {label: int(count) for label, count in zip(labels, counts)}
+    if not counts[0]:
+        del histogram[labels[0]]
+    return histogram
+
+
+def retention_curves(
+    users: np.ndarray,
+    days: np.ndarray,
+    streaks: Dict[str, np.ndarray],
+    *,
+    today: int,
+    weeks: int,
+) -> List[Dict]:
+    """
+    Weekly retention per monthly cohort (month of a user's first reflection):
+    the share of the cohort that reflected in week k after their first day.
+    Week k only counts users for whom it has started, so young cohorts are
+    not dragged down by weeks that have not happened yet (those are None).
+    """
+    if len(users) == 0:
+        return []
+
+    first_day = streaks["first_day"]
+    months = (first_day.astype("datetime64[D]").astype("datetime64[M]")).astype(np.int64)
+    cohort_months, cohort = np.unique(months, return_inverse=True)
+    n_cohorts = len(cohort_months)
+
+    # week index of every reflection, relative to its user's first day
+    user_index = np.repeat(np.arange(len(first_day)), streaks["total"])
+    week = (days - first_day[user_index]) // 7
+    in_range = week < weeks
+    active = np.unique(user_index[in_range] * weeks + week[in_range])
+    retained = np.bincount(
+        cohort[active // weeks] * weeks + active % weeks, minlength=n_cohorts * weeks
+    ).reshape(n_cohorts, weeks)
+
+    # users whose week k has begun: count by last started week, then sum from the right
+    started = np.clip((today - first_day) // 7, 0, weeks - 1)
+    eligible = np.bincount(cohort * weeks + started, minlength=n_cohorts * weeks).reshape(n_cohorts, weeks)
+    eligible = np.cumsum(eligible[:, ::-1], axis=1)[:, ::-1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = np.round(retained / eligible, 4)
+
+    curves = []
+    for index, month in enumerate(cohort_months):
+        curves.append({
+            "cohort": str(np.datetime64(int(month), "M")),
+            "users": int(eligible[index, 0]),
+            "retention": [
+                float(rate) if count else None
+                for rate, count in zip(rates[index], eligible[index])
+            ],
+        })
+    return curves
+
+
+def cohort_report(
+    users: np.ndarray,
+    days: np.ndarray,
+    *,
+    today: date,
+    weeks: int = 12,
+) -> Dict:
+    """Summary, histograms and retention for sorted (user, day) activity."""
+    today_n = day_number(today)
+    streaks = user_streaks(users, days, today=today_n)
+    last_day = streaks["last_day"]
+
+    same_user = users[1:] == users[:-1]
+    gaps = np.diff(days)[same_user]
+    recent = days[days > today_n - 30]
+
+    summary = {
+        "users": int(len(streaks["user_id"])),
+        "reflections": int(len(users)),
+        "active_1d": int(np.count_nonzero(last_day >= today_n)),
+        "active_7d": int(np.count_nonzero(last_day > today_n - 7)),
+        "active_30d": int(np.count_nonzero(last_day > today_n - 30)),
+    }
+    if len(users):
+        longest = streaks["longest"]
+        summary.update({
+            "longest_streak_mean": round(float(longest.mean()), 2),
+            "longest_streak_p50": int(np.percentile(longest, 50)),
+            "longest_streak_p90": int(np.percentile(longest, 90)),
+            "longest_streak_max": int(longest.max()),
+            "users_on_streak": int(np.count_nonzero(streaks["current"])),
+            "gap_days_median": float(np.median(gaps)) if len(gaps) else None,
+        })
+
+    return {
+        "generated_for": today.isoformat(),
+        "summary": summary,
+        "histograms": {
+            "reflections_per_user": _histogram(streaks["total"], COUNT_EDGES),
+            "longest_streak": _histogram(streaks["longest"], COUNT_EDGES),
+            "current_streak": _histogram(streaks["current"], COUNT_EDGES),
+            # days between consecutive reflections of the same user; 1 is back-to-back
+            "gap_days": _histogram(gaps, GAP_EDGES),
+            "weekday": dict(zip(WEEKDAYS, np.bincount((days + 3) % 7, minlength=7).tolist())),
+            # reflections per day over the last 30 days, oldest first
+            "last_30_days": np.bincount(recent - (today_n - 29), minlength=30)[:30].tolist(),
+        },
+        "retention_weeks": weeks,
+        "retention": retention_curves(users, days, streaks, today=today_n, weeks=weeks),
+    }
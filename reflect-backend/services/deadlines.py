@@ -0,0 +1,94 @@
+"""
+Cross-user scan of upcoming goal deadlines.
+
+Each database is walked as a range over ix_goals_status_deadline: active
+goals with a deadline in [since, until], in (deadline, id) order, fetched
+in keyset pages of GOAL_SCAN_BATCH_SIZE rows. With sharding on, the
+per-shard walks are merged through a heap (heapq.merge), so callers get a
+single deadline-ordered stream while at most one page per shard is held
+in memory. Nothing is sorted in Python and cost grows with the rows in the
+range, not with the size of the goals table.
+"""
+import heapq
+import os
+from collections import namedtuple
+from datetime import date, timedelta
+from typing import Iterator, Optional
+
+from sqlalchemy import and_, bindparam, or_, select
+
+from db import session_factories
+from models import Goal
+
+GOAL_SCAN_BATCH_SIZE = int(os.environ.get("GOAL_SCAN_BATCH_SIZE", "500"))
+
+DueGoal = namedtuple("DueGoal", ["deadline", "goal_id", "user_id", "description", "days_until"])
+
+_COLUMNS = (Goal.deadline, Goal.id, Goal.user_id, Goal.description)
+_RANGE = (
+    Goal.status == "active",
+    Goal.deadline >= bindparam("since"),
+    Goal.deadline <= bindparam("until"),
+)
+
+_FIRST_PAGE = (
+    select(*_COLUMNS)
+    .where(*_RANGE)
+    .order_by(Goal.deadline.asc(), Goal.id.asc())
+    .limit(bindparam("limit"))
+)
+# continues after the last (deadline, id) of the previous page
+_NEXT_PAGE = (
+    select(*_COLUMNS)
+    .where(
+        *_RANGE,
+        or_(
+            Goal.deadline > bindparam("after_deadline"),
+            and_(Goal.deadline == bindparam("after_deadline"), Goal.id > bindparam("after_id")),
+        ),
+    )
+    .order_by(Goal.deadline.asc(), Goal.id.asc())
+    .limit(bindparam("limit"))
+)
+
+
+def _walk(make_session, *, since: date, until: date, today: date, batch_size: int) -> Iterator[DueGoal]:
+    db = make_session()
+    try:
+        params = {"since": since, "until": until, "limit": batch_size}
+        rows = db.execute(_FIRST_PAGE, params).all()
+        while rows:
+            for deadline, goal_id, user_id, description in rows:
+                yield DueGoal(deadline, goal_id, user_id, description, (deadline - today).days)
+            if len(rows) < batch_size:
+                return
+            last_deadline, last_id = rows[-1][0], rows[-1][1]
+            rows = db.execute(
+                _NEXT_PAGE,
+                {**params, "after_deadline": last_deadline, "after_id": last_id},
+            ).all()
+    finally:
+        db.close()
+
+
+def iter_due_goals(
+    *,
+    within_days: int,
+    overdue_days: Optional[int] = None,
+    today: Optional[date] = None,
+    batch_size: int = GOAL_SCAN_BATCH_SIZE,
+) -> Iterator[DueGoal]:
+    """
+    Active goals of every user due within `within_days` days, ordered by
+    (deadline, goal id). Overdue goals are included, limited to the last
+    `overdue_days` days when given.
+    """
+    today = today or date.today()
+    since = today - timedelta(days=overdue_days) if overdue_days is not None else date.min
+    until = today + timedelta(days=within_days)
+
+    walks = [
+        _walk(make_session, since=since, until=until, today=today, batch_size=batch_size)
+        for make_session in session_factories()
+    ]
+    return heapq.merge(*walks, key=lambda due: (due.deadline, due.goal_id))
@@ -0,0 +1,82 @@
+"""
+Versioned edits for journal entries and reflections.
+
+Rows that clients edit carry a `version`, bumped on every change to their
+text. A client can send a patch against the version it last saw instead
+of the whole text: the server checks the version, applies the patch and
+stores the result. Stale versions are refused with EditConflict, so two
+tabs cannot silently overwrite each other.
+
+Patches use the revision delta format (services/revisions.py): a JSON list
+whose [start, end] pieces copy that range of the current text and whose
+string pieces are inserted as is. Offsets count characters (code points).
+"""
+from typing import Optional
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from services.revisions import InvalidDelta, apply_delta
+
+# largest patch accepted, in pieces; a client with more to say sends the text
+MAX_PATCH_PIECES = 1000
+
+
+class EditConflict(Exception):
+    def __init__(self, message: str, version: int):
+        super().__init__(message)
+        self.version = version
+
+
+class InvalidPatch(Exception):
+    pass
+
+
+def current_version(row) -> int:
+    # rows written before versioning have NULL, which counts as version 1
+    return row.version or 1
+
+
+def apply_patch(text: Optional[str], patch) -> str:
+    """The text `patch` makes of `text`; raises InvalidPatch."""
+    if not isinstance(patch, list) or len(patch) > MAX_PATCH_PIECES:
+        raise InvalidPatch(f"patch must be a list of at most {MAX_PATCH_PIECES} pieces.")
+    try:
+        return apply_delta(text or "", patch)
+    except InvalidDelta as e:
+        raise InvalidPatch(str(e))
+
+
+def claim_version(*, db: Session, row, base_version: Optional[int]) -> int:
+    """
+    Move `row` to its next version, atomically checking that it is still at
+    `base_version` (any version when None). Raises EditConflict if another
+    write got there first.
+
+    The version is written with a conditional UPDATE right away, which also
+    takes the write lock, so of two writers sending the same base only one
+    succeeds; the rest of the change is flushed later with the session.
+    """
+    db.flush()
+    version = current_version(row)
+    if base_version is not None and base_version != version:
+        raise EditConflict("This text was changed since your copy was loaded.", version)
+
+    table = row.__table__
+    matches_version = table.c.version == version
+    if version == 1:
+        matches_version = or_(matches_version, table.c.version.is_(None))
+    result = db.execute(
+        update(table)
+        .where(table.c.id == row.id, matches_version)
+        .values(version=version + 1, updated_at=table.c.updated_at)
+    )
+    if result.rowcount != 1:
+        db.rollback()
+        latest = db.execute(select(table.c.version).where(table.c.id == row.id)).scalar()
+        raise EditConflict("This text was changed since your copy was loaded.", latest or 1)
+
+    # assigned through the ORM as well, so the version goes out with the
+    # row's other changes (change events list it); it costs no extra UPDATE
+    row.version = version + 1
+    return version + 1
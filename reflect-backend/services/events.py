@@ -0,0 +1,176 @@
+"""
+In-process pub/sub bus for per-user server push.
+
+Services call publish_change after a commit; /api/events/stream relays the
+events to the user's open clients, which patch their state instead of
+refetching. A change event is compact:
+
+    {"entity": "goal", "op": "create" | "update" | "delete", "id": 7,
+     "fields": {...}, "version": "<updated_at>"}
+
+`fields` holds the whole serialized row for creates, only the changed keys
+for updates and nothing for deletes. Every event gets a per-user sequence
+number; a client that sees a gap, or receives "resync" because it fell
+behind, should refetch once.
+
+Publishing is a no-op when the user has no open stream, so scripts and
+jobs pay nothing. The bus lives in one process: with several workers a
+client only hears about changes made through the worker it is connected to.
+"""
+import os
+import queue
+import threading
+from collections import namedtuple
+from datetime import date, datetime, time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import inspect
+
+EVENTS_QUEUE_SIZE = int(os.environ.get("EVENTS_QUEUE_SIZE", "256"))
+
+Event = namedtuple("Event", ["topic", "seq", "data"])
+
+# what a subscriber receives once its queue overflowed; it then resyncs
+RESYNC = "resync"
+
+
+class Subscription:
+    def __init__(self, user_id: int, topics: Optional[Iterable[str]], max_queued: int):
+        self.user_id = user_id
+        self.topics = set(topics) if topics is not None else None
+        self._queue = queue.Queue(maxsize=max_queued)
+        self.overflowed = False
+
+    def wants(self, topic: str) -> bool:
+        return self.topics is None or topic in self.topics
+
+    def offer(self, event: Event) -> None:
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # a stalled client loses events instead of blocking publishers
+            self.overflowed = True
+
+    def get(self, timeout: float) -> Optional[Event]:
+        """Next event, a RESYNC event after an overflow, or None on timeout."""
+        if self.overflowed:
+            self.overflowed = False
+            with self._queue.mutex:
+                self._queue.queue.clear()
+            return Event(RESYNC, None, {})
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    def __init__(self, max_queued: int = EVENTS_QUEUE_SIZE):
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, List[Subscription]] = {}
+        self._seq: Dict[int, int] = {}
+
+    def subscribe(self, user_id: int, topics: Optional[Iterable[str]] = None) -> Subscription:
+        subscription = Subscription(user_id, topics, self.max_queued)
+        with self._lock:
+            self._subscribers.setdefault(user_id, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+            if not subscriptions:
+                self._subscribers.pop(subscription.user_id, None)
+
+    def has_subscribers(self, user_id: int) -> bool:
+        return bool(self._subscribers.get(user_id))
+
+    def publish(self, user_id: int, topic: str, data: Dict) -> int:
+        """Queue the event for the user's subscribers; returns how many got it."""
+        with self._lock:
+            subscriptions = [s for s in self._subscribers.get(user_id, ()) if s.wants(topic)]
+            if not subscriptions:
+                return 0
+            seq = self._seq[user_id] = self._seq.get(user_id, 0) + 1
+        event = Event(topic, seq, data)
+        for subscription in subscriptions:
+            subscription.offer(event)
+        return len(subscriptions)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "users": len(self._subscribers),
+                "subscriptions": sum(len(s) for s in self._subscribers.values()),
+            }
+
+
+bus = EventBus()
+
+# entity -> row serializer, registered by the app so events match the REST shapes
+_serializers: Dict[str, Callable] = {}
+
+
+def register_serializer(entity: str, serializer: Callable) -> None:
+    _serializers[entity] = serializer
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, time):
+        return value.strftime("%H:%M")
+    return value
+
+
+def _serialize(entity: str, obj) -> Dict:
+    serializer = _serializers.get(entity)
+    if serializer is not None:
+        return serializer(obj)
+    return {column.key: _json_value(getattr(obj, column.key)) for column in inspect(obj).mapper.column_attrs}
+
+
+def changed_fields(obj) -> List[str]:
+    """Attributes of `obj` modified since it was loaded; call before the commit."""
+    return [attr.key for attr in inspect(obj).attrs if attr.history.has_changes()]
+
+
+def publish_change(
+    *,
+    user_id: int,
+    entity: str,
+    op: str,
+    obj=None,
+    entity_id: Optional[int] = None,
+    changed: Optional[Iterable[str]] = None,
+) -> None:
+    """
+    Publish a change to `user_id`'s streams. Pass the committed row for
+    create/update (with the changed attribute names for updates) and
+    `entity_id` for deletes.
+    """
+    if not bus.has_subscribers(user_id):
+        return
+
+    fields, version = None, None
+    if obj is not None:
+        entity_id = obj.id
+        row = _serialize(entity, obj)
+        version = row.get("updated_at")
+        if op == "create" or changed is None:
+            fields = row
+        else:
+            fields = {key: row[key] for key in changed if key in row}
+            if version is not None:
+                fields["updated_at"] = version
+
+    bus.publish(user_id, "change", {
+        "entity": entity,
+        "op": op,
+        "id": entity_id,
+        "fields": fields,
+        "version": version,
+    })
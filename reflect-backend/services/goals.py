@@ -1,9 +1,14 @@
-from datetime import date
-from typing import List, Optional
+from datetime import date, timedelta
+from typing import List, Optional, TYPE_CHECKING
 
+from sqlalchemy import bindparam, select
 from sqlalchemy.orm import Session
 
 from models import Goal
+from services.events import changed_fields, publish_change
+
+if TYPE_CHECKING:  # imported lazily, only the ASGI path needs it
+    from sqlalchemy.ext.asyncio import AsyncSession
 
 class GoalNotFound(Exception):
     pass
@@ -36,10 +41,24 @@ def create_goal(
     db.add(goal)
     db.commit()
     db.refresh(goal)
+    publish_change(user_id=user_id, entity="goal", op="create", obj=goal)
 
     return goal
 
 
+# one statement per status filter, bound per call
+_GOALS_FOR_USER = (
+    select(Goal)
+    .where(Goal.user_id == bindparam("user_id"))
+    .order_by(Goal.created_at.asc())
+)
+_GOALS_FOR_USER_WITH_STATUS = (
+    select(Goal)
+    .where(Goal.user_id == bindparam("user_id"), Goal.status == bindparam("status"))
+    .order_by(Goal.created_at.asc())
+)
+
+
 def get_goals_for_user(
     *,
     db: Session,
@@ -52,12 +71,67 @@ def get_goals_for_user(
     Optionally filter by status.
     """
 
-    query = db.query(Goal).filter(Goal.user_id == user_id)
+    if status is None:
+        result = db.execute(_GOALS_FOR_USER, {"user_id": user_id})
+    else:
+        result = db.execute(_GOALS_FOR_USER_WITH_STATUS, {"user_id": user_id, "status": status})
+    return list(result.scalars())
+
+
+# active goals due by :until, served by ix_goals_user_status_deadline
+_UPCOMING_GOALS = (
+    select(Goal)
+    .where(
+        Goal.user_id == bindparam("user_id"),
+        Goal.status == "active",
+        Goal.deadline >= bindparam("since"),
+        Goal.deadline <= bindparam("until"),
+    )
+    .order_by(Goal.deadline.asc(), Goal.id.asc())
+)
 
-    if status is not None:
-        query = query.filter(Goal.status == status)
 
-    return query.order_by(Goal.created_at.asc()).all()
+def get_upcoming_goals(
+    *,
+    db: Session,
+    user_id: int,
+    within_days: int,
+    include_overdue: bool = True,
+    today: Optional[date] = None,
+) -> List[Goal]:
+    """
+    Active goals due in the next `within_days` days, soonest first.
+
+    Overdue goals come first unless include_overdue is False.
+    """
+
+    today = today or date.today()
+    result = db.execute(
+        _UPCOMING_GOALS,
+        {
+            "user_id": user_id,
+            "since": date.min if include_overdue else today,
+            "until": today + timedelta(days=within_days),
+        },
+    )
+    return list(result.scalars())
+
+
+async def get_goals_for_user_async(
+    *,
+    db: "AsyncSession",
+    user_id: int,
+    status: Optional[str] = None,
+) -> List[Goal]:
+    """
+    Async variant of get_goals_for_user for the ASGI insights path.
+    """
+
+    if status is None:
+        result = await db.execute(_GOALS_FOR_USER, {"user_id": user_id})
+    else:
+        result = await db.execute(_GOALS_FOR_USER_WITH_STATUS, {"user_id": user_id, "status": status})
+    return list(result.scalars().all())
 
 
 def update_goal(
@@ -98,7 +172,36 @@ def update_goal(
     if status is not None:
         goal.status = status.strip()
 
+    changed = changed_fields(goal)
     db.commit()
     db.refresh(goal)
+    publish_change(user_id=user_id, entity="goal", op="update", obj=goal, changed=changed)
 
-    return goal
\ No newline at end of file
+    return goal
+
+
+def delete_goal(
+    *,
+    db: Session,
+    goal_id: int,
+    user_id: int,
+) -> None:
+    """
+    Delete a goal owned by the user.
+    """
+
+    goal = (
+        db.query(Goal)
+        .filter(
+            Goal.id == goal_id,
+            Goal.user_id == user_id,
+        )
+        .one_or_none()
+    )
+
+    if goal is None:
+        raise GoalNotFound("Goal not found.")
+
+    db.delete(goal)
+    db.commit()
+    publish_change(user_id=user_id, entity="goal", op="delete", entity_id=goal_id)
\ No newline at end of file
@@ -0,0 +1,122 @@
+"""
+Plain-text extraction for the HTML produced by the TipTap rich text editor.
+"""
+import re
+from html.parser import HTMLParser
+from typing import Dict, List
+
+# tags that end a line of text in the editor output
+BLOCK_TAGS = {
+    "p", "div", "br", "li", "ul", "ol", "blockquote", "pre",
+    "h1", "h2", "h3", "h4", "h5", "h6", "hr", "tr",
+}
+
+# tags whose contents are never user text
+SKIP_TAGS = {"script", "style"}
+
+PREVIEW_LENGTH = 200
+
+_WORD_RE = re.compile(r"\S+")
+_SPACES_RE = re.compile(r"[ \t\r\f\v]+")
+_LETTERS_RE = re.compile(r"[a-z][a-z']*")
+
+# common words that say nothing about what an entry is about
+STOPWORDS = frozenset("""
+a about after again all also am an and any are as at be because been before
+being but by can could did do does doing don done down during each even
+every few for from get got had has have having he her here hers him his how
+i i'm if in into is it it's its just know like made make me more most much
+my myself no not now of off on once one only or other our out over really
+same she should so some still such than that the their them then there
+these they thing things think this those through to today too up very was
+we well went were what when where which while who why will with would you
+your
+""".split())
+
+
+class _TextExtractor(HTMLParser):
+    """Single-pass HTML tokenizer that keeps text and block boundaries."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    """
+    Convert editor HTML to plain text.
+
+    Block elements become line breaks, runs of whitespace collapse to a
+    single space and blank lines are dropped.
+    """
+    if not html:
+        return ""
+
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+
+    lines = (
+        _SPACES_RE.sub(" ", line).strip()
+        for line in "".join(extractor.parts).split("\n")
+    )
+    return "\n".join(line for line in lines if line)
+
+
+def text_stats(html: str) -> Dict:
+    """
+    Extract plain text and its word and character counts in one pass.
+    """
+    text = html_to_text(html)
+    return {
+        "plain_text": text,
+        "word_count": len(_WORD_RE.findall(text)),
+        "char_count": len(text),
+    }
+
+
+def words(text: str) -> List[str]:
+    """Lowercased words of plain text, in order, apostrophes kept inside words."""
+    return [word.strip("'") for word in _LETTERS_RE.findall(text.lower())]
+
+
+def content_terms(text: str) -> List[str]:
+    """
+    The words that carry meaning, in order: stopwords, words under three
+    letters and possessive 's endings are dropped.
+    """
+    terms = []
+    for word in words(text):
+        if word.endswith("'s"):
+            word = word[:-2]
+        if len(word) > 2 and word not in STOPWORDS:
+            terms.append(word)
+    return terms
+
+
+def make_preview(text: str, length: int = PREVIEW_LENGTH) -> str:
+    """Cut plain text to a preview, breaking on a word boundary."""
+    if not text:
+        return ""
+    text = text.replace("\n", " ")
+    if len(text) <= length:
+        return text
+    cut = text.rfind(" ", 0, length)
+    return text[: cut if cut > 0 else length].rstrip() + "…"
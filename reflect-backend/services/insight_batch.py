@@ -0,0 +1,329 @@
+"""
+Nightly batch generation of morning insights.
+
+Walks every user who reflected the day before `insight_date` in user_id
+order, builds their prompt contexts, sends them through a batch LLM client
+with bounded parallelism and stores the parsed insights in
+`morning_insights` so the morning request is a single row lookup.
+"""
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import DailyReflection, Goal, InsightBatchRun, MorningInsight
+from services.ai_insights import (
+    INSIGHTS_MODEL,
+    _build_context,
+    _build_prompt,
+    _generate_default_insights,
+    _parse_insights,
+    estimate_tokens,
+)
+from services.reflections import condensed_fields
+
+if TYPE_CHECKING:  # imported lazily, only the ASGI path needs it
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+BATCH_CHUNK_SIZE = int(os.environ.get("INSIGHT_BATCH_CHUNK_SIZE", "50"))
+BATCH_MAX_PARALLEL = int(os.environ.get("INSIGHT_BATCH_MAX_PARALLEL", "8"))
+
+BatchResult = namedtuple("BatchResult", ["text", "error", "latency"])
+
+
+class BatchLLMClient(ABC):
+    """
+    Runs `complete` over many prompts with at most `max_parallel` in flight.
+
+    Subclasses implement `complete(prompt) -> str`; the base class cannot be
+    instantiated on its own.
+    """
+
+    def __init__(self, max_parallel: int = BATCH_MAX_PARALLEL):
+        self.max_parallel = max_parallel
+
+    @abstractmethod
+    def complete(self, prompt: str) -> str:
+        ...
+
+    def _timed_complete(self, prompt: str) -> BatchResult:
+        started = time.perf_counter()
+        try:
+            text = self.complete(prompt)
+            return BatchResult(text, None, time.perf_counter() - started)
+        except Exception as e:
+            return BatchResult(None, e, time.perf_counter() - started)
+
+    def generate_batch(self, prompts: List[str]) -> List[BatchResult]:
+        """Results come back in prompt order."""
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as pool:
+            return list(pool.map(self._timed_complete, prompts))
+
+
+class AnthropicBatchClient(BatchLLMClient):
+    def __init__(self, api_key: str, max_parallel: int = BATCH_MAX_PARALLEL):
+        from anthropic import Anthropic
+
+        super().__init__(max_parallel=max_parallel)
+        # one client, so the HTTP connection pool is shared across threads
+        self.client = Anthropic(api_key=api_key)
+
+    def complete(self, prompt: str) -> str:
+        message = self.client.messages.create(
+            model=INSIGHTS_MODEL,
+            max_tokens=1024,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        return message.content[0].text
+
+
+def default_batch_client() -> Optional[BatchLLMClient]:
+    """Anthropic-backed client, or None when no API key is configured."""
+    api_key = os.environ.get("ANTHROPIC_API_KEY")
+    if not api_key:
+        return None
+    return AnthropicBatchClient(api_key)
+
+
+def get_stored_insights(
+    *,
+    db: Session,
+    user_id: int,
+    insight_date: date,
+) -> Optional[List[Dict]]:
+    """
+    Return the pre-generated insights for a user and morning, if any.
+
+    Rule-based fallbacks the batch stored after a failed or skipped model
+    call ("default" rows) are not returned, so the morning request tries
+    the model again.
+    """
+    row = (
+        db.query(MorningInsight)
+        .filter(
+            MorningInsight.user_id == user_id,
+            MorningInsight.insight_date == insight_date,
+        )
+        .one_or_none()
+    )
+    if row is None or row.source == "default":
+        return None
+    return json.loads(row.insights)
+
+
+def store_insights(
+    *,
+    db: Session,
+    user_id: int,
+    insight_date: date,
+    insights: List[Dict],
+    source: str = "ai",
+) -> MorningInsight:
+    """
+    Insert or replace the stored insights for a user and morning.
+    """
+    row = (
+        db.query(MorningInsight)
+        .filter(
+            MorningInsight.user_id == user_id,
+            MorningInsight.insight_date == insight_date,
+        )
+        .one_or_none()
+    )
+    if row is None:
+        row = MorningInsight(user_id=user_id, insight_date=insight_date)
+        db.add(row)
+    row.insights = json.dumps(insights)
+    row.source = source
+    db.commit()
+    return row
+
+
+async def get_stored_insights_async(
+    *,
+    db: "AsyncSession",
+    user_id: int,
+    insight_date: date,
+) -> Optional[List[Dict]]:
+    """
+    Async variant of get_stored_insights for the ASGI insights path.
+    """
+    result = await db.execute(
+        select(MorningInsight.insights, MorningInsight.source).where(
+            MorningInsight.user_id == user_id,
+            MorningInsight.insight_date == insight_date,
+        )
+    )
+    row = result.one_or_none()
+    if row is None or row.source == "default":
+        return None
+    return json.loads(row.insights)
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _goal_dict(goal: Goal) -> Dict:
+    return {
+        "description": goal.description,
+        "deadline": goal.deadline.isoformat() if goal.deadline else None,
+    }
+
+
+def _reflection_dict(reflection: DailyReflection) -> Dict:
+    return {
+        "summary": reflection.summary,
+        "accomplishments": reflection.accomplishments,
+        "improvements_to_make": reflection.improvements_to_make,
+        "condensed": condensed_fields(reflection),
+    }
+
+
+def _process_chunk(db: Session, client, insight_date: date, reflections):
+    """
+    Generate and store insights for one chunk.
+
+    Returns the number of failed model calls, the per-call latencies and
+    the estimated prompt size of each call.
+    """
+    user_ids = [r.user_id for r in reflections]
+
+    goals_by_user = {user_id: [] for user_id in user_ids}
+    goals = (
+        db.query(Goal)
+        .filter(Goal.user_id.in_(user_ids), Goal.status == "active")
+        .order_by(Goal.user_id, Goal.created_at.asc())
+        .all()
+    )
+    for goal in goals:
+        goals_by_user[goal.user_id].append(_goal_dict(goal))
+
+    inputs = [(goals_by_user[r.user_id], _reflection_dict(r)) for r in reflections]
+
+    prompt_tokens = []
+    if client is not None:
+        prompts = [_build_prompt(_build_context(g, r)) for g, r in inputs]
+        prompt_tokens = [estimate_tokens(p) for p in prompts]
+        results = client.generate_batch(prompts)
+    else:
+        results = [BatchResult(None, None, 0.0)] * len(inputs)
+
+    existing = {
+        row.user_id: row
+        for row in db.query(MorningInsight).filter(
+            MorningInsight.user_id.in_(user_ids),
+            MorningInsight.insight_date == insight_date,
+        )
+    }
+
+    failed = 0
+    for user_id, (goal_dicts, reflection), result in zip(user_ids, inputs, results):
+        source = "ai"
+        try:
+            if result.error is not None or result.text is None:
+                raise ValueError(result.error or "no model configured")
+            insights = _parse_insights(result.text)
+        except Exception:
+            if client is not None:
+                failed += 1
+            source = "default"
+            insights = _generate_default_insights(goal_dicts, reflection)
+
+        row = existing.get(user_id)
+        if row is None:
+            row = MorningInsight(user_id=user_id, insight_date=insight_date)
+            db.add(row)
+        row.insights = json.dumps(insights)
+        row.source = source
+
+    return failed, [r.latency for r in results if client is not None], prompt_tokens
+
+
+def run_nightly_insights(
+    *,
+    db: Session,
+    insight_date: date,
+    client: Optional[BatchLLMClient] = None,
+    chunk_size: int = BATCH_CHUNK_SIZE,
+) -> InsightBatchRun:
+    """
+    Generate insights for every user who reflected on the day before
+    `insight_date`.
+
+    Progress is committed after each chunk, so calling this again for the
+    same date resumes after the last finished user. A completed run is
+    returned unchanged.
+    """
+    run = (
+        db.query(InsightBatchRun)
+        .filter(InsightBatchRun.insight_date == insight_date)
+        .one_or_none()
+    )
+    if run is None:
+        run = InsightBatchRun(insight_date=insight_date, status="running", last_user_id=0)
+        db.add(run)
+        db.commit()
+    elif run.status == "completed":
+        return run
+
+    reflection_date = insight_date - timedelta(days=1)
+    resumed = run.last_user_id > 0
+    latencies = []
+    prompt_tokens = []
+    started = time.perf_counter()
+    processed_this_run = 0
+
+    while True:
+        reflections = (
+            db.query(DailyReflection)
+            .filter(
+                DailyReflection.reflection_date == reflection_date,
+                DailyReflection.user_id > run.last_user_id,
+            )
+            .order_by(DailyReflection.user_id.asc())
+            .limit(chunk_size)
+            .all()
+        )
+        if not reflections:
+            break
+
+        failed, chunk_latencies, chunk_tokens = _process_chunk(db, client, insight_date, reflections)
+        latencies.extend(chunk_latencies)
+        prompt_tokens.extend(chunk_tokens)
+        processed_this_run += len(reflections)
+
+        run.last_user_id = reflections[-1].user_id
+        run.users_processed += len(reflections)
+        run.users_failed += failed
+        db.commit()
+
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    run.stats = json.dumps({
+        "resumed": resumed,
+        "users": processed_this_run,
+        "elapsed_seconds": round(elapsed, 3),
+        "users_per_second": round(processed_this_run / elapsed, 2) if elapsed else 0.0,
+        "llm_calls": len(latencies),
+        "prompt_tokens_avg": round(sum(prompt_tokens) / len(prompt_tokens), 1) if prompt_tokens else 0.0,
+        "prompt_tokens_max": max(prompt_tokens, default=0),
+        "llm_latency_p50": round(_percentile(latencies, 50), 3),
+        "llm_latency_p95": round(_percentile(latencies, 95), 3),
+        "llm_latency_max": round(latencies[-1], 3) if latencies else 0.0,
+    })
+    run.status = "completed"
+    run.finished_at = datetime.now(timezone.utc)
+    db.commit()
+
+    return run
@@ -1,8 +1,14 @@
 from datetime import date
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
-from sqlalchemy.orm import Session
-from models import DailyReflection, JournalEntry
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session, defer
+from models import ArchivedJournalEntry, DailyReflection, JournalEntry, JournalRevision
+from services import related_entries, revisions, text_analytics
+from services.archive import get_archived_journal_entries, reaches_archive, thaw_journal_entry
+from services.edits import EditConflict, InvalidPatch, apply_patch, claim_version, current_version
+from services.events import changed_fields, publish_change
+from services.html_text import html_to_text, text_stats
 
 class JournalEntryNotFound(Exception):
     pass
@@ -42,15 +48,39 @@ def create_journal_entry(
         content=content,
         entry_date=entry_date,
         reflection_id=reflection_id,
+        **text_stats(content),
     )
 
     db.add(entry)
+    db.flush()
+    text_analytics.record_analysis(
+        db=db,
+        user_id=user_id,
+        source="journal_entry",
+        source_id=entry.id,
+        day=entry_date,
+        text=entry.plain_text,
+    )
+    revisions.record_revision(db=db, entry=entry)
     db.commit()
     db.refresh(entry)
+    related_entries.entry_saved(entry)
+    publish_change(user_id=user_id, entity="journal_entry", op="create", obj=entry)
 
     return entry
 
 
+# hot lookup for the day view; user and date are bound per call
+_ENTRIES_FOR_DATE = (
+    select(JournalEntry)
+    .where(
+        JournalEntry.user_id == bindparam("user_id"),
+        JournalEntry.entry_date == bindparam("entry_date"),
+    )
+    .order_by(JournalEntry.created_at.asc())
+)
+
+
 def get_journal_entries_for_date(
     *,
     db: Session,
@@ -62,15 +92,96 @@ def get_journal_entries_for_date(
     ordered by creation time.
     """
 
-    return (
+    entries = list(db.execute(
+        _ENTRIES_FOR_DATE,
+        {"user_id": user_id, "entry_date": entry_date},
+    ).scalars())
+    if not reaches_archive(entry_date):
+        return entries
+
+    archived = get_archived_journal_entries(db=db, user_id=user_id, entry_date=entry_date)
+    return sorted(archived + entries, key=lambda e: e.created_at)
+
+
+def get_all_journal_entries(
+    *,
+    db: Session,
+    user_id: int,
+    with_content: bool = True,
+) -> List[JournalEntry]:
+    """
+    Fetch every journal entry for a user, hot and archived, newest first.
+    """
+    query = (
         db.query(JournalEntry)
-        .filter(
-            JournalEntry.user_id == user_id,
-            JournalEntry.entry_date == entry_date,
+        .filter(JournalEntry.user_id == user_id)
+        .order_by(JournalEntry.entry_date.desc(), JournalEntry.created_at.desc())
+    )
+    if not with_content:
+        query = query.options(defer(JournalEntry.content))
+    entries = query.all()
+    if not reaches_archive(None):
+        return entries
+
+    archived = get_archived_journal_entries(db=db, user_id=user_id, with_content=with_content)
+    return sorted(
+        archived + entries,
+        key=lambda e: (e.entry_date, e.created_at),
+        reverse=True,
+    )
+
+
+def _find_entry(db: Session, entry_id: int, user_id: int):
+    """The user's entry, hot or archived; raises JournalEntryNotFound."""
+    entry = (
+        db.query(JournalEntry)
+        .filter(JournalEntry.id == entry_id, JournalEntry.user_id == user_id)
+        .one_or_none()
+    )
+    if entry is None and reaches_archive(None):
+        entry = (
+            db.query(ArchivedJournalEntry)
+            .filter(ArchivedJournalEntry.id == entry_id, ArchivedJournalEntry.user_id == user_id)
+            .one_or_none()
         )
-        .order_by(JournalEntry.created_at.asc())
-        .all()
+    if entry is None:
+        raise JournalEntryNotFound("Journal entry not found.")
+    return entry
+
+
+def get_related_journal_entries(
+    *,
+    db: Session,
+    entry_id: int,
+    user_id: int,
+    limit: int = 5,
+) -> List[Tuple[JournalEntry, float]]:
+    """
+    The user's entries with the most similar wording to `entry_id`, best
+    first, as (entry, similarity) pairs. Entries come without `content`
+    loaded; archived entries may be included.
+    """
+    entry = _find_entry(db, entry_id, user_id)
+    text = entry.plain_text if entry.plain_text is not None else html_to_text(entry.content)
+    ranked = related_entries.related_entry_ids(
+        db=db, user_id=user_id, entry_id=entry_id, text=text, limit=limit
     )
+    ids = [related_id for related_id, _ in ranked]
+    if not ids:
+        return []
+
+    models = [JournalEntry] + ([ArchivedJournalEntry] if reaches_archive(None) else [])
+    found = {}
+    for model in models:
+        rows = (
+            db.query(model)
+            .options(defer(model.content))
+            .filter(model.user_id == user_id, model.id.in_(ids))
+        )
+        found.update((row.id, row) for row in rows)
+
+    # the index may briefly lag a delete made by another process
+    return [(found[related_id], score) for related_id, score in ranked if related_id in found]
 
 
 def update_journal_entry(
@@ -80,11 +191,16 @@ def update_journal_entry(
     user_id: int,
     content: Optional[str] = None,
     reflection_id: Optional[int] = None,
+    patch: Optional[list] = None,
+    base_version: Optional[int] = None,
 ) -> JournalEntry:
     """
     Update an existing journal entry.
 
-    Requires explicit entry_id.
+    Requires explicit entry_id. The new content is either given whole or
+    as a `patch` against the current content (see services/edits.py).
+    With `base_version`, the update is refused with EditConflict unless
+    the entry is still at that version.
     """
 
     entry = (
@@ -96,13 +212,32 @@ def update_journal_entry(
         .one_or_none()
     )
 
+    if entry is None:
+        # archived entries are moved back hot before being changed
+        entry = thaw_journal_entry(db=db, user_id=user_id, entry_id=entry_id)
+
     if entry is None:
         raise JournalEntryNotFound("Journal entry not found.")
 
-    if content is not None:
+    version = current_version(entry)
+    if base_version is not None and base_version != version:
+        raise EditConflict("Journal entry was changed since it was loaded.", version)
+
+    previous_content = entry.content
+    if patch is not None:
+        try:
+            content = apply_patch(previous_content, patch)
+        except InvalidPatch as e:
+            raise InvalidJournalEntry(str(e))
+
+    # saving the text it already has is not a change
+    if content is not None and content != previous_content:
         if not content.strip():
             raise InvalidJournalEntry("Journal entry content cannot be empty.")
+        claim_version(db=db, row=entry, base_version=version)
         entry.content = content
+        for field, value in text_stats(content).items():
+            setattr(entry, field, value)
 
     if reflection_id is not None:
         if reflection_id is not None:
@@ -122,8 +257,22 @@ def update_journal_entry(
 
         entry.reflection_id = reflection_id
 
+    changed = changed_fields(entry)
+    if "content" in changed:
+        text_analytics.record_analysis(
+            db=db,
+            user_id=user_id,
+            source="journal_entry",
+            source_id=entry.id,
+            day=entry.entry_date,
+            text=entry.plain_text,
+        )
+        revisions.record_revision(db=db, entry=entry, previous_content=previous_content)
     db.commit()
     db.refresh(entry)
+    if "content" in changed:
+        related_entries.entry_saved(entry)
+    publish_change(user_id=user_id, entity="journal_entry", op="update", obj=entry, changed=changed)
 
     return entry
 
@@ -148,8 +297,54 @@ def delete_journal_entry(
         .one_or_none()
     )
 
+    if entry is None:
+        # archived entries are moved back hot before being changed
+        entry = thaw_journal_entry(db=db, user_id=user_id, entry_id=entry_id)
+
     if entry is None:
         raise JournalEntryNotFound("Journal entry not found.")
 
     db.delete(entry)
+    text_analytics.remove_analysis(db=db, source="journal_entry", source_id=entry_id)
+    revisions.delete_revisions(db=db, entry_id=entry_id)
     db.commit()
+    related_entries.entry_deleted(user_id, entry_id)
+    publish_change(user_id=user_id, entity="journal_entry", op="delete", entity_id=entry_id)
+
+
+def get_journal_entry_revisions(
+    *,
+    db: Session,
+    entry_id: int,
+    user_id: int,
+) -> List[JournalRevision]:
+    """Saved versions of an entry's content, newest first, without the content."""
+    _find_entry(db, entry_id, user_id)
+    return revisions.list_revisions(db=db, entry_id=entry_id)
+
+
+def get_journal_entry_revision(
+    *,
+    db: Session,
+    entry_id: int,
+    user_id: int,
+    revision: int,
+) -> Tuple[JournalRevision, str]:
+    """One saved version of an entry and its content."""
+    _find_entry(db, entry_id, user_id)
+    return revisions.get_revision(db=db, entry_id=entry_id, revision=revision)
+
+
+def restore_journal_entry_revision(
+    *,
+    db: Session,
+    entry_id: int,
+    user_id: int,
+    revision: int,
+) -> JournalEntry:
+    """
+    Put an earlier version's content back. The restore is a save like any
+    other, so it becomes the newest revision and can itself be undone.
+    """
+    _, content = get_journal_entry_revision(db=db, entry_id=entry_id, user_id=user_id, revision=revision)
+    return update_journal_entry(db=db, entry_id=entry_id, user_id=user_id, content=content)
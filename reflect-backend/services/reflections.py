@@ -1,8 +1,23 @@
-from datetime import date
-from typing import Optional, List
+import re
+from datetime import date, datetime, timezone
+from typing import Dict, Optional, List, TYPE_CHECKING
 
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.orm import Session
 from models import DailyReflection
+from services.archive import (
+    get_archived_reflection,
+    get_archived_reflections_in_range,
+    reaches_archive,
+    thaw_reflection,
+)
+from services.edits import EditConflict, InvalidPatch, apply_patch, claim_version, current_version
+from services.events import changed_fields, publish_change
+from services.text_analytics import record_analysis, reflection_text
+
+if TYPE_CHECKING:  # imported lazily, only the ASGI path needs it
+    from sqlalchemy.ext.asyncio import AsyncSession
 
 class InvalidReflectionDate(Exception):
     pass
@@ -10,6 +25,85 @@ class InvalidReflectionDate(Exception):
 class ReflectionNotFound(Exception):
     pass
 
+class InvalidReflection(Exception):
+    pass
+
+# fields that get a condensed copy for AI prompts, and where it is stored
+CONDENSED_FIELDS = {
+    "summary": "condensed_summary",
+    "accomplishments": "condensed_accomplishments",
+    "improvements_to_make": "condensed_improvements_to_make",
+}
+
+CONDENSED_MAX_CHARS = 280
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+def condense_text(text: Optional[str], max_chars: int = CONDENSED_MAX_CHARS) -> Optional[str]:
+    """
+    Extractive condensation: keep leading sentences up to max_chars.
+
+    Text that already fits is returned unchanged; a first sentence longer
+    than max_chars is cut on a word boundary.
+    """
+    if text is None:
+        return None
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+
+    kept = []
+    length = 0
+    for sentence in _SENTENCE_END_RE.split(text):
+        if length + len(sentence) + (1 if kept else 0) > max_chars:
+            break
+        kept.append(sentence)
+        length += len(sentence) + (1 if len(kept) > 1 else 0)
+
+    if kept:
+        return " ".join(kept)
+
+    cut = text.rfind(" ", 0, max_chars - 1)
+    return text[: cut if cut > 0 else max_chars - 1].rstrip() + "…"
+
+def condensed_fields(reflection: DailyReflection) -> Dict[str, Optional[str]]:
+    """
+    Condensed versions of the reflection's text fields.
+
+    Uses the stored copies while they are current (condensed_at matches
+    updated_at) and computes them otherwise, without persisting.
+    """
+    if reflection.condensed_at is not None and reflection.condensed_at == reflection.updated_at:
+        return {field: getattr(reflection, column) for field, column in CONDENSED_FIELDS.items()}
+    return {field: condense_text(getattr(reflection, field)) for field in CONDENSED_FIELDS}
+
+def refresh_condensed_fields(*, db: Session, reflection: DailyReflection) -> Dict[str, Optional[str]]:
+    """
+    Like condensed_fields, but stores recomputed copies.
+
+    Stale rows (written before condensation existed) are updated with
+    updated_at written back unchanged, so refreshing is not an edit.
+    """
+    if reflection.condensed_at is not None and reflection.condensed_at == reflection.updated_at:
+        return condensed_fields(reflection)
+
+    fields = condensed_fields(reflection)
+    table = DailyReflection.__table__
+    values = {column: fields[field] for field, column in CONDENSED_FIELDS.items()}
+
+    db.execute(
+        update(table)
+        .where(table.c.id == reflection.id)
+        .values(**values, condensed_at=table.c.updated_at, updated_at=table.c.updated_at)
+    )
+    db.commit()
+
+    for column, value in values.items():
+        set_committed_value(reflection, column, value)
+    set_committed_value(reflection, "condensed_at", reflection.updated_at)
+
+    return fields
+
 def create_or_update_daily_reflection(
         *,
         db: Session,
@@ -17,16 +111,42 @@ def create_or_update_daily_reflection(
         reflection_date: date,
         summary: Optional[str],
         accomplishments: Optional[str],
-        improvements_to_make: Optional[str]
+        improvements_to_make: Optional[str],
+        base_version: Optional[int] = None
 ) -> DailyReflection:
+    """
+    Save the day's reflection. With `base_version`, an existing reflection
+    is only changed while it is still at that version (EditConflict
+    otherwise); saving the text it already has writes nothing.
+    """
     if reflection_date > date.today():
         raise InvalidReflectionDate("Err: Reflection date cannot be in the future.")
+    # set explicitly so the condensed copies can be stamped with the same value
+    now = datetime.now(timezone.utc)
     reflection = db.query(DailyReflection).filter(
         DailyReflection.user_id == user_id,
         DailyReflection.reflection_date == reflection_date
         ).one_or_none()
+
+    # editing a day that was moved to the archive brings it back hot
+    if reflection is None and reaches_archive(reflection_date):
+        reflection = thaw_reflection(db=db, user_id=user_id, reflection_date=reflection_date)
     
-    if reflection is None:
+    created = reflection is None
+    values = {
+        "summary": summary,
+        "accomplishments": accomplishments,
+        "improvements_to_make": improvements_to_make,
+    }
+    if not created:
+        version = current_version(reflection)
+        if base_version is not None and base_version != version:
+            raise EditConflict("Reflection was changed since it was loaded.", version)
+        if all(getattr(reflection, field) == value for field, value in values.items()):
+            return reflection
+        claim_version(db=db, row=reflection, base_version=version)
+
+    if created:
         reflection = DailyReflection(
             user_id=user_id,
             reflection_date=reflection_date,
@@ -39,24 +159,110 @@ def create_or_update_daily_reflection(
         reflection.summary = summary
         reflection.accomplishments = accomplishments
         reflection.improvements_to_make = improvements_to_make
+
+    for field, column in CONDENSED_FIELDS.items():
+        setattr(reflection, column, condense_text(getattr(reflection, field)))
+    reflection.updated_at = now
+    reflection.condensed_at = now
+    changed = None if created else changed_fields(reflection)
+    db.flush()
+    record_analysis(
+        db=db,
+        user_id=user_id,
+        source="reflection",
+        source_id=reflection.id,
+        day=reflection_date,
+        text=reflection_text(getattr(reflection, field) for field in CONDENSED_FIELDS),
+    )
     db.commit()
     db.refresh(reflection)
+    publish_change(
+        user_id=user_id,
+        entity="reflection",
+        op="create" if created else "update",
+        obj=reflection,
+        changed=changed,
+    )
 
     return reflection
 
+def patch_daily_reflection(
+        *,
+        db: Session,
+        user_id: int,
+        reflection_date: date,
+        base_version: int,
+        patches: Dict[str, list]
+) -> DailyReflection:
+    """
+    Apply text patches (field name -> patch, see services/edits.py) to the
+    day's reflection at `base_version`; fields without a patch keep their
+    text. Raises EditConflict when the reflection has moved on.
+    """
+    unknown = set(patches) - set(CONDENSED_FIELDS)
+    if unknown:
+        raise InvalidReflection(f"Cannot patch: {', '.join(sorted(unknown))}.")
+
+    reflection = get_reflection_for_date(db=db, user_id=user_id, reflection_date=reflection_date)
+    if reflection is None:
+        raise ReflectionNotFound("Reflection not found.")
+    if base_version != current_version(reflection):
+        raise EditConflict("Reflection was changed since it was loaded.", current_version(reflection))
+
+    values = {}
+    for field in CONDENSED_FIELDS:
+        old = getattr(reflection, field)
+        if field not in patches:
+            values[field] = old
+            continue
+        try:
+            new = apply_patch(old, patches[field])
+        except InvalidPatch as e:
+            raise InvalidReflection(f"{field}: {e}")
+        # an empty field stays None when the patch leaves it empty
+        values[field] = old if new == (old or "") else new
+
+    # the version is checked again, atomically, when the change is written
+    return create_or_update_daily_reflection(
+        db=db,
+        user_id=user_id,
+        reflection_date=reflection_date,
+        base_version=base_version,
+        **values,
+    )
+
+# built once at import; executing a module-level statement with bound
+# parameters skips per-call construction and reuses its compiled form
+_REFLECTION_FOR_DATE = select(DailyReflection).where(
+    DailyReflection.user_id == bindparam("user_id"),
+    DailyReflection.reflection_date == bindparam("reflection_date"),
+)
+
 def get_reflection_for_date(
         *,
         db: Session,
         user_id: int,
         reflection_date: date
 ) -> Optional[DailyReflection]:
-    return (
-        db.query(DailyReflection).filter(
-            DailyReflection.user_id == user_id,
-            DailyReflection.reflection_date == reflection_date
-        )
-        .one_or_none()
+    reflection = db.execute(
+        _REFLECTION_FOR_DATE,
+        {"user_id": user_id, "reflection_date": reflection_date},
+    ).scalar_one_or_none()
+    if reflection is None and reaches_archive(reflection_date):
+        return get_archived_reflection(db=db, user_id=user_id, reflection_date=reflection_date)
+    return reflection
+
+async def get_reflection_for_date_async(
+        *,
+        db: "AsyncSession",
+        user_id: int,
+        reflection_date: date
+) -> Optional[DailyReflection]:
+    result = await db.execute(
+        _REFLECTION_FOR_DATE,
+        {"user_id": user_id, "reflection_date": reflection_date},
     )
+    return result.scalar_one_or_none()
 
 def get_reflections_in_range(
         *,
@@ -68,7 +274,7 @@ def get_reflections_in_range(
     if start_date > end_date:
         raise InvalidReflectionDate("Err: Start date cannot be after end date.")
     
-    return (
+    reflections = (
         db.query(DailyReflection).filter(
             DailyReflection.user_id == user_id,
             DailyReflection.reflection_date >= start_date,
@@ -77,4 +283,15 @@ def get_reflections_in_range(
         .order_by(DailyReflection.reflection_date.asc())
         .all()
     )
+    if not reaches_archive(start_date):
+        return reflections
+
+    # cold part of the range: a date is either hot or archived, never both
+    archived = get_archived_reflections_in_range(
+        db=db,
+        user_id=user_id,
+        start_date=start_date,
+        end_date=end_date,
+    )
+    return sorted(archived + reflections, key=lambda r: r.reflection_date)
 
@@ -0,0 +1,428 @@
+"""
+"Related past entries": an offline MinHash/LSH index over journal text.
+
+Each entry's plain text becomes a set of content words (lowercased,
+stopwords dropped). The set is summarized by a 64-value MinHash
+signature: two signatures agree in a position with probability equal to
+the Jaccard similarity of the two word sets. For locality-sensitive
+lookup the signature is cut into 32 bands of 2 values. Entries sharing
+any band are candidates, which finds pairs from a Jaccard of about 0.2
+up. Only candidates are scored, so a query costs 32 bucket lookups plus
+the candidates rather than a pass over the whole journal.
+
+Storage is one file per user in RELATED_INDEX_DIR: a small header and
+fixed-size records (entry id, live flag, band keys, signature) that are
+read and written in place through mmap. The bucket table is rebuilt from
+the band keys when a file is opened; open files are kept in a small LRU.
+
+The journal services call entry_saved/entry_deleted after each commit.
+A user's file is built from the database on their first related query,
+and the hooks skip users without one.
+
+Several API workers may share a file. Every access takes an flock on a
+"<file>.lock" companion (shared to read, exclusive to write; rebuilds
+replace the index file, so it cannot carry the lock itself). Each write
+bumps a generation number in the header; a process that finds another
+generation, or a replaced file, reloads its count, slots and buckets
+before going on. The file only ever grows in place, so another
+process's older, shorter mapping stays valid until it reloads.
+"""
+import mmap
+import os
+import random
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from db import ARCHIVE_ENABLED
+from models import ArchivedJournalEntry, JournalEntry
+from services.html_text import content_terms, html_to_text
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): run a single worker there
+    fcntl = None
+
+RELATED_INDEX_DIR = os.environ.get("RELATED_INDEX_DIR", "related_index")
+# open user indexes kept in memory
+RELATED_CACHE_USERS = int(os.environ.get("RELATED_CACHE_USERS", "256"))
+# estimated Jaccard below which a candidate is not reported
+RELATED_MIN_SIMILARITY = float(os.environ.get("RELATED_MIN_SIMILARITY", "0.1"))
+
+# part of the file format; files written with other values are rebuilt
+NUM_PERM = 64
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+
+_MAGIC = b"RLMH"
+_VERSION = 1
+# magic, version, num_perm, bands, reserved, count, capacity, generation
+_HEADER = struct.Struct("<4sHHHHIII")
+_HEADER_SIZE = 32
+_PREFIX = struct.Struct(f"<II{BANDS}I")  # entry id, live, band keys
+_RECORD = struct.Struct(f"<II{BANDS}I{NUM_PERM}I")
+_SIGNATURE = struct.Struct(f"<{NUM_PERM}I")
+_INITIAL_CAPACITY = 64
+
+_MERSENNE = (1 << 61) - 1
+_seeded = random.Random(0x5EED)
+# fixed hash family (a*x + b) mod p, so signatures stay comparable across runs
+_PERMUTATIONS = [
+    (_seeded.randrange(1, _MERSENNE), _seeded.randrange(0, _MERSENNE)) for _ in range(NUM_PERM)
+]
+
+
+def signature(text: str) -> Optional[Tuple[int, ...]]:
+    """MinHash signature of the text's content words; None when it has none."""
+    hashes = [zlib.crc32(word.encode("utf-8")) for word in set(content_terms(text or ""))]
+    if not hashes:
+        return None
+    return tuple(
+        min((a * h + b) % _MERSENNE for h in hashes) & 0xFFFFFFFF
+        for a, b in _PERMUTATIONS
+    )
+
+
+def band_keys(sig: Tuple[int, ...]) -> List[int]:
+    return [
+        zlib.crc32(_SIGNATURE.pack(*sig)[band * ROWS * 4:(band + 1) * ROWS * 4])
+        for band in range(BANDS)
+    ]
+
+
+def similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+class IndexFormatError(Exception):
+    pass
+
+
+@contextmanager
+def _flocked(lock_file, exclusive: bool):
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        yield
+    finally:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _lock_file(path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return open(f"{path}.lock", "a")
+
+
+class UserIndex:
+    """One user's signature file, memory-mapped, with its LSH buckets in memory."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock_file = _lock_file(path)
+        self._file = self._map = None
+        try:
+            with _flocked(self._lock_file, exclusive=True):
+                if not os.path.exists(path):
+                    _write_file(path, [])
+                self._load()
+        except Exception:
+            self.close()
+            raise
+
+    def _load(self) -> None:
+        """(Re)open the file and rebuild the in-memory state from it. Caller holds the file lock."""
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+        self._file = open(self.path, "r+b")
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, version, num_perm, bands, _, self.count, self.capacity, self.generation = (
+            _HEADER.unpack_from(self._map, 0)
+        )
+        if (magic, version, num_perm, bands) != (_MAGIC, _VERSION, NUM_PERM, BANDS):
+            raise IndexFormatError(f"{self.path}: unexpected index format")
+
+        self.slots: Dict[int, int] = {}
+        self.buckets: Dict[Tuple[int, int], Set[int]] = {}
+        self.dead = 0
+        for slot in range(self.count):
+            entry_id, live, *keys = _PREFIX.unpack_from(self._map, self._offset(slot))
+            if live:
+                self.slots[entry_id] = slot
+                self._bucket(slot, keys)
+            else:
+                self.dead += 1
+
+    def _sync(self) -> None:
+        """Pick up writes and rebuilds made through other handles. Caller holds the file lock."""
+        replaced = os.stat(self.path).st_ino != self._inode
+        if replaced or _HEADER.unpack_from(self._map, 0)[-1] != self.generation:
+            self._load()
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        with _flocked(self._lock_file, exclusive):
+            self._sync()
+            yield
+
+    @staticmethod
+    def _offset(slot: int) -> int:
+        return _HEADER_SIZE + slot * _RECORD.size
+
+    def _bucket(self, slot: int, keys: Iterable[int]) -> None:
+        for band, key in enumerate(keys):
+            self.buckets.setdefault((band, key), set()).add(slot)
+
+    def _unbucket(self, slot: int) -> None:
+        _, _, *keys = _PREFIX.unpack_from(self._map, self._offset(slot))
+        for band, key in enumerate(keys):
+            members = self.buckets.get((band, key))
+            if members is not None:
+                members.discard(slot)
+                if not members:
+                    del self.buckets[(band, key)]
+
+    def _write_header(self) -> None:
+        """Store count and capacity, marking the file changed for other handles."""
+        self.generation = (self.generation + 1) & 0xFFFFFFFF
+        _HEADER.pack_into(
+            self._map, 0, _MAGIC, _VERSION, NUM_PERM, BANDS, 0, self.count, self.capacity, self.generation
+        )
+
+    def _grow(self) -> None:
+        self.capacity *= 2
+        self._map.close()
+        self._file.truncate(self._offset(self.capacity))
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._write_header()
+
+    def signature_of(self, entry_id: int) -> Optional[Tuple[int, ...]]:
+        with self._locked(exclusive=False):
+            slot = self.slots.get(entry_id)
+            if slot is None:
+                return None
+            return _SIGNATURE.unpack_from(self._map, self._offset(slot) + _PREFIX.size)
+
+    def upsert(self, entry_id: int, sig: Optional[Tuple[int, ...]]) -> None:
+        with self._locked(exclusive=True):
+            if sig is None:
+                self._remove(entry_id)
+            else:
+                self._upsert(entry_id, sig)
+
+    def remove(self, entry_id: int) -> None:
+        with self._locked(exclusive=True):
+            self._remove(entry_id)
+
+    def _upsert(self, entry_id: int, sig: Tuple[int, ...]) -> None:
+        slot = self.slots.get(entry_id)
+        if slot is None:
+            if self.count == self.capacity:
+                self._grow()
+            slot = self.count
+            self.count += 1
+        else:
+            self._unbucket(slot)
+        keys = band_keys(sig)
+        _RECORD.pack_into(self._map, self._offset(slot), entry_id, 1, *keys, *sig)
+        self.slots[entry_id] = slot
+        self._bucket(slot, keys)
+        self._write_header()
+
+    def _remove(self, entry_id: int) -> None:
+        slot = self.slots.pop(entry_id, None)
+        if slot is None:
+            return
+        self._unbucket(slot)
+        struct.pack_into("<I", self._map, self._offset(slot) + 4, 0)
+        self.dead += 1
+        self._write_header()
+        if self.dead > _INITIAL_CAPACITY and self.dead * 2 > self.count:
+            self._compact()
+
+    def _compact(self) -> None:
+        records = [
+            bytes(self._map[self._offset(slot):self._offset(slot) + _RECORD.size])
+            for slot in sorted(self.slots.values())
+        ]
+        self.count, self.dead = len(records), 0
+        self.slots, self.buckets = {}, {}
+        for slot, record in enumerate(records):
+            self._map[self._offset(slot):self._offset(slot) + _RECORD.size] = record
+            entry_id, _, *keys = _PREFIX.unpack_from(record)
+            self.slots[entry_id] = slot
+            self._bucket(slot, keys)
+        self._write_header()
+
+    def query(
+        self,
+        sig: Tuple[int, ...],
+        *,
+        exclude: Optional[int] = None,
+        limit: int = 5,
+        min_similarity: float = RELATED_MIN_SIMILARITY,
+    ) -> List[Tuple[int, float]]:
+        """(entry_id, similarity) of the closest entries sharing a band with `sig`."""
+        with self._locked(exclusive=False):
+            candidates = set()
+            for band, key in enumerate(band_keys(sig)):
+                candidates |= self.buckets.get((band, key), set())
+            if exclude is not None:
+                candidates.discard(self.slots.get(exclude))
+
+            scored = []
+            for slot in candidates:
+                entry_id = struct.unpack_from("<I", self._map, self._offset(slot))[0]
+                other = _SIGNATURE.unpack_from(self._map, self._offset(slot) + _PREFIX.size)
+                score = similarity(sig, other)
+                if score >= min_similarity:
+                    scored.append((entry_id, score))
+        scored.sort(key=lambda item: (-item[1], -item[0]))
+        return scored[:limit]
+
+    def flush(self) -> None:
+        self._map.flush()
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+        self._lock_file.close()
+
+
+def _write_file(path: str, records: List[Tuple[int, Tuple[int, ...]]]) -> None:
+    """Write a complete index file next to `path`, then swap it in. Caller holds the file lock."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    capacity = max(_INITIAL_CAPACITY, 1 << (len(records) - 1).bit_length()) if records else _INITIAL_CAPACITY
+    buffer = bytearray(_HEADER_SIZE + capacity * _RECORD.size)
+    _HEADER.pack_into(buffer, 0, _MAGIC, _VERSION, NUM_PERM, BANDS, 0, len(records), capacity, 0)
+    for slot, (entry_id, sig) in enumerate(records):
+        _RECORD.pack_into(buffer, UserIndex._offset(slot), entry_id, 1, *band_keys(sig), *sig)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(buffer)
+    os.replace(tmp_path, path)
+
+
+# -- PER-USER FILES --
+
+_lock = threading.Lock()
+_open: "OrderedDict[int, UserIndex]" = OrderedDict()
+
+
+def index_path(user_id: int) -> str:
+    return os.path.join(RELATED_INDEX_DIR, f"{user_id}.mhx")
+
+
+def _entry_texts(db: Session, user_id: int) -> Iterable[Tuple[int, str]]:
+    models = [JournalEntry] + ([ArchivedJournalEntry] if ARCHIVE_ENABLED else [])
+    for model in models:
+        rows = db.execute(
+            select(model.id, model.plain_text).where(model.user_id == user_id)
+        ).all()
+        for entry_id, text in rows:
+            if text is None:
+                # rows written before plain_text existed
+                text = html_to_text(db.get(model, entry_id).content)
+            yield entry_id, text
+
+
+def _cached(user_id: int) -> Optional[UserIndex]:
+    """The user's open index, opening the file if there is one. Caller holds _lock."""
+    index = _open.get(user_id)
+    if index is not None:
+        _open.move_to_end(user_id)
+        return index
+    if not os.path.exists(index_path(user_id)):
+        return None
+    try:
+        index = UserIndex(index_path(user_id))
+    except IndexFormatError as e:
+        print(f"Rebuilding related-entries index: {e}")
+        os.remove(index_path(user_id))
+        return None
+    _open[user_id] = index
+    while len(_open) > RELATED_CACHE_USERS:
+        _, evicted = _open.popitem(last=False)
+        evicted.close()
+    return index
+
+
+def rebuild_user_index(*, db: Session, user_id: int) -> int:
+    """Re-index all of the user's entries from the database; returns how many were indexed."""
+    records = []
+    for entry_id, text in _entry_texts(db, user_id):
+        sig = signature(text)
+        if sig is not None:
+            records.append((entry_id, sig))
+    with _lock:
+        stale = _open.pop(user_id, None)
+        if stale is not None:
+            stale.close()
+        # other workers' handles see the new inode and reload
+        with _lock_file(index_path(user_id)) as lock_file, _flocked(lock_file, exclusive=True):
+            _write_file(index_path(user_id), records)
+    return len(records)
+
+
+def related_entry_ids(
+    *,
+    db: Session,
+    user_id: int,
+    entry_id: int,
+    text: str,
+    limit: int = 5,
+) -> List[Tuple[int, float]]:
+    """
+    (entry_id, similarity) of the user's entries most similar to `text`
+    (the content of `entry_id`), best first. Builds the user's index on
+    first use.
+    """
+    with _lock:
+        index = _cached(user_id)
+    if index is None:
+        rebuild_user_index(db=db, user_id=user_id)
+
+    with _lock:
+        index = _cached(user_id)
+        sig = index.signature_of(entry_id) or signature(text)
+        if sig is None:
+            return []
+        return index.query(sig, exclude=entry_id, limit=limit)
+
+
+# -- HOOKS (called by the journal services after commit) --
+
+def entry_saved(entry) -> None:
+    try:
+        text = entry.plain_text if entry.plain_text is not None else html_to_text(entry.content)
+        sig = signature(text)
+        with _lock:
+            index = _cached(entry.user_id)
+            if index is not None:
+                index.upsert(entry.id, sig)
+                index.flush()
+    except Exception as e:
+        # a stale index only affects suggestions; the write already succeeded
+        print(f"Related-entries index update failed for entry {entry.id}: {e}")
+
+
+def entry_deleted(user_id: int, entry_id: int) -> None:
+    try:
+        with _lock:
+            index = _cached(user_id)
+            if index is not None:
+                index.remove(entry_id)
+                index.flush()
+    except Exception as e:
+        print(f"Related-entries index update failed for entry {entry_id}: {e}")
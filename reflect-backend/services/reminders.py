@@ -0,0 +1,604 @@
+"""
+In-process reminders for scheduled task start times.
+
+Pending reminders live in a hierarchical timer wheel (seconds, minutes,
+hours). Adding or cancelling one is O(1); the dispatcher thread sleeps
+until the next non-empty slot or cascade boundary, so an idle wheel means
+no wakeups at all.
+
+The wheel is filled incrementally: every REMINDER_LOAD_AHEAD_H hours the
+dispatcher reads the next window of tasks (one query per database),
+expanding recurring series with occurs_on. In between, every insert,
+update and delete of a task also writes a scheduled_task_changes row in
+the same transaction (ORM mapper events, so bulk operations and other
+processes are covered; query-level update()/delete() are not); the dispatcher reads that small table every REMINDER_POLL_S
+seconds, re-reads the tasks named there and replaces their reminders. In
+the dispatcher's own process the scheduled task service functions also
+call task_saved/task_deleted, which update the wheel right away.
+Tasks are told apart by (user id, task id): with DB_SHARD_MODE set every
+shard numbers its tasks from 1.
+
+Due reminders go to the configured sinks: "log" prints them, "webhook"
+POSTs them as JSON to REMINDER_WEBHOOK_URL (webhook_standin.py is a local
+stand-in), and "sse" publishes them on the event bus (services/events.py),
+which /api/reminders/stream and /api/events/stream relay to the browser.
+
+The dispatcher starts with the first request the app serves, so the
+parent process of the dev server's reloader does not run one too. Only
+one process runs it: with several workers (uvicorn --workers N) the first
+to take an exclusive lock on REMINDER_LOCK_FILE does, and the others check
+again every REMINDER_LOCK_RETRY_S seconds in case it exits. Reminders on
+the "sse" sink therefore reach only clients streaming from that worker.
+"""
+import json
+import os
+import threading
+import time
+import urllib.request
+from collections import Counter, namedtuple
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, event, insert, or_, select
+
+from db import session_factories
+from models import ScheduledTask, ScheduledTaskChange
+from services.events import bus
+from services.task_intervals import occurs_on
+
+REMINDERS_ENABLED = os.environ.get("REMINDERS_ENABLED", "0") == "1"
+REMINDER_LEAD_MINUTES = int(os.environ.get("REMINDER_LEAD_MINUTES", "10"))
+# size of each incremental load; must stay under the wheel's 24 hour span
+REMINDER_LOAD_AHEAD_H = min(float(os.environ.get("REMINDER_LOAD_AHEAD_H", "12")), 23)
+# comma-separated: log, webhook, sse
+REMINDER_SINKS = os.environ.get("REMINDER_SINKS", "log")
+REMINDER_WEBHOOK_URL = os.environ.get("REMINDER_WEBHOOK_URL", "http://127.0.0.1:5055/reminders")
+REMINDER_WEBHOOK_TIMEOUT_S = float(os.environ.get("REMINDER_WEBHOOK_TIMEOUT_S", "2"))
+# how often the dispatcher reads task changes made by other processes
+REMINDER_POLL_S = float(os.environ.get("REMINDER_POLL_S", "5"))
+# held by the one process that runs the dispatcher
+REMINDER_LOCK_FILE = os.environ.get("REMINDER_LOCK_FILE", "reminders.lock")
+REMINDER_LOCK_RETRY_S = float(os.environ.get("REMINDER_LOCK_RETRY_S", "30"))
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): run a single worker there
+    fcntl = None
+
+# fields of a task the wheel needs; occurs_on accepts it in place of a row
+TaskTimes = namedtuple(
+    "TaskTimes",
+    ["id", "user_id", "title", "task_date", "start_time", "is_recurring", "recurrence_pattern", "is_completed"],
+)
+
+
+# tasks are identified by (user_id, task id): every shard numbers its tasks
+# from 1, and a user's tasks all live in one shard
+TaskKey = Tuple[int, int]
+
+
+def task_key(task) -> TaskKey:
+    return task.user_id, task.id
+
+
+def task_times(task: ScheduledTask) -> TaskTimes:
+    return TaskTimes(
+        task.id,
+        task.user_id,
+        task.title,
+        task.task_date,
+        task.start_time,
+        task.is_recurring,
+        task.recurrence_pattern,
+        task.is_completed,
+    )
+
+
+class TimerWheel:
+    """
+    Hierarchical timer wheel with one-second ticks.
+
+    Level 0 has 60 one-second slots, level 1 60 one-minute slots and
+    level 2 24 one-hour slots. A timer sits on the lowest level whose span
+    covers it and moves down a level when the clock reaches the start of its
+    slot. Timers more than a day out are rejected; the caller loads them later.
+    """
+
+    LEVELS = ((1, 60), (60, 60), (3600, 24))  # (seconds per slot, slots)
+
+    def __init__(self, now: int):
+        self.now = now
+        self._slots = [[{} for _ in range(count)] for _, count in self.LEVELS]
+        self._where: Dict = {}
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def _place(self, key, due: int, payload) -> bool:
+        for level, (granularity, count) in enumerate(self.LEVELS):
+            if level == 0:
+                fits = due - self.now < count
+            else:
+                fits = due // granularity - self.now // granularity < count
+            if fits:
+                slot = (due // granularity) % count
+                self._slots[level][slot][key] = (due, payload)
+                self._where[key] = (level, slot)
+                return True
+        return False
+
+    def add(self, key, due: int, payload) -> bool:
+        """Schedule (or reschedule) `key`; overdue timers fire on the next tick."""
+        self.cancel(key)
+        return self._place(key, max(due, self.now + 1), payload)
+
+    def cancel(self, key) -> bool:
+        where = self._where.pop(key, None)
+        if where is None:
+            return False
+        level, slot = where
+        del self._slots[level][slot][key]
+        return True
+
+    def next_event(self) -> Optional[int]:
+        """Earliest tick at which a timer fires or a slot cascades, None when empty."""
+        if not self._where:
+            return None
+        best = None
+        for level, (granularity, count) in enumerate(self.LEVELS):
+            base = self.now // granularity
+            for offset in range(1, count + 1):
+                if self._slots[level][(base + offset) % count]:
+                    tick = (base + offset) * granularity
+                    best = tick if best is None else min(best, tick)
+                    break
+        return best
+
+    def advance(self, to: int) -> List[Tuple[int, object]]:
+        """Move the clock to `to` and return the (due, payload) of expired timers."""
+        fired = []
+        while True:
+            event = self.next_event()
+            if event is None or event > to:
+                self.now = max(self.now, to)
+                return fired
+            self.now = event
+            # cascade from the top, then expire this second's slot
+            for level in range(len(self.LEVELS) - 1, 0, -1):
+                granularity, count = self.LEVELS[level]
+                if self.now % granularity == 0:
+                    slot = self._slots[level][(self.now // granularity) % count]
+                    moved = list(slot.items())
+                    slot.clear()
+                    for key, (due, payload) in moved:
+                        del self._where[key]
+                        self._place(key, due, payload)
+            slot = self._slots[0][self.now % self.LEVELS[0][1]]
+            for key, (due, payload) in sorted(slot.items(), key=lambda item: item[1][0]):
+                del self._where[key]
+                fired.append((due, payload))
+            slot.clear()
+
+
+def _occurrences(task: TaskTimes, start: float, end: float, lead: timedelta) -> Iterator[Tuple[date, int]]:
+    """(occurrence date, reminder timestamp) with the reminder in [start, end)."""
+    first = (datetime.fromtimestamp(start) + lead).date()
+    last = (datetime.fromtimestamp(end) + lead).date()
+    day = max(first, task.task_date)
+    while day <= last:
+        if occurs_on(task, day):
+            remind_at = (datetime.combine(day, task.start_time) - lead).timestamp()
+            if start <= remind_at < end:
+                yield day, int(remind_at)
+        day += timedelta(days=1)
+
+
+def reminder_payload(task: TaskTimes, day: date, remind_at: int, lead_minutes: int) -> Dict:
+    return {
+        "task_id": task.id,
+        "user_id": task.user_id,
+        "title": task.title,
+        "task_date": day.isoformat(),
+        "start_time": task.start_time.strftime("%H:%M"),
+        "remind_at": datetime.fromtimestamp(remind_at).isoformat(),
+        "minutes_before": lead_minutes,
+    }
+
+
+# -- sinks --
+
+def log_sink(reminder: Dict) -> None:
+    print(f"reminder for user {reminder['user_id']}: {reminder['title']} at {reminder['start_time']}")
+
+
+class WebhookSink:
+    def __init__(self, url: str, timeout: float = REMINDER_WEBHOOK_TIMEOUT_S):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, reminder: Dict) -> None:
+        body = json.dumps(reminder).encode("utf-8")
+        req = urllib.request.Request(
+            self.url, data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            response.read()
+
+
+def stream_sink(reminder: Dict) -> None:
+    """Publishes the reminder on the event bus for the user's open streams."""
+    bus.publish(reminder["user_id"], "reminder", reminder)
+
+
+def configured_sinks() -> List[Callable[[Dict], None]]:
+    sinks = []
+    for name in (part.strip() for part in REMINDER_SINKS.split(",")):
+        if name == "log":
+            sinks.append(log_sink)
+        elif name == "webhook":
+            sinks.append(WebhookSink(REMINDER_WEBHOOK_URL))
+        elif name == "sse":
+            sinks.append(stream_sink)
+        elif name:
+            print(f"Unknown reminder sink: {name}")
+    return sinks
+
+
+class ReminderDispatcher:
+    def __init__(
+        self,
+        sinks: List[Callable[[Dict], None]],
+        *,
+        lead_minutes: int = REMINDER_LEAD_MINUTES,
+        load_ahead_s: float = REMINDER_LOAD_AHEAD_H * 3600,
+        poll_s: float = REMINDER_POLL_S,
+        factories=None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.sinks = sinks
+        self.lead_minutes = lead_minutes
+        self.lead = timedelta(minutes=lead_minutes)
+        self.load_ahead_s = load_ahead_s
+        self.poll_s = poll_s
+        self.factories = factories
+        self.clock = clock
+
+        self._cond = threading.Condition()
+        self._wheel = TimerWheel(int(clock()))
+        self._by_task: Dict[TaskKey, set] = {}
+        self._loaded_until = float(int(clock()))
+        self._next_poll = 0.0
+        # while tasks are read from the database: task key -> the TaskTimes
+        # the hooks saved meanwhile (None once deleted), newer than the read
+        self._changed_during_read: Optional[Dict[TaskKey, Optional[TaskTimes]]] = None
+        self._thread = None
+        self._stopping = False
+        self._counters = Counter()
+
+    # -- wheel contents --
+
+    def _schedule(self, task: TaskTimes, start: float, end: float) -> None:
+        if task.is_completed:
+            return
+        for day, remind_at in _occurrences(task, start, end, self.lead):
+            key = (*task_key(task), day)
+            if self._wheel.add(key, remind_at, reminder_payload(task, day, remind_at, self.lead_minutes)):
+                self._by_task.setdefault(task_key(task), set()).add(key)
+
+    def _cancel_task(self, key: TaskKey) -> None:
+        for wheel_key in self._by_task.pop(key, ()):
+            self._wheel.cancel(wheel_key)
+
+    def load_window(self) -> None:
+        """Read the tasks with reminders in the next window and add them to the wheel."""
+        start = self._loaded_until
+        end = max(start, self.clock()) + self.load_ahead_s
+        first_day = (datetime.fromtimestamp(start) + self.lead).date()
+        last_day = (datetime.fromtimestamp(end) + self.lead).date()
+
+        stmt = select(ScheduledTask).where(
+            ScheduledTask.is_completed.is_(False),
+            or_(
+                ScheduledTask.task_date.between(first_day, last_day),
+                and_(ScheduledTask.is_recurring.is_(True), ScheduledTask.task_date <= last_day),
+            ),
+        )
+        tasks = []
+        self._begin_read()
+        try:
+            for make_session in self.factories or session_factories():
+                db = make_session()
+                try:
+                    tasks.extend(task_times(task) for task in db.execute(stmt).scalars())
+                finally:
+                    db.close()
+                self._counters["db_loads"] += 1
+        finally:
+            with self._cond:
+                changed = self._end_read()
+
+        with self._cond:
+            # the wheel only accepts timers within a day of its clock
+            fired = self._advance()
+            for task in tasks:
+                if task_key(task) not in changed:
+                    self._schedule(task, start, end)
+            # the hooks already covered these up to the old window end
+            for latest in changed.values():
+                if latest is not None:
+                    self._schedule(latest, start, end)
+            self._loaded_until = end
+            self._counters["tasks_loaded"] += len(tasks)
+            self._cond.notify()
+        self._deliver(fired)
+
+    def poll_changes(self) -> None:
+        """Apply the task writes recorded in scheduled_task_changes, from any process."""
+        self._next_poll = self.clock() + self.poll_s
+        self._counters["change_polls"] += 1
+        for make_session in self.factories or session_factories():
+            db = make_session()
+            try:
+                self._begin_read()
+                try:
+                    changes = db.execute(select(
+                        ScheduledTaskChange.id, ScheduledTaskChange.user_id, ScheduledTaskChange.task_id,
+                    )).all()
+                    keys = {(user_id, task_id) for _, user_id, task_id in changes}
+                    current = {}
+                    if keys:
+                        # ids are unique within this database, so they select its rows
+                        current = {
+                            task_key(task): task_times(task)
+                            for task in db.execute(select(ScheduledTask).where(
+                                ScheduledTask.id.in_({task_id for _, task_id in keys})
+                            )).scalars()
+                        }
+                finally:
+                    with self._cond:
+                        changed = self._end_read()
+                if not changes:
+                    continue
+
+                with self._cond:
+                    fired = self._advance()
+                    for key in keys - set(changed):
+                        self._cancel_task(key)
+                        if key in current:
+                            self._schedule(current[key], self._wheel.now + 1, self._loaded_until)
+                    self._counters["changes_applied"] += len(changes)
+                    self._cond.notify()
+                self._deliver(fired)
+
+                # applying twice is harmless, so rows go only after they took effect
+                db.execute(delete(ScheduledTaskChange).where(
+                    ScheduledTaskChange.id.in_([change_id for change_id, _, _ in changes])
+                ))
+                db.commit()
+            finally:
+                db.close()
+
+    def _begin_read(self) -> None:
+        with self._cond:
+            self._changed_during_read = {}
+
+    def _end_read(self) -> Dict[TaskKey, Optional[TaskTimes]]:
+        """Tasks the hooks changed since _begin_read; caller holds the lock."""
+        changed, self._changed_during_read = self._changed_during_read or {}, None
+        return changed
+
+    def task_saved(self, task: TaskTimes) -> None:
+        """Replace the task's pending reminders after a create or update."""
+        with self._cond:
+            fired = self._advance()
+            self._cancel_task(task_key(task))
+            self._schedule(task, self._wheel.now + 1, self._loaded_until)
+            if self._changed_during_read is not None:
+                self._changed_during_read[task_key(task)] = task
+            self._cond.notify()
+        self._deliver(fired)
+
+    def task_deleted(self, user_id: int, task_id: int) -> None:
+        with self._cond:
+            self._cancel_task((user_id, task_id))
+            if self._changed_during_read is not None:
+                self._changed_during_read[(user_id, task_id)] = None
+            self._cond.notify()
+
+    # -- dispatch --
+
+    def _advance(self):
+        """Bring the wheel's clock up to now; caller holds the lock and delivers what fired."""
+        fired = self._wheel.advance(int(self.clock()))
+        for _, reminder in fired:
+            key = (reminder["user_id"], reminder["task_id"])
+            wheel_keys = self._by_task.get(key)
+            if wheel_keys is not None:
+                wheel_keys.discard((*key, date.fromisoformat(reminder["task_date"])))
+                if not wheel_keys:
+                    del self._by_task[key]
+        return fired
+
+    def _deliver(self, fired) -> None:
+        for _, reminder in fired:
+            self._counters["fired"] += 1
+            for sink in self.sinks:
+                try:
+                    sink(reminder)
+                except Exception as e:
+                    self._counters["sink_errors"] += 1
+                    print(f"Error delivering reminder for task {reminder['task_id']}: {e}")
+
+    def tick(self) -> None:
+        """
+        Fire what is due, loading the next window first when it starts and
+        applying recorded task changes when a poll is due (always right
+        after a load, so writes made during it are not missed).
+        """
+        if self.clock() >= self._loaded_until:
+            self.load_window()
+            self.poll_changes()
+        elif self.clock() >= self._next_poll:
+            self.poll_changes()
+        with self._cond:
+            fired = self._advance()
+        self._deliver(fired)
+
+    def _seconds_until_next(self) -> float:
+        next_tick = self._wheel.next_event()
+        wake = min(self._loaded_until, self._next_poll)
+        if next_tick is not None:
+            wake = min(wake, next_tick)
+        return max(wake - self.clock(), 0)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                delay = self._seconds_until_next()
+                if delay > 0:
+                    self._cond.wait(delay)
+                if self._stopping:
+                    return
+            self._counters["wakeups"] += 1
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Error in reminder dispatcher: {e}")
+                time.sleep(1)
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="reminders", daemon=True)
+        self.load_window()
+        self.poll_changes()
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            return {
+                "pending": len(self._wheel),
+                "next_due": self._wheel.next_event(),
+                "loaded_until": datetime.fromtimestamp(self._loaded_until).isoformat(),
+                "lead_minutes": self.lead_minutes,
+                "counters": dict(self._counters),
+            }
+
+
+_dispatcher: Optional[ReminderDispatcher] = None
+_dispatcher_lock = threading.Lock()
+# open file whose flock marks this process as the one running the dispatcher
+_lock_handle = None
+_next_start_attempt = 0.0
+
+
+def _take_process_lock() -> bool:
+    """Take the cross-process dispatcher lock without waiting; False if another process has it."""
+    global _lock_handle
+    if _lock_handle is not None or fcntl is None:
+        return True
+    handle = open(REMINDER_LOCK_FILE, "a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _lock_handle = handle
+    return True
+
+
+def _release_process_lock() -> None:
+    global _lock_handle
+    if _lock_handle is not None:
+        _lock_handle.close()  # closing the file drops the flock
+        _lock_handle = None
+
+
+def start_reminders() -> Optional[ReminderDispatcher]:
+    """
+    Start this process's dispatcher if no other process runs one. Returns
+    None when reminders are off or another process holds the lock.
+    """
+    global _dispatcher, _next_start_attempt
+    if not REMINDERS_ENABLED:
+        return None
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _next_start_attempt = time.monotonic() + REMINDER_LOCK_RETRY_S
+            if not _take_process_lock():
+                return None
+            dispatcher = ReminderDispatcher(configured_sinks())
+            try:
+                dispatcher.start()
+            except Exception as e:
+                print(f"Error starting reminder dispatcher: {e}")
+                _release_process_lock()
+                return None
+            _dispatcher = dispatcher
+    return _dispatcher
+
+
+def stop_reminders() -> None:
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is not None:
+            _dispatcher.stop()
+            _dispatcher = None
+        _release_process_lock()
+
+
+def init_reminders(app) -> None:
+    @app.before_request
+    def ensure_reminders():
+        # standby workers try again now and then, in case the holder exited
+        if REMINDERS_ENABLED and _dispatcher is None and time.monotonic() >= _next_start_attempt:
+            start_reminders()
+
+
+def _record_task_change(mapper, connection, target) -> None:
+    connection.execute(insert(ScheduledTaskChange.__table__).values(
+        user_id=target.user_id,
+        task_id=target.id,
+        created_at=datetime.now(),
+    ))
+
+
+def track_task_changes() -> None:
+    """Record every task insert/update/delete in scheduled_task_changes; idempotent."""
+    for name in ("after_insert", "after_update", "after_delete"):
+        if not event.contains(ScheduledTask, name, _record_task_change):
+            event.listen(ScheduledTask, name, _record_task_change)
+
+
+if REMINDERS_ENABLED:
+    # every process records changes, whichever of them runs the dispatcher
+    track_task_changes()
+
+
+# hooks for the scheduled task service; no-ops while no dispatcher runs
+
+def task_saved(task: ScheduledTask) -> None:
+    if _dispatcher is not None:
+        _dispatcher.task_saved(task_times(task))
+
+
+def task_deleted(user_id: int, task_id: int) -> None:
+    if _dispatcher is not None:
+        _dispatcher.task_deleted(user_id, task_id)
+
+
+def get_reminder_metrics() -> Dict:
+    if _dispatcher is None:
+        # "running" is per process; another worker may hold the dispatcher
+        return {"enabled": REMINDERS_ENABLED, "running": False}
+    return {"enabled": REMINDERS_ENABLED, "running": True, **_dispatcher.snapshot()}
@@ -0,0 +1,285 @@
+"""
+Revision history for journal entry content.
+
+Every save of an entry's content becomes a revision. Most are stored as a
+delta against the last snapshot (a full copy); a new snapshot starts every
+REVISION_SNAPSHOT_EVERY revisions, or sooner when the delta would no
+longer be small. Rebuilding any revision therefore reads the revision and
+its snapshot and applies one delta.
+
+Deltas are JSON lists of pieces: [start, end] copies base[start:end], a
+string is inserted as is. Saves that arrive within REVISION_COALESCE_S of
+the revision they would follow are folded into it, so a burst of saves
+while typing is one revision. When a snapshot starts, groups of revisions
+that fall entirely outside the retention limits (REVISION_KEEP per entry,
+REVISION_KEEP_DAYS) are deleted.
+"""
+import json
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from difflib import SequenceMatcher
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Session, defer
+
+from models import JournalRevision
+
+REVISION_SNAPSHOT_EVERY = int(os.environ.get("REVISION_SNAPSHOT_EVERY", "16"))
+REVISION_KEEP = int(os.environ.get("REVISION_KEEP", "100"))
+REVISION_KEEP_DAYS = int(os.environ.get("REVISION_KEEP_DAYS", "90"))
+REVISION_COALESCE_S = float(os.environ.get("REVISION_COALESCE_S", "120"))
+
+# blocks end after a closing block tag or a line break; most saves touch
+# only a few of them, so blocks are matched first and words only within
+# the blocks that changed
+_BLOCK_RE = re.compile(r".*?(?:</(?:p|li|h[1-6]|blockquote|pre)>|<br\s*/?>)|.+", re.S)
+
+# tags, runs of other text and runs of whitespace: edits line up on word
+# and tag boundaries, and the tokens join back to the exact input
+_TOKEN_RE = re.compile(r"<[^>]*>|[^<\s]+|\s+|<")
+
+
+class RevisionNotFound(Exception):
+    pass
+
+
+class InvalidDelta(Exception):
+    pass
+
+
+def _now() -> datetime:
+    # stored naive, like every DateTime read back from SQLite
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class _DeltaWriter:
+    """Builds a delta, merging adjacent copies and adjacent inserts."""
+
+    def __init__(self):
+        self.pieces = []
+
+    def copy(self, start: int, end: int) -> None:
+        if start == end:
+            return
+        last = self.pieces[-1] if self.pieces else None
+        if isinstance(last, list) and last[1] == start:
+            last[1] = end
+        else:
+            self.pieces.append([start, end])
+
+    def insert(self, text: str) -> None:
+        if not text:
+            return
+        if self.pieces and isinstance(self.pieces[-1], str):
+            self.pieces[-1] += text
+        else:
+            self.pieces.append(text)
+
+
+def _diff(out: _DeltaWriter, a: List[str], b: List[str], offset: int, refine: bool) -> None:
+    """
+    Emit the edit from token list `a` (starting at char `offset` of the
+    base) to `b`. With `refine`, replaced runs of blocks are diffed again
+    word by word.
+    """
+    head = 0
+    while head < len(a) and head < len(b) and a[head] == b[head]:
+        head += 1
+    tail = 0
+    while tail < len(a) - head and tail < len(b) - head and a[-1 - tail] == b[-1 - tail]:
+        tail += 1
+
+    offsets = [offset]
+    for token in a:
+        offsets.append(offsets[-1] + len(token))
+
+    out.copy(offsets[0], offsets[head])
+    matcher = SequenceMatcher(None, a[head:len(a) - tail], b[head:len(b) - tail], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        i1, i2, j1, j2 = i1 + head, i2 + head, j1 + head, j2 + head
+        if tag == "equal":
+            out.copy(offsets[i1], offsets[i2])
+        elif tag == "replace" and refine:
+            _diff(
+                out,
+                _TOKEN_RE.findall("".join(a[i1:i2])),
+                _TOKEN_RE.findall("".join(b[j1:j2])),
+                offsets[i1],
+                refine=False,
+            )
+        elif tag != "delete":
+            out.insert("".join(b[j1:j2]))
+    out.copy(offsets[len(a) - tail], offsets[len(a)])
+
+
+def make_delta(base: str, target: str) -> list:
+    """Edit script that turns `base` into `target` (see apply_delta)."""
+    out = _DeltaWriter()
+    _diff(out, _BLOCK_RE.findall(base), _BLOCK_RE.findall(target), 0, refine=True)
+    return out.pieces
+
+
+def apply_delta(base: str, delta: list) -> str:
+    """Rebuild the target of make_delta(base, target) from `base`."""
+    parts = []
+    for piece in delta:
+        if isinstance(piece, str):
+            parts.append(piece)
+        elif (
+            isinstance(piece, list) and len(piece) == 2
+            and all(isinstance(n, int) for n in piece)
+            and 0 <= piece[0] <= piece[1] <= len(base)
+        ):
+            parts.append(base[piece[0]:piece[1]])
+        else:
+            raise InvalidDelta(f"Invalid delta piece: {piece!r}")
+    return "".join(parts)
+
+
+def _latest(db: Session, entry_id: int) -> Optional[JournalRevision]:
+    return (
+        db.query(JournalRevision)
+        .filter(JournalRevision.entry_id == entry_id)
+        .order_by(JournalRevision.revision.desc())
+        .first()
+    )
+
+
+def _get(db: Session, entry_id: int, revision: int) -> Optional[JournalRevision]:
+    return (
+        db.query(JournalRevision)
+        .filter(JournalRevision.entry_id == entry_id, JournalRevision.revision == revision)
+        .one_or_none()
+    )
+
+
+def _store(db: Session, row: JournalRevision, content: str, snapshot: Optional[JournalRevision]) -> bool:
+    """
+    Write `content` into `row`, as a delta against `snapshot` when that is
+    worth it. Returns True when the row became a snapshot.
+    """
+    row.char_count = len(content)
+    if snapshot is not None and row.revision - snapshot.revision < REVISION_SNAPSHOT_EVERY:
+        delta = json.dumps(make_delta(snapshot.data, content), separators=(",", ":"))
+        # a delta near the size of the text saves little and costs a rebuild
+        if len(delta) <= len(content) // 2:
+            row.base_revision = snapshot.revision
+            row.data = delta
+            return False
+    row.base_revision = None
+    row.data = content
+    return True
+
+
+def record_revision(*, db: Session, entry, previous_content: Optional[str] = None) -> JournalRevision:
+    """
+    Record `entry`'s current content as its newest revision.
+
+    `previous_content` is the content the save replaced; it becomes the
+    first revision of entries written before history was kept. Flushes but
+    does not commit, so the revision is saved with the entry.
+    """
+    now = _now()
+    latest = _latest(db, entry.id)
+    coalesce = (
+        latest is not None
+        and (now - latest.created_at.replace(tzinfo=None)).total_seconds() < REVISION_COALESCE_S
+    )
+
+    if latest is None and previous_content is not None and previous_content != entry.content:
+        latest = JournalRevision(
+            entry_id=entry.id, user_id=entry.user_id, revision=1,
+            data=previous_content, char_count=len(previous_content),
+            created_at=now, updated_at=now,
+        )
+        db.add(latest)
+
+    if coalesce:
+        # part of the same burst of saves: overwrite the newest revision,
+        # which nothing else is based on yet
+        row = latest
+        snapshot = _get(db, entry.id, row.base_revision) if row.base_revision else None
+    else:
+        row = JournalRevision(
+            entry_id=entry.id,
+            user_id=entry.user_id,
+            revision=latest.revision + 1 if latest else 1,
+            created_at=now,
+        )
+        db.add(row)
+        if latest is None:
+            snapshot = None
+        else:
+            snapshot = latest if latest.base_revision is None else _get(db, entry.id, latest.base_revision)
+
+    row.updated_at = now
+    if _store(db, row, entry.content, snapshot) and row is not latest:
+        db.flush()
+        _prune(db, entry.id, row.revision, now)
+    db.flush()
+    return row
+
+
+def _prune(db: Session, entry_id: int, newest: int, now: datetime) -> None:
+    """
+    Drop revisions outside the retention limits. Deletion goes by whole
+    snapshot groups so every kept delta still has its snapshot; up to
+    REVISION_SNAPSHOT_EVERY extra revisions may be kept.
+    """
+    keep_from = newest - REVISION_KEEP + 1
+    recent = (
+        db.query(JournalRevision.revision)
+        .filter(
+            JournalRevision.entry_id == entry_id,
+            JournalRevision.updated_at >= now - timedelta(days=REVISION_KEEP_DAYS),
+        )
+        .order_by(JournalRevision.revision)
+        .first()
+    )
+    keep_from = max(keep_from, recent.revision if recent else newest)
+
+    group_start = (
+        db.query(JournalRevision.revision)
+        .filter(
+            JournalRevision.entry_id == entry_id,
+            JournalRevision.base_revision.is_(None),
+            JournalRevision.revision <= keep_from,
+        )
+        .order_by(JournalRevision.revision.desc())
+        .first()
+    )
+    if group_start is not None:
+        db.query(JournalRevision).filter(
+            JournalRevision.entry_id == entry_id,
+            JournalRevision.revision < group_start.revision,
+        ).delete(synchronize_session=False)
+
+
+def list_revisions(*, db: Session, entry_id: int) -> List[JournalRevision]:
+    """Revisions of an entry, newest first, without their data loaded."""
+    return (
+        db.query(JournalRevision)
+        .options(defer(JournalRevision.data))
+        .filter(JournalRevision.entry_id == entry_id)
+        .order_by(JournalRevision.revision.desc())
+        .all()
+    )
+
+
+def get_revision(*, db: Session, entry_id: int, revision: int) -> Tuple[JournalRevision, str]:
+    """A revision and its rebuilt content."""
+    row = _get(db, entry_id, revision)
+    if row is None:
+        raise RevisionNotFound("Revision not found.")
+    if row.base_revision is None:
+        return row, row.data
+
+    snapshot = _get(db, entry_id, row.base_revision)
+    return row, apply_delta(snapshot.data, json.loads(row.data))
+
+
+def delete_revisions(*, db: Session, entry_id: int) -> None:
+    db.query(JournalRevision).filter(JournalRevision.entry_id == entry_id).delete(
+        synchronize_session=False
+    )
@@ -1,13 +1,50 @@
 from datetime import datetime, date, time, timezone
 from typing import List, Dict, Optional
+from sqlalchemy import bindparam, select
 from sqlalchemy.orm import Session
 from models import ScheduledTask
+from services import reminders
+from services.events import changed_fields, publish_change
+from services.task_intervals import find_conflicts
 
 
 class ScheduledTaskNotFound(Exception):
     pass
 
 
+class TaskOverlap(Exception):
+    """Raised when a task would overlap existing ones; carries (date, task) pairs."""
+
+    def __init__(self, conflicts):
+        super().__init__("Task overlaps existing scheduled tasks.")
+        self.conflicts = conflicts
+
+
+def _check_slot(
+    *,
+    db: Session,
+    user_id: int,
+    task_date: date,
+    start_time: time,
+    end_time: time,
+    is_recurring: bool,
+    recurrence_pattern: Optional[str],
+    exclude_task_id: Optional[int] = None,
+) -> None:
+    conflicts = find_conflicts(
+        db=db,
+        user_id=user_id,
+        task_date=task_date,
+        start_time=start_time,
+        end_time=end_time,
+        is_recurring=is_recurring,
+        recurrence_pattern=recurrence_pattern,
+        exclude_task_id=exclude_task_id,
+    )
+    if conflicts:
+        raise TaskOverlap(conflicts)
+
+
 def create_scheduled_task(
     *,
     db: Session,
@@ -19,10 +56,27 @@ def create_scheduled_task(
     end_time: time,
     is_recurring: bool = False,
     recurrence_pattern: Optional[str] = None,
+    allow_overlap: bool = False,
 ) -> ScheduledTask:
     """
     Create a new scheduled task.
+
+    Raises TaskOverlap if it would overlap another task (including
+    occurrences of recurring series), unless allow_overlap is set.
     """
+    if end_time <= start_time:
+        raise ValueError("end_time must be after start_time.")
+    if not allow_overlap:
+        _check_slot(
+            db=db,
+            user_id=user_id,
+            task_date=task_date,
+            start_time=start_time,
+            end_time=end_time,
+            is_recurring=is_recurring,
+            recurrence_pattern=recurrence_pattern,
+        )
+
     task = ScheduledTask(
         user_id=user_id,
         title=title,
@@ -36,6 +90,8 @@ def create_scheduled_task(
     db.add(task)
     db.commit()
     db.refresh(task)
+    reminders.task_saved(task)
+    publish_change(user_id=user_id, entity="scheduled_task", op="create", obj=task)
     return task
 
 
@@ -62,6 +118,13 @@ def get_scheduled_tasks_for_week(
     return tasks
 
 
+# module-level so its compiled form is reused across calls
+_TASK_BY_ID = select(ScheduledTask).where(
+    ScheduledTask.id == bindparam("task_id"),
+    ScheduledTask.user_id == bindparam("user_id"),
+)
+
+
 def get_scheduled_task(
     *,
     db: Session,
@@ -71,14 +134,10 @@ def get_scheduled_task(
     """
     Get a single scheduled task by ID.
     """
-    task = (
-        db.query(ScheduledTask)
-        .filter(
-            ScheduledTask.id == task_id,
-            ScheduledTask.user_id == user_id,
-        )
-        .one_or_none()
-    )
+    task = db.execute(
+        _TASK_BY_ID,
+        {"task_id": task_id, "user_id": user_id},
+    ).scalar_one_or_none()
 
     if task is None:
         raise ScheduledTaskNotFound("Scheduled task not found.")
@@ -99,12 +158,38 @@ def update_scheduled_task(
     is_recurring: Optional[bool] = None,
     recurrence_pattern: Optional[str] = None,
     is_completed: Optional[bool] = None,
+    allow_overlap: bool = False,
 ) -> ScheduledTask:
     """
     Update a scheduled task.
+
+    Rescheduling is checked for overlaps like create_scheduled_task.
     """
     task = get_scheduled_task(db=db, task_id=task_id, user_id=user_id)
 
+    rescheduled = any(
+        value is not None
+        for value in (task_date, start_time, end_time, is_recurring, recurrence_pattern)
+    )
+    if rescheduled:
+        new_start = start_time if start_time is not None else task.start_time
+        new_end = end_time if end_time is not None else task.end_time
+        if new_end <= new_start:
+            raise ValueError("end_time must be after start_time.")
+        if not allow_overlap:
+            _check_slot(
+                db=db,
+                user_id=user_id,
+                task_date=task_date if task_date is not None else task.task_date,
+                start_time=new_start,
+                end_time=new_end,
+                is_recurring=is_recurring if is_recurring is not None else task.is_recurring,
+                recurrence_pattern=(
+                    recurrence_pattern if recurrence_pattern is not None else task.recurrence_pattern
+                ),
+                exclude_task_id=task.id,
+            )
+
     if title is not None:
         task.title = title
     if description is not None:
@@ -126,8 +211,11 @@ def update_scheduled_task(
         else:
             task.completed_at = None
 
+    changed = changed_fields(task)
     db.commit()
     db.refresh(task)
+    reminders.task_saved(task)
+    publish_change(user_id=user_id, entity="scheduled_task", op="update", obj=task, changed=changed)
     return task
 
 
@@ -143,3 +231,5 @@ def delete_scheduled_task(
     task = get_scheduled_task(db=db, task_id=task_id, user_id=user_id)
     db.delete(task)
     db.commit()
+    reminders.task_deleted(user_id, task_id)
+    publish_change(user_id=user_id, entity="scheduled_task", op="delete", entity_id=task_id)
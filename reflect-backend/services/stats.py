@@ -2,6 +2,7 @@ from datetime import date, timedelta
 from typing import Dict
 from sqlalchemy.orm import Session
 from models import DailyReflection
+from services.archive import get_archived_reflection_dates, reaches_archive
 
 
 def get_user_stats(*, db: Session, user_id: int) -> Dict:
@@ -16,7 +17,11 @@ def get_user_stats(*, db: Session, user_id: int) -> Dict:
         .all()
     )
 
-    total_reflections = len(reflections)
+    reflection_dates = {r.reflection_date for r in reflections}
+    if reaches_archive(None):
+        reflection_dates.update(get_archived_reflection_dates(db=db, user_id=user_id))
+
+    total_reflections = len(reflection_dates)
 
     if total_reflections == 0:
         return {
@@ -30,8 +35,6 @@ def get_user_stats(*, db: Session, user_id: int) -> Dict:
     today = date.today()
     check_date = today
 
-    reflection_dates = {r.reflection_date for r in reflections}
-
     # Check if there's a reflection today or yesterday to start the streak
     if today in reflection_dates:
         current_streak = 1
@@ -0,0 +1,347 @@
+"""
+Per-entry text analytics: a lexicon mood score, word counts and top terms.
+
+Analysis runs once per write, in the journal and reflection services, and
+is stored per entry (TextAnalytics). Each entry's numbers are also added
+to a per-day and a per-week AnalyticsRollup of its user, and taken out
+again when the entry changes or is deleted, so the trend endpoints read
+only the rollups. backfill_text_analytics.py analyzes historical rows.
+"""
+import json
+import os
+from collections import Counter
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from models import AnalyticsRollup, TextAnalytics
+from services.html_text import content_terms, html_to_text, words
+
+# bump when the lexicon or the scoring changes; the backfill redoes rows
+# written by an older version
+ANALYZER_VERSION = 1
+
+# most frequent terms kept per entry; rollups merge these
+ENTRY_TERMS = int(os.environ.get("ANALYTICS_ENTRY_TERMS", "20"))
+
+PERIODS = ("day", "week")
+
+# longest range a trend request may cover, per period
+MAX_TREND_DAYS = {"day": 366, "week": 5 * 366}
+
+# small hand-made lexicon: word -> weight, 1 (mild) to 3 (strong)
+POSITIVE_WORDS = {
+    "good": 1, "nice": 1, "fine": 1, "okay": 1, "calm": 2, "relaxed": 2,
+    "rested": 2, "productive": 2, "focused": 2, "motivated": 2, "hopeful": 2,
+    "glad": 2, "happy": 2, "grateful": 2, "thankful": 2, "proud": 2,
+    "confident": 2, "energized": 2, "enjoyed": 2, "fun": 2, "peaceful": 2,
+    "progress": 1, "better": 1, "accomplished": 2, "satisfied": 2,
+    "excited": 3, "great": 3, "amazing": 3, "wonderful": 3, "love": 3,
+    "loved": 3, "joy": 3, "fantastic": 3, "awesome": 3, "thrilled": 3,
+}
+
+NEGATIVE_WORDS = {
+    "bad": 1, "meh": 1, "bored": 1, "slow": 1, "late": 1, "worse": 1,
+    "tired": 2, "exhausted": 2, "stressed": 2, "stress": 2, "anxious": 2,
+    "anxiety": 2, "worried": 2, "sad": 2, "lonely": 2, "frustrated": 2,
+    "annoyed": 2, "overwhelmed": 2, "distracted": 2, "procrastinated": 2,
+    "unproductive": 2, "sick": 2, "hurt": 2, "upset": 2, "failed": 2,
+    "angry": 3, "awful": 3, "terrible": 3, "miserable": 3, "hate": 3,
+    "hated": 3, "depressed": 3, "panic": 3, "horrible": 3,
+}
+
+# a sentiment word right after one of these counts for the other side
+NEGATIONS = frozenset(
+    "not no never don't didn't doesn't isn't wasn't weren't can't couldn't "
+    "won't wouldn't hardly barely without".split()
+)
+NEGATION_WINDOW = 2
+
+
+class InvalidAnalyticsRange(Exception):
+    pass
+
+
+def week_start(day: date) -> date:
+    """Monday of the week `day` falls in."""
+    return day - timedelta(days=day.weekday())
+
+
+def mood_score(positive: int, negative: int) -> Optional[float]:
+    """Net sentiment in [-1, 1], or None when no lexicon word was seen."""
+    if positive + negative == 0:
+        return None
+    return round((positive - negative) / (positive + negative), 4)
+
+
+def analyze_text(text: str) -> Dict:
+    """
+    Analyze plain text: word count, positive and negative lexicon weights,
+    the mood they give and the ENTRY_TERMS most frequent content terms.
+    """
+    tokens = words(text or "")
+    positive = negative = 0
+    since_negation = NEGATION_WINDOW + 1
+
+    for word in tokens:
+        if word in NEGATIONS:
+            since_negation = 0
+            continue
+        since_negation += 1
+
+        weight = POSITIVE_WORDS.get(word, 0) - NEGATIVE_WORDS.get(word, 0)
+        if since_negation <= NEGATION_WINDOW:
+            weight = -weight
+        if weight > 0:
+            positive += weight
+        else:
+            negative -= weight
+
+    return {
+        "words": len(tokens),
+        "positive": positive,
+        "negative": negative,
+        "mood": mood_score(positive, negative),
+        "terms": dict(Counter(content_terms(text or "")).most_common(ENTRY_TERMS)),
+    }
+
+
+def reflection_text(fields: Iterable[Optional[str]]) -> str:
+    """Plain text of a reflection's HTML fields, one after another."""
+    return "\n".join(html_to_text(field) for field in fields if field)
+
+
+# -- rollups --
+
+def _rollups_for(db: Session, user_id: int, day: date, cache: Dict) -> List[AnalyticsRollup]:
+    """The day and week rollups `day` counts towards, new ones unsaved."""
+    found = []
+    for period, start in (("day", day), ("week", week_start(day))):
+        key = (user_id, period, start)
+        if key not in cache:
+            cache[key] = (
+                db.query(AnalyticsRollup)
+                .filter(
+                    AnalyticsRollup.user_id == user_id,
+                    AnalyticsRollup.period == period,
+                    AnalyticsRollup.period_start == start,
+                )
+                .one_or_none()
+            ) or AnalyticsRollup(
+                user_id=user_id, period=period, period_start=start,
+                entries=0, words=0, positive=0, negative=0, terms="{}",
+            )
+        found.append(cache[key])
+    return found
+
+
+def _apply(db: Session, row: TextAnalytics, sign: int, cache: Dict) -> None:
+    """Add (sign=1) or take out (sign=-1) one entry's numbers from its rollups."""
+    terms = json.loads(row.terms)
+    for rollup in _rollups_for(db, row.user_id, row.day, cache):
+        rollup.entries += sign
+        rollup.words += sign * row.words
+        rollup.positive += sign * row.positive
+        rollup.negative += sign * row.negative
+        merged = Counter(json.loads(rollup.terms))
+        for term, count in terms.items():
+            merged[term] += sign * count
+        rollup.terms = json.dumps({term: n for term, n in merged.items() if n > 0})
+
+
+def _save_rollups(db: Session, cache: Dict) -> None:
+    # rollups left without entries are dropped instead of kept at zero
+    for rollup in cache.values():
+        if rollup.entries > 0:
+            db.add(rollup)
+        elif sa_inspect(rollup).persistent:
+            db.delete(rollup)
+    db.flush()
+
+
+def record_analysis(
+    *,
+    db: Session,
+    user_id: int,
+    source: str,
+    source_id: int,
+    day: date,
+    text: str,
+) -> TextAnalytics:
+    """
+    Analyze `text` for a journal entry or reflection and fold the result
+    into the user's rollups, replacing an earlier analysis of the same row.
+
+    Flushes but does not commit: callers run it inside their own write so
+    the entry and its analytics are saved together.
+    """
+    result = analyze_text(text)
+    cache = {}
+
+    row = (
+        db.query(TextAnalytics)
+        .filter(TextAnalytics.source == source, TextAnalytics.source_id == source_id)
+        .one_or_none()
+    )
+    if row is None:
+        row = TextAnalytics(user_id=user_id, source=source, source_id=source_id)
+        db.add(row)
+    else:
+        _apply(db, row, -1, cache)
+
+    row.day = day
+    row.words = result["words"]
+    row.positive = result["positive"]
+    row.negative = result["negative"]
+    row.mood = result["mood"]
+    row.terms = json.dumps(result["terms"])
+    row.analyzer_version = ANALYZER_VERSION
+
+    _apply(db, row, 1, cache)
+    _save_rollups(db, cache)
+    return row
+
+
+def remove_analysis(*, db: Session, source: str, source_id: int) -> None:
+    """Drop a deleted row's analysis and take it out of the rollups."""
+    row = (
+        db.query(TextAnalytics)
+        .filter(TextAnalytics.source == source, TextAnalytics.source_id == source_id)
+        .one_or_none()
+    )
+    if row is None:
+        return
+    cache = {}
+    _apply(db, row, -1, cache)
+    db.delete(row)
+    _save_rollups(db, cache)
+
+
+def rebuild_rollups(*, db: Session, user_ids: Iterable[int]) -> int:
+    """
+    Recompute the rollups of `user_ids` from their TextAnalytics rows.
+
+    For the backfill, which writes analyses in bulk without touching the
+    rollups. Commits; returns the number of rollups written.
+    """
+    written = 0
+    for user_id in user_ids:
+        db.query(AnalyticsRollup).filter(AnalyticsRollup.user_id == user_id).delete()
+        cache = {}
+        rows = (
+            db.query(TextAnalytics)
+            .filter(TextAnalytics.user_id == user_id)
+            .yield_per(1000)
+        )
+        for row in rows:
+            _apply(db, row, 1, cache)
+        db.add_all(cache.values())
+        db.commit()
+        written += len(cache)
+    return written
+
+
+# -- trends, read from the rollups only --
+
+def _check_range(start_date: date, end_date: date, period: str) -> None:
+    if period not in PERIODS:
+        raise InvalidAnalyticsRange(f"period must be one of: {', '.join(PERIODS)}.")
+    if start_date > end_date:
+        raise InvalidAnalyticsRange("Start date cannot be after end date.")
+    if (end_date - start_date).days >= MAX_TREND_DAYS[period]:
+        raise InvalidAnalyticsRange(
+            f"Range too long: at most {MAX_TREND_DAYS[period]} days by {period}."
+        )
+
+
+def get_mood_trend(
+    *,
+    db: Session,
+    user_id: int,
+    start_date: date,
+    end_date: date,
+    period: str = "day",
+) -> List[Dict]:
+    """
+    Mood, entry and word counts per day or week in the range, oldest
+    first. Periods without entries are left out; weeks are those starting
+    on the Monday on or before start_date up to end_date.
+    """
+    _check_range(start_date, end_date, period)
+    first = week_start(start_date) if period == "week" else start_date
+
+    rollups = (
+        db.query(AnalyticsRollup)
+        .filter(
+            AnalyticsRollup.user_id == user_id,
+            AnalyticsRollup.period == period,
+            AnalyticsRollup.period_start >= first,
+            AnalyticsRollup.period_start <= end_date,
+        )
+        .order_by(AnalyticsRollup.period_start)
+        .all()
+    )
+    return [
+        {
+            "period_start": rollup.period_start.isoformat(),
+            "entries": rollup.entries,
+            "words": rollup.words,
+            "mood": mood_score(rollup.positive, rollup.negative),
+        }
+        for rollup in rollups
+    ]
+
+
+def get_top_terms(
+    *,
+    db: Session,
+    user_id: int,
+    start_date: date,
+    end_date: date,
+    limit: int = 20,
+) -> List[Dict]:
+    """
+    The most used terms between start_date and end_date, inclusive.
+
+    Weeks that lie wholly in the range are read from their week rollup and
+    the days around them from day rollups, so a long range reads about one
+    row per week.
+    """
+    _check_range(start_date, end_date, "week")
+
+    first_week = start_date if start_date.weekday() == 0 else week_start(start_date) + timedelta(days=7)
+    last_week = week_start(end_date + timedelta(days=1)) - timedelta(days=7)
+
+    query = db.query(AnalyticsRollup.terms).filter(AnalyticsRollup.user_id == user_id)
+    if first_week <= last_week:
+        parts = [
+            query.filter(
+                AnalyticsRollup.period == "week",
+                AnalyticsRollup.period_start.between(first_week, last_week),
+            ),
+            query.filter(
+                AnalyticsRollup.period == "day",
+                AnalyticsRollup.period_start >= start_date,
+                AnalyticsRollup.period_start < first_week,
+            ),
+            query.filter(
+                AnalyticsRollup.period == "day",
+                AnalyticsRollup.period_start > last_week + timedelta(days=6),
+                AnalyticsRollup.period_start <= end_date,
+            ),
+        ]
+    else:
+        parts = [
+            query.filter(
+                AnalyticsRollup.period == "day",
+                AnalyticsRollup.period_start.between(start_date, end_date),
+            )
+        ]
+
+    totals = Counter()
+    for part in parts:
+        for (terms,) in part:
+            totals.update(json.loads(terms))
+    return [{"term": term, "count": count} for term, count in totals.most_common(limit)]
@@ -0,0 +1,127 @@
+"""
+Split the monolithic app.db into shard files for DB_SHARD_MODE=hash|per_user.
+
+Rows are copied verbatim (primary keys included, so journal entries keep
+pointing at their reflections) into the shard that owns their user_id.
+Tables without a user_id column hold cross-user bookkeeping and are not
+copied. The source database is left untouched.
+
+With ARCHIVE_ENABLED=1 the archive tier is split the same way: rows of
+"<source>.archive.db" go to the archive file next to their shard, and each
+shard's id sequences are then raised above its archived ids.
+
+Usage:
+    DB_SHARD_MODE=hash DB_SHARD_COUNT=8 python split_shards.py [--source app.db]
+"""
+import argparse
+import os
+import sqlite3
+from collections import defaultdict
+
+from db import (
+    ARCHIVE_ENABLED,
+    ArchiveBase,
+    Base,
+    DB_SHARD_MODE,
+    archive_path_for,
+    reserve_archived_ids,
+    shard_router,
+)
+
+
+def _copy_table(source, table, router, batch_size: int):
+    """Copy one table's rows into their shards; returns rows copied, None if the source lacks it."""
+    schema = table.schema or "main"
+    qualified_name = f"{schema}.{table.name}"
+    exists = source.execute(
+        f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+    ).fetchone()
+    if not exists:
+        return None
+
+    # only columns present on both sides; older sources may lack new ones
+    source_columns = [row[1] for row in source.execute(f"PRAGMA {schema}.table_info({table.name})")]
+    columns = [name for name in source_columns if name in table.columns]
+    column_list = ", ".join(f'"{name}"' for name in columns)
+    placeholders = ", ".join("?" for _ in columns)
+    user_index = columns.index("user_id")
+
+    cursor = source.execute(f"SELECT {column_list} FROM {qualified_name} ORDER BY id")
+    total = 0
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+
+        by_shard = defaultdict(list)
+        for row in rows:
+            by_shard[router.shard_key(row[user_index])].append(row)
+
+        for key, shard_rows in by_shard.items():
+            shard_engine = router.engine_for_key(key)
+            with shard_engine.begin() as conn:
+                conn.exec_driver_sql(
+                    f"INSERT OR REPLACE INTO {qualified_name} ({column_list}) VALUES ({placeholders})",
+                    shard_rows,
+                )
+        total += len(rows)
+    return total
+
+
+def split(source_path: str, batch_size: int = 1000, router=None) -> dict:
+    """
+    Copy every per-user table into the shards of `router` (the configured
+    shard_router by default); returns {table: rows copied}. Archive tables
+    are included when ARCHIVE_ENABLED is set.
+    """
+    router = router or shard_router
+    source = sqlite3.connect(source_path)
+    tables = list(Base.metadata.sorted_tables)
+    archive_path = archive_path_for(source_path)
+    if os.path.exists(archive_path):
+        if ARCHIVE_ENABLED:
+            source.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+            tables += ArchiveBase.metadata.sorted_tables
+        else:
+            print(f"not splitting {archive_path}: ARCHIVE_ENABLED is off")
+    copied = {}
+
+    for table in tables:
+        if "user_id" not in table.columns:
+            print(f"skipping {table.name} (no user_id)")
+            continue
+
+        total = _copy_table(source, table, router, batch_size)
+        if total is None:
+            continue
+        copied[table.name] = total
+        print(f"{table.name}: {total} rows")
+
+    source.close()
+
+    if ARCHIVE_ENABLED:
+        # new rows in a shard must not take the ids of its archived rows
+        for key in router.shard_keys():
+            for table in ArchiveBase.metadata.sorted_tables:
+                if "archive_of" in table.info:
+                    reserve_archived_ids(table, bind=router.engine_for_key(key))
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split app.db into shard files")
+    parser.add_argument("--source", default="app.db")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    if shard_router is None:
+        raise SystemExit(f"DB_SHARD_MODE is {DB_SHARD_MODE!r}; set it to 'hash' or 'per_user'.")
+
+    import models  # noqa: F401  registers the tables on Base.metadata
+
+    split(args.source, batch_size=args.batch_size)
+    print(f"shards in {shard_router.directory}: {', '.join(shard_router.shard_keys())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import tempfile
+
+import profiling
+import services.admission as admission
+from asgi import application
+from db import dispose_async_engine
+from main import create_app
+from services.admission import EXPENSIVE, STANDARD, AdmissionController, TokenBucket
+
+
+async def call_asgi(path, headers):
+    """Run one GET through the ASGI app; returns (status, headers, body)."""
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": b"",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await application(scope, receive, send)
+    start = sent[0]
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, sent[1]["body"]
+
+
+async def asgi_checks():
+    print("\n=== The ASGI morning insights route is admitted too ===")
+    in_flight = admission._controller.snapshot()["in_flight"]
+    headers = {"X-User-Id": "9403"}
+    statuses = [(await call_asgi("/api/morning-insights", headers))[0] for _ in range(admission.ADMISSION_EXPENSIVE_BURST)]
+    assert statuses == [200] * admission.ADMISSION_EXPENSIVE_BURST
+    status, response_headers, body = await call_asgi("/api/morning-insights", headers)
+    print(status, response_headers.get("retry-after"), body)
+    assert status == 429 and int(response_headers["retry-after"]) >= 1
+
+    admission._controller.shed_concurrency = 0
+    try:
+        status, response_headers, _ = await call_asgi("/api/morning-insights", {"X-User-Id": "9404"})
+        assert status == 503
+        assert response_headers["retry-after"] == str(admission.ADMISSION_SHED_RETRY_AFTER_S)
+    finally:
+        admission._controller.shed_concurrency = admission.ADMISSION_SHED_CONCURRENCY
+    # every admitted request was released again
+    assert admission._controller.snapshot()["in_flight"] == in_flight
+
+    print("\n=== ... and profiled with the admin header ===")
+    saved = profiling.PROFILE_ADMIN_TOKEN, profiling.PROFILE_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        profiling.PROFILE_ADMIN_TOKEN, profiling.PROFILE_DIR = "secret", tmp
+        try:
+            status, response_headers, _ = await call_asgi(
+                "/api/morning-insights", {"X-User-Id": "9405", profiling.PROFILE_HEADER: "secret"}
+            )
+            assert status == 200
+            assert os.path.exists(os.path.join(tmp, response_headers["x-profile-id"] + ".pstats"))
+            assert "x-profile-id" not in (await call_asgi("/api/morning-insights", {"X-User-Id": "9405"}))[1]
+        finally:
+            profiling.PROFILE_ADMIN_TOKEN, profiling.PROFILE_DIR = saved
+    # as at lifespan shutdown; the driver's thread would keep the process alive
+    await dispose_async_engine()
+
+
+def main():
+    print("=== Token bucket refills at its rate ===")
+    bucket = TokenBucket(rate=2.0, burst=2, now=0.0)
+    assert bucket.try_take(0.0) == 0.0
+    assert bucket.try_take(0.0) == 0.0
+    assert bucket.try_take(0.0) == 0.5
+    assert bucket.try_take(0.5) == 0.0
+
+    print("\n=== Expensive requests are shed while the process is busy ===")
+    controller = AdmissionController(
+        limits={EXPENSIVE: (1.0, 5), STANDARD: (10.0, 10)},
+        shed_concurrency=2,
+        shed_retry_after=3,
+    )
+    assert controller.admit(1, STANDARD).status is None
+    assert controller.admit(2, STANDARD).status is None
+    shed = controller.admit(3, EXPENSIVE)
+    assert (shed.status, shed.retry_after) == (503, 3)
+    assert controller.admit(3, STANDARD).status is None   # cheap requests still go through
+    controller.release()
+    controller.release()
+    controller.release()
+    assert controller.admit(3, EXPENSIVE).status is None
+    print(controller.snapshot())
+
+    print("\n=== Per-user limit on an expensive route ===")
+    app = create_app()
+    client = app.test_client()
+    busy = {"X-User-Id": "9400"}
+    other = {"X-User-Id": "9401"}
+
+    statuses = [client.get("/api/stats", headers=busy).status_code for _ in range(admission.ADMISSION_EXPENSIVE_BURST)]
+    assert statuses == [200] * admission.ADMISSION_EXPENSIVE_BURST
+    limited = client.get("/api/stats", headers=busy)
+    print(limited.status_code, limited.headers.get("Retry-After"), limited.get_json())
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 1
+
+    # other users and cheap routes are unaffected
+    assert client.get("/api/stats", headers=other).status_code == 200
+    assert client.get("/api/goals", headers=busy).status_code == 200
+    assert client.get("/api/journal-entries?date=2024-01-01", headers=busy).status_code == 200
+    assert client.get("/api/journal-entries", headers=busy).status_code == 429
+
+    print("\n=== Shedding through the app ===")
+    admission._controller.shed_concurrency = 0
+    try:
+        shed = client.get("/api/stats", headers={"X-User-Id": "9402"})
+        assert shed.status_code == 503
+        assert shed.headers["Retry-After"] == str(admission.ADMISSION_SHED_RETRY_AFTER_S)
+        assert client.get("/api/goals", headers={"X-User-Id": "9402"}).status_code == 200
+    finally:
+        admission._controller.shed_concurrency = admission.ADMISSION_SHED_CONCURRENCY
+
+    metrics = client.get("/api/metrics/admission", headers=other).get_json()
+    print(metrics)
+    assert metrics["counters"]["expensive.rate_limited"] == 2
+    assert metrics["counters"]["expensive.shed"] == 1
+    # finished requests are released; only the metrics request itself is in flight
+    assert metrics["in_flight"] == 1
+
+    asyncio.run(asgi_checks())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import os
+from datetime import date, timedelta
+
+# must be set before db.py is imported
+os.environ.setdefault("ARCHIVE_ENABLED", "1")
+
+from sqlalchemy import Text, select, type_coerce
+
+from column_types import is_compressed
+from db import SessionLocal, engine, init_db
+from models import ArchivedJournalEntry, ArchivedReflection, DailyReflection, JournalEntry
+from services.archive import archive_old_rows, cold_cutoff
+from services.journal_entries import (
+    create_journal_entry,
+    get_all_journal_entries,
+    get_journal_entries_for_date,
+    update_journal_entry,
+)
+from services.reflections import (
+    create_or_update_daily_reflection,
+    get_reflection_for_date,
+    get_reflections_in_range,
+)
+from services.stats import get_user_stats
+
+
+def main():
+    print("=== Creating tables ===")
+    init_db()
+    # tables created before the hot tables asked for AUTOINCREMENT are rebuilt
+    with engine.connect() as conn:
+        for name in ("journal_entries", "daily_reflections"):
+            sql = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE name = ?", (name,)).scalar()
+            assert "AUTOINCREMENT" in sql, sql
+
+    db = SessionLocal()
+
+    try:
+        user_id = 9100
+        for model in (JournalEntry, DailyReflection, ArchivedJournalEntry, ArchivedReflection):
+            db.query(model).filter(model.user_id.in_([user_id, user_id + 1])).delete()
+        db.commit()
+
+        cutoff = cold_cutoff()
+        old_day = cutoff - timedelta(days=10)
+        hot_day = date.today() - timedelta(days=1)
+        long_text = "A long day of work on the archive. " * 20
+
+        print("\n=== Creating old and recent rows ===")
+        old_reflection = create_or_update_daily_reflection(
+            db=db,
+            user_id=user_id,
+            reflection_date=old_day,
+            summary=long_text,
+            accomplishments="Old accomplishments",
+            improvements_to_make=None,
+        )
+        old_entry = create_journal_entry(
+            db=db,
+            user_id=user_id,
+            content=f"<p>{long_text}</p>",
+            entry_date=old_day,
+            reflection_id=old_reflection.id,
+        )
+        # the ORM objects go stale once their rows leave the hot tables
+        old_reflection_id, old_entry_id = old_reflection.id, old_entry.id
+        create_or_update_daily_reflection(
+            db=db,
+            user_id=user_id,
+            reflection_date=hot_day,
+            summary="Recent",
+            accomplishments=None,
+            improvements_to_make=None,
+        )
+        create_journal_entry(db=db, user_id=user_id, content="<p>Recent entry</p>", entry_date=hot_day)
+
+        print("\n=== Archiving ===")
+        moved = archive_old_rows(db=db, batch_size=1)
+        print(moved)
+        assert moved["journal_entries"] >= 1
+        assert moved["daily_reflections"] >= 1
+        assert db.query(DailyReflection).filter(DailyReflection.user_id == user_id).count() == 1
+        assert db.query(JournalEntry).filter(JournalEntry.user_id == user_id).count() == 1
+
+        stored = db.execute(
+            select(type_coerce(ArchivedReflection.summary, Text))
+            .where(ArchivedReflection.id == old_reflection_id)
+        ).scalar_one()
+        assert is_compressed(stored)
+
+        print("\n=== Reading through to the archive ===")
+        reflection = get_reflection_for_date(db=db, user_id=user_id, reflection_date=old_day)
+        print(reflection)
+        assert reflection.id == old_reflection_id
+        assert reflection.summary == long_text
+
+        in_range = get_reflections_in_range(
+            db=db,
+            user_id=user_id,
+            start_date=old_day,
+            end_date=hot_day,
+        )
+        print(in_range)
+        assert [r.reflection_date for r in in_range] == [old_day, hot_day]
+
+        entries = get_journal_entries_for_date(db=db, user_id=user_id, entry_date=old_day)
+        assert [e.id for e in entries] == [old_entry_id]
+        assert entries[0].content == f"<p>{long_text}</p>"
+
+        everything = get_all_journal_entries(db=db, user_id=user_id, with_content=False)
+        assert [e.entry_date for e in everything] == [hot_day, old_day]
+
+        stats = get_user_stats(db=db, user_id=user_id)
+        print(stats)
+        assert stats["total_reflections"] == 2
+
+        print("\n=== Editing an archived entry thaws it ===")
+        updated = update_journal_entry(
+            db=db,
+            entry_id=old_entry_id,
+            user_id=user_id,
+            content="<p>Rewritten</p>",
+        )
+        assert updated.id == old_entry_id
+        assert db.query(ArchivedJournalEntry).filter(ArchivedJournalEntry.user_id == user_id).count() == 0
+        assert db.query(ArchivedReflection).filter(ArchivedReflection.user_id == user_id).count() == 0
+        assert get_journal_entries_for_date(db=db, user_id=user_id, entry_date=old_day)[0].content == "<p>Rewritten</p>"
+
+        print("\n=== Archiving again ===")
+        print(archive_old_rows(db=db))
+        assert db.query(JournalEntry).filter(JournalEntry.user_id == user_id).count() == 1
+
+        print("\n=== Archived ids are never handed out again ===")
+        # the newest rows in the hot tables, archived right away
+        newest_entry = create_journal_entry(db=db, user_id=user_id, content="<p>Newest</p>", entry_date=old_day)
+        newest_reflection = create_or_update_daily_reflection(
+            db=db,
+            user_id=user_id,
+            reflection_date=old_day - timedelta(days=1),
+            summary="Newest",
+            accomplishments=None,
+            improvements_to_make=None,
+        )
+        newest_entry_id, newest_reflection_id = newest_entry.id, newest_reflection.id
+        archive_old_rows(db=db)
+        assert db.get(ArchivedJournalEntry, newest_entry_id) is not None
+        assert db.get(ArchivedReflection, newest_reflection_id) is not None
+
+        other_entry = create_journal_entry(db=db, user_id=user_id + 1, content="<p>Someone else</p>", entry_date=hot_day)
+        other_reflection = create_or_update_daily_reflection(
+            db=db,
+            user_id=user_id + 1,
+            reflection_date=hot_day,
+            summary="Someone else",
+            accomplishments=None,
+            improvements_to_make=None,
+        )
+        print(newest_entry_id, other_entry.id, newest_reflection_id, other_reflection.id)
+        assert other_entry.id > newest_entry_id
+        assert other_reflection.id > newest_reflection_id
+
+    finally:
+        db.close()
+        print("\n=== DB session closed ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+from datetime import date, timedelta
+
+from sqlalchemy import event
+
+from db import SessionLocal, engine, init_db
+from models import Goal, JournalEntry, ScheduledTask
+from main import create_app
+from services.bulk import BulkTargetNotFound, BulkTaskOverlap, InvalidBulkOperation, apply_bulk_operations
+from services.goals import create_goal
+from services.task_intervals import find_free_slots
+
+
+def task(day, start, end, **extra):
+    return {
+        "op": "create",
+        "type": "scheduled_task",
+        "data": {"title": f"{start}-{end}", "task_date": day.isoformat(), "start_time": start, "end_time": end, **extra},
+    }
+
+
+def main():
+    print("=== Creating tables ===")
+    init_db()
+
+    db = SessionLocal()
+
+    try:
+        user_id = 9200
+        for model in (ScheduledTask, Goal, JournalEntry):
+            db.query(model).filter(model.user_id == user_id).delete()
+        db.commit()
+
+        monday = date.today() + timedelta(days=7 - date.today().weekday())
+        goal_a = create_goal(db=db, user_id=user_id, description="Goal A")
+        goal_b = create_goal(db=db, user_id=user_id, description="Goal B")
+
+        print("\n=== Planning a week in one request ===")
+        operations = [
+            {
+                "op": "create",
+                "type": "scheduled_task",
+                "data": {
+                    "title": f"Task {day}",
+                    "task_date": (monday + timedelta(days=day)).isoformat(),
+                    "start_time": "09:00",
+                    "end_time": "10:00",
+                },
+            }
+            for day in range(5)
+        ]
+        operations += [
+            {"op": "update", "type": "goal", "id": goal_a.id, "data": {"status": "completed"}},
+            {"op": "delete", "type": "goal", "id": goal_b.id},
+            {
+                "op": "create",
+                "type": "journal_entry",
+                "data": {"content": "<p>Planned the week</p>", "entry_date": date.today().isoformat()},
+            },
+        ]
+
+        commits = []
+
+        def count_commit(conn):
+            commits.append(1)
+
+        event.listen(engine, "commit", count_commit)
+        try:
+            results = apply_bulk_operations(db=db, user_id=user_id, operations=operations)
+        finally:
+            event.remove(engine, "commit", count_commit)
+        print([(r.op, r.type, r.id) for r in results])
+
+        assert len(results) == len(operations)
+        assert all(r.id for r in results)
+        assert len(commits) == 1
+        assert results[5].obj.status == "completed"
+        assert results[6].obj is None
+        assert results[7].obj.word_count == 3
+        assert db.query(ScheduledTask).filter(ScheduledTask.user_id == user_id).count() == 5
+        assert db.query(Goal).filter(Goal.user_id == user_id).count() == 1
+
+        print("\n=== Invalid operation rejects the whole batch ===")
+        try:
+            apply_bulk_operations(db=db, user_id=user_id, operations=[
+                {"op": "delete", "type": "scheduled_task", "id": results[0].id},
+                {"op": "create", "type": "goal", "data": {"description": "  "}},
+            ])
+            assert False, "expected InvalidBulkOperation"
+        except InvalidBulkOperation as e:
+            print(e, "at", e.index)
+            assert e.index == 1
+
+        print("\n=== Missing target rolls back earlier operations ===")
+        try:
+            apply_bulk_operations(db=db, user_id=user_id, operations=[
+                {"op": "delete", "type": "scheduled_task", "id": results[0].id},
+                {"op": "update", "type": "goal", "id": goal_b.id, "data": {"status": "active"}},
+            ])
+            assert False, "expected BulkTargetNotFound"
+        except BulkTargetNotFound as e:
+            print(e, "at", e.index)
+            assert e.index == 1
+        assert db.query(ScheduledTask).filter(ScheduledTask.user_id == user_id).count() == 5
+
+        print("\n=== Tasks in a batch follow the scheduling rules ===")
+        later = monday + timedelta(days=14)
+        try:
+            # the second overlaps the first, which is not saved yet
+            apply_bulk_operations(db=db, user_id=user_id, operations=[
+                task(later, "09:00", "11:00"), task(later, "10:00", "10:30"),
+            ])
+            assert False, "expected BulkTaskOverlap"
+        except BulkTaskOverlap as e:
+            print(e, "at", e.index)
+            assert e.index == 1 and e.conflicts[0][1].title == "09:00-11:00"
+
+        for operations in (
+            [task(later, "15:00", "14:00")],
+            [{"op": "update", "type": "scheduled_task", "id": results[0].id, "data": {"end_time": "08:00"}}],
+        ):
+            try:
+                apply_bulk_operations(db=db, user_id=user_id, operations=operations)
+                assert False, "expected InvalidBulkOperation"
+            except InvalidBulkOperation as e:
+                assert not isinstance(e, BulkTaskOverlap) and e.index == 0
+        assert db.query(ScheduledTask).filter(ScheduledTask.task_date == later).count() == 0
+
+        # moving a task away in the batch frees its slot for a later create
+        moved = apply_bulk_operations(db=db, user_id=user_id, operations=[
+            {"op": "update", "type": "scheduled_task", "id": results[0].id, "data": {"start_time": "13:00", "end_time": "14:00"}},
+            task(monday, "09:00", "10:00"),
+            task(monday, "09:30", "10:30", allow_overlap=True),
+        ])
+        assert moved[0].obj.start_time.hour == 13
+
+        client = create_app().test_client()
+        response = client.post("/api/bulk", json={"operations": [
+            task(later, "09:00", "11:00"), task(later, "10:00", "10:30"),
+        ]}, headers={"X-User-Id": str(user_id)})
+        print(response.status_code, response.get_json()["error"])
+        assert response.status_code == 409 and response.get_json()["index"] == 1
+        assert response.get_json()["conflicts"][0]["date"] == later.isoformat()
+
+        # free slots stay disjoint with the batch-written tasks
+        slots = find_free_slots(db=db, user_id=user_id, start_date=monday, end_date=monday, duration_minutes=30)
+        windows = [(slot["start_time"], slot["end_time"]) for slot in slots]
+        print(windows)
+        assert all(a[1] <= b[0] for a, b in zip(windows, windows[1:]))
+
+        for model in (ScheduledTask, Goal, JournalEntry):
+            db.query(model).filter(model.user_id == user_id).delete()
+        db.commit()
+
+    finally:
+        db.close()
+        print("\n=== DB session closed ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import os
+import time
+
+import services.ai_insights as ai_insights
+from services.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+def main():
+    print("=== Breaker opens after repeated failures ===")
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=0.2)
+    for _ in range(3):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+    print(breaker.snapshot())
+
+    print("\n=== Half-open probe after the reset timeout ===")
+    time.sleep(0.25)
+    assert breaker.allow_request()       # the probe
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow_request()   # everyone else still short-circuits
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    print(breaker.snapshot())
+
+    print("\n=== Latency budget falls back and fills the cache later ===")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "test-key")
+    ai_insights.INSIGHTS_LATENCY_BUDGET_S = 0.1
+    ai_insights._breaker = CircuitBreaker("anthropic", failure_threshold=2, reset_timeout=60)
+
+    def slow_model(api_key, prompt):
+        time.sleep(0.3)
+        return [{"type": "goal", "title": "Late AI Insight", "message": "...", "color": "blue"}]
+
+    ai_insights._call_model = slow_model
+    late = []
+    goals = [{"description": "Write the report", "deadline": None}]
+
+    started = time.perf_counter()
+    insights = ai_insights.generate_morning_insights(goals, None, on_late_result=late.append)
+    elapsed = time.perf_counter() - started
+    assert elapsed < 0.25
+    assert insights[0]["title"] != "Late AI Insight"
+    print(f"fallback returned after {elapsed:.2f}s")
+
+    time.sleep(0.4)
+    assert late and late[0][0]["title"] == "Late AI Insight"
+    print("late result delivered:", late[0][0]["title"])
+
+    print("\n=== Breaker skips the model after repeated timeouts ===")
+    ai_insights.generate_morning_insights(goals, None)
+    calls_before = ai_insights.get_insights_metrics()["counters"]["upstream_calls"]
+    ai_insights.generate_morning_insights(goals, None)
+    metrics = ai_insights.get_insights_metrics()
+    assert metrics["breaker"]["state"] == OPEN
+    assert metrics["counters"]["upstream_calls"] == calls_before
+    print(metrics)
+
+
+if __name__ == "__main__":
+    main()
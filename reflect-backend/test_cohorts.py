@@ -0,0 +1,90 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from db import SessionLocal, init_db
+from models import DailyReflection
+from services.cohorts import cohort_report, day_number, load_activity, sort_activity, user_streaks
+from services.stats import get_user_stats
+
+
+def array_checks():
+    print("=== Streaks, gaps and retention from arrays ===")
+    today = date(2026, 3, 31)
+    t = day_number(today)
+    # user 1: 3-day run, a gap, then a 2-day run ending yesterday
+    # user 2: one day in February; user 3: five days in a row ending today
+    users = np.array([2, 1, 1, 1, 1, 1, 3, 3, 3, 3, 3, 1])
+    days = np.array([t - 40, t - 10, t - 9, t - 8, t - 2, t - 1, t - 4, t - 3, t - 2, t - 1, t, t - 9])
+    users, days = sort_activity(users, days)
+    assert len(users) == 11  # the duplicate day is dropped
+
+    streaks = user_streaks(users, days, today=t)
+    print({key: value.tolist() for key, value in streaks.items() if key in ("user_id", "total", "longest", "current")})
+    assert streaks["user_id"].tolist() == [1, 2, 3]
+    assert streaks["total"].tolist() == [5, 1, 5]
+    assert streaks["longest"].tolist() == [3, 1, 5]
+    assert streaks["current"].tolist() == [2, 0, 5]
+
+    report = cohort_report(users, days, today=today, weeks=3)
+    print(report["summary"])
+    assert report["summary"]["users_on_streak"] == 2
+    assert report["histograms"]["gap_days"] == {"1": 7, "2": 0, "3": 0, "4-7": 1, "8-14": 0, "15-30": 0, "31-90": 0, "91+": 0}
+    assert report["histograms"]["last_30_days"][-1] == 1
+    feb, mar = report["retention"]
+    assert feb == {"cohort": "2026-02", "users": 1, "retention": [1.0, 0.0, 0.0]}
+    # week 1 has only begun for user 1 and week 2 for nobody
+    assert mar["users"] == 2 and mar["retention"] == [1.0, 1.0, None]
+
+    empty = cohort_report(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), today=today)
+    assert empty["summary"]["users"] == 0 and empty["retention"] == []
+
+
+def database_checks(db):
+    print("\n=== Vectorized stats match get_user_stats ===")
+    today = date.today()
+    histories = {
+        9900: [1, 2, 3, 5, 6, 20],
+        9901: [0, 1, 2, 3],
+        9902: [30, 31, 32, 33, 34, 35, 36, 60],
+    }
+    db.query(DailyReflection).filter(DailyReflection.user_id.in_(histories)).delete()
+    for user_id, ago in histories.items():
+        db.add_all(
+            DailyReflection(user_id=user_id, reflection_date=today - timedelta(days=n), summary="<p>ok</p>")
+            for n in ago
+        )
+    db.commit()
+
+    users, days = load_activity(factories=[SessionLocal])
+    streaks = user_streaks(users, days, today=day_number(today))
+    for user_id in histories:
+        index = int(np.searchsorted(streaks["user_id"], user_id))
+        vectorized = {
+            "current_streak": int(streaks["current"][index]),
+            "longest_streak": int(streaks["longest"][index]),
+            "total_reflections": int(streaks["total"][index]),
+        }
+        print(user_id, vectorized)
+        assert vectorized == get_user_stats(db=db, user_id=user_id)
+
+    # leave no reflections behind for the other scripts' date-based queries
+    db.query(DailyReflection).filter(DailyReflection.user_id.in_(histories)).delete()
+    db.commit()
+
+
+def main():
+    print("=== Creating tables ===")
+    init_db()
+    array_checks()
+
+    db = SessionLocal()
+    try:
+        database_checks(db)
+    finally:
+        db.close()
+        print("\n=== DB session closed ===")
+
+
+if __name__ == "__main__":
+    main()
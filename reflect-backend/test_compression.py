@@ -0,0 +1,72 @@
+import gzip
+import json
+
+from flask import Flask, Response, jsonify
+
+from compression import (
+    AVAILABLE_ENCODINGS,
+    COMPRESSION_MIN_SIZE,
+    choose_encoding,
+    init_compression,
+)
+
+
+def build_app():
+    app = Flask(__name__)
+    init_compression(app)
+
+    @app.route("/large")
+    def large():
+        entries = [
+            {"id": i, "content": "<p class=\"editor-paragraph\">Dear journal...</p>" * 20}
+            for i in range(50)
+        ]
+        return jsonify(entries)
+
+    @app.route("/small")
+    def small():
+        return jsonify({"ok": True})
+
+    @app.route("/stream")
+    def stream():
+        def events():
+            for i in range(5):
+                yield f"data: {json.dumps({'n': i, 'pad': 'x' * 200})}\n\n"
+        return Response(events(), mimetype="text/event-stream")
+
+    return app
+
+
+def main():
+    print("=== Negotiating encodings ===")
+    print("available:", AVAILABLE_ENCODINGS)
+    assert choose_encoding("gzip") == "gzip"
+    assert choose_encoding("identity") is None
+    assert choose_encoding("gzip;q=0, deflate") is None
+    assert choose_encoding("*") == AVAILABLE_ENCODINGS[0]
+
+    client = build_app().test_client()
+
+    print("\n=== Compressing a large JSON response ===")
+    plain = client.get("/large")
+    compressed = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["Vary"]
+    assert gzip.decompress(compressed.data) == plain.data
+    print(f"{len(plain.data)} bytes -> {len(compressed.data)} bytes")
+
+    print("\n=== Skipping small responses ===")
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+    print(f"{len(small.data)} bytes < {COMPRESSION_MIN_SIZE} threshold, sent as-is")
+
+    print("\n=== Compressing a streamed response ===")
+    streamed = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert streamed.headers["Content-Encoding"] == "gzip"
+    body = gzip.decompress(streamed.data).decode("utf-8")
+    assert body.count("data: ") == 5
+    print(body.splitlines()[0][:60], "...")
+
+
+if __name__ == "__main__":
+    main()
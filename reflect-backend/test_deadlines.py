@@ -0,0 +1,87 @@
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from db import SessionLocal, init_db
+from models import Goal
+from services.deadlines import iter_due_goals
+from services.goals import create_goal, get_upcoming_goals, update_goal
+
+
+def query_plan(db, sql, params):
+    return " ".join(row[-1] for row in db.execute(text("EXPLAIN QUERY PLAN " + sql), params))
+
+
+def main():
+    print("=== Creating tables ===")
+    init_db()
+
+    db = SessionLocal()
+
+    try:
+        users = (9600, 9601)
+        db.query(Goal).filter(Goal.user_id.in_(users)).delete()
+        db.commit()
+
+        today = date.today()
+
+        print("\n=== Creating goals with deadlines ===")
+        overdue = create_goal(db=db, user_id=9600, description="Overdue", deadline=today - timedelta(days=3))
+        soon = create_goal(db=db, user_id=9600, description="Soon", deadline=today + timedelta(days=2))
+        later = create_goal(db=db, user_id=9600, description="Later", deadline=today + timedelta(days=30))
+        create_goal(db=db, user_id=9600, description="No deadline")
+        done = create_goal(db=db, user_id=9600, description="Done", deadline=today + timedelta(days=1))
+        update_goal(db=db, goal_id=done.id, user_id=9600, status="completed")
+        other = create_goal(db=db, user_id=9601, description="Other user", deadline=today + timedelta(days=2))
+
+        print("\n=== Upcoming goals for one user ===")
+        upcoming = get_upcoming_goals(db=db, user_id=9600, within_days=7, today=today)
+        print(upcoming)
+        assert [goal.id for goal in upcoming] == [overdue.id, soon.id]
+        not_overdue = get_upcoming_goals(db=db, user_id=9600, within_days=7, include_overdue=False, today=today)
+        assert [goal.id for goal in not_overdue] == [soon.id]
+        assert later.id in [goal.id for goal in get_upcoming_goals(db=db, user_id=9600, within_days=30)]
+
+        print("\n=== Cross-user scan in deadline order ===")
+        due = [
+            goal for goal in iter_due_goals(within_days=7, today=today, batch_size=2)
+            if goal.user_id in users
+        ]
+        for goal in due:
+            print(goal)
+        assert [goal.goal_id for goal in due] == sorted(
+            [overdue.id, soon.id, other.id],
+            key=lambda goal_id: (db.get(Goal, goal_id).deadline, goal_id),
+        )
+        assert due[0].days_until == -3
+
+        recent_only = [
+            goal.goal_id for goal in iter_due_goals(within_days=7, overdue_days=1, today=today)
+            if goal.user_id in users
+        ]
+        assert overdue.id not in recent_only
+
+        print("\n=== Range scans use the deadline indexes ===")
+        per_user = query_plan(
+            db,
+            "SELECT id FROM goals WHERE user_id = :u AND status = 'active' AND deadline <= :d",
+            {"u": 9600, "d": today.isoformat()},
+        )
+        cross_user = query_plan(
+            db,
+            "SELECT id FROM goals WHERE status = 'active' AND deadline BETWEEN :a AND :b ORDER BY deadline",
+            {"a": today.isoformat(), "b": today.isoformat()},
+        )
+        print(per_user)
+        print(cross_user)
+        assert "ix_goals_user_status_deadline" in per_user
+        assert "ix_goals_status_deadline" in cross_user
+        assert "TEMP B-TREE" not in cross_user
+
+    finally:
+        db.close()
+        print("\n=== DB session closed ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import json
+from datetime import date, timedelta
+
+from sqlalchemy import update
+
+from db import SessionLocal, init_db
+from main import create_app
+from models import AnalyticsRollup, DailyReflection, JournalEntry, JournalRevision, TextAnalytics
+from services.bulk import apply_bulk_operations
+from services.edits import EditConflict, InvalidPatch, apply_patch, claim_version
+from services.journal_entries import create_journal_entry, update_journal_entry
+from services.reflections import create_or_update_daily_reflection
+
+USER_ID = 9980
+HEADERS = {"X-User-Id": str(USER_ID)}
+
+
+def patch_checks():
+    print("=== Patches ===")
+    assert apply_patch("<p>hello</p>", [[0, 8], " world", [8, 12]]) == "<p>hello world</p>"
+    assert apply_patch(None, ["<p>new</p>"]) == "<p>new</p>"
+    for bad in ("text", [[0, 99]], [None], [[0, 1]] * 1001):
+        try:
+            apply_patch("<p>hello</p>", bad)
+            raise AssertionError(f"accepted {bad!r}")
+        except InvalidPatch:
+            pass
+
+
+def journal_checks(db, client):
+    print("\n=== Journal entries ===")
+    content = "".join(f"<p>Paragraph {n} of a long entry about the week.</p>" for n in range(200))
+    entry = create_journal_entry(db=db, user_id=USER_ID, content=content, entry_date=date.today())
+    url = f"/api/journal-entries/{entry.id}"
+    assert client.get(f"/api/journal-entries?date={date.today()}", headers=HEADERS).get_json()[0]["version"] == 1
+
+    at = content.index("</p>")
+    patch = [[0, at], " Added on the train.", [at, len(content)]]
+    response = client.patch(url, json={"base_version": 1, "patch": patch}, headers=HEADERS)
+    body = response.get_json()
+    print({key: body[key] for key in ("version", "char_count")})
+    assert response.status_code == 200 and body["version"] == 2 and "content" not in body
+    content = content[:at] + " Added on the train." + content[at:]
+    db.expire_all()
+    assert db.get(JournalEntry, entry.id).content == content
+
+    full = len(json.dumps({"content": content}))
+    sent = len(json.dumps({"base_version": 1, "patch": patch}))
+    print(f"request body: {sent} bytes as a patch, {full} as the whole text")
+    assert sent * 50 < full
+
+    # a second tab still at version 1
+    stale = client.patch(url, json={"base_version": 1, "patch": ["<p>other tab</p>"]}, headers=HEADERS)
+    assert stale.status_code == 409 and stale.get_json()["version"] == 2
+
+    # a patch that changes nothing is not a write
+    revisions = db.query(JournalRevision).filter(JournalRevision.entry_id == entry.id).count()
+    response = client.patch(url, json={"base_version": 2, "patch": [[0, len(content)]]}, headers=HEADERS)
+    assert response.get_json()["version"] == 2
+    assert db.query(JournalRevision).filter(JournalRevision.entry_id == entry.id).count() == revisions
+
+    for body in (
+        {"patch": [[0, 5]]},
+        {"base_version": "2", "patch": [[0, 5]]},
+        {"base_version": 2, "patch": [[0, len(content) + 1]]},
+        {"base_version": 2, "patch": [""]},
+    ):
+        assert client.patch(url, json=body, headers=HEADERS).status_code == 400, body
+
+    # whole-text saves keep working, and may name a base too
+    response = client.patch(url, json={"content": "<p>short now</p>"}, headers=HEADERS)
+    assert response.get_json()["version"] == 3 and response.get_json()["content"] == "<p>short now</p>"
+    assert client.patch(url, json={"content": "<p>x</p>", "base_version": 2}, headers=HEADERS).status_code == 409
+    return entry
+
+
+def race_checks(db, entry):
+    print("\n=== Two writers from the same base ===")
+    entry_id = entry.id
+    db.commit()  # end this session's read, as a request's session would
+    other = SessionLocal()
+    try:
+        update_journal_entry(db=other, entry_id=entry_id, user_id=USER_ID, content="<p>warm up</p>")
+        # the second writer has passed its version check when the first one saves
+        stale_row = other.get(JournalEntry, entry_id)
+        assert stale_row.version == 4
+        update_journal_entry(db=db, entry_id=entry_id, user_id=USER_ID, patch=[[0, 3], "first ", [3, 14]], base_version=4)
+
+        try:
+            stale_row.content = "<p>second</p>"
+            claim_version(db=other, row=stale_row, base_version=4)
+            raise AssertionError("second writer was not refused")
+        except EditConflict as e:
+            print(e, e.version)
+            assert e.version == 5
+    finally:
+        other.close()
+    db.expire_all()
+    assert db.get(JournalEntry, entry_id).content == "<p>first warm up</p>"
+
+    # rows from before versioning count as version 1
+    db.execute(update(JournalEntry.__table__).where(JournalEntry.id == entry_id).values(version=None))
+    db.commit()
+    db.expire_all()
+    updated = update_journal_entry(db=db, entry_id=entry_id, user_id=USER_ID, patch=["<p>legacy</p>"], base_version=1)
+    assert updated.version == 2
+
+    results = apply_bulk_operations(db=db, user_id=USER_ID, operations=[
+        {"op": "update", "type": "journal_entry", "id": entry_id, "data": {"content": "<p>from bulk</p>"}},
+    ])
+    assert results[0].obj.version == 3
+
+
+def reflection_checks(db, client):
+    print("\n=== Reflections ===")
+    day = date.today() - timedelta(days=2)
+    url = f"/api/reflections/{day}"
+    reflection = create_or_update_daily_reflection(
+        db=db, user_id=USER_ID, reflection_date=day,
+        summary="<p>Long day.</p>", accomplishments="<p>Finished the report.</p>", improvements_to_make=None,
+    )
+    assert reflection.version == 1
+
+    response = client.patch(url, json={
+        "base_version": 1,
+        "patches": {"summary": [[0, 12], " Good though.", [12, 16]], "improvements_to_make": ["<p>Sleep earlier.</p>"]},
+    }, headers=HEADERS)
+    body = response.get_json()
+    print(body)
+    assert response.status_code == 200 and body["version"] == 2 and "summary" not in body
+
+    saved = client.get(f"/api/reflections?date={day}", headers=HEADERS).get_json()
+    assert saved["summary"] == "<p>Long day. Good though.</p>"
+    assert saved["accomplishments"] == "<p>Finished the report.</p>"
+    assert saved["improvements_to_make"] == "<p>Sleep earlier.</p>"
+
+    assert client.patch(url, json={"base_version": 1, "patches": {"summary": [[0, 3]]}}, headers=HEADERS).status_code == 409
+    assert client.patch(url, json={"base_version": 2, "patches": {"mood": ["x"]}}, headers=HEADERS).status_code == 400
+    assert client.patch(url, json={"base_version": 2}, headers=HEADERS).status_code == 400
+    missing = f"/api/reflections/{day - timedelta(days=1)}"
+    assert client.patch(missing, json={"base_version": 1, "patches": {}}, headers=HEADERS).status_code == 404
+
+    # resaving the same text through the old endpoint writes nothing
+    db.expire_all()
+    before = db.query(DailyReflection).filter(DailyReflection.id == reflection.id).one().updated_at
+    response = client.post("/api/reflections", json={
+        "reflection_date": day.isoformat(), "base_version": 2,
+        "summary": saved["summary"], "accomplishments": saved["accomplishments"],
+        "improvements_to_make": saved["improvements_to_make"],
+    }, headers=HEADERS)
+    assert response.get_json()["version"] == 2
+    db.expire_all()
+    assert db.query(DailyReflection).filter(DailyReflection.id == reflection.id).one().updated_at == before
+
+    stale = client.post("/api/reflections", json={
+        "reflection_date": day.isoformat(), "base_version": 1, "summary": "<p>old tab</p>",
+    }, headers=HEADERS)
+    assert stale.status_code == 409 and stale.get_json()["version"] == 2
+
+
+def cleanup(db):
+    for model in (JournalEntry, DailyReflection, JournalRevision, TextAnalytics, AnalyticsRollup):
+        db.query(model).filter(model.user_id == USER_ID).delete()
+    db.commit()
+
+
+def main():
+    print("=== Creating tables ===")
+    init_db()
+    patch_checks()
+
+    client = create_app().test_client()
+    db = SessionLocal()
+    try:
+        cleanup(db)
+        entry = journal_checks(db, client)
+        race_checks(db, entry)
+        reflection_checks(db, client)
+        # leave no reflections behind for the other scripts' date-based queries
+        cleanup(db)
+    finally:
+        db.close()
+        print("\n=== DB session closed ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+from datetime import date, timedelta
+from datetime import time as dtime
+
+from db import SessionLocal, init_db
+from main import create_app
+from models import Goal, JournalEntry, ScheduledTask
+from services.bulk import apply_bulk_operations
+from services.events import RESYNC, EventBus, bus
+from services.goals import create_goal, delete_goal, update_goal
+from services.journal_entries import create_journal_entry, update_journal_entry
+from services.scheduled_tasks import (
+    create_scheduled_task,
+    delete_scheduled_task,
+    update_scheduled_task,
+)
+
+
+def drain(subscription):
+    events = []
+    while True:
+        event = subscription.get(timeout=0.05)
+        if event is None:
+            return events
+        events.append(event)
+
+
+def bus_checks():
+    print("=== Per-user sequence numbers, topic filters and overflow ===")
+    local = EventBus(max_queued=3)
+    everything = local.subscribe(1)
+    reminders_only = local.subscribe(1, topics={"reminder"})
+    other_user = local.subscribe(2)
+
+    assert local.publish(1, "change", {"n": 1}) == 1
+    assert local.publish(1, "reminder", {"n": 2}) == 2
+    assert local.publish(3, "change", {}) == 0
+
+    assert [(e.topic, e.seq) for e in drain(everything)] == [("change", 1), ("reminder", 2)]
+    assert [e.seq for e in drain(reminders_only)] == [2]
+    assert drain(other_user) == []
+
+    # a subscriber that stops reading gets one resync instead of a stale backlog
+    for n in range(5):
+        local.publish(1, "change", {"n": n})
+    events = drain(everything)
+    print([(e.topic, e.seq) for e in events])
+    assert events[0].topic == RESYNC
+    assert local.publish(1, "change", {}) == 1
+    assert drain(everything)[0].seq == 8
+
+    local.unsubscribe(everything)
+    local.unsubscribe(reminders_only)
+    assert not local.has_subscribers(1)
+    print(local.snapshot())
+
+
+def service_checks(db, user_id):
+    print("\n=== Services publish compact change events ===")
+    subscription = bus.subscribe(user_id, topics={"change"})
+    try:
+        day = date.today() + timedelta(days=40)
+        task = create_scheduled_task(
+            db=db, user_id=user_id, title="Deep work", description=None,
+            task_date=day, start_time=dtime(9, 0), end_time=dtime(11, 0),
+        )
+        update_scheduled_task(db=db, task_id=task.id, user_id=user_id, is_completed=True)
+        # unchanged values do not show up as changes
+        update_scheduled_task(db=db, task_id=task.id, user_id=user_id, title="Deep work")
+        delete_scheduled_task(db=db, task_id=task.id, user_id=user_id)
+
+        created, completed, untouched, deleted = [e.data for e in drain(subscription)]
+        print(completed)
+        assert created["op"] == "create" and created["fields"]["title"] == "Deep work"
+        assert created["fields"]["start_time"] == "09:00"
+        assert completed["op"] == "update" and completed["id"] == task.id
+        assert set(completed["fields"]) == {"is_completed", "completed_at", "updated_at"}
+        assert completed["fields"]["is_completed"] is True
+        assert completed["version"] == completed["fields"]["updated_at"]
+        assert set(untouched["fields"]) == {"updated_at"}
+        assert deleted == {
+            "entity": "scheduled_task", "op": "delete", "id": task.id, "fields": None, "version": None,
+        }
+
+        goal = create_goal(db=db, user_id=user_id, description="Run a 10k")
+        update_goal(db=db, goal_id=goal.id, user_id=user_id, status="completed")
+        delete_goal(db=db, goal_id=goal.id, user_id=user_id)
+        ops = [(e.data["entity"], e.data["op"], e.data["fields"] and sorted(e.data["fields"])) for e in drain(subscription)]
+        print(ops)
+        assert ops[1] == ("goal", "update", ["status"])
+        assert ops[2] == ("goal", "delete", None)
+
+        entry = create_journal_entry(db=db, user_id=user_id, content="<p>Morning pages</p>", entry_date=day)
+        update_journal_entry(db=db, entry_id=entry.id, user_id=user_id, content="<p>Morning pages, longer</p>")
+        _, edited = [e.data for e in drain(subscription)]
+        assert edited["entity"] == "journal_entry"
+        assert edited["fields"]["content"] == "<p>Morning pages, longer</p>"
+        assert "entry_date" not in edited["fields"]
+
+        print("\n=== Bulk mutations publish one event per operation ===")
+        results = apply_bulk_operations(db=db, user_id=user_id, operations=[
+            {"op": "update", "type": "journal_entry", "id": entry.id, "data": {"reflection_id": None, "content": "<p>Bulk</p>"}},
+            {"op": "create", "type": "goal", "data": {"description": "Read more"}},
+        ])
+        bulk_update, bulk_create = [e.data for e in drain(subscription)]
+        assert bulk_update["fields"]["content"] == "<p>Bulk</p>"
+        assert "reflection_id" not in bulk_update["fields"]
+        assert bulk_create["op"] == "create" and bulk_create["id"] == results[1].id
+    finally:
+        bus.unsubscribe(subscription)
+
+    # nobody listening: publishing is skipped entirely
+    seq_before = bus._seq.get(user_id)
+    create_goal(db=db, user_id=user_id, description="Unheard")
+    assert bus._seq.get(user_id) == seq_before
+
+
+def stream_checks(user_id):
+    print("\n=== /api/events/stream relays events as SSE ===")
+    client = create_app().test_client()
+    headers = {"X-User-Id": str(user_id)}
+    response = client.get("/api/events/stream", headers=headers, buffered=False)
+    chunks = response.response
+    assert next(chunks).decode().startswith(": connected")
+
+    created = client.post("/api/goals", headers=headers, json={"description": "Pushed"}).get_json()
+    frame = next(chunks).decode()
+    print(frame.strip())
+    assert "event: change" in frame and f'"id": {created["id"]}' in frame
+    response.close()
+    assert not bus.has_subscribers(user_id)
+
+
+def main():
+    print("=== Creating tables ===")
+    init_db()
+    bus_checks()
+
+    db = SessionLocal()
+    try:
+        user_id = 9800
+        for model in (ScheduledTask, Goal, JournalEntry):
+            db.query(model).filter(model.user_id == user_id).delete()
+        db.commit()
+        service_checks(db, user_id)
+        stream_checks(user_id)
+    finally:
+        db.close()
+        print("\n=== DB session closed ===")
+
+
+if __name__ == "__main__":
+    main()
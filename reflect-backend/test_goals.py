@@ -1,6 +1,6 @@
 from datetime import date, timedelta
 
-from db import Base, engine, SessionLocal
+from db import SessionLocal, init_db
 from models import Goal
 from services.goals import (
     create_goal,
@@ -11,7 +11,7 @@ from services.goals import (
 
 def main():
     print("=== Creating tables ===")
-    Base.metadata.create_all(bind=engine)
+    init_db()
 
     db = SessionLocal()
 
@@ -0,0 +1,122 @@
+import json
+from datetime import date, timedelta
+
+from db import SessionLocal, init_db
+from models import InsightBatchRun, MorningInsight
+from services.goals import create_goal
+from services.reflections import create_or_update_daily_reflection
+from services.insight_batch import (
+    BatchLLMClient,
+    get_stored_insights,
+    run_nightly_insights,
+)
+
+
+class StubBatchClient(BatchLLMClient):
+    """Local stand-in for the model: echoes a canned insight per prompt."""
+
+    def __init__(self, fail_marker=None, interrupt_after=None):
+        super().__init__(max_parallel=4)
+        self.fail_marker = fail_marker
+        self.interrupt_after = interrupt_after
+        self.calls = 0
+
+    def complete(self, prompt):
+        self.calls += 1
+        if self.interrupt_after is not None and self.calls > self.interrupt_after:
+            raise KeyboardInterrupt  # not caught per call: aborts the run
+        if self.fail_marker and self.fail_marker in prompt:
+            raise TimeoutError("stub timeout")
+        return json.dumps([{
+            "type": "motivation",
+            "title": "Stub Insight",
+            "message": "Generated by the stub client.",
+            "color": "blue",
+        }])
+
+
+def main():
+    print("=== Creating tables ===")
+    init_db()
+
+    # a client without `complete` fails when built, not mid-batch
+    try:
+        BatchLLMClient()
+        raise AssertionError("BatchLLMClient was instantiated")
+    except TypeError:
+        pass
+
+    db = SessionLocal()
+
+    try:
+        user_ids = [9001, 9002, 9003, 9004, 9005]
+        insight_date = date.today() - timedelta(days=30)
+        reflection_date = insight_date - timedelta(days=1)
+
+        db.query(InsightBatchRun).filter(InsightBatchRun.insight_date == insight_date).delete()
+        db.query(MorningInsight).filter(MorningInsight.insight_date == insight_date).delete()
+        db.commit()
+
+        print("\n=== Creating reflections and goals ===")
+        for user_id in user_ids:
+            create_or_update_daily_reflection(
+                db=db,
+                user_id=user_id,
+                reflection_date=reflection_date,
+                summary=f"Summary for user {user_id}",
+                accomplishments="Shipped the batch job",
+                improvements_to_make="SLOW-USER" if user_id == 9003 else "Sleep earlier",
+            )
+        create_goal(db=db, user_id=9001, description="Run a 10k", deadline=insight_date + timedelta(days=3))
+
+        print("\n=== Interrupted run ===")
+        try:
+            run_nightly_insights(
+                db=db,
+                insight_date=insight_date,
+                client=StubBatchClient(interrupt_after=2),
+                chunk_size=2,
+            )
+        except KeyboardInterrupt:
+            print("run interrupted")
+        db.rollback()
+
+        run = db.query(InsightBatchRun).filter(InsightBatchRun.insight_date == insight_date).one()
+        print(run)
+        assert run.status == "running"
+        assert run.last_user_id == 9002
+
+        print("\n=== Resumed run ===")
+        client = StubBatchClient(fail_marker="SLOW-USER")
+        run = run_nightly_insights(db=db, insight_date=insight_date, client=client, chunk_size=2)
+        print(run, json.loads(run.stats))
+        assert run.status == "completed"
+        assert client.calls == 3  # only the users after the cursor
+        assert run.users_failed == 1
+
+        print("\n=== Stored insights ===")
+        for user_id in user_ids:
+            if user_id == 9003:
+                continue  # the failed call, below
+            insights = get_stored_insights(db=db, user_id=user_id, insight_date=insight_date)
+            print(user_id, [i["title"] for i in insights])
+            assert insights
+
+        # the failed user's rule-based fallback is kept but not served, so
+        # the morning request calls the model again
+        fallback = (
+            db.query(MorningInsight)
+            .filter(MorningInsight.user_id == 9003, MorningInsight.insight_date == insight_date)
+            .one()
+        )
+        assert fallback.source == "default"
+        assert json.loads(fallback.insights)[0]["title"] != "Stub Insight"
+        assert get_stored_insights(db=db, user_id=9003, insight_date=insight_date) is None
+
+    finally:
+        db.close()
+        print("\n=== DB session closed ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 from datetime import date, timedelta
 
-from db import Base, engine, SessionLocal
+from db import SessionLocal, init_db
 from models import DailyReflection, JournalEntry
 from services.reflections import create_or_update_daily_reflection
 from services.journal_entries import (
@@ -12,7 +12,7 @@ from services.journal_entries import (
 
 def main():
     print("=== Creating tables ===")
-    Base.metadata.create_all(bind=engine)
+    init_db()
 
     db = SessionLocal()
 
@@ -61,6 +61,17 @@ def main():
         )
         print(updated)
 
+        print("\n=== Derived plain text ===")
+        html_entry = create_journal_entry(
+            db=db,
+            user_id=user_id,
+            content="<p>Rich <strong>text</strong> entry</p><ul><li><p>one &amp; two</p></li></ul>",
+            entry_date=yesterday,
+        )
+        assert html_entry.plain_text == "Rich text entry\none & two"
+        assert html_entry.word_count == 6
+        print(repr(html_entry.plain_text), html_entry.word_count, html_entry.char_count)
+
         print("\n=== Access via relationship ===")
         for je in reflection.journal_entries:
             print("Reflection linked entry:", je)
@@ -0,0 +1,65 @@
+import os
+import pstats
+import tempfile
+
+from sqlalchemy import text
+
+import db as db_module
+import profiling
+from db import SessionLocal, get_slow_queries
+from main import create_app
+
+
+def main():
+    print("=== Slow statements are captured with their plan ===")
+    db_module.SLOW_QUERY_MS = 20
+    db = SessionLocal()
+    try:
+        # a recursive CTE that takes tens of milliseconds
+        slow_sql = (
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :limit) "
+            "SELECT count(*) FROM n"
+        )
+        assert db.execute(text(slow_sql), {"limit": 300000}).scalar() == 300000
+        db.execute(text("SELECT 1")).scalar()
+    finally:
+        db.close()
+
+    slow = get_slow_queries()
+    print(slow[-1])
+    assert slow and slow[-1]["sql"].startswith("WITH RECURSIVE")
+    assert slow[-1]["params"] == ["300000"]
+    assert slow[-1]["duration_ms"] >= 20
+    assert slow[-1]["plan"], "expected EXPLAIN QUERY PLAN output"
+    assert not any(q["sql"] == "SELECT 1" for q in slow)
+
+    print("\n=== Requests are profiled with the admin header only ===")
+    profiling.PROFILE_ADMIN_TOKEN = "secret"
+    profiling.PROFILE_DIR = tempfile.mkdtemp()
+    app = create_app()
+    client = app.test_client()
+    user = {"X-User-Id": "9500"}
+
+    plain = client.get("/api/goals", headers=user)
+    assert plain.status_code == 200
+    assert "X-Profile-Id" not in plain.headers
+    assert client.get("/api/goals", headers={**user, "X-Profile-Token": "wrong"}).headers.get("X-Profile-Id") is None
+
+    profiled = client.get("/api/goals", headers={**user, "X-Profile-Token": "secret"})
+    assert profiled.status_code == 200
+    profile_id = profiled.headers["X-Profile-Id"]
+    path = os.path.join(profiling.PROFILE_DIR, f"{profile_id}.pstats")
+    assert os.path.exists(path)
+    stats = pstats.Stats(path)
+    assert any("get_goals_for_user" in name for _, _, name in stats.stats)
+    print(profile_id, stats.total_calls, "calls")
+
+    print("\n=== Slow-query log needs the admin token ===")
+    assert client.get("/api/admin/slow-queries", headers=user).status_code == 403
+    listed = client.get("/api/admin/slow-queries", headers={**user, "X-Profile-Token": "secret"})
+    assert listed.status_code == 200
+    assert listed.get_json()[-1]["sql"].startswith("WITH RECURSIVE")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,21 @@
 from datetime import date, timedelta
 
-from db import Base, engine, SessionLocal
+from db import SessionLocal, init_db
 from models import DailyReflection
 from services.reflections import (
     create_or_update_daily_reflection,
     get_reflection_for_date,
     get_reflections_in_range,
+    condensed_fields,
+    refresh_condensed_fields,
+    CONDENSED_MAX_CHARS,
 )
+from services.ai_insights import _build_context, estimate_tokens
 
 
 def main():
     print("=== Creating tables ===")
-    Base.metadata.create_all(bind=engine)
+    init_db()
 
     db = SessionLocal()
 
@@ -72,6 +76,38 @@ def main():
         for r in reflections:
             print(r.reflection_date, r.summary)
 
+        print("\n=== Condensed copies of a long reflection ===")
+        long_text = " ".join(f"Sentence number {i} about the long day." for i in range(60))
+        long_reflection = create_or_update_daily_reflection(
+            db=db,
+            user_id=user_id,
+            reflection_date=today - timedelta(days=2),
+            summary=long_text,
+            accomplishments="Short accomplishment",
+            improvements_to_make=long_text,
+        )
+        assert long_reflection.condensed_at == long_reflection.updated_at
+        condensed = refresh_condensed_fields(db=db, reflection=long_reflection)
+        assert len(condensed["summary"]) <= CONDENSED_MAX_CHARS
+        assert condensed["accomplishments"] == "Short accomplishment"
+        print(len(long_text), "->", len(condensed["summary"]), "chars")
+
+        print("\n=== Token-budgeted context ===")
+        goals = [
+            {"description": "Someday goal", "deadline": None},
+            {"description": "Urgent goal", "deadline": (today + timedelta(days=1)).isoformat()},
+        ]
+        reflection_dict = {
+            "summary": long_reflection.summary,
+            "accomplishments": long_reflection.accomplishments,
+            "improvements_to_make": long_reflection.improvements_to_make,
+            "condensed": condensed_fields(long_reflection),
+        }
+        context = _build_context(goals, reflection_dict, token_budget=200)
+        print(context)
+        assert estimate_tokens(context) <= 200
+        assert context.index("Urgent goal") < context.index("Someday goal")
+
     finally:
         db.close()
         print("\n=== DB session closed ===")
@@ -0,0 +1,173 @@
+import multiprocessing
+import os
+import tempfile
+from datetime import date, timedelta
+
+import services.related_entries as related_entries
+from db import SessionLocal, init_db
+from main import create_app
+from models import JournalEntry
+from services.journal_entries import (
+    create_journal_entry,
+    delete_journal_entry,
+    get_related_journal_entries,
+    update_journal_entry,
+)
+from services.related_entries import UserIndex, signature, similarity
+
+RUNNING = [
+    "<p>Long run this morning along the river, legs heavy but the marathon training plan is working.</p>",
+    "<p>Marathon training: easy river run, then stretching. Legs feel fresher than last week.</p>",
+    "<p>Skipped the long run, legs sore. Marathon plan says rest, so a slow walk by the river.</p>",
+]
+COOKING = [
+    "<p>Tried a new pasta recipe with roasted garlic and basil. Dinner guests loved the sauce.</p>",
+    "<p>Baked sourdough bread and made a garlic basil pasta sauce for dinner again.</p>",
+]
+
+
+def index_checks(directory):
+    print("=== Signatures and the on-disk index ===")
+    a, b = signature(RUNNING[0]), signature(RUNNING[1])
+    assert similarity(a, a) == 1.0
+    assert similarity(a, b) > similarity(a, signature(COOKING[0]))
+    assert signature("<p>the and of</p>") is None  # stopwords only
+
+    path = os.path.join(directory, "unit.mhx")
+    index = UserIndex(path)
+    topics = ["garden", "family", "career", "health", "travel", "music", "money"]
+    moods = ["calm", "tired", "hopeful", "anxious", "grateful"]
+    texts = {
+        n: f"{topics[n % 7]} {topics[n % 7]}plans {moods[n % 5]} {moods[n % 5]}ness entry{chr(97 + n % 26)}{chr(97 + n // 26)}"
+        for n in range(1, 151)
+    }
+    for entry_id, text in texts.items():
+        index.upsert(entry_id, signature(text))
+    assert index.count == 150 and index.capacity == 256  # grew from 64
+
+    hits = index.query(signature(texts[8]), exclude=8)
+    print(hits[:3])
+    assert hits and all(entry_id != 8 for entry_id, _ in hits)
+    assert all(entry_id % 7 == 1 or entry_id % 5 == 3 for entry_id, _ in hits)
+
+    for entry_id in range(1, 101):
+        index.remove(entry_id)
+    # compacted when more than half the records were dead, so the file holds
+    # fewer records than were ever written
+    assert len(index.slots) == 50 and index.count == 50 + index.dead < 150
+    index.close()
+
+    reopened = UserIndex(path)
+    assert sorted(reopened.slots) == list(range(101, 151))
+    assert reopened.signature_of(120) == signature(texts[120])
+    reopened.close()
+
+
+def _text(entry_id):
+    # content words drop digits, so spell the id in letters
+    return " ".join(f"{word}{''.join(chr(97 + int(d)) for d in str(entry_id))}" for word in ("note", "item"))
+
+
+def _writer(path, worker, start):
+    index = UserIndex(path)  # opened before anyone writes, so its count goes stale
+    start.wait()
+    for n in range(150):
+        index.upsert(worker * 1000 + n, signature(_text(worker * 1000 + n)))
+    for n in range(0, 150, 3):
+        index.remove(worker * 1000 + n)
+    index.close()
+
+
+def worker_checks(directory):
+    print("\n=== Several worker processes writing one file ===")
+    path = os.path.join(directory, "shared.mhx")
+    watcher = UserIndex(path)
+    start = multiprocessing.Barrier(3)
+    writers = [multiprocessing.Process(target=_writer, args=(path, worker, start)) for worker in (1, 2)]
+    for process in writers:
+        process.start()
+    start.wait()
+    for process in writers:
+        process.join()
+    assert all(process.exitcode == 0 for process in writers)
+
+    # nothing overwritten: every live record is there with its own signature
+    expected = {worker * 1000 + n for worker in (1, 2) for n in range(150) if n % 3}
+    reopened = UserIndex(path)
+    assert set(reopened.slots) == expected, len(reopened.slots)
+    assert reopened.signature_of(2005) == signature(_text(2005))
+    reopened.close()
+
+    # a handle opened before the writes catches up on its next use
+    hits = watcher.query(signature(_text(1007)), limit=1)
+    print(hits)
+    assert hits == [(1007, 1.0)] and len(watcher.slots) == len(expected)
+
+    # and follows a rebuild, which replaces the file
+    with related_entries._lock_file(path) as lock_file, related_entries._flocked(lock_file, exclusive=True):
+        related_entries._write_file(path, [(1, signature("after the rebuild"))])
+    assert watcher.signature_of(1) == signature("after the rebuild") and len(watcher.slots) == 1
+    watcher.close()
+
+
+def service_checks(db, user_id):
+    print("\n=== Related entries through the journal service ===")
+    day = date.today() - timedelta(days=3)
+    running = [create_journal_entry(db=db, user_id=user_id, content=c, entry_date=day) for c in RUNNING]
+    cooking = [create_journal_entry(db=db, user_id=user_id, content=c, entry_date=day) for c in COOKING]
+    # no index yet: the hooks leave it alone and the first query builds it
+    assert not os.path.exists(related_entries.index_path(user_id))
+
+    related = get_related_journal_entries(db=db, entry_id=running[0].id, user_id=user_id)
+    print([(entry.id, round(score, 2)) for entry, score in related])
+    assert {entry.id for entry, _ in related} == {running[1].id, running[2].id}
+    assert os.path.exists(related_entries.index_path(user_id))
+
+    # later writes are applied to the index in place
+    latest = create_journal_entry(
+        db=db, user_id=user_id, content="<p>Marathon training long run by the river, legs fine.</p>", entry_date=day
+    )
+    ids = [entry.id for entry, _ in get_related_journal_entries(db=db, entry_id=running[0].id, user_id=user_id)]
+    assert latest.id in ids
+
+    update_journal_entry(db=db, entry_id=latest.id, user_id=user_id, content=COOKING[1] + "<p>Bread again.</p>")
+    ids = [entry.id for entry, _ in get_related_journal_entries(db=db, entry_id=cooking[0].id, user_id=user_id)]
+    assert latest.id in ids and running[0].id not in ids
+
+    delete_journal_entry(db=db, entry_id=latest.id, user_id=user_id)
+    ids = [entry.id for entry, _ in get_related_journal_entries(db=db, entry_id=cooking[0].id, user_id=user_id)]
+    assert ids == [cooking[1].id]
+
+    print("\n=== /api/journal-entries/<id>/related ===")
+    client = create_app().test_client()
+    response = client.get(f"/api/journal-entries/{running[1].id}/related?limit=1", headers={"X-User-Id": str(user_id)})
+    body = response.get_json()
+    print(body)
+    assert response.status_code == 200 and len(body) == 1
+    assert "preview" in body[0] and 0 < body[0]["similarity"] <= 1
+    other = client.get(f"/api/journal-entries/{running[1].id}/related", headers={"X-User-Id": str(user_id + 1)})
+    assert other.status_code == 404
+
+
+def main():
+    print("=== Creating tables ===")
+    init_db()
+
+    with tempfile.TemporaryDirectory() as directory:
+        related_entries.RELATED_INDEX_DIR = directory
+        index_checks(directory)
+        worker_checks(directory)
+
+        db = SessionLocal()
+        try:
+            user_id = 9950
+            db.query(JournalEntry).filter(JournalEntry.user_id == user_id).delete()
+            db.commit()
+            service_checks(db, user_id)
+        finally:
+            db.close()
+            print("\n=== DB session closed ===")
+
+
+if __name__ == "__main__":
+    main()
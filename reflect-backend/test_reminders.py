@@ -0,0 +1,370 @@
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as dtime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import services.reminders as reminders
+from db import SessionLocal, ShardRouter, init_db
+from models import ScheduledTask, ScheduledTaskChange
+from services.events import bus
+from services.reminders import ReminderDispatcher, TimerWheel, WebhookSink, stream_sink
+from services.scheduled_tasks import (
+    create_scheduled_task,
+    delete_scheduled_task,
+    update_scheduled_task,
+)
+
+
+def wheel_checks():
+    print("=== Timer wheel fires at the due second ===")
+    wheel = TimerWheel(now=1_000_000)
+    dues = {"a": 1_000_005, "b": 1_000_090, "c": 1_000_000 + 2 * 3600 + 7, "d": 1_000_000 + 23 * 3600}
+    for key, due in dues.items():
+        assert wheel.add(key, due, key)
+    assert not wheel.add("too-far", 1_000_000 + 26 * 3600, None)
+    wheel.add("cancelled", 1_000_050, "cancelled")
+    assert wheel.cancel("cancelled")
+
+    fired, steps = [], 0
+    while len(wheel):
+        event = wheel.next_event()
+        steps += 1
+        for due, payload in wheel.advance(event):
+            assert due == dues[payload] == wheel.now, (payload, due, wheel.now)
+            fired.append(payload)
+    print(fired, "in", steps, "wakeups")
+    assert fired == ["a", "b", "c", "d"]
+    # a few cascade boundaries per timer, not one wakeup per second
+    assert steps < 20
+
+
+class Clock:
+    def __init__(self, now: datetime):
+        self.now = now.timestamp()
+
+    def __call__(self):
+        return self.now
+
+
+def dispatcher_checks(db, user_id):
+    print("\n=== Incremental loads, recurring series and in-place updates ===")
+    day = date.today() + timedelta(days=30)
+    clock = Clock(datetime.combine(day, dtime(7, 0)))
+    delivered = []
+    dispatcher = ReminderDispatcher(
+        [lambda r: delivered.append(r) if r["user_id"] == user_id else None],
+        lead_minutes=10,
+        load_ahead_s=6 * 3600,
+        factories=[SessionLocal],
+        clock=clock,
+    )
+
+    standup = create_scheduled_task(
+        db=db, user_id=user_id, title="Standup", description=None,
+        task_date=day, start_time=dtime(9, 0), end_time=dtime(9, 15),
+        is_recurring=True, recurrence_pattern="daily",
+    )
+    review = create_scheduled_task(
+        db=db, user_id=user_id, title="Review", description=None,
+        task_date=day, start_time=dtime(11, 0), end_time=dtime(12, 0),
+    )
+
+    dispatcher.load_window()
+    reminders._dispatcher = dispatcher
+    try:
+        # created while running: added in place, no reload
+        lunch = create_scheduled_task(
+            db=db, user_id=user_id, title="Lunch", description=None,
+            task_date=day, start_time=dtime(12, 30), end_time=dtime(13, 0),
+        )
+        update_scheduled_task(db=db, task_id=review.id, user_id=user_id, start_time=dtime(10, 0), end_time=dtime(10, 30))
+        gone = create_scheduled_task(
+            db=db, user_id=user_id, title="Gone", description=None,
+            task_date=day, start_time=dtime(12, 0), end_time=dtime(12, 15),
+        )
+        delete_scheduled_task(db=db, task_id=gone.id, user_id=user_id)
+        # the hooks updated the wheel without reading the table
+        assert dispatcher.snapshot()["counters"]["db_loads"] == 1
+
+        for hour in range(8, 20):
+            clock.now = datetime.combine(day, dtime(hour, 0)).timestamp()
+            dispatcher.tick()
+        assert [(r["title"], r["remind_at"][11:16]) for r in delivered] == [
+            ("Standup", "08:50"),
+            ("Review", "09:50"),
+            ("Lunch", "12:20"),
+        ]
+
+        # the next window brings tomorrow's standup; completing it stops the series
+        for hour in (8, 9):
+            clock.now = datetime.combine(day + timedelta(days=1), dtime(hour, 0)).timestamp()
+            dispatcher.tick()
+        assert delivered[-1]["title"] == "Standup" and delivered[-1]["task_date"] == (day + timedelta(days=1)).isoformat()
+        update_scheduled_task(db=db, task_id=standup.id, user_id=user_id, is_completed=True)
+        clock.now = datetime.combine(day + timedelta(days=3), dtime(9, 0)).timestamp()
+        dispatcher.tick()
+        assert sum(r["title"] == "Standup" for r in delivered) == 2
+
+        print(dispatcher.snapshot())
+    finally:
+        reminders._dispatcher = None
+
+
+def outbox_checks(db, user_id):
+    print("\n=== Writes from other processes arrive through scheduled_task_changes ===")
+    day = date.today() + timedelta(days=40)
+    clock = Clock(datetime.combine(day, dtime(7, 0)))
+    delivered = []
+    dispatcher = ReminderDispatcher(
+        [lambda r: delivered.append(r) if r["user_id"] == user_id else None],
+        lead_minutes=10,
+        load_ahead_s=6 * 3600,
+        poll_s=60,
+        factories=[SessionLocal],
+        clock=clock,
+    )
+    dispatcher.load_window()
+    dispatcher.poll_changes()
+
+    # plain ORM writes with no dispatcher in this process, as in another worker
+    moved = ScheduledTask(
+        user_id=user_id, title="Moved elsewhere", task_date=day,
+        start_time=dtime(9, 0), end_time=dtime(9, 30),
+    )
+    dropped = ScheduledTask(
+        user_id=user_id, title="Dropped elsewhere", task_date=day,
+        start_time=dtime(10, 0), end_time=dtime(10, 30),
+    )
+    db.add_all([moved, dropped])
+    db.commit()
+    dispatcher.poll_changes()
+    assert (user_id, moved.id) in dispatcher._by_task and (user_id, dropped.id) in dispatcher._by_task
+
+    moved.start_time, moved.end_time = dtime(11, 0), dtime(11, 30)
+    db.delete(dropped)
+    db.commit()
+    dispatcher.poll_changes()
+    # consumed rows are removed
+    assert db.query(ScheduledTaskChange).count() == 0
+
+    for hour in range(8, 13):
+        clock.now = datetime.combine(day, dtime(hour, 0)).timestamp()
+        dispatcher.tick()
+    print([(r["title"], r["remind_at"][11:16]) for r in delivered])
+    assert [(r["title"], r["remind_at"][11:16]) for r in delivered] == [("Moved elsewhere", "10:50")]
+    print(dispatcher.snapshot()["counters"])
+
+
+class Rows:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self.rows
+
+
+def race_checks(db, user_id):
+    print("\n=== A task deleted while a window loads stays cancelled ===")
+    day = date.today() + timedelta(days=50)
+    clock = Clock(datetime.combine(day, dtime(12, 0)))
+    task = create_scheduled_task(
+        db=db, user_id=user_id, title="Cancelled mid-load", description=None,
+        # clear of the daily standup above
+        task_date=day, start_time=dtime(14, 0), end_time=dtime(14, 30),
+    )
+    task_id = task.id
+
+    class RacingSession:
+        # returns the rows read, then deletes the task before the caller sees them
+        def __init__(self):
+            self.session = SessionLocal()
+
+        def execute(self, stmt):
+            rows = list(self.session.execute(stmt).scalars())
+            if any(row.id == task_id for row in rows):
+                other = SessionLocal()
+                try:
+                    delete_scheduled_task(db=other, task_id=task_id, user_id=user_id)
+                finally:
+                    other.close()
+            return Rows(rows)
+
+        def close(self):
+            self.session.close()
+
+    dispatcher = ReminderDispatcher(
+        [], lead_minutes=10, load_ahead_s=6 * 3600, factories=[RacingSession], clock=clock,
+    )
+    reminders._dispatcher = dispatcher
+    try:
+        dispatcher.load_window()
+    finally:
+        reminders._dispatcher = None
+    assert (user_id, task_id) not in dispatcher._by_task, dispatcher._by_task.get((user_id, task_id))
+
+
+def shard_checks():
+    print("\n=== Task ids repeat across shards ===")
+    day = date.today() + timedelta(days=45)
+    clock = Clock(datetime.combine(day, dtime(7, 0)))
+    with tempfile.TemporaryDirectory() as tmp:
+        router = ShardRouter("per_user", 4, tmp, max_engines=4)
+        users = (9801, 9802)
+        tasks = {}
+        for user_id in users:
+            session = router.session_for_user(user_id)
+            try:
+                task = ScheduledTask(
+                    user_id=user_id, title=f"Task of {user_id}", task_date=day,
+                    start_time=dtime(9, 0), end_time=dtime(9, 30),
+                )
+                session.add(task)
+                session.commit()
+                tasks[user_id] = task.id
+            finally:
+                session.close()
+        # both shards start numbering at 1
+        assert tasks[9801] == tasks[9802] == 1
+
+        delivered = []
+        dispatcher = ReminderDispatcher(
+            [delivered.append],
+            lead_minutes=10,
+            load_ahead_s=6 * 3600,
+            factories=[lambda key=f"user_{u}": router.session_for_key(key) for u in users],
+            clock=clock,
+        )
+        dispatcher.load_window()
+        dispatcher.poll_changes()
+        assert set(dispatcher._by_task) == {(9801, 1), (9802, 1)}
+
+        # another worker moves user 9801's task 1: only that one is replaced
+        session = router.session_for_user(9801)
+        try:
+            task = session.get(ScheduledTask, 1)
+            task.start_time, task.end_time = dtime(10, 0), dtime(10, 30)
+            session.commit()
+        finally:
+            session.close()
+        dispatcher.poll_changes()
+        assert {key: len(keys) for key, keys in dispatcher._by_task.items()} == {(9801, 1): 1, (9802, 1): 1}
+
+        # and deleting it through the hook leaves user 9802's task alone
+        dispatcher.task_deleted(9801, 1)
+        assert set(dispatcher._by_task) == {(9802, 1)}
+        for hour in (8, 9, 10, 11):
+            clock.now = datetime.combine(day, dtime(hour, 0)).timestamp()
+            dispatcher.tick()
+        print(delivered)
+        assert [(r["user_id"], r["remind_at"][11:16]) for r in delivered] == [(9802, "08:50")]
+
+
+def lock_checks():
+    print("\n=== One dispatcher across processes ===")
+    saved = (reminders.REMINDERS_ENABLED, reminders.REMINDER_LOCK_FILE, reminders.configured_sinks)
+    with tempfile.TemporaryDirectory() as tmp:
+        reminders.REMINDERS_ENABLED = True
+        reminders.REMINDER_LOCK_FILE = os.path.join(tmp, "reminders.lock")
+        reminders.configured_sinks = lambda: []
+        try:
+            # another worker holds the lock (a separate open file is a separate flock)
+            holder = open(reminders.REMINDER_LOCK_FILE, "a")
+            fcntl.flock(holder, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            assert reminders.start_reminders() is None
+            assert reminders.get_reminder_metrics()["running"] is False
+
+            # it exits: the next attempt takes over
+            holder.close()
+            dispatcher = reminders.start_reminders()
+            assert dispatcher is not None and reminders.get_reminder_metrics()["running"]
+            blocked = open(reminders.REMINDER_LOCK_FILE, "a")
+            try:
+                fcntl.flock(blocked, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                assert False, "lock should be held"
+            except OSError:
+                pass
+            finally:
+                blocked.close()
+        finally:
+            reminders.stop_reminders()
+            reminders.REMINDERS_ENABLED, reminders.REMINDER_LOCK_FILE, reminders.configured_sinks = saved
+
+
+def sink_checks(db, user_id):
+    print("\n=== Dispatcher thread delivers to the webhook and SSE sinks ===")
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # a clock 1.5 s before a whole minute, far enough out to not clash with real tasks
+    target = datetime.combine(date.today() + timedelta(days=60), dtime(6, 0))
+    offset = target.timestamp() - 1.5 - time.time()
+    dispatcher = ReminderDispatcher(
+        [WebhookSink(f"http://127.0.0.1:{server.server_port}/reminders"), stream_sink],
+        lead_minutes=0,
+        load_ahead_s=3600,
+        factories=[SessionLocal],
+        clock=lambda: time.time() + offset,
+    )
+    subscription = bus.subscribe(user_id, topics={"reminder"})
+    try:
+        create_scheduled_task(
+            db=db, user_id=user_id, title="Early run", description=None,
+            task_date=target.date(), start_time=target.time(), end_time=dtime(7, 0),
+        )
+        dispatcher.start()
+        reminder = subscription.get(timeout=5).data
+        print(reminder)
+        assert reminder["title"] == "Early run"
+        deadline = time.time() + 2
+        while not received and time.time() < deadline:
+            time.sleep(0.05)
+        assert received and received[0]["title"] == "Early run"
+        # one wakeup for the initial window, one for the reminder
+        assert dispatcher.snapshot()["counters"]["wakeups"] <= 2
+    finally:
+        dispatcher.stop()
+        bus.unsubscribe(subscription)
+        server.shutdown()
+
+
+def main():
+    print("=== Creating tables ===")
+    init_db()
+    reminders.track_task_changes()
+    wheel_checks()
+
+    db = SessionLocal()
+    try:
+        user_id = 9700
+        db.query(ScheduledTask).filter(ScheduledTask.user_id == user_id).delete()
+        db.query(ScheduledTaskChange).delete()
+        db.commit()
+        dispatcher_checks(db, user_id)
+        outbox_checks(db, user_id)
+        race_checks(db, user_id)
+        shard_checks()
+        sink_checks(db, user_id)
+        lock_checks()
+    finally:
+        db.close()
+        print("\n=== DB session closed ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import random
+from datetime import date
+
+import services.revisions as revisions
+from db import SessionLocal, init_db
+from main import create_app
+from models import AnalyticsRollup, JournalEntry, JournalRevision, TextAnalytics
+from services.html_text import text_stats
+from services.journal_entries import (
+    create_journal_entry,
+    delete_journal_entry,
+    get_journal_entry_revision,
+    get_journal_entry_revisions,
+    update_journal_entry,
+)
+from services.revisions import InvalidDelta, apply_delta, make_delta
+
+USER_ID = 9970
+
+WORDS = "river garden morning coffee quiet meeting project walk letter rain".split()
+
+
+def paragraph(rng, n=12):
+    return "<p>" + " ".join(rng.choice(WORDS) for _ in range(n)) + ".</p>"
+
+
+def edit(rng, html):
+    """A small change somewhere in the text, like one autosave's worth of typing."""
+    at = rng.randrange(len(html))
+    choice = rng.random()
+    if choice < 0.5:
+        return html[:at] + " " + rng.choice(WORDS) + html[at:]
+    if choice < 0.8:
+        return html + paragraph(rng)
+    return html[:at] + html[at + rng.randrange(1, 20):]
+
+
+def delta_checks():
+    print("=== Deltas ===")
+    rng = random.Random(3)
+    base = "".join(paragraph(rng) for _ in range(20))
+    target = base
+    for _ in range(200):
+        target = edit(rng, target)
+        assert apply_delta(base, make_delta(base, target)) == target
+
+    small = make_delta(base, base.replace("</p>", " again</p>", 1))
+    print(small)
+    assert len(small) == 3 and small[1] == " again"
+    assert make_delta(base, base) == [[0, len(base)]]
+    assert apply_delta("", make_delta("", "<p>new</p>")) == "<p>new</p>"
+
+    for bad in ([[0, len(base) + 1]], [[5, 2]], [7], [["a", "b"]]):
+        try:
+            apply_delta(base, bad)
+            raise AssertionError(f"accepted {bad}")
+        except InvalidDelta:
+            pass
+
+
+def history_checks(db):
+    print("\n=== History through the journal service ===")
+    rng = random.Random(11)
+    revisions.REVISION_COALESCE_S = 0
+    revisions.REVISION_SNAPSHOT_EVERY = 4
+
+    content = "".join(paragraph(rng) for _ in range(30))
+    entry = create_journal_entry(db=db, user_id=USER_ID, content=content, entry_date=date.today())
+    saved = [content]
+    for _ in range(10):
+        content = edit(rng, content)
+        update_journal_entry(db=db, entry_id=entry.id, user_id=USER_ID, content=content)
+        saved.append(content)
+
+    rows = get_journal_entry_revisions(db=db, entry_id=entry.id, user_id=USER_ID)
+    print([(r.revision, r.base_revision) for r in rows])
+    assert [r.revision for r in rows] == list(range(11, 0, -1))
+    snapshots = [r.revision for r in rows if r.base_revision is None]
+    assert sorted(snapshots) == [1, 5, 9]
+    assert all(r.base_revision in snapshots for r in rows if r.base_revision is not None)
+
+    for number, expected in enumerate(saved, start=1):
+        row, rebuilt = get_journal_entry_revision(db=db, entry_id=entry.id, user_id=USER_ID, revision=number)
+        assert rebuilt == expected and row.char_count == len(expected), number
+
+    stored = sum(len(row.data) for row in db.query(JournalRevision).filter(JournalRevision.entry_id == entry.id))
+    full = sum(len(text) for text in saved)
+    print(f"stored {stored} chars for {full} chars of versions")
+    assert stored < full / 2
+
+    print("\n=== Saves in a burst become one revision ===")
+    revisions.REVISION_COALESCE_S = 3600
+    for _ in range(3):
+        content = edit(rng, content)
+        update_journal_entry(db=db, entry_id=entry.id, user_id=USER_ID, content=content)
+    # revision 11 was only just written, so the burst is folded into it
+    rows = get_journal_entry_revisions(db=db, entry_id=entry.id, user_id=USER_ID)
+    assert rows[0].revision == 11
+    assert get_journal_entry_revision(db=db, entry_id=entry.id, user_id=USER_ID, revision=11)[1] == content
+
+    print("\n=== Retention ===")
+    revisions.REVISION_COALESCE_S = 0
+    revisions.REVISION_KEEP = 5
+    for _ in range(20):
+        content = edit(rng, content)
+        update_journal_entry(db=db, entry_id=entry.id, user_id=USER_ID, content=content)
+    rows = get_journal_entry_revisions(db=db, entry_id=entry.id, user_id=USER_ID)
+    kept = [r.revision for r in rows]
+    print(kept)
+    assert kept[0] == 31 and len(kept) <= 5 + 4
+    assert rows[-1].base_revision is None  # every kept delta still has its snapshot
+    for number in kept:
+        get_journal_entry_revision(db=db, entry_id=entry.id, user_id=USER_ID, revision=number)
+    assert get_journal_entry_revision(db=db, entry_id=entry.id, user_id=USER_ID, revision=31)[1] == content
+    return entry
+
+
+def legacy_checks(db):
+    print("\n=== Entries saved before history existed ===")
+    old = "<p>Written long ago.</p>"
+    entry = JournalEntry(user_id=USER_ID, content=old, entry_date=date.today(), **text_stats(old))
+    db.add(entry)
+    db.commit()
+
+    update_journal_entry(db=db, entry_id=entry.id, user_id=USER_ID, content="<p>Overwritten by mistake.</p>")
+    rows = get_journal_entry_revisions(db=db, entry_id=entry.id, user_id=USER_ID)
+    assert [r.revision for r in rows] == [2, 1]
+    assert get_journal_entry_revision(db=db, entry_id=entry.id, user_id=USER_ID, revision=1)[1] == old
+    return entry, old
+
+
+def route_checks(db, entry, old):
+    print("\n=== /api/journal-entries/<id>/revisions ===")
+    client = create_app().test_client()
+    headers = {"X-User-Id": str(USER_ID)}
+    base = f"/api/journal-entries/{entry.id}/revisions"
+
+    listing = client.get(base, headers=headers).get_json()
+    print(listing)
+    assert [r["revision"] for r in listing] == [2, 1] and "content" not in listing[0]
+    assert client.get(f"{base}/1", headers=headers).get_json()["content"] == old
+
+    restored = client.post(f"{base}/1/restore", headers=headers)
+    assert restored.status_code == 200 and restored.get_json()["content"] == old
+    assert [r["revision"] for r in client.get(base, headers=headers).get_json()] == [3, 2, 1]
+
+    assert client.get(f"{base}/9", headers=headers).status_code == 404
+    assert client.post(f"{base}/9/restore", headers=headers).status_code == 404
+    assert client.get(base, headers={"X-User-Id": str(USER_ID + 1)}).status_code == 404
+
+    delete_journal_entry(db=db, entry_id=entry.id, user_id=USER_ID)
+    assert db.query(JournalRevision).filter(JournalRevision.entry_id == entry.id).count() == 0
+
+
+def cleanup(db):
+    for model in (JournalEntry, JournalRevision, TextAnalytics, AnalyticsRollup):
+        db.query(model).filter(model.user_id == USER_ID).delete()
+    db.commit()
+
+
+def main():
+    print("=== Creating tables ===")
+    init_db()
+    delta_checks()
+
+    db = SessionLocal()
+    try:
+        cleanup(db)
+        history_checks(db)
+        entry, old = legacy_checks(db)
+        route_checks(db, entry, old)
+        cleanup(db)
+    finally:
+        db.close()
+        print("\n=== DB session closed ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+from datetime import date, time, timedelta
+
+from db import SessionLocal, init_db
+from models import ScheduledTask
+from services.scheduled_tasks import (
+    TaskOverlap,
+    create_scheduled_task,
+    update_scheduled_task,
+)
+from services.calendar_layout import get_week_layout
+from services.task_intervals import DayIntervals, find_free_slots
+
+
+def main():
+    print("=== Creating tables ===")
+    init_db()
+
+    db = SessionLocal()
+
+    try:
+        user_id = 9300
+        db.query(ScheduledTask).filter(ScheduledTask.user_id == user_id).delete()
+        db.commit()
+
+        # a Monday a couple of weeks out
+        monday = date.today() + timedelta(days=14 - date.today().weekday())
+
+        print("\n=== Creating tasks ===")
+        standup = create_scheduled_task(
+            db=db,
+            user_id=user_id,
+            title="Standup",
+            description=None,
+            task_date=monday,
+            start_time=time(9, 0),
+            end_time=time(9, 30),
+            is_recurring=True,
+            recurrence_pattern="weekdays",
+        )
+        lunch = create_scheduled_task(
+            db=db,
+            user_id=user_id,
+            title="Lunch",
+            description=None,
+            task_date=monday + timedelta(days=2),
+            start_time=time(12, 0),
+            end_time=time(13, 0),
+        )
+        print(standup, lunch)
+
+        print("\n=== Overlap with a recurring occurrence ===")
+        try:
+            create_scheduled_task(
+                db=db,
+                user_id=user_id,
+                title="Clash",
+                description=None,
+                task_date=monday + timedelta(days=3),
+                start_time=time(9, 15),
+                end_time=time(10, 0),
+            )
+            assert False, "expected TaskOverlap"
+        except TaskOverlap as e:
+            print(e, e.conflicts)
+            assert [task.id for _, task in e.conflicts] == [standup.id]
+
+        # weekends are free of the weekday standup
+        saturday = create_scheduled_task(
+            db=db,
+            user_id=user_id,
+            title="Long run",
+            description=None,
+            task_date=monday + timedelta(days=5),
+            start_time=time(9, 0),
+            end_time=time(11, 0),
+        )
+
+        print("\n=== Back-to-back tasks do not overlap ===")
+        create_scheduled_task(
+            db=db,
+            user_id=user_id,
+            title="After standup",
+            description=None,
+            task_date=monday,
+            start_time=time(9, 30),
+            end_time=time(10, 0),
+        )
+
+        print("\n=== Rescheduling is checked too ===")
+        try:
+            update_scheduled_task(
+                db=db,
+                task_id=lunch.id,
+                user_id=user_id,
+                start_time=time(9, 0),
+                end_time=time(9, 45),
+            )
+            assert False, "expected TaskOverlap"
+        except TaskOverlap as e:
+            print(e)
+        update_scheduled_task(db=db, task_id=lunch.id, user_id=user_id, is_completed=True)
+        update_scheduled_task(db=db, task_id=saturday.id, user_id=user_id, end_time=time(11, 30))
+
+        print("\n=== Free slots ===")
+        slots = find_free_slots(
+            db=db,
+            user_id=user_id,
+            start_date=monday,
+            end_date=monday + timedelta(days=2),
+            duration_minutes=60,
+            day_start=time(8, 0),
+            day_end=time(14, 0),
+        )
+        for slot in slots:
+            print(slot)
+        assert slots[0] == {"date": monday, "start_time": time(8, 0), "end_time": time(9, 0)}
+        assert slots[1] == {"date": monday, "start_time": time(10, 0), "end_time": time(14, 0)}
+        wednesday = [s for s in slots if s["date"] == monday + timedelta(days=2)]
+        assert [(s["start_time"], s["end_time"]) for s in wednesday] == [
+            (time(8, 0), time(9, 0)),
+            (time(9, 30), time(12, 0)),
+            (time(13, 0), time(14, 0)),
+        ]
+
+        print("\n=== Interval queries with nested intervals ===")
+        day = DayIntervals([
+            ScheduledTask(start_time=time(8, 0), end_time=time(12, 0)),
+            ScheduledTask(start_time=time(9, 0), end_time=time(9, 30)),
+            ScheduledTask(start_time=time(13, 0), end_time=time(14, 0)),
+        ])
+        assert len(day.overlapping(9 * 60 + 45, 10 * 60)) == 1
+        assert len(day.overlapping(12 * 60, 13 * 60)) == 0
+        assert day.free_slots(30, 8 * 60, 15 * 60) == [(12 * 60, 13 * 60), (14 * 60, 15 * 60)]
+
+        print("\n=== Week layout ===")
+        create_scheduled_task(
+            db=db,
+            user_id=user_id,
+            title="Overlapping",
+            description=None,
+            task_date=monday,
+            start_time=time(9, 15),
+            end_time=time(10, 15),
+            allow_overlap=True,
+        )
+
+        def to_dict(task):
+            return {"id": task.id, "title": task.title}
+
+        sunday = monday - timedelta(days=1)
+        layout = get_week_layout(
+            db=db,
+            user_id=user_id,
+            start_date=sunday,
+            end_date=sunday + timedelta(days=6),
+            to_dict=to_dict,
+        )
+        assert len(layout["days"]) == 7
+        day = layout["days"][monday.isoformat()]
+        print(day)
+        assert [t["title"] for t in day["tasks"]] == ["Standup", "Overlapping", "After standup"]
+        assert day["hours"] == {"9": [0, 1, 2]}
+        assert [(t["lane"], t["lanes"]) for t in day["tasks"]] == [(0, 2), (1, 2), (0, 2)]
+        assert day["tasks"][1]["duration_minutes"] == 60
+
+        cached = get_week_layout(
+            db=db,
+            user_id=user_id,
+            start_date=sunday,
+            end_date=sunday + timedelta(days=6),
+            to_dict=to_dict,
+        )
+        assert cached is layout
+
+        update_scheduled_task(db=db, task_id=standup.id, user_id=user_id, is_completed=True)
+        refreshed = get_week_layout(
+            db=db,
+            user_id=user_id,
+            start_date=sunday,
+            end_date=sunday + timedelta(days=6),
+            to_dict=to_dict,
+        )
+        assert refreshed["version"] != layout["version"]
+
+    finally:
+        db.close()
+        print("\n=== DB session closed ===")
+
+
+if __name__ == "__main__":
+    main()
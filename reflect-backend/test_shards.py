@@ -0,0 +1,189 @@
+import os
+import sqlite3
+import tempfile
+from datetime import date, datetime, time, timedelta
+
+# must be set before db.py is imported: split_shards also splits the archive
+os.environ.setdefault("ARCHIVE_ENABLED", "1")
+
+from flask import g
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+
+import db as db_module
+from db import ShardRouter, init_db
+from main import create_app
+from models import ArchivedJournalEntry, DailyReflection, JournalEntry
+from split_shards import split
+
+USER_IDS = list(range(1, 11))
+
+
+def datetime_on(day):
+    return datetime.combine(day, time(12, 0))
+
+
+def routing_checks(tmp):
+    print("=== Routing ===")
+    hashed = ShardRouter("hash", 4, os.path.join(tmp, "hash"), max_engines=8)
+    assert hashed.shard_key(5) == "shard_001" and hashed.shard_key(8) == "shard_000"
+    assert hashed.path_for("shard_001") == os.path.join(tmp, "hash", "shard_001.db")
+
+    per_user = ShardRouter("per_user", 4, os.path.join(tmp, "per_user"), max_engines=8)
+    assert per_user.shard_key(5) == "user_5"
+    # nothing is created until a shard is used
+    assert per_user.shard_keys() == []
+
+
+def schema_checks(tmp):
+    print("\n=== Schema created on first use ===")
+    router = ShardRouter("hash", 4, os.path.join(tmp, "schema"), max_engines=8)
+    session = router.session_for_user(6)
+    try:
+        session.add(JournalEntry(user_id=6, content="<p>sharded</p>", entry_date=date.today()))
+        session.commit()
+    finally:
+        session.close()
+
+    assert router.shard_keys() == ["shard_002"]
+    tables = inspect(router.engine_for_key("shard_002")).get_table_names()
+    assert "journal_entries" in tables and "daily_reflections" in tables
+
+    # the row lives in user 6's shard and nowhere else
+    other = router.session_for_user(7)
+    try:
+        assert other.query(JournalEntry).count() == 0
+    finally:
+        other.close()
+    session = router.session_for_user(6)
+    try:
+        assert session.query(JournalEntry).filter(JournalEntry.user_id == 6).count() == 1
+    finally:
+        session.close()
+
+
+def eviction_checks(tmp):
+    print("\n=== Engine cache eviction ===")
+    router = ShardRouter("per_user", 4, os.path.join(tmp, "lru"), max_engines=2)
+    first = router.engine_for_key("user_1")
+    router.engine_for_key("user_2")
+    assert router.engine_for_key("user_1") is first  # touched: now most recent
+    router.engine_for_key("user_3")
+
+    cached = [key for _, key in router._engines]
+    print(cached)
+    assert cached == ["user_1", "user_3"]
+
+    # an evicted shard reopens with a fresh engine on the same file
+    reopened = router.engine_for_key("user_2")
+    assert "user_2" in [key for _, key in router._engines]
+    assert reopened.url.database == router.path_for("user_2")
+    assert sorted(router.shard_keys()) == ["user_1", "user_2", "user_3"]
+
+
+def split_checks(tmp):
+    print("\n=== split_shards round trip ===")
+    source_path = os.path.join(tmp, "source.db")
+    source_engine = create_engine(f"sqlite:///{source_path}", future=True)
+    init_db(bind=source_engine)
+    Session = sessionmaker(bind=source_engine, future=True, autoflush=False)
+    with Session() as session:
+        for user_id in USER_IDS:
+            reflection = DailyReflection(user_id=user_id, reflection_date=date.today(), summary=f"<p>{user_id}</p>")
+            session.add(reflection)
+            session.flush()
+            for n in range(user_id):
+                session.add(JournalEntry(
+                    user_id=user_id, reflection_id=reflection.id,
+                    content=f"<p>{user_id}/{n}</p>", entry_date=date.today(),
+                ))
+        # archived entries, with ids above every hot one
+        old_day = date.today() - timedelta(days=800)
+        for user_id in USER_IDS:
+            session.add(ArchivedJournalEntry(
+                id=1000 + user_id, user_id=user_id, content=f"<p>old {user_id}</p>",
+                entry_date=old_day, created_at=datetime_on(old_day), updated_at=datetime_on(old_day),
+            ))
+        session.commit()
+    source_engine.dispose()
+
+    router = ShardRouter("hash", 3, os.path.join(tmp, "split"), max_engines=8)
+    copied = split(source_path, batch_size=7, router=router)
+    print(copied)
+    assert copied["journal_entries"] == sum(USER_IDS)
+    assert copied["daily_reflections"] == len(USER_IDS)
+    assert copied["archived_journal_entries"] == len(USER_IDS)
+    assert router.shard_keys() == ["shard_000", "shard_001", "shard_002"]
+
+    source = sqlite3.connect(source_path)
+    try:
+        for user_id in USER_IDS:
+            session = router.session_for_user(user_id)
+            try:
+                entries = session.query(JournalEntry).filter(JournalEntry.user_id == user_id).all()
+                assert len(entries) == user_id
+                # primary keys are kept, so entries still point at their reflection
+                expected = source.execute(
+                    "SELECT id FROM daily_reflections WHERE user_id = ?", (user_id,)
+                ).fetchone()[0]
+                assert {entry.reflection_id for entry in entries} == {expected}
+                # and no other user's rows leaked into this shard
+                foreign = session.query(JournalEntry).filter(JournalEntry.user_id != user_id).all()
+                assert all(router.shard_key(e.user_id) == router.shard_key(user_id) for e in foreign)
+
+                # archived entries moved to the archive next to the shard
+                archived = session.query(ArchivedJournalEntry).filter(ArchivedJournalEntry.user_id == user_id).all()
+                assert [a.id for a in archived] == [1000 + user_id]
+            finally:
+                session.close()
+    finally:
+        source.close()
+
+    # a new entry in a shard skips the ids of the shard's archived entries
+    session = router.session_for_user(1)
+    try:
+        entry = JournalEntry(user_id=1, content="<p>new</p>", entry_date=date.today())
+        session.add(entry)
+        session.commit()
+        highest = max(a.id for a in session.query(ArchivedJournalEntry))
+        print(entry.id, highest)
+        assert entry.id > highest
+    finally:
+        session.close()
+
+
+def request_checks(tmp):
+    print("\n=== Request sessions follow the user ===")
+    router = ShardRouter("hash", 4, os.path.join(tmp, "requests"), max_engines=8)
+    app = create_app()
+    saved, db_module.shard_router = db_module.shard_router, router
+    try:
+        with app.test_request_context():
+            g.user_id = 9
+            session = db_module.SessionLocal()
+            try:
+                assert session.get_bind().url.database == router.path_for("shard_001")
+            finally:
+                session.close()
+        # outside a request, scripts still get app.db
+        session = db_module.SessionLocal()
+        try:
+            assert session.get_bind().url.database == "app.db"
+        finally:
+            session.close()
+    finally:
+        db_module.shard_router = saved
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        routing_checks(tmp)
+        schema_checks(tmp)
+        eviction_checks(tmp)
+        split_checks(tmp)
+        request_checks(tmp)
+    print("\n=== Done ===")
+
+
+if __name__ == "__main__":
+    main()
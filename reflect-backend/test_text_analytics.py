@@ -0,0 +1,180 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import backfill_text_analytics
+from db import SessionLocal, init_db
+from main import create_app
+from models import AnalyticsRollup, DailyReflection, JournalEntry, TextAnalytics
+from services.html_text import text_stats
+from services.journal_entries import create_journal_entry, delete_journal_entry, update_journal_entry
+from services.reflections import create_or_update_daily_reflection
+from services.text_analytics import analyze_text, get_mood_trend, get_top_terms, week_start
+
+USER_ID = 9960
+
+
+def analyzer_checks():
+    print("=== Analyzer ===")
+    happy = analyze_text("Great run this morning, felt calm and grateful.")
+    print(happy)
+    assert happy["words"] == 8 and happy["negative"] == 0
+    assert happy["positive"] == 3 + 2 + 2 and happy["mood"] == 1.0
+    assert set(happy["terms"]) == {"great", "run", "morning", "felt", "calm", "grateful"}
+
+    # negation flips the words right after it
+    flipped = analyze_text("Not happy, not great, and so tired today.")
+    assert flipped["positive"] == 0 and flipped["negative"] == 2 + 3 + 2
+    assert flipped["mood"] == -1.0
+    assert analyze_text("The meeting was on Tuesday.")["mood"] is None
+    assert analyze_text("")["words"] == 0
+
+
+def rollup(db, period, start):
+    return (
+        db.query(AnalyticsRollup)
+        .filter(
+            AnalyticsRollup.user_id == USER_ID,
+            AnalyticsRollup.period == period,
+            AnalyticsRollup.period_start == start,
+        )
+        .one_or_none()
+    )
+
+
+def incremental_checks(db, monday):
+    print("\n=== Writes keep the rollups current ===")
+    tuesday, next_monday = monday + timedelta(days=1), monday + timedelta(days=7)
+
+    first = create_journal_entry(db=db, user_id=USER_ID, content="<p>Great garden day, happy.</p>", entry_date=monday)
+    second = create_journal_entry(db=db, user_id=USER_ID, content="<p>Tired and stressed at work.</p>", entry_date=tuesday)
+    create_journal_entry(db=db, user_id=USER_ID, content="<p>Garden again, calm garden.</p>", entry_date=next_monday)
+    create_or_update_daily_reflection(
+        db=db, user_id=USER_ID, reflection_date=tuesday,
+        summary="<p>Work was awful.</p>", accomplishments="<p>Shipped the garden planner.</p>",
+        improvements_to_make=None,
+    )
+
+    day = rollup(db, "day", tuesday)
+    assert day.entries == 2 and day.positive == 0 and day.negative == 2 + 2 + 3
+    week = rollup(db, "week", monday)
+    assert week.entries == 3 and week.words == 4 + 5 + 7
+    assert rollup(db, "week", next_monday).entries == 1
+
+    # an edit replaces the entry's contribution instead of adding to it
+    update_journal_entry(db=db, entry_id=second.id, user_id=USER_ID, content="<p>Rested and happy.</p>")
+    day = rollup(db, "day", tuesday)
+    assert day.entries == 2 and day.positive == 2 + 2 and day.negative == 3
+    create_or_update_daily_reflection(
+        db=db, user_id=USER_ID, reflection_date=tuesday,
+        summary="<p>Work was fine.</p>", accomplishments=None, improvements_to_make=None,
+    )
+    assert rollup(db, "day", tuesday).negative == 0
+
+    trend = get_mood_trend(db=db, user_id=USER_ID, start_date=monday, end_date=next_monday)
+    print(trend)
+    assert [point["period_start"] for point in trend] == [
+        monday.isoformat(), tuesday.isoformat(), next_monday.isoformat()
+    ]
+    assert trend[0]["mood"] == 1.0 and trend[1]["entries"] == 2
+    weekly = get_mood_trend(db=db, user_id=USER_ID, start_date=tuesday, end_date=next_monday, period="week")
+    assert [point["entries"] for point in weekly] == [3, 1]
+
+    # a range starting mid-week reads that week's days, then whole weeks
+    terms = get_top_terms(db=db, user_id=USER_ID, start_date=tuesday, end_date=next_monday + timedelta(days=6))
+    print(terms)
+    assert terms[0] == {"term": "garden", "count": 2}
+    assert {"term": "great", "count": 1} not in terms  # Monday's entry is outside
+
+    delete_journal_entry(db=db, entry_id=first.id, user_id=USER_ID)
+    assert rollup(db, "day", monday) is None
+    assert rollup(db, "week", monday).entries == 2
+    assert db.query(TextAnalytics).filter(TextAnalytics.source_id == first.id).count() == 0
+
+
+def backfill_checks(db, monday):
+    print("\n=== Backfill matches the incremental rollups ===")
+    expected = {
+        (r.period, r.period_start): (r.entries, r.words, r.positive, r.negative, r.terms)
+        for r in db.query(AnalyticsRollup).filter(AnalyticsRollup.user_id == USER_ID)
+    }
+
+    # rows written without going through the services, as before analytics existed
+    old_day = monday - timedelta(days=14)
+    content = "<p>Awful day, not productive.</p>"
+    db.add(JournalEntry(user_id=USER_ID, content=content, entry_date=old_day, **text_stats(content)))
+    db.query(TextAnalytics).filter(TextAnalytics.user_id == USER_ID).delete()
+    db.query(AnalyticsRollup).filter(AnalyticsRollup.user_id == USER_ID).delete()
+    db.commit()
+
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        analyzed, users = backfill_text_analytics.backfill(SessionLocal, pool, batch_size=2, max_pending=2)
+    print(analyzed, "rows analyzed")
+    assert USER_ID in users
+    assert db.query(TextAnalytics).filter(TextAnalytics.user_id == USER_ID).count() == 4
+
+    rebuilt = {
+        (r.period, r.period_start): (r.entries, r.words, r.positive, r.negative, r.terms)
+        for r in db.query(AnalyticsRollup).filter(AnalyticsRollup.user_id == USER_ID)
+    }
+    old = rebuilt.pop(("day", old_day))
+    assert old[0] == 1 and old[2] == 0 and old[3] == 3 + 2
+    rebuilt.pop(("week", week_start(old_day)))
+    assert {key: value[:4] for key, value in rebuilt.items()} == {key: value[:4] for key, value in expected.items()}
+
+    # nothing left to do on a second run
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        assert backfill_text_analytics.backfill(SessionLocal, pool, batch_size=2, max_pending=2)[0] == 0
+
+
+def route_checks(monday):
+    print("\n=== /api/analytics ===")
+    client = create_app().test_client()
+    headers = {"X-User-Id": str(USER_ID)}
+    end = monday + timedelta(days=13)
+
+    response = client.get(f"/api/analytics/mood?start={monday}&end={end}&period=week", headers=headers)
+    print(response.get_json())
+    assert response.status_code == 200 and len(response.get_json()) == 2
+
+    response = client.get(f"/api/analytics/terms?start={monday}&end={end}&limit=1", headers=headers)
+    assert response.get_json() == [{"term": "garden", "count": 2}]
+
+    bad = [
+        f"/api/analytics/mood?start={end}&end={monday}",
+        f"/api/analytics/mood?start={monday}&end={end}&period=month",
+        f"/api/analytics/mood?start={monday}",
+        f"/api/analytics/mood?start={monday - timedelta(days=400)}&end={end}",
+        f"/api/analytics/terms?start={monday}&end={end}&limit=0",
+        f"/api/analytics/terms?start={monday}&end={end}&limit=x",
+    ]
+    for url in bad:
+        assert client.get(url, headers=headers).status_code == 400, url
+
+
+def cleanup(db):
+    for model in (JournalEntry, DailyReflection, TextAnalytics, AnalyticsRollup):
+        db.query(model).filter(model.user_id == USER_ID).delete()
+    db.commit()
+
+
+def main():
+    print("=== Creating tables ===")
+    init_db()
+    analyzer_checks()
+
+    monday = week_start(date.today()) - timedelta(days=21)
+    db = SessionLocal()
+    try:
+        cleanup(db)
+        incremental_checks(db, monday)
+        backfill_checks(db, monday)
+        route_checks(monday)
+        # leave no reflections behind for the other scripts' date-based queries
+        cleanup(db)
+    finally:
+        db.close()
+        print("\n=== DB session closed ===")
+
+
+if __name__ == "__main__":
+    main()
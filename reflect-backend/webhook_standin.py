@@ -0,0 +1,46 @@
+"""
+Local stand-in for the reminder webhook.
+
+Prints every JSON body POSTed to it. Run it next to the API with
+REMINDER_SINKS=webhook and the default REMINDER_WEBHOOK_URL.
+
+Usage:
+    python webhook_standin.py [--port 5055]
+"""
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+
+class ReminderHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", "0"))
+        try:
+            reminder = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self.send_response(400)
+            self.end_headers()
+            return
+        print(f"{self.path}: {json.dumps(reminder)}", flush=True)
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass  # the reminder line above is enough
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reminder webhook stand-in")
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+
+    server = HTTPServer(("127.0.0.1", args.port), ReminderHandler)
+    print(f"listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { BookOpen, Calendar, Loader2, Trash2, Search, ChevronDown, ChevronUp, Filter, Edit2 } from 'lucide-react';
 import * as api from '../services/api';
+import useChangeEvents, { applyChange } from '../hooks/useChangeEvents';
 import ConfirmDialog from './ConfirmDialog';
 import JournalModal from '../views/JournalModal';
 import { useTheme } from '../contexts/ThemeContext';
@@ -36,6 +37,15 @@ export default function JournalEntriesView({ userId }) {
     }
   };
 
+  // entries written or edited elsewhere are patched in, newest first
+  useChangeEvents(userId, (event, data) => {
+    if (event === 'resync') {
+      loadJournalEntries();
+    } else if (event === 'change' && data.entity === 'journal_entry') {
+      setEntries(current => applyChange(current, data, { prepend: true }));
+    }
+  });
+
   const formatDate = (dateString) => {
     const date = new Date(dateString + 'T00:00:00');
     return date.toLocaleDateString('en-US', {
@@ -68,17 +78,22 @@ export default function JournalEntriesView({ userId }) {
     }
   };
 
+  const handleRestoredEntry = (restored) => {
+    setEntries(current => current.map(entry => (entry.id === restored.id ? restored : entry)));
+    setEditingEntry(restored);
+  };
+
   const handleUpdateEntry = async (content) => {
     if (!editingEntry) return;
 
     setSaving(true);
     try {
-      await api.updateJournalEntry(userId, editingEntry.id, content);
-      // Reload entries to get updated data
-      await loadJournalEntries();
+      const updated = await api.saveJournalEntry(userId, editingEntry, content);
+      setEntries(current => current.map(entry => (entry.id === updated.id ? updated : entry)));
       setEditingEntry(null);
     } catch (err) {
-      setError(err.message);
+      // a conflict is shown in the modal, with the unsaved text still there
+      if (err.status !== 409) setError(err.message);
       throw err;
     } finally {
       setSaving(false);
@@ -376,9 +391,12 @@ export default function JournalEntriesView({ userId }) {
           isOpen={true}
           onClose={() => setEditingEntry(null)}
           onSubmit={handleUpdateEntry}
+          onRestored={handleRestoredEntry}
           loading={saving}
           initialContent={editingEntry.content}
           isEditing={true}
+          userId={userId}
+          entryId={editingEntry.id}
         />
       )}
 
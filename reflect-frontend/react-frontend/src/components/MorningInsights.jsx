@@ -3,6 +3,14 @@ import { Sunrise, Target, TrendingUp, Sparkles, Loader2, Lightbulb } from 'lucid
 import { useTheme } from '../contexts/ThemeContext';
 import * as api from '../services/api';
 
+// the API names icons by string
+const ICONS = { Target, TrendingUp, Sparkles, Lightbulb };
+
+const withIcon = (insight) => ({
+  ...insight,
+  icon: typeof insight.icon === 'string' ? (ICONS[insight.icon] || Sparkles) : insight.icon,
+});
+
 export default function MorningInsights({ userId, onNavigate }) {
   const { timeOfDay } = useTheme();
   const [loading, setLoading] = useState(true);
@@ -17,9 +25,20 @@ export default function MorningInsights({ userId, onNavigate }) {
   const loadMorningData = async () => {
     setLoading(true);
     try {
-      // Call AI insights API endpoint
-      const aiInsights = await api.getMorningInsights(userId);
-      setInsights(aiInsights);
+      // Stream AI insights: show the rule-based placeholder right away and
+      // replace it insight by insight as the model finishes each one
+      let receivedAiInsight = false;
+      await api.streamMorningInsights(userId, (event, data) => {
+        if (event === 'placeholder') {
+          setInsights(data.map(withIcon));
+          setLoading(false);
+        } else if (event === 'insight') {
+          const insight = withIcon(data);
+          setInsights(prev => (receivedAiInsight ? [...prev, insight] : [insight]));
+          receivedAiInsight = true;
+          setLoading(false);
+        }
+      });
 
       // Still load goals for display purposes
       const goalsData = await api.getGoals(userId, 'active');
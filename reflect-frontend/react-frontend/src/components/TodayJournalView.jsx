@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { BookOpen, Loader2, Clock, Trash2, Edit2 } from 'lucide-react';
 import * as api from '../services/api';
+import useChangeEvents, { applyChange } from '../hooks/useChangeEvents';
 import ConfirmDialog from './ConfirmDialog';
 import JournalModal from '../views/JournalModal';
 import './RichTextEditor.css';
@@ -31,6 +32,17 @@ export default function TodayJournalView({ userId }) {
     }
   };
 
+  useChangeEvents(userId, (event, data) => {
+    if (event === 'resync') {
+      loadTodayEntries();
+      return;
+    }
+    if (event !== 'change' || data.entity !== 'journal_entry') return;
+    // only today's entries belong here; edits never move an entry to another day
+    if (data.op === 'create' && data.fields.entry_date !== api.getTodayDate()) return;
+    setEntries(current => applyChange(current, data));
+  });
+
   const formatTime = (dateString) => {
     const date = new Date(dateString);
     return date.toLocaleTimeString('en-US', {
@@ -54,17 +66,22 @@ export default function TodayJournalView({ userId }) {
     }
   };
 
+  const handleRestoredEntry = (restored) => {
+    setEntries(current => current.map(entry => (entry.id === restored.id ? restored : entry)));
+    setEditingEntry(restored);
+  };
+
   const handleUpdateEntry = async (content) => {
     if (!editingEntry) return;
 
     setSaving(true);
     try {
-      await api.updateJournalEntry(userId, editingEntry.id, content);
-      // Reload entries to get updated data
-      await loadTodayEntries();
+      const updated = await api.saveJournalEntry(userId, editingEntry, content);
+      setEntries(current => current.map(entry => (entry.id === updated.id ? updated : entry)));
       setEditingEntry(null);
     } catch (err) {
-      setError(err.message);
+      // a conflict is shown in the modal, with the unsaved text still there
+      if (err.status !== 409) setError(err.message);
       throw err;
     } finally {
       setSaving(false);
@@ -174,9 +191,12 @@ export default function TodayJournalView({ userId }) {
           isOpen={true}
           onClose={() => setEditingEntry(null)}
           onSubmit={handleUpdateEntry}
+          onRestored={handleRestoredEntry}
           loading={saving}
           initialContent={editingEntry.content}
           isEditing={true}
+          userId={userId}
+          entryId={editingEntry.id}
         />
       )}
 
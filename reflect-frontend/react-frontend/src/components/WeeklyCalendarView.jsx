@@ -2,11 +2,15 @@ import React, { useState, useEffect } from 'react';
 import { ChevronLeft, ChevronRight, Plus, Loader2, Check } from 'lucide-react';
 import { useTheme } from '../contexts/ThemeContext';
 import * as api from '../services/api';
+import useChangeEvents from '../hooks/useChangeEvents';
+
+// fields that change how a task looks but not where it sits in the grid
+const IN_PLACE_FIELDS = new Set(['title', 'description', 'is_completed', 'completed_at', 'updated_at']);
 
 export default function WeeklyCalendarView({ userId, onOpenTaskModal }) {
   const { timeOfDay } = useTheme();
   const [currentWeek, setCurrentWeek] = useState(new Date());
-  const [tasks, setTasks] = useState([]);
+  const [week, setWeek] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
@@ -20,8 +24,8 @@ export default function WeeklyCalendarView({ userId, onOpenTaskModal }) {
     setLoading(true);
     try {
       const { start, end } = api.getWeekDateRange(currentWeek);
-      const data = await api.getScheduledTasks(userId, start, end);
-      setTasks(data);
+      const data = await api.getScheduledTasksWeek(userId, start, end);
+      setWeek(data);
     } catch (err) {
       setError(err.message);
     } finally {
@@ -29,6 +33,46 @@ export default function WeeklyCalendarView({ userId, onOpenTaskModal }) {
     }
   };
 
+  // merge fields into every occurrence of the task shown this week
+  const patchTask = (taskId, fields) => {
+    setWeek((current) => {
+      if (!current) return current;
+      const days = {};
+      for (const [date, day] of Object.entries(current.days)) {
+        days[date] = {
+          ...day,
+          tasks: day.tasks.map((t) => (t.id === taskId ? { ...t, ...fields } : t)),
+        };
+      }
+      return { ...current, days };
+    });
+  };
+
+  const isShownThisWeek = (taskId) =>
+    Object.values(week?.days || {}).some((day) => day.tasks.some((t) => t.id === taskId));
+
+  const fallsInWeek = (fields) => {
+    if (!fields?.task_date) return false;
+    const { start, end } = api.getWeekDateRange(currentWeek);
+    return fields.is_recurring || (fields.task_date >= start && fields.task_date <= end);
+  };
+
+  useChangeEvents(userId, (event, data) => {
+    if (event === 'resync') {
+      loadWeekTasks();
+      return;
+    }
+    if (event !== 'change' || data.entity !== 'scheduled_task') return;
+
+    const fields = data.fields || {};
+    if (data.op === 'update' && Object.keys(fields).every((key) => IN_PLACE_FIELDS.has(key))) {
+      patchTask(data.id, fields);
+    } else if (isShownThisWeek(data.id) || fallsInWeek(fields)) {
+      // moves, resizes, new and removed tasks change the bucketing and overlap layout
+      loadWeekTasks();
+    }
+  });
+
   const getWeekDays = () => {
     const { sunday } = api.getWeekDateRange(currentWeek);
     return Array.from({ length: 7 }, (_, i) => {
@@ -56,28 +100,24 @@ export default function WeeklyCalendarView({ userId, onOpenTaskModal }) {
     setCurrentWeek(newDate);
   };
 
+  // tasks arrive bucketed by day and start hour, so a cell is a lookup
   const getTasksForDayAndHour = (date, hour) => {
     const dateStr = date.toISOString().split('T')[0];
-    return tasks.filter(task => {
-      if (task.task_date !== dateStr) return false;
-      const taskStartHour = parseInt(task.start_time.split(':')[0]);
-      return taskStartHour === hour;
-    });
+    const day = week?.days[dateStr];
+    if (!day) return [];
+    return (day.hours[hour] || []).map((index) => day.tasks[index]);
   };
 
-  const calculateTaskHeight = (startTime, endTime) => {
-    const [startHour, startMin] = startTime.split(':').map(Number);
-    const [endHour, endMin] = endTime.split(':').map(Number);
-    const durationMinutes = (endHour * 60 + endMin) - (startHour * 60 + startMin);
-    return Math.max(durationMinutes / 60, 0.5); // Minimum 0.5 hour height
+  const calculateTaskHeight = (task) => {
+    return Math.max(task.duration_minutes / 60, 0.5); // Minimum 0.5 hour height
   };
 
   const handleToggleComplete = async (task) => {
     try {
-      await api.updateScheduledTask(userId, task.id, {
+      const updated = await api.updateScheduledTask(userId, task.id, {
         is_completed: !task.is_completed
       });
-      await loadWeekTasks();
+      patchTask(task.id, { is_completed: updated.is_completed, completed_at: updated.completed_at });
     } catch (err) {
       console.error('Error toggling task completion:', err);
     }
@@ -230,7 +270,7 @@ export default function WeeklyCalendarView({ userId, onOpenTaskModal }) {
 
                       {/* Tasks */}
                       {dayTasks.map((task) => {
-                        const height = calculateTaskHeight(task.start_time, task.end_time);
+                        const height = calculateTaskHeight(task);
                         const taskIsPast = isTaskPast(task);
 
                         return (
@@ -248,7 +288,10 @@ export default function WeeklyCalendarView({ userId, onOpenTaskModal }) {
                             }`}
                             style={{
                               height: `${height * 80}px`,
-                              minHeight: '40px'
+                              minHeight: '40px',
+                              // overlapping tasks share the column side by side
+                              width: `${100 / task.lanes}%`,
+                              marginLeft: `${(100 * task.lane) / task.lanes}%`
                             }}
                           >
                             <div className="flex items-start justify-between gap-1">
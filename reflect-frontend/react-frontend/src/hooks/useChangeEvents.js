@@ -0,0 +1,94 @@
+import { useEffect, useRef } from 'react';
+import * as api from '../services/api';
+
+// One event stream per user, shared by every mounted listener
+const connections = new Map();
+
+const MAX_BACKOFF_MS = 30000;
+
+const connect = (userId) => {
+  const connection = { listeners: new Set(), controller: null, closed: false };
+
+  const dispatch = (event, data) => {
+    connection.listeners.forEach((listener) => listener(event, data));
+  };
+
+  const run = async () => {
+    let backoff = 1000;
+    let connectedBefore = false;
+    while (!connection.closed) {
+      connection.controller = new AbortController();
+      try {
+        const opened = api.streamEvents(userId, (event, data) => {
+          backoff = 1000;
+          dispatch(event, data);
+        }, connection.controller.signal);
+        // events may have been missed while disconnected
+        if (connectedBefore) dispatch('resync', {});
+        connectedBefore = true;
+        await opened;
+      } catch (err) {
+        if (connection.closed) return;
+        console.error('Event stream error:', err);
+      }
+      await new Promise((resolve) => setTimeout(resolve, backoff));
+      backoff = Math.min(backoff * 2, MAX_BACKOFF_MS);
+    }
+  };
+
+  run();
+  return connection;
+};
+
+const subscribe = (userId, listener) => {
+  let connection = connections.get(userId);
+  if (!connection) {
+    connection = connect(userId);
+    connections.set(userId, connection);
+  }
+  connection.listeners.add(listener);
+
+  return () => {
+    connection.listeners.delete(listener);
+    if (connection.listeners.size === 0) {
+      connection.closed = true;
+      connection.controller?.abort();
+      connections.delete(userId);
+    }
+  };
+};
+
+/**
+ * Call onEvent(event, data) for every change pushed for the user: 'change'
+ * events carry {entity, op, id, fields, version}; 'resync' means events
+ * were lost and the caller should refetch.
+ */
+export default function useChangeEvents(userId, onEvent) {
+  const handler = useRef(onEvent);
+  handler.current = onEvent;
+
+  useEffect(() => {
+    if (!userId) return undefined;
+    return subscribe(userId, (event, data) => handler.current(event, data));
+  }, [userId]);
+}
+
+/**
+ * Apply a change event to a list of rows: deletes remove the row, updates
+ * merge the changed fields and creates insert the row unless it is already
+ * there (the tab that made the change usually is). Created rows go last,
+ * or first with `prepend` for newest-first lists.
+ */
+export const applyChange = (rows, change, { prepend = false } = {}) => {
+  if (change.op === 'delete') {
+    return rows.filter((row) => row.id !== change.id);
+  }
+  const index = rows.findIndex((row) => row.id === change.id);
+  if (index === -1) {
+    if (change.op !== 'create') return rows;
+    return prepend ? [change.fields, ...rows] : [...rows, change.fields];
+  }
+  const next = [...rows];
+  next[index] = { ...rows[index], ...change.fields };
+  return next;
+};
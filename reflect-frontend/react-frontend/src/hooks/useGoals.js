@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import * as api from '../services/api';
+import useChangeEvents from './useChangeEvents';
 
 export default function useGoals(userId) {
   const [activeGoals, setActiveGoals] = useState([]);
@@ -26,6 +27,32 @@ export default function useGoals(userId) {
     }
   };
 
+  // Goal edits from other tabs and devices arrive as change events
+  useChangeEvents(userId, (event, data) => {
+    if (event === 'resync') {
+      loadGoals();
+      return;
+    }
+    if (event !== 'change' || data.entity !== 'goal') return;
+
+    const existing = [...activeGoals, ...completedGoals].find(g => g.id === data.id);
+    const goal = data.op === 'delete' ? null
+      : data.op === 'create' ? data.fields
+      : existing && { ...existing, ...data.fields };
+    if (data.op === 'update' && !goal) return;
+
+    // a status change moves the goal between the two lists
+    const place = (goals, status) => {
+      const rest = goals.filter(g => g.id !== data.id);
+      if (!goal || goal.status !== status) return rest;
+      return goals.some(g => g.id === data.id)
+        ? goals.map(g => (g.id === data.id ? goal : g))
+        : [...rest, goal];
+    };
+    setActiveGoals(goals => place(goals, 'active'));
+    setCompletedGoals(goals => place(goals, 'completed'));
+  });
+
   const createNewGoal = async (description, deadline = null) => {
     try {
       const newGoal = await api.createGoal(userId, description, deadline);
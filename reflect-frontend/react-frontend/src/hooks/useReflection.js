@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import * as api from '../services/api';
+import { makeTextPatch } from '../services/textPatch';
 
 export default function useReflection(userId) {
   const [currentQuestion, setCurrentQuestion] = useState(0);
@@ -91,14 +92,30 @@ export default function useReflection(userId) {
     
     try {
       const today = api.getTodayDate();
-      
-      const reflection = await api.createOrUpdateReflection(
-        userId,
-        today,
-        summary,
-        accomplishments,
-        improvementsToMake
-      );
+      const fields = { summary, accomplishments, improvements_to_make: improvementsToMake };
+      let reflection;
+
+      if (savedReflection?.version && savedReflection.reflection_date === today) {
+        // only the fields that changed are sent, as patches on the saved text
+        const patches = {};
+        for (const [field, value] of Object.entries(fields)) {
+          if ((value || '') !== (savedReflection[field] || '')) {
+            patches[field] = makeTextPatch(savedReflection[field], value || '');
+          }
+        }
+        const saved = Object.keys(patches).length
+          ? await api.patchReflection(userId, today, savedReflection.version, patches)
+          : savedReflection;
+        reflection = { ...savedReflection, ...saved, ...fields };
+      } else {
+        reflection = await api.createOrUpdateReflection(
+          userId,
+          today,
+          summary,
+          accomplishments,
+          improvementsToMake
+        );
+      }
       
       setAnswers([summary, accomplishments, improvementsToMake]);
       setSavedReflection(reflection);
@@ -109,7 +126,9 @@ export default function useReflection(userId) {
       }, 3000);
       
     } catch (err) {
-      setError(err.message || 'Failed to update reflection. Please try again.');
+      setError(err.status === 409
+        ? 'This reflection was changed in another window. Reload to see the latest version.'
+        : err.message || 'Failed to update reflection. Please try again.');
     } finally {
       setLoading(false);
     }
@@ -1,4 +1,6 @@
 // API Service for connecting to Flask backend
+import { makeTextPatch } from './textPatch';
+
 // Base URL - adjust this based on your Flask server configuration
 const API_BASE_URL = 'http://127.0.0.1:5000/api';
 
@@ -12,7 +14,11 @@ const getHeaders = (userId) => ({
 const handleResponse = async (response) => {
   if (!response.ok) {
     const error = await response.json();
-    throw new Error(error.error || 'API request failed');
+    const err = new Error(error.error || 'API request failed');
+    err.status = response.status;
+    // 429/503 from admission control say when to try again
+    if (error.retry_after !== undefined) err.retryAfter = error.retry_after;
+    throw err;
   }
   return response.json();
 };
@@ -36,6 +42,21 @@ export const createOrUpdateReflection = async (userId, reflectionDate, summary,
   return handleResponse(response);
 };
 
+/**
+ * Save changes to a reflection as text patches (see textPatch.js) against
+ * the version last loaded. `patches` maps field names to patches; fails
+ * with status 409 when the reflection changed since `baseVersion`.
+ * Returns the reflection without its text fields.
+ */
+export const patchReflection = async (userId, reflectionDate, baseVersion, patches) => {
+  const response = await fetch(`${API_BASE_URL}/reflections/${reflectionDate}`, {
+    method: 'PATCH',
+    headers: getHeaders(userId),
+    body: JSON.stringify({ base_version: baseVersion, patches }),
+  });
+  return handleResponse(response);
+};
+
 /**
  * Get reflection for a specific date
  */
@@ -110,6 +131,85 @@ export const updateJournalEntry = async (userId, entryId, content) => {
   return handleResponse(response);
 };
 
+/**
+ * Save changes to a journal entry as a text patch (see textPatch.js)
+ * against the version last loaded. Fails with status 409 when the entry
+ * changed since `baseVersion`. Returns the entry without its content.
+ */
+export const patchJournalEntry = async (userId, entryId, baseVersion, patch) => {
+  const response = await fetch(`${API_BASE_URL}/journal-entries/${entryId}`, {
+    method: 'PATCH',
+    headers: getHeaders(userId),
+    body: JSON.stringify({ base_version: baseVersion, patch }),
+  });
+  return handleResponse(response);
+};
+
+/**
+ * Save new content for an entry loaded earlier: as a patch when the full
+ * text and version of `entry` are known, else as the whole text. A 409
+ * means the entry was saved elsewhere in the meantime.
+ */
+export const saveJournalEntry = async (userId, entry, content) => {
+  if (typeof entry.content !== 'string' || !entry.version) {
+    return updateJournalEntry(userId, entry.id, content);
+  }
+  try {
+    const updated = await patchJournalEntry(userId, entry.id, entry.version, makeTextPatch(entry.content, content));
+    return { ...updated, content };
+  } catch (err) {
+    if (err.status === 409) {
+      err.message = 'This entry was changed in another window. Reopen it to see the latest version.';
+    }
+    throw err;
+  }
+};
+
+/**
+ * Earlier entries with similar wording to an entry, best first.
+ * Each item is an entry preview plus a `similarity` between 0 and 1.
+ */
+export const getRelatedJournalEntries = async (userId, entryId, limit = 5) => {
+  const response = await fetch(`${API_BASE_URL}/journal-entries/${entryId}/related?limit=${limit}`, {
+    method: 'GET',
+    headers: getHeaders(userId),
+  });
+  return handleResponse(response);
+};
+
+/**
+ * List the saved versions of a journal entry, newest first (without content)
+ */
+export const getJournalRevisions = async (userId, entryId) => {
+  const response = await fetch(`${API_BASE_URL}/journal-entries/${entryId}/revisions`, {
+    method: 'GET',
+    headers: getHeaders(userId),
+  });
+  return handleResponse(response);
+};
+
+/**
+ * Get one saved version of a journal entry, with its content
+ */
+export const getJournalRevision = async (userId, entryId, revision) => {
+  const response = await fetch(`${API_BASE_URL}/journal-entries/${entryId}/revisions/${revision}`, {
+    method: 'GET',
+    headers: getHeaders(userId),
+  });
+  return handleResponse(response);
+};
+
+/**
+ * Restore a saved version of a journal entry; returns the updated entry
+ */
+export const restoreJournalRevision = async (userId, entryId, revision) => {
+  const response = await fetch(`${API_BASE_URL}/journal-entries/${entryId}/revisions/${revision}/restore`, {
+    method: 'POST',
+    headers: getHeaders(userId),
+  });
+  return handleResponse(response);
+};
+
 /**
  * Delete a journal entry
  */
@@ -153,6 +253,17 @@ export const getGoals = async (userId, status = null) => {
   return handleResponse(response);
 };
 
+/**
+ * Get active goals due within `within` days, overdue ones first
+ */
+export const getUpcomingGoals = async (userId, within = 7, includeOverdue = true) => {
+  const response = await fetch(`${API_BASE_URL}/goals/upcoming?within=${within}&overdue=${includeOverdue ? 1 : 0}`, {
+    method: 'GET',
+    headers: getHeaders(userId),
+  });
+  return handleResponse(response);
+};
+
 /**
  * Update a goal
  */
@@ -264,6 +375,36 @@ export const updateScheduledTask = async (userId, taskId, updates) => {
   return handleResponse(response);
 };
 
+/**
+ * Get a week of scheduled tasks bucketed for the calendar grid:
+ * { days: { 'YYYY-MM-DD': { tasks: [...], hours: { '9': [taskIndex, ...] } } } }
+ * Each task also carries start_minute, duration_minutes, lane and lanes.
+ */
+export const getScheduledTasksWeek = async (userId, startDate, endDate) => {
+  const response = await fetch(
+    `${API_BASE_URL}/scheduled-tasks?start_date=${startDate}&end_date=${endDate}&layout=week`,
+    {
+      method: 'GET',
+      headers: getHeaders(userId),
+    }
+  );
+  return handleResponse(response);
+};
+
+/**
+ * Find open slots of at least durationMinutes on each day between two dates
+ */
+export const getFreeSlots = async (userId, startDate, endDate, durationMinutes = 60) => {
+  const response = await fetch(
+    `${API_BASE_URL}/scheduled-tasks/free-slots?start_date=${startDate}&end_date=${endDate}&duration=${durationMinutes}`,
+    {
+      method: 'GET',
+      headers: getHeaders(userId),
+    }
+  );
+  return handleResponse(response);
+};
+
 /**
  * Get AI-powered morning insights
  */
@@ -275,6 +416,92 @@ export const getMorningInsights = async (userId) => {
   return handleResponse(response);
 };
 
+/**
+ * Read a Server-Sent Events response, calling onEvent(event, data) for each
+ * event that carries data. Comment lines (keep-alives) are skipped.
+ */
+const readEventStream = async (response, onEvent) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // events are separated by a blank line
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      let data = '';
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
+};
+
+/**
+ * Stream morning insights as Server-Sent Events.
+ *
+ * EventSource cannot send the X-User-Id header, so the stream is read with
+ * fetch. onEvent(event, data) is called with 'placeholder' (rule-based
+ * insights to show immediately), 'insight' (one finished AI insight) and
+ * finally 'done'.
+ */
+export const streamMorningInsights = async (userId, onEvent) => {
+  const response = await fetch(`${API_BASE_URL}/morning-insights/stream`, {
+    method: 'GET',
+    headers: getHeaders(userId),
+  });
+  if (!response.ok || !response.body) {
+    throw new Error('Failed to stream insights');
+  }
+  await readEventStream(response, onEvent);
+};
+
+/**
+ * Receive task start reminders until `signal` (an AbortSignal) aborts.
+ * onReminder(reminder) gets {task_id, title, task_date, start_time, remind_at, minutes_before}.
+ */
+export const streamReminders = async (userId, onReminder, signal) => {
+  const response = await fetch(`${API_BASE_URL}/reminders/stream`, {
+    method: 'GET',
+    headers: getHeaders(userId),
+    signal,
+  });
+  if (!response.ok || !response.body) {
+    throw new Error('Failed to stream reminders');
+  }
+  await readEventStream(response, (event, data) => {
+    if (event === 'reminder') onReminder(data);
+  });
+};
+
+/**
+ * Receive change events for the user's data until `signal` aborts.
+ * onEvent(event, data) gets 'change' ({entity, op, id, fields, version}),
+ * 'reminder', and 'resync' when the server dropped events and the client
+ * should refetch.
+ */
+export const streamEvents = async (userId, onEvent, signal) => {
+  const response = await fetch(`${API_BASE_URL}/events/stream`, {
+    method: 'GET',
+    headers: getHeaders(userId),
+    signal,
+  });
+  if (!response.ok || !response.body) {
+    throw new Error('Failed to stream events');
+  }
+  await readEventStream(response, onEvent);
+};
+
 /**
  * Delete a scheduled task
  */
@@ -286,6 +513,26 @@ export const deleteScheduledTask = async (userId, taskId) => {
   return handleResponse(response);
 };
 
+// ==================== BULK ====================
+
+/**
+ * Apply several creates/updates/deletes in one request and one transaction.
+ *
+ * operations: [{ op: 'create' | 'update' | 'delete',
+ *                type: 'scheduled_task' | 'goal' | 'journal_entry',
+ *                id, data }]
+ * Resolves to { results: [{ op, type, id, item }] } in the same order; if
+ * any operation is invalid nothing is applied and the error names it.
+ */
+export const bulkMutate = async (userId, operations) => {
+  const response = await fetch(`${API_BASE_URL}/bulk`, {
+    method: 'POST',
+    headers: getHeaders(userId),
+    body: JSON.stringify({ operations }),
+  });
+  return handleResponse(response);
+};
+
 /**
  * Get start and end dates for the current week (Sunday - Saturday)
  */
@@ -320,4 +567,32 @@ export const getUserStats = async (userId) => {
     headers: getHeaders(userId),
   });
   return handleResponse(response);
+};
+
+/**
+ * Get mood, entry and word counts per day or week (period: 'day' | 'week')
+ */
+export const getMoodTrend = async (userId, startDate, endDate, period = 'day') => {
+  const response = await fetch(
+    `${API_BASE_URL}/analytics/mood?start=${startDate}&end=${endDate}&period=${period}`,
+    {
+      method: 'GET',
+      headers: getHeaders(userId),
+    }
+  );
+  return handleResponse(response);
+};
+
+/**
+ * Get the most used terms in journal entries and reflections over a date range
+ */
+export const getTopTerms = async (userId, startDate, endDate, limit = 20) => {
+  const response = await fetch(
+    `${API_BASE_URL}/analytics/terms?start=${startDate}&end=${endDate}&limit=${limit}`,
+    {
+      method: 'GET',
+      headers: getHeaders(userId),
+    }
+  );
+  return handleResponse(response);
 };
\ No newline at end of file
@@ -0,0 +1,45 @@
+// Text patches for the autosave protocol (see reflect-backend/services/edits.py).
+// A patch is a list of pieces: [start, end] keeps that range of the saved
+// text, a string is inserted. Offsets count code points, like Python strings.
+
+const isLowSurrogate = (code) => code >= 0xdc00 && code <= 0xdfff;
+
+const codePointLength = (text) => {
+  let length = 0;
+  for (let i = 0; i < text.length; i++) {
+    if (!isLowSurrogate(text.charCodeAt(i))) length++;
+  }
+  return length;
+};
+
+/**
+ * Patch that turns `base` into `target`: the unchanged start and end are
+ * kept, whatever lies between is sent. Typing in one place, which is what
+ * an autosave usually carries, costs only the new words.
+ */
+export const makeTextPatch = (base, target) => {
+  base = base || '';
+  let head = 0;
+  const shorter = Math.min(base.length, target.length);
+  while (head < shorter && base.charCodeAt(head) === target.charCodeAt(head)) head++;
+  let tail = 0;
+  while (
+    tail < shorter - head
+    && base.charCodeAt(base.length - 1 - tail) === target.charCodeAt(target.length - 1 - tail)
+  ) tail++;
+
+  // never cut a surrogate pair in two
+  if (head > 0 && isLowSurrogate(base.charCodeAt(head))) head--;
+  if (tail > 0 && isLowSurrogate(base.charCodeAt(base.length - tail))) tail--;
+
+  const headEnd = codePointLength(base.slice(0, head));
+  const tailStart = headEnd + codePointLength(base.slice(head, base.length - tail));
+  const baseEnd = tailStart + codePointLength(base.slice(base.length - tail));
+
+  const patch = [];
+  if (head > 0) patch.push([0, headEnd]);
+  const inserted = target.slice(head, target.length - tail);
+  if (inserted) patch.push(inserted);
+  if (tail > 0) patch.push([tailStart, baseEnd]);
+  return patch;
+};
@@ -1,13 +1,59 @@
 import React, { useState } from 'react';
-import { X, PenSquare, Loader2 } from 'lucide-react';
+import { X, PenSquare, Loader2, History } from 'lucide-react';
 import { useTheme } from '../contexts/ThemeContext';
 import RichTextEditor from '../components/RichTextEditor';
+import * as api from '../services/api';
 import '../components/RichTextEditor.css';
 
-export default function JournalModal({ isOpen, onClose, onSubmit, loading, initialContent = '', isEditing = false }) {
+export default function JournalModal({ isOpen, onClose, onSubmit, onRestored, loading, initialContent = '', isEditing = false, userId = null, entryId = null }) {
   const { timeOfDay } = useTheme();
   const [content, setContent] = useState(initialContent);
   const [error, setError] = useState('');
+  const [related, setRelated] = useState([]);
+  const [revisions, setRevisions] = useState([]);
+  const [showHistory, setShowHistory] = useState(false);
+  const [restoring, setRestoring] = useState(null);
+
+  // Earlier entries with similar wording, shown while editing a saved entry
+  React.useEffect(() => {
+    if (!isOpen || !userId || !entryId) {
+      setRelated([]);
+      return;
+    }
+    let cancelled = false;
+    api.getRelatedJournalEntries(userId, entryId)
+      .then(entries => { if (!cancelled) setRelated(entries); })
+      .catch(err => console.error('Error loading related entries:', err));
+    return () => { cancelled = true; };
+  }, [isOpen, userId, entryId]);
+
+  // Saved versions of the entry, loaded when the history panel is opened
+  React.useEffect(() => {
+    if (!isOpen || !showHistory || !userId || !entryId) {
+      return;
+    }
+    let cancelled = false;
+    api.getJournalRevisions(userId, entryId)
+      .then(rows => { if (!cancelled) setRevisions(rows); })
+      .catch(err => console.error('Error loading revisions:', err));
+    return () => { cancelled = true; };
+  }, [isOpen, showHistory, userId, entryId]);
+
+  const handleRestore = async (revision) => {
+    setRestoring(revision);
+    setError('');
+    try {
+      const entry = await api.restoreJournalRevision(userId, entryId, revision);
+      setContent(entry.content);
+      // the next save patches against the restored text and its new version
+      if (onRestored) onRestored(entry);
+      setRevisions(await api.getJournalRevisions(userId, entryId));
+    } catch (err) {
+      setError(err.message || 'Failed to restore this version');
+    } finally {
+      setRestoring(null);
+    }
+  };
 
   // Update content when initialContent changes (for edit mode)
   React.useEffect(() => {
@@ -91,6 +137,61 @@ export default function JournalModal({ isOpen, onClose, onSubmit, loading, initi
             </p>
           </div>
 
+          {isEditing && entryId && (
+            <div>
+              <button
+                type="button"
+                onClick={() => setShowHistory(open => !open)}
+                className="flex items-center gap-2 text-sm font-medium text-zinc-400 hover:text-zinc-200 transition-colors"
+              >
+                <History size={16} />
+                {showHistory ? 'Hide history' : 'Show history'}
+              </button>
+              {showHistory && (
+                <ul className="mt-2 space-y-2 max-h-40 overflow-y-auto">
+                  {revisions.map((rev, index) => (
+                    <li key={rev.revision} className="p-3 rounded-lg bg-zinc-800/50 border border-zinc-800 flex items-center justify-between">
+                      <div>
+                        <p className="text-sm text-zinc-300">
+                          {new Date(rev.updated_at).toLocaleString()}
+                          {index === 0 && <span className="text-zinc-500"> (current)</span>}
+                        </p>
+                        <p className="text-xs text-zinc-500">{rev.char_count} characters</p>
+                      </div>
+                      {index > 0 && (
+                        <button
+                          type="button"
+                          onClick={() => handleRestore(rev.revision)}
+                          disabled={restoring !== null || loading}
+                          className="px-3 py-1 rounded-lg bg-zinc-800 text-zinc-300 hover:bg-zinc-700 text-sm disabled:opacity-50"
+                        >
+                          {restoring === rev.revision ? 'Restoring...' : 'Restore'}
+                        </button>
+                      )}
+                    </li>
+                  ))}
+                  {revisions.length === 0 && (
+                    <li className="text-sm text-zinc-500">No earlier versions saved yet.</li>
+                  )}
+                </ul>
+              )}
+            </div>
+          )}
+
+          {related.length > 0 && (
+            <div>
+              <p className="text-sm font-medium text-zinc-400 mb-2">Related past entries</p>
+              <ul className="space-y-2 max-h-40 overflow-y-auto">
+                {related.map(entry => (
+                  <li key={entry.id} className="p-3 rounded-lg bg-zinc-800/50 border border-zinc-800">
+                    <p className="text-xs text-zinc-500 mb-1">{api.formatDate(entry.entry_date)}</p>
+                    <p className="text-sm text-zinc-300 line-clamp-2">{entry.preview}</p>
+                  </li>
+                ))}
+              </ul>
+            </div>
+          )}
+
           <div className="flex gap-3">
             <button
               type="button"